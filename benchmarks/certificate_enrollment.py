@@ -0,0 +1,133 @@
+"""Compares certificate enrollment throughput of the openssl commands OTS used to run with the in process CA engine
+
+Usage: python benchmarks/certificate_enrollment.py [iterations]
+
+"sign" is what /Marti/api/tls/signClient/v2 does for every EUD, signing a CSR the client generated. "issue" is what the
+web UI and ``flask ots issue-certificate`` do: generate a key and CSR, sign it, and export the key and PKCS#12 files.
+The openssl numbers run the same commands certificate_authority.py used to run, including its ``openssl list
+-providers`` check.
+"""
+
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from cryptography.hazmat.primitives import serialization
+from flask import Flask
+
+from opentakserver import ca_engine
+from opentakserver.certificate_authority import CertificateAuthority
+from opentakserver.defaultconfig import DefaultConfig
+
+PASSWORD = "atakatak"
+
+
+def run(command):
+    exit_code = subprocess.call(
+        command, shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    if exit_code:
+        raise Exception("{} failed with exit code {}".format(command, exit_code))
+
+
+def openssl_sign(ca_folder, folder, name):
+    run(
+        "openssl x509 -sha256 -req -days 3650 -in {0}/{1}.csr -CA {2}/ca.pem "
+        "-CAkey {2}/ca-do-not-share.key -out {0}/{1}.pem -set_serial {3} -passin pass:{4} "
+        "-extensions client -extfile {2}/ca_config.cfg".format(
+            folder, name, ca_folder, int.from_bytes(os.urandom(8), "big"), PASSWORD
+        )
+    )
+
+
+def openssl_issue(ca_folder, folder, name):
+    run(
+        "openssl req -new -newkey rsa:2048 -sha256 -keyout {0}/{1}.key -passout pass:{2} "
+        "-out {0}/{1}.csr -subj /CN={1} -config {3}/ca_config.cfg".format(
+            folder, name, PASSWORD, ca_folder
+        )
+    )
+    openssl_sign(ca_folder, folder, name)
+    run("openssl list -providers")
+    run(
+        "openssl pkcs12 -legacy -export -in {0}/{1}.pem -inkey {0}/{1}.key -out {0}/{1}.p12 "
+        "-name {1} -passin pass:{2} -passout pass:{2}".format(folder, name, PASSWORD)
+    )
+    run(
+        "openssl rsa -in {0}/{1}.key -passin pass:{2} -out {0}/{1}.nopass.key".format(
+            folder, name, PASSWORD
+        )
+    )
+
+
+def engine_issue(ca, folder, name):
+    key = ca_engine.generate_key()
+    csr = ca_engine.build_csr(key, ca_engine.parse_subject("/CN={}".format(name)))
+    certificate = ca_engine.sign_csr(ca, csr, 3650)
+    files = {
+        ".key": ca_engine.private_key_pem(key, PASSWORD),
+        ".nopass.key": ca_engine.private_key_pem(key),
+        ".pem": ca_engine.certificate_pem(certificate),
+        ".p12": ca_engine.pkcs12_bundle(name, key, certificate, PASSWORD),
+    }
+    for extension, data in files.items():
+        with open(os.path.join(folder, name + extension), "wb") as f:
+            f.write(data)
+
+
+def measure(label, iterations, function):
+    start = time.perf_counter()
+    for i in range(iterations):
+        function(i)
+    elapsed = time.perf_counter() - start
+    print(
+        "{:<16} {:>8.1f} ms/cert {:>8.1f} certs/s".format(
+            label, elapsed * 1000 / iterations, iterations / elapsed
+        )
+    )
+
+
+def main(iterations):
+    with tempfile.TemporaryDirectory() as ca_folder:
+        app = Flask(__name__)
+        app.config.from_object(DefaultConfig)
+        app.config["OTS_CA_FOLDER"] = ca_folder
+        app.config["OTS_CA_PASSWORD"] = PASSWORD
+        certificate_authority = CertificateAuthority(logging.getLogger(__name__), app)
+        certificate_authority.create_ca()
+        ca = certificate_authority.load_ca()
+
+        folder = os.path.join(ca_folder, "bench")
+        os.makedirs(folder)
+        csrs = []
+        for i in range(iterations):
+            csr = ca_engine.build_csr(
+                ca_engine.generate_key(), ca_engine.parse_subject("/CN=eud{}".format(i))
+            )
+            csrs.append(csr)
+            with open(os.path.join(folder, "eud{}.csr".format(i)), "wb") as f:
+                f.write(csr.public_bytes(serialization.Encoding.PEM))
+
+        measure(
+            "sign openssl",
+            iterations,
+            lambda i: openssl_sign(ca_folder, folder, "eud{}".format(i)),
+        )
+        measure(
+            "sign engine",
+            iterations,
+            lambda i: certificate_authority.sign(csrs[i], "eud{}".format(i)),
+        )
+        measure(
+            "issue openssl",
+            iterations,
+            lambda i: openssl_issue(ca_folder, folder, "u{}".format(i)),
+        )
+        measure("issue engine", iterations, lambda i: engine_issue(ca, folder, "u{}".format(i)))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
@@ -15,7 +15,6 @@ import colorlog
 import flask_wtf
 import pika
 import pytz
-import requests
 import sqlalchemy
 import yaml
 from flask import Flask, current_app, g, request, session
@@ -36,10 +35,18 @@ from werkzeug.middleware.proxy_fix import ProxyFix
 
 import opentakserver
 from opentakserver.certificate_authority import CertificateAuthority
+from opentakserver.controllers.group_change_controller import GroupChangeController
+from opentakserver.controllers.map_delta_controller import MapDeltaController
 from opentakserver.controllers.meshtastic_controller import MeshtasticController
+from opentakserver.controllers.presence_controller import PresenceController
 from opentakserver.defaultconfig import DefaultConfig
 from opentakserver.EmailValidator import EmailValidator
 from opentakserver.extensions import apscheduler, babel, db, ldap_manager, logger, mail, socketio
+from opentakserver.group_routing import GROUP_MASK_EXCHANGE
+from opentakserver.http_cache import ensure_cache_versions
+from opentakserver.http_client import http_client
+from opentakserver.json_provider import ORJSONProvider
+from opentakserver.map_deltas import MAP_UPDATES_EXCHANGE
 from opentakserver.models.Group import Group, GroupTypeEnum
 from opentakserver.models.Icon import Icon
 from opentakserver.models.role import Role
@@ -47,6 +54,7 @@ from opentakserver.models.WebAuthn import WebAuthn
 from opentakserver.PasswordValidator import PasswordValidator
 from opentakserver.plugins.Plugin import Plugin
 from opentakserver.plugins.PluginManager import PluginManager
+from opentakserver.presence import PRESENCE_EXCHANGE
 from opentakserver.sql_jobstore import SQLJobStore
 from opentakserver.UsernameValidator import UsernameValidator
 
@@ -171,6 +179,10 @@ def init_extensions(app):
         "firehose", durable=True, exchange_type="fanout"
     )  # A firehose of all CoT data
     channel.exchange_declare("flask-socketio", durable=False, exchange_type="fanout")
+    channel.exchange_declare(PRESENCE_EXCHANGE, durable=False, exchange_type="fanout")
+    channel.exchange_declare(MAP_UPDATES_EXCHANGE, durable=False, exchange_type="fanout")
+    # For routing CoTs to groups by bitmask
+    channel.exchange_declare(GROUP_MASK_EXCHANGE, durable=True, exchange_type="headers")
     channel.close()
     rabbit_connection.close()
 
@@ -197,6 +209,8 @@ def init_extensions(app):
 
     mail.init_app(app)
 
+    http_client.init_app(app)
+
     babel.init_app(app, locale_selector=get_locale, timezone_selector=get_timezone)
 
 
@@ -233,6 +247,7 @@ def setup_logging(app):
 
 def create_app(cli=True):
     app = Flask(__name__)
+    app.json = ORJSONProvider(app)
     app.config.from_object(DefaultConfig)
     setup_logging(app)
 
@@ -420,9 +435,8 @@ def main(app):
         if icons == 0:
             logger.info("Downloading icons...")
             try:
-                r = requests.get(
-                    "https://github.com/brian7704/OpenTAKServer-Installer/raw/master/iconsets.sqlite",
-                    stream=True,
+                r = http_client.get(
+                    "https://github.com/brian7704/OpenTAKServer-Installer/raw/master/iconsets.sqlite"
                 )
                 with open(
                     os.path.join(app.config.get("OTS_DATA_FOLDER"), "icons.sqlite"), "wb"
@@ -476,6 +490,10 @@ def main(app):
             )
         db.session.commit()
 
+    app.presence_controller = PresenceController(app.app_context())
+    app.group_change_controller = GroupChangeController(app.app_context())
+    app.map_delta_controller = MapDeltaController(app.app_context())
+
     if app.config.get("OTS_ENABLE_MESHTASTIC"):
         mestastic_thread = MeshtasticController(app.app_context())
         app.mestastic_thread = mestastic_thread
@@ -507,6 +525,9 @@ def main(app):
 
     create_default_groups(app)
 
+    with app.app_context():
+        ensure_cache_versions()
+
     try:
         socketio.run(
             app,
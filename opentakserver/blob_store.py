@@ -0,0 +1,96 @@
+"""Content addressed storage for data packages and mission content
+
+Files are stored in ``UPLOAD_FOLDER`` as ``<sha256><extension>``, the same names /Marti/sync/content already looks for.
+Uploads are streamed to a temp file in that folder while they're hashed, so memory use doesn't depend on the file size.
+The temp file is then hard linked to its final name, which fails instead of overwriting when another upload of the same
+content got there first, so identical uploads are only stored once and readers never see a partial file.
+"""
+
+import glob
+import hashlib
+import io
+import os
+import re
+import tempfile
+from dataclasses import dataclass
+from typing import BinaryIO
+
+from flask import current_app as app
+
+CHUNK_SIZE = 1024 * 1024
+SHA256 = re.compile(r"^[0-9a-f]{64}$")
+
+
+@dataclass
+class Blob:
+    hash: str
+    size: int
+    path: str
+    created: bool
+
+
+def blob_folder() -> str:
+    folder = app.config.get("UPLOAD_FOLDER")
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def blob_path(file_hash: str, extension: str = "") -> str:
+    if not SHA256.match(file_hash or ""):
+        raise ValueError(f"Invalid hash: {file_hash}")
+    return os.path.join(blob_folder(), f"{file_hash}{extension}")
+
+
+def find_blob(file_hash: str, extension: str = "") -> str | None:
+    """Returns the path of a stored file, trying any extension when it isn't stored with ``extension``"""
+    try:
+        path = blob_path(file_hash, extension)
+    except ValueError:
+        return None
+    if os.path.exists(path):
+        return path
+
+    matches = glob.glob(os.path.join(blob_folder(), f"{file_hash}.*"))
+    return matches[0] if matches else None
+
+
+def save_blob(source: BinaryIO | bytes, extension: str = "") -> Blob:
+    """Streams source into the store and returns its hash
+
+    :param source: A file like object or bytes
+    :param extension: Appended to the hash to build the file name, i.e. ".zip"
+    """
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+
+    folder = blob_folder()
+    sha256 = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(dir=folder, prefix=".upload-")
+    try:
+        with os.fdopen(fd, "wb") as temp:
+            while chunk := source.read(CHUNK_SIZE):
+                sha256.update(chunk)
+                temp.write(chunk)
+                size += len(chunk)
+        # mkstemp creates files only the owner can read, the reverse proxy needs to read them too
+        os.chmod(temp_path, 0o644)
+
+        file_hash = sha256.hexdigest()
+        path = blob_path(file_hash, extension)
+        created = False
+        if not os.path.exists(path):
+            try:
+                os.link(temp_path, path)
+                created = True
+            except FileExistsError:
+                pass
+            except OSError:
+                # Hard links aren't supported on every filesystem, a rename is still atomic
+                os.replace(temp_path, path)
+                created = True
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    return Blob(file_hash, size, path, created)
@@ -1,5 +1,6 @@
 import os
 import platform
+import socket
 import sys
 
 import click
@@ -8,6 +9,7 @@ from flask import current_app as app
 from flask import g
 from flask.cli import with_appcontext
 
+from opentakserver import bulk_certificates
 from opentakserver.certificate_authority import CertificateAuthority
 from opentakserver.defaultconfig import DefaultConfig
 from opentakserver.extensions import logger
@@ -44,6 +46,50 @@ def issue_certificate(cn):
         ca.issue_certificate(cn)
 
 
+@ots.command()
+@with_appcontext
+@click.argument("common_names", nargs=-1)
+@click.option(
+    "--csv",
+    "csv_file",
+    type=click.File("r"),
+    help="A CSV file with common names in the first column",
+)
+@click.option("--server", help="The address EUDs connect to, defaults to this host's FQDN")
+@click.option("--output", default="enrollment_packages.zip", help="Where to write the zip")
+@click.option("--overwrite", is_flag=True, help="Reissue certificates that already exist")
+@click.option("--workers", type=int, help="Number of worker processes, defaults to the CPU count")
+def issue_certificates(common_names, csv_file, server, output, overwrite, workers):
+    """Issue certificates and enrollment packages for many common names at once"""
+    ca = CertificateAuthority(logger, app)
+    if not ca.check_if_ca_exists():
+        logger.error("Certificate authority doesn't exist")
+        sys.exit(1)
+
+    common_names = bulk_certificates.read_common_names(common_names)
+    if csv_file:
+        common_names += bulk_certificates.read_common_names(csv_file.read())
+
+    succeeded = []
+    server = server or socket.getfqdn()
+    results = bulk_certificates.issue_certificates(common_names, server, overwrite, workers)
+    for done, result in enumerate(results, start=1):
+        if result.status == bulk_certificates.ERROR:
+            logger.error(
+                "[{}/{}] {}: {}".format(done, len(common_names), result.common_name, result.error)
+            )
+        else:
+            succeeded.append(result.common_name)
+            logger.info(
+                "[{}/{}] {}: {}".format(done, len(common_names), result.common_name, result.status)
+            )
+
+    bulk_certificates.write_archive(succeeded, output)
+    logger.info("Wrote enrollment packages for {} users to {}".format(len(succeeded), output))
+    if len(succeeded) < len(common_names):
+        sys.exit(1)
+
+
 @ots.command()
 @with_appcontext
 def issue_server_certificate():
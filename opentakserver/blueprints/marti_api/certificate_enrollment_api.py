@@ -1,4 +1,5 @@
 import base64
+import binascii
 import datetime
 import os
 import traceback
@@ -7,14 +8,16 @@ from xml.etree.ElementTree import Element, SubElement, tostring
 
 import bleach
 import sqlalchemy
-from flask import Blueprint
+from flask import Blueprint, Response
 from flask import current_app as app
 from flask import jsonify, request
 from flask_ldap3_login import AuthenticationResponseStatus
 from flask_security import verify_password
 from OpenSSL import crypto
 
+from opentakserver import revocation
 from opentakserver.certificate_authority import CertificateAuthority
+from opentakserver.downloads import send_download
 from opentakserver.extensions import db, ldap_manager, logger
 from opentakserver.models.Certificate import Certificate
 from opentakserver.models.EUD import EUD
@@ -113,7 +116,9 @@ def sign_csr_v2():
 
         cert_authority = CertificateAuthority(logger, app)
 
-        signed_csr = cert_authority.sign_csr(csr.encode(), common_name, False).decode("utf-8")
+        signed_pem = cert_authority.sign_csr(csr.encode(), common_name, False)
+        serial_number = revocation.serial_number(signed_pem)
+        signed_csr = signed_pem.decode("utf-8")
         signed_csr = signed_csr.replace("-----BEGIN CERTIFICATE-----\n", "")
         signed_csr = signed_csr.replace("\n-----END CERTIFICATE-----\n", "")
 
@@ -187,6 +192,7 @@ def sign_csr_v2():
                     app.config.get("OTS_CA_FOLDER"), "certs", common_name, common_name + ".csr"
                 )
                 certificate.cert_password = app.config.get("OTS_CA_PASSWORD")
+                certificate.serial_number = serial_number
 
                 db.session.add(certificate)
                 db.session.commit()
@@ -213,6 +219,7 @@ def sign_csr_v2():
                     app.config.get("OTS_CA_FOLDER"), "certs", common_name, common_name + ".csr"
                 )
                 certificate.cert_password = app.config.get("OTS_CA_PASSWORD")
+                certificate.serial_number = serial_number
 
                 db.session.commit()
 
@@ -236,3 +243,36 @@ def sign_csr_v2():
     except BaseException as e:
         logger.error(traceback.format_exc())
         return jsonify({"error": str(e)}), 500
+
+
+@certificate_authority_api_blueprint.route("/Marti/api/tls/crl")
+def crl():
+    return send_download(
+        app.config.get("OTS_CA_FOLDER"), revocation.BASE_CRL, mimetype="application/x-pem-file"
+    )
+
+
+@certificate_authority_api_blueprint.route("/Marti/api/tls/crl/delta")
+def delta_crl():
+    return send_download(
+        app.config.get("OTS_CA_FOLDER"), revocation.DELTA_CRL, mimetype="application/x-pem-file"
+    )
+
+
+@certificate_authority_api_blueprint.route("/Marti/api/tls/ocsp", methods=["POST"])
+@certificate_authority_api_blueprint.route("/Marti/api/tls/ocsp/<path:encoded_request>")
+def ocsp(encoded_request=None):
+    if encoded_request:
+        try:
+            request_der = base64.b64decode(encoded_request)
+        except binascii.Error:
+            request_der = b""
+    else:
+        request_der = request.get_data()
+
+    response, max_age = revocation.ocsp_response(request_der)
+    return Response(
+        response,
+        mimetype="application/ocsp-response",
+        headers={"Cache-Control": f"max-age={max_age}, public, no-transform, must-revalidate"},
+    )
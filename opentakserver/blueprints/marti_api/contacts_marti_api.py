@@ -1,12 +1,14 @@
 from flask import Blueprint, jsonify, request
 
 from opentakserver.extensions import db, logger
+from opentakserver.http_cache import conditional
 from opentakserver.models.EUD import EUD
 
 contacts_api = Blueprint("contacts_api", __name__)
 
 
 @contacts_api.route("/Marti/api/contacts/all")
+@conditional("euds")
 def get_all_contacts():
     euds = db.session.execute(db.session.query(EUD)).all()
 
@@ -1,12 +1,12 @@
-import datetime
-from xml.etree.ElementTree import Element, fromstring, tostring
-
 from flask import Blueprint, jsonify, request
 from flask_babel import gettext
+from sqlalchemy import select
 
 from opentakserver.extensions import db, logger
-from opentakserver.functions import datetime_from_iso8601_string
 from opentakserver.models.CoT import CoT
+from opentakserver.models.Point import Point
+from opentakserver.spatial import bbox_filter, parse_bbox
+from opentakserver.streaming import stream_xml_events, time_window
 
 cot_marti_api = Blueprint("cot_api", __name__)
 
@@ -41,36 +41,18 @@ def get_all_cot(uid):
     logger.debug(request.headers)
     logger.debug(request.args)
 
-    sec_ago = request.args.get("secago")
-    start = request.args.get("start")
-    end = request.args.get("end")
-
-    query = db.session.query(CoT).filter_by(uid=uid)
-    if sec_ago:
-        try:
-            query = query.filter(CoT.start >= datetime.datetime.now(datetime.UTC) - datetime.timedelta(seconds=int(sec_ago)))
-        except ValueError:
-            return (
-                jsonify(
-                    {
-                        "success": False,
-                        "error": gettext("Invalid secago value: %(sec_ago)s", sec_ago=sec_ago),
-                    }
-                ),
-                400,
-            )
-    if start:
-        query = query.filter(CoT.start >= datetime_from_iso8601_string(start))
-    if end:
-        query = query.filter(CoT.stale <= datetime_from_iso8601_string(end))
-
-    cots = db.session.execute(query)
-
-    events = Element("events")
-    for cot in cots:
-        events.append(fromstring(cot[0].xml))
-
-    return tostring(events).decode("utf-8"), 200
+    try:
+        query = time_window(
+            select(CoT.xml).where(CoT.uid == uid),
+            request.args,
+            CoT.start,
+            end_column=CoT.stale,
+            id_column=CoT.id,
+        )
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    return stream_xml_events(query)
 
 
 @cot_marti_api.route("/Marti/api/cot/sa")
@@ -78,11 +60,31 @@ def get_cot_by_time_and_bbox():
     logger.debug(request.headers)
     logger.debug(request.args)
 
-    start = request.args.get("start")
-    end = request.args.get("end")
-    left = request.args.get("left")
-    bottom = request.args.get("bottom")
-    right = request.args.get("right")
-    top = request.args.get("top")
+    try:
+        bbox = parse_bbox(request.args)
+    except ValueError as e:
+        return (
+            jsonify(
+                {
+                    "success": False,
+                    "error": gettext("Invalid bounding box: %(error)s", error=str(e)),
+                }
+            ),
+            400,
+        )
+
+    if not bbox:
+        return (
+            jsonify(
+                {"success": False, "error": gettext("left, bottom, right, and top are required")}
+            ),
+            400,
+        )
 
-    return "", 200
+    query = bbox_filter(select(CoT.xml).join(Point, Point.cot_id == CoT.id), bbox)
+    try:
+        query = time_window(query, request.args, Point.timestamp, id_column=Point.id)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    return stream_xml_events(query)
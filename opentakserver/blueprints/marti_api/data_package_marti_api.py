@@ -12,14 +12,17 @@ import bleach
 import sqlalchemy
 from flask import Blueprint
 from flask import current_app as app
-from flask import jsonify, request, send_from_directory
+from flask import jsonify, request
 from flask_babel import gettext
 from flask_login import current_user
 from werkzeug.datastructures.file_storage import FileStorage
 from werkzeug.utils import secure_filename
 
+from opentakserver.blob_store import find_blob, save_blob
+from opentakserver.downloads import send_download
 from opentakserver.extensions import db, logger
 from opentakserver.functions import format_bytes, iso8601_string_from_datetime
+from opentakserver.http_cache import conditional
 from opentakserver.models.DataPackage import DataPackage
 from opentakserver.models.MissionContent import MissionContent
 
@@ -27,33 +30,30 @@ data_package_marti_api = Blueprint("data_package_marti_api", __name__)
 
 
 def save_data_package_file(file, filename: str = None, username: str = None, eud_uid: str = None):
-    file_hash = request.args.get("hash")
-    if not file_hash:
-        sha256 = hashlib.sha256()
-        if type(file) == bytes:
-            sha256.update(file)
-            file_hash = sha256.hexdigest()
-            filename, extension = os.path.splitext(secure_filename(filename))
-            with open(os.path.join(app.config.get("UPLOAD_FOLDER"), f"{file_hash}.zip"), "wb") as f:
-                f.write(file)
-        else:
-            sha256.update(file.stream.read())
-            file.stream.seek(0)
-            file_hash = sha256.hexdigest()
-            file.save(os.path.join(app.config.get("UPLOAD_FOLDER"), f"{file_hash}.zip"))
-            filename, extension = os.path.splitext(secure_filename(file.filename))
-            logger.debug("Got file: {} - {}".format(file.filename, file_hash))
-    else:
-        file.save(os.path.join(app.config.get("UPLOAD_FOLDER"), f"{file_hash}.zip"))
-        filename, extension = os.path.splitext(secure_filename(file.filename))
-        logger.debug("Got file: {} - {}".format(file.filename, file_hash))
+    """
+    Streams a data package into the blob store and saves it to the database
+
+    :param file: A FileStorage, file like object, or bytes
+    :param filename: The data package's file name, defaults to the FileStorage's file name
+    :return: The data package's sha256 hash
+    """
+    if isinstance(file, FileStorage):
+        filename = filename or file.filename
+        file = file.stream
+
+    blob = save_blob(file, ".zip")
+    filename, extension = os.path.splitext(secure_filename(filename or blob.hash))
+    logger.debug("Got file: {} - {}".format(filename, blob.hash))
+
+    client_hash = request.args.get("hash")
+    if client_hash and client_hash.lower() != blob.hash:
+        logger.warning(f"Data package {filename} has hash {blob.hash}, client sent {client_hash}")
 
-    file_size = os.path.getsize(os.path.join(app.config.get("UPLOAD_FOLDER"), f"{file_hash}.zip"))
     save_data_package_to_db(
-        f"{filename}.zip", file_hash, "application/x-zip-compressed", file_size, username, eud_uid
+        f"{filename}.zip", blob.hash, "application/x-zip-compressed", blob.size, username, eud_uid
     )
 
-    return file_hash
+    return blob.hash
 
 
 def save_data_package_to_db(
@@ -155,24 +155,15 @@ def create_data_package_zip(file: FileStorage | str) -> str:
     zipf.writestr("MANIFEST/manifest.xml", tostring(manifest))
     zipf.close()
 
-    # Get the sha256 hash of the data package zip for its file name on disk and for the data_packages table
-    zip_file = open(os.path.join(app.config.get("UPLOAD_FOLDER"), f"{filename}.zip"), "rb")
-    zip_file_bytes = zip_file.read()
-    zip_file.close()
+    # Move the zip into the blob store under its sha256 hash, which is also its hash in the data_packages table
+    zip_path = os.path.join(app.config.get("UPLOAD_FOLDER"), f"{filename}.zip")
+    with open(zip_path, "rb") as zip_file:
+        blob = save_blob(zip_file, ".zip")
+    os.remove(zip_path)
 
-    sha256 = hashlib.sha256()
-    sha256.update(zip_file_bytes)
-    data_package_hash = sha256.hexdigest()
+    save_data_package_to_db(f"{filename}.zip", blob.hash, "application/zip", blob.size)
 
-    os.rename(
-        os.path.join(app.config.get("UPLOAD_FOLDER"), f"{filename}.zip"),
-        os.path.join(app.config.get("UPLOAD_FOLDER"), f"{data_package_hash}.zip"),
-    )
-    save_data_package_to_db(
-        f"{filename}.zip", data_package_hash, "application/zip", len(zip_file_bytes)
-    )
-
-    return data_package_hash
+    return blob.hash
 
 
 @data_package_marti_api.route("/Marti/sync/missionupload", methods=["POST"])
@@ -242,7 +233,7 @@ def data_package_metadata(file_hash):
         data_package = db.session.execute(
             db.select(DataPackage).filter_by(hash=file_hash)
         ).scalar_one()
-        return send_from_directory(
+        return send_download(
             app.config.get("UPLOAD_FOLDER"),
             data_package.hash + ".zip",
             download_name=data_package.filename,
@@ -314,6 +305,7 @@ def get_data_package():
 
 
 @data_package_marti_api.route("/Marti/sync/search", methods=["GET"])
+@conditional("data_packages")
 def data_package_search():
     query = db.session.query(DataPackage)
 
@@ -365,16 +357,15 @@ def download_data_package():
         return "", 200
 
     filename, extension = os.path.splitext(secure_filename(file[0].filename))
-    if os.path.exists(os.path.join(app.config.get("UPLOAD_FOLDER"), f"{file_hash}{extension}")):
-        return send_from_directory(
-            app.config.get("UPLOAD_FOLDER"),
-            f"{file_hash}{extension}",
-            download_name=file[0].filename,
+    path = find_blob(file_hash, extension)
+    if path:
+        return send_download(
+            os.path.dirname(path), os.path.basename(path), download_name=file[0].filename
         )
     elif os.path.exists(
         os.path.join(app.config.get("OTS_DATA_FOLDER"), "missions", file[0].filename)
     ):
-        return send_from_directory(
+        return send_download(
             os.path.join(app.config.get("OTS_DATA_FOLDER"), "missions"), file[0].filename
         )
     else:
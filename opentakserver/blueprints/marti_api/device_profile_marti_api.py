@@ -1,10 +1,8 @@
 import datetime
-import io
 import os
 import re
 import traceback
 import uuid
-import zipfile
 from urllib.parse import urlparse
 from xml.etree.ElementTree import Element, SubElement, tostring
 
@@ -12,7 +10,6 @@ from flask import Blueprint, Response
 from flask import current_app as app
 from flask import request
 from sqlalchemy import or_
-from werkzeug.wsgi import FileWrapper
 
 import opentakserver
 from opentakserver.blueprints.marti_api.marti_api import verify_client_cert
@@ -21,6 +18,7 @@ from opentakserver.models.DataPackage import DataPackage
 from opentakserver.models.DeviceProfiles import DeviceProfiles
 from opentakserver.models.Packages import Packages
 from opentakserver.models.Plugins import Plugins
+from opentakserver.zip_cache import ZipStream, static_zip
 
 device_profile_marti_api_blueprint = Blueprint("device_profile_marti_api_blueprint", __name__)
 
@@ -67,18 +65,21 @@ def get_ldap_attributes(prefs: Element):
                 subelement.text = user_info[field][0]
 
 
-def create_profile_zip(enrollment=True, syncSecago=-1, clientUid: str | None = None):
+def create_profile_zip(enrollment=True, syncSecago=-1, clientUid: str | None = None) -> ZipStream:
+    """
+    The maps, plugins, data packages, and truststore are the same for every EUD so they're compressed once and
+    cached by zip_cache. Only the manifest and preference.pref are generated for each request.
+    """
     # preference.pref
     prefs = Element("preferences")
     pref = SubElement(prefs, "preference", {"version": "1", "name": "com.atakmap.app_preferences"})
 
     get_ldap_attributes(pref)
 
-    plugins = None
-    data_packages = None
-    device_profiles = None
-    zip_buffer = io.BytesIO()
-    zipf = zipfile.ZipFile(zip_buffer, "a", zipfile.ZIP_DEFLATED, False)
+    plugins = []
+    data_packages = []
+    device_profiles = []
+    static_files = []
 
     # MANIFEST file
     manifest = Element("MissionPackageManifest", {"version": "2"})
@@ -93,11 +94,6 @@ def create_profile_zip(enrollment=True, syncSecago=-1, clientUid: str | None = N
         "Content",
         {"ignore": "false", "zipEntry": "5c2bfcae3d98c9f4d262172df99ebac5/preference.pref"},
     )
-    SubElement(
-        contents,
-        "Content",
-        {"ignore": "false", "zipEntry": "5c2bfcae3d98c9f4d262172df99ebac5/truststore-root.p12"},
-    )
 
     enable_update_server = SubElement(
         pref, "entry", {"key": "appMgmtEnableUpdateServer", "class": "class java.lang.Boolean"}
@@ -146,22 +142,21 @@ def create_profile_zip(enrollment=True, syncSecago=-1, clientUid: str | None = N
 
     if enrollment:
         # Add the maps to the zip
-        if app.config.get("OTS_PROFILE_MAP_SOURCES") and enrollment:
+        if app.config.get("OTS_PROFILE_MAP_SOURCES"):
             maps_path = os.path.join(os.path.dirname(opentakserver.__file__), "maps")
-            for root, dirs, map_files in os.walk(maps_path):
-                for map in map_files:
-                    zipf.writestr(f"maps/{map}", open(os.path.join(maps_path, map), "r").read())
-                    SubElement(contents, "Content", {"ignore": "false", "zipEntry": f"maps/{map}"})
-
-            device_profiles = db.session.execute(
-                db.session.query(DeviceProfiles).filter_by(enrollment=True, active=True)
-            ).all()
-            plugins = db.session.execute(
-                db.session.query(Packages).filter_by(install_on_enrollment=True)
-            ).all()
-            data_packages = db.session.execute(
-                db.session.query(DataPackage).filter_by(install_on_enrollment=True)
-            ).all()
+            for map in sorted(os.listdir(maps_path)):
+                if os.path.isfile(os.path.join(maps_path, map)):
+                    static_files.append((f"maps/{map}", os.path.join(maps_path, map)))
+
+        device_profiles = db.session.execute(
+            db.session.query(DeviceProfiles).filter_by(enrollment=True, active=True)
+        ).all()
+        plugins = db.session.execute(
+            db.session.query(Packages).filter_by(install_on_enrollment=True)
+        ).all()
+        data_packages = db.session.execute(
+            db.session.query(DataPackage).filter_by(install_on_enrollment=True)
+        ).all()
     else:
         device_profile_query = db.session.query(DeviceProfiles).filter_by(
             connection=True, active=True
@@ -198,49 +193,41 @@ def create_profile_zip(enrollment=True, syncSecago=-1, clientUid: str | None = N
         )
         p.text = profile[0].preference_value
 
-    if plugins:
-        for plugin in plugins:
-            plugin = plugin[0]
-
-            SubElement(
-                contents,
-                "Content",
-                {
-                    "ignore": "false",
-                    "zipEntry": f"5c2bfcae3d98c9f4d262172df99ebac5/{plugin.file_name}",
-                },
-            )
-            zipf.write(
-                os.path.join(app.config.get("OTS_DATA_FOLDER"), "packages", plugin.file_name),
+    for plugin in plugins:
+        plugin = plugin[0]
+        static_files.append(
+            (
                 f"5c2bfcae3d98c9f4d262172df99ebac5/{plugin.file_name}",
+                os.path.join(app.config.get("OTS_DATA_FOLDER"), "packages", plugin.file_name),
             )
+        )
 
-    if data_packages:
-        for data_package in data_packages:
-            data_package = data_package[0]
-            SubElement(
-                contents,
-                "Content",
-                {
-                    "ignore": "false",
-                    "zipEntry": f"5c2bfcae3d98c9f4d262172df99ebac5/{data_package.filename}",
-                },
-            )
-            zipf.write(
-                os.path.join(app.config.get("UPLOAD_FOLDER"), f"{data_package.hash}.zip"),
+    for data_package in data_packages:
+        data_package = data_package[0]
+        static_files.append(
+            (
                 f"5c2bfcae3d98c9f4d262172df99ebac5/{data_package.filename}",
+                os.path.join(app.config.get("UPLOAD_FOLDER"), f"{data_package.hash}.zip"),
             )
+        )
 
-    zipf.writestr("MANIFEST/manifest.xml", tostring(manifest))
-
-    zipf.writestr("5c2bfcae3d98c9f4d262172df99ebac5/preference.pref", tostring(prefs))
+    static_files.append(
+        (
+            "5c2bfcae3d98c9f4d262172df99ebac5/truststore-root.p12",
+            os.path.join(app.config.get("OTS_CA_FOLDER"), "truststore-root.p12"),
+        )
+    )
 
-    with open(
-        os.path.join(app.config.get("OTS_CA_FOLDER"), "truststore-root.p12"), "rb"
-    ) as truststore:
-        zipf.writestr("5c2bfcae3d98c9f4d262172df99ebac5/truststore-root.p12", truststore.read())
+    cached_zip = static_zip(static_files)
+    for name in cached_zip.names():
+        SubElement(contents, "Content", {"ignore": "false", "zipEntry": name})
 
-    return zip_buffer
+    return cached_zip.stream(
+        {
+            "MANIFEST/manifest.xml": tostring(manifest),
+            "5c2bfcae3d98c9f4d262172df99ebac5/preference.pref": tostring(prefs),
+        }
+    )
 
 
 # Authentication for /Marti endpoints handled by client cert validation
@@ -249,9 +236,8 @@ def create_profile_zip(enrollment=True, syncSecago=-1, clientUid: str | None = N
 def enrollment_profile():
     try:
         profile_zip = create_profile_zip()
-        profile_zip.seek(0)
         return Response(
-            FileWrapper(profile_zip), mimetype="application/zip", direct_passthrough=True
+            profile_zip, mimetype="application/zip", headers={"Content-Length": profile_zip.length}
         )
     except BaseException as e:
         logger.error(f"Failed to send enrollment package: {e}")
@@ -275,9 +261,8 @@ def connection_profile():
             client_uid = request.args["clientUid"]
 
         profile_zip = create_profile_zip(False, syncSecago, client_uid)
-        profile_zip.seek(0)
         return Response(
-            FileWrapper(profile_zip), mimetype="application/zip", direct_passthrough=True
+            profile_zip, mimetype="application/zip", headers={"Content-Length": profile_zip.length}
         )
     except BaseException as e:
         logger.error(f"Failed to send enrollment package: {e}")
@@ -2,7 +2,6 @@ import datetime
 import traceback
 
 import bleach
-import pika
 from flask import Blueprint
 from flask import current_app as app
 from flask import jsonify, request
@@ -10,9 +9,12 @@ from flask_babel import gettext
 from flask_security import current_user
 from OpenSSL.crypto import X509
 
-from opentakserver.blueprints.marti_api.marti_api import verify_client_cert
+from opentakserver.blueprints.marti_api.marti_api import client_cert_principal, verify_client_cert
 from opentakserver.extensions import db, ldap_manager, logger
 from opentakserver.functions import iso8601_string_from_datetime
+from opentakserver.group_changes import Binding, group_change
+from opentakserver.group_routing import user_mask
+from opentakserver.http_cache import conditional
 from opentakserver.models.Group import Group
 from opentakserver.models.GroupUser import GroupUser
 
@@ -32,6 +34,7 @@ def group_cache_enabled():
 
 
 @group_api.route("/Marti/api/groups/all")
+@conditional("groups", principal=client_cert_principal)
 def get_all_groups():
     cert = verify_client_cert()
     if not cert:
@@ -251,14 +254,8 @@ def put_active_groups():
         for eud in user.euds:
             uids.append(eud.uid)
 
-    rabbit_credentials = pika.PlainCredentials(
-        app.config.get("OTS_RABBITMQ_USERNAME"), app.config.get("OTS_RABBITMQ_PASSWORD")
-    )
-    rabbit_host = app.config.get("OTS_RABBITMQ_SERVER_ADDRESS")
-    rabbit_connection = pika.BlockingConnection(
-        pika.ConnectionParameters(host=rabbit_host, credentials=rabbit_credentials)
-    )
-    channel = rabbit_connection.channel()
+    bind = []
+    unbind = []
 
     group_subscriptions = db.session.execute(
         db.session.query(GroupUser).filter_by(user_id=user.id)
@@ -325,28 +322,19 @@ def put_active_groups():
                     group_subscription.enabled = active
                     db.session.add(group_subscription)
 
+                group = group_subscription.group
                 for uid in uids:
+                    binding = Binding(uid, group.name, group_subscription.direction, group.bitpos)
                     if active:
-                        channel.queue_declare(queue=uid)
-                        channel.queue_bind(
-                            queue=uid,
-                            exchange="groups",
-                            routing_key=f"{group_subscription.group.name}.{group_subscription.direction}",
-                        )
+                        bind.append(binding)
                     else:
-                        channel.queue_unbind(
-                            queue=uid,
-                            exchange="groups",
-                            routing_key=f"{group_subscription.group.name}.{group_subscription.direction}",
-                        )
+                        unbind.append(binding)
 
                 user_in_group = True
 
         if not user_in_group:
             logger.warning(f"{username} is not in the {group_name} group")
             db.session.rollback()
-            channel.close()
-            rabbit_connection.close()
             return (
                 jsonify(
                     {
@@ -362,9 +350,12 @@ def put_active_groups():
             )
 
     try:
-        channel.close()
-        rabbit_connection.close()
         db.session.commit()
+        # The bindings are applied after the response is sent
+        mask = user_mask(user.id, Group.IN)
+        app.group_change_controller.submit(
+            group_change(bind, unbind, masks={uid: mask for uid in uids})
+        )
         return "", 200
     except BaseException as e:
         logger.error(f"Failed to update group subscriptions for {current_user.username}: {e}")
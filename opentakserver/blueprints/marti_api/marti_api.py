@@ -3,19 +3,24 @@ import os
 import traceback
 from urllib.parse import unquote, urlparse
 
-from flask import Blueprint
+from flask import Blueprint, Response
 from flask import current_app as app
-from flask import jsonify, request, send_from_directory
+from flask import jsonify, request, stream_with_context
 from flask_babel import gettext
-from OpenSSL import crypto
 from OpenSSL.crypto import X509
-from simplekml import Document, GxMultiTrack, GxTrack, Icon, IconStyle, Kml, Style
+from sqlalchemy.orm import joinedload
+from werkzeug.utils import secure_filename
 
 from opentakserver import __version__ as version
+from opentakserver.crypto_cache import verify_certificate
+from opentakserver.downloads import content_disposition
 from opentakserver.extensions import db, logger
 from opentakserver.functions import datetime_from_iso8601_string, iso8601_string_from_datetime
+from opentakserver.http_cache import conditional
 from opentakserver.models.EUD import EUD
 from opentakserver.models.Point import Point
+from opentakserver.presence import registry as presence
+from opentakserver.track_export import kml_chunks, kmz_chunks
 
 marti_api = Blueprint("marti_api", __name__)
 
@@ -27,26 +32,23 @@ def verify_client_cert() -> X509 | bool:
     if cert_header not in request.headers:
         return False
 
-    cert = unquote(request.headers.get(cert_header))
-    cert = crypto.load_certificate(crypto.FILETYPE_PEM, cert)
-    with open(os.path.join(app.config.get("OTS_CA_FOLDER"), "ca.pem"), "rb") as f:
-        ca_cert = crypto.load_certificate(crypto.FILETYPE_PEM, f.read())
+    return verify_certificate(unquote(request.headers.get(cert_header))) or False
 
-    store = crypto.X509Store()
-    store.add_cert(ca_cert)
-    ctx = crypto.X509StoreContext(store, cert)
 
-    try:
-        ctx.verify_certificate()
-        return cert
-    except crypto.X509StoreContextError:
-        return False
+def client_cert_principal(**kwargs) -> str | None:
+    """Cache principal for http_cache.conditional(). Views handle a missing or invalid cert"""
+    cert = verify_client_cert()
+    if not cert:
+        return None
+    return cert.get_subject().commonName
 
 
 @marti_api.route("/Marti/api/clientEndPoints", methods=["GET"])
+@conditional("euds", extra=lambda: presence.version)
 def client_end_points():
     # TODO: Add group support ?group=__ANON__
-    euds = db.session.execute(db.select(EUD)).scalars()
+    euds = db.session.execute(db.select(EUD).options(joinedload(EUD.user))).scalars()
+    online = {session.uid for session in presence.online()}
     return_value = {
         "version": 3,
         "type": "com.bbn.marti.remote.ClientEndpoint",
@@ -63,7 +65,7 @@ def client_end_points():
                 "uid": eud.uid,
                 "username": eud.user.username if eud.user else "anonymous",
                 "lastEventTime": iso8601_string_from_datetime(eud.last_event_time),
-                "lastStatus": eud.last_status,
+                "lastStatus": "Connected" if eud.uid in online else "Disconnected",
             }
         )
 
@@ -93,13 +95,27 @@ def atak_track_history():
         end_time = request.args.get("endTime")
         uid = request.args.get("uid")
         file_format = request.args.get("format")
-        # Not sure what these three are supposed to do
+        # Minutes between points that starts a new track
         multitrack_threshold = request.args.get("multiTrackThreshold")
+        # Not sure what this one is supposed to do
         extended_data = request.args.get("extendedData")
-        optimize_export = request.args.get("optimizeExport")
+        optimize_export = request.args.get("optimizeExport", "false").lower() == "true"
 
-        kml = Kml()
-        doc: Document = kml.newdocument(name=uid)
+        try:
+            multitrack_threshold = float(multitrack_threshold) if multitrack_threshold else None
+        except ValueError:
+            return (
+                jsonify(
+                    {
+                        "success": False,
+                        "error": gettext(
+                            "Invalid multiTrackThreshold: %(threshold)s",
+                            threshold=multitrack_threshold,
+                        ),
+                    }
+                ),
+                400,
+            )
 
         eud = db.session.execute(db.session.query(EUD).filter_by(uid=uid)).first()
         if not eud:
@@ -109,60 +125,60 @@ def atak_track_history():
             )
         eud: EUD = eud[0]
 
-        icon = Icon(href=f"files/team_{eud.team.name.lower().replace(' ', '')}.png")
-        icon_style = IconStyle(scale=1.0, heading=0.0, icon=icon)
-        style = Style(iconstyle=icon_style)
-        doc.styles.append(style)
-        kml.addfile(
-            os.path.join(
-                os.path.dirname(os.path.realpath(__file__)),
-                "icons",
-                f"team_{eud.team.name.lower().replace(' ', '')}.png",
+        icon_href = None
+        files = {}
+        if eud.team:
+            icon_name = f"team_{eud.team.name.lower().replace(' ', '')}.png"
+            icon_href = f"files/{icon_name}"
+            icon_path = os.path.join(
+                os.path.dirname(os.path.realpath(__file__)), "icons", icon_name
             )
+            if os.path.exists(icon_path):
+                files[icon_href] = icon_path
+
+        # The track is simplified as it streams, skip points it can't use instead of failing mid-response
+        query = db.session.query(Point.timestamp, Point.longitude, Point.latitude).filter(
+            Point.device_uid == uid,
+            Point.latitude.is_not(None),
+            Point.longitude.is_not(None),
+            Point.timestamp.is_not(None),
         )
 
-        query = db.session.query(Point)
-
-        if uid:
-            query = query.filter(Point.device_uid == uid)
-
         if start_time:
             query = query.filter(Point.timestamp >= datetime_from_iso8601_string(start_time))
 
         if end_time:
             query = query.filter(Point.timestamp <= datetime_from_iso8601_string(end_time))
 
-        points = db.session.execute(query)
-        timestamps = []
-        coords = []
-        for point in points:
-            point = point[0]
-            timestamps.append(iso8601_string_from_datetime(point.timestamp))
-            coords.append((point.longitude, point.latitude))
-
-        multitrack: GxMultiTrack = doc.newgxmultitrack(gxinterpolate=0)
-        multitrack.style = style
-        multitrack.name = eud.callsign
-
-        track: GxTrack = multitrack.newgxtrack(name=uid, gxaltitudemode="clampToGround")
-        track.newwhen(timestamps)
-        track.newgxcoord(coords)
+        # Stream rows from the DB instead of loading the whole track
+        rows = db.session.execute(query.order_by(Point.timestamp).execution_options(yield_per=1000))
+
+        kml = kml_chunks(
+            rows,
+            uid,
+            eud.callsign,
+            icon_href,
+            optimize_export,
+            app.config.get("OTS_TRACK_EXPORT_BUCKET_SECONDS"),
+            app.config.get("OTS_TRACK_EXPORT_TOLERANCE_METERS"),
+            multitrack_threshold,
+        )
 
         if file_format == "kmz":
-            kml.savekmz(os.path.join(app.config.get("UPLOAD_FOLDER"), f"{uid}.kmz"))
-            return send_from_directory(
-                app.config.get("UPLOAD_FOLDER"),
-                f"{uid}.kmz",
-                as_attachment=True,
-                download_name=f"{uid}.kmz",
+            return Response(
+                stream_with_context(kmz_chunks(kml, files)),
+                mimetype="application/vnd.google-earth.kmz",
+                headers={
+                    "Content-Disposition": content_disposition(secure_filename(uid) + ".kmz", True)
+                },
             )
         else:
-            kml.save(os.path.join(app.config.get("UPLOAD_FOLDER"), f"{uid}.kml"))
-            return send_from_directory(
-                app.config.get("UPLOAD_FOLDER"),
-                f"{uid}.kml",
-                as_attachment=True,
-                download_name=f"{uid}.kml",
+            return Response(
+                stream_with_context(chunk.encode("utf-8") for chunk in kml),
+                mimetype="application/vnd.google-earth.kml+xml",
+                headers={
+                    "Content-Disposition": content_disposition(secure_filename(uid) + ".kml", True)
+                },
             )
 
     except BaseException as e:
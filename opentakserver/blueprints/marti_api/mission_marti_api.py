@@ -1,12 +1,11 @@
 import datetime
-import hashlib
 import json
 import os
 import time
 import traceback
 import uuid
 from urllib.parse import urlparse
-from xml.etree.ElementTree import Element, SubElement, fromstring, tostring
+from xml.etree.ElementTree import Element, SubElement, tostring
 
 import bleach
 import flask
@@ -18,29 +17,39 @@ from flask import Blueprint, Response
 from flask import current_app as app
 from flask import jsonify, request
 from flask_babel import gettext
-from flask_security import current_user, hash_password, verify_password
-from sqlalchemy import insert, or_, update
+from flask_security import hash_password, verify_password
+from sqlalchemy import insert, or_, select, update
+from sqlalchemy.orm import selectinload
 from werkzeug.utils import secure_filename
 
+from opentakserver.blob_store import save_blob
 from opentakserver.blueprints.marti_api.data_package_marti_api import save_data_package_file
-from opentakserver.blueprints.marti_api.marti_api import verify_client_cert
+from opentakserver.blueprints.marti_api.marti_api import client_cert_principal, verify_client_cert
+from opentakserver.crypto_cache import server_private_key, server_public_key
 from opentakserver.extensions import db, logger
 from opentakserver.functions import datetime_from_iso8601_string, iso8601_string_from_datetime
+from opentakserver.http_cache import conditional
 from opentakserver.models.CoT import CoT
 from opentakserver.models.EUD import EUD
 from opentakserver.models.Group import Group
 from opentakserver.models.GroupMission import GroupMission
 from opentakserver.models.GroupUser import GroupUser
 from opentakserver.models.Mission import Mission
-from opentakserver.models.MissionChange import MissionChange, generate_mission_change_cot
+from opentakserver.models.MissionChange import (
+    MissionChange,
+    generate_mission_change_cot,
+    squash_mission_changes,
+)
 from opentakserver.models.MissionContent import MissionContent
 from opentakserver.models.MissionContentMission import MissionContentMission
 from opentakserver.models.MissionInvitation import InvitationTypeEnum, MissionInvitation
 from opentakserver.models.MissionLogEntry import MissionLogEntry
 from opentakserver.models.MissionRole import MissionRole
+from opentakserver.models.MissionSummary import mission_summaries, summary_query
 from opentakserver.models.MissionUID import MissionUID
 from opentakserver.models.Team import Team
 from opentakserver.models.user import User
+from opentakserver.streaming import stream_xml_events, time_window
 
 mission_marti_api = Blueprint("mission_marti_api", __name__)
 
@@ -61,18 +70,12 @@ def verify_token() -> dict | bool:
 
     token = token.replace("Bearer ", "")
 
-    with open(
-        os.path.join(
-            app.config.get("OTS_CA_FOLDER"), "certs", "opentakserver", "opentakserver.pub"
-        ),
-        "r",
-    ) as key:
-        try:
-            return jwt.decode(token, key.read(), algorithms=["RS256"])
-        except BaseException as e:
-            logger.error("Failed to validate mission token: {}".format(e))
-            logger.debug(traceback.format_exc())
-            return False
+    try:
+        return jwt.decode(token, server_public_key(), algorithms=["RS256"])
+    except BaseException as e:
+        logger.error("Failed to validate mission token: {}".format(e))
+        logger.debug(traceback.format_exc())
+        return False
 
 
 # iTAK sucks and doesn't send a token for some reason...
@@ -160,17 +163,7 @@ def generate_token(mission: Mission, eud_uid: str):
         "MISSION_GUID": mission.guid,
     }
 
-    server_key = open(
-        os.path.join(
-            app.config.get("OTS_CA_FOLDER"), "certs", "opentakserver", "opentakserver.nopass.key"
-        ),
-        "r",
-    )
-
-    token = jwt.encode(payload, server_key.read(), algorithm="RS256")
-    server_key.close()
-
-    return token
+    return jwt.encode(payload, server_private_key(), algorithm="RS256")
 
 
 def generate_new_mission_cot(mission: Mission) -> Element:
@@ -343,6 +336,7 @@ def get_mission_by_guid(mission_guid: str):
 
 
 @mission_marti_api.route("/Marti/api/missions")
+@conditional("missions", "groups", principal=client_cert_principal)
 def get_missions():
     cert = verify_client_cert()
     if not cert:
@@ -369,29 +363,26 @@ def get_missions():
     }
 
     try:
-        query = db.session.query(Mission)
+        query = summary_query().order_by(Mission.name)
 
         # Let admins see all missions
         if not user.has_role("administrator"):
-            group_filters = []
-            groups = db.session.execute(
-                db.session.query(GroupUser).filter_by(user_id=user.id, direction=Group.IN)
-            ).scalars()
-            for group in groups:
-                group_filters.append(GroupMission.group_id == group.group.id)
-            if group_filters:
-                query = query.outerjoin(GroupMission).where(or_(*group_filters))
-            else:
-                # If a user isn't in a group, only show them __ANON__ missions
-                query.outerjoin(GroupMission).where(GroupMission.group_id == 1)
+            in_groups = select(GroupUser.group_id).where(
+                GroupUser.user_id == user.id, GroupUser.direction == Group.IN
+            )
+            # If a user isn't in a group, only show them __ANON__ missions
+            anon_group = select(Group.id).where(Group.name == "__ANON__", ~in_groups.exists())
+            group_missions = select(GroupMission.mission_name).where(
+                GroupMission.group_id.in_(in_groups.union(anon_group))
+            )
+            query = query.where(Mission.name.in_(group_missions))
 
-        missions = db.session.execute(query).scalars()
-        for mission in missions:
-            if not password_protected and mission.password_protected:
-                continue
-            if tool and tool.lower() != "public" and mission.tool != tool:
-                continue
-            response["data"].append(mission.to_marti_json())
+        if not password_protected:
+            query = query.where(Mission.password_protected.is_not(True))
+        if tool and tool.lower() != "public":
+            query = query.where(Mission.tool == tool)
+
+        response["data"] = mission_summaries(query)
 
     except BaseException as e:
         logger.error(f"Failed to get missions: {e}")
@@ -1559,15 +1550,35 @@ def mission_unsubscribe(mission_name: str):
     return "", 200
 
 
-@mission_marti_api.route("/Marti/api/missions/<mission_name>/changes", methods=["GET"])
-def mission_changes(mission_name):
+def mission_principal(mission_name: str) -> str | object:
+    """Cache principal for mission endpoints, the same for every client that passes check_permission"""
     permission_granted = check_permission(mission_name)
-    if isinstance(permission_granted, flask.Response):
+    if permission_granted is not True:
         return permission_granted
+    return ""
 
-    squashed = request.args.get("squashed")
-    if squashed:
-        squashed = bleach.clean(squashed)
+
+def mission_changes_principal(mission_name: str) -> str | object | None:
+    """secago is relative to the current time so those responses can't be reused and skip the cache"""
+    principal = mission_principal(mission_name)
+    if principal == "" and request.args.get("secago"):
+        return None
+    return principal
+
+
+@mission_marti_api.route("/Marti/api/missions/<mission_name>/changes", methods=["GET"])
+@conditional("missions", principal=mission_changes_principal)
+def mission_changes(mission_name):
+    """
+    Returns the mission's changes, oldest first. ATAK polls this to sync missions so the time window arguments
+    let it fetch only what changed since its last sync.
+
+    since: Only changes with a serverTime after this
+    secago, start, end: Only changes with a serverTime in this window
+    squashed: When true, collapses changes to the same UID or content into the latest one
+    """
+
+    squashed = request.args.get("squashed", "false").lower() == "true"
 
     response = {
         "version": "3",
@@ -1576,11 +1587,37 @@ def mission_changes(mission_name):
         "nodeId": app.config.get("OTS_NODE_ID"),
     }
 
-    changes = db.session.execute(
-        db.session.query(MissionChange).filter_by(mission_name=mission_name)
-    ).all()
+    query = (
+        select(MissionChange)
+        .where(MissionChange.mission_name == mission_name)
+        .options(selectinload(MissionChange.content_resource), selectinload(MissionChange.uid))
+    )
+    try:
+        query = time_window(query, request.args, MissionChange.server_time)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    since = request.args.get("since")
+    if since:
+        try:
+            query = query.where(MissionChange.server_time > datetime_from_iso8601_string(since))
+        except ValueError:
+            return (
+                jsonify(
+                    {
+                        "success": False,
+                        "error": gettext("Invalid since value: %(since)s", since=since),
+                    }
+                ),
+                400,
+            )
+
+    changes = db.session.execute(query.order_by(MissionChange.id)).scalars().all()
+    if squashed:
+        changes = squash_mission_changes(changes)
+
     for change in changes:
-        response["data"].append(change[0].to_json())
+        response["data"].append(change.to_json())
 
     return jsonify(response)
 
@@ -1716,7 +1753,7 @@ def upload_content():
         and request.content_type == "application/x-zip-compressed"
     ):
         file_hash = save_data_package_file(
-            request.data, secure_filename(file_name) + ".zip", username, creator_uid
+            request.stream, secure_filename(file_name) + ".zip", username, creator_uid
         )
 
         response = {
@@ -1748,13 +1785,10 @@ def upload_content():
             400,
         )
 
-    file = request.data
-    sha256 = hashlib.sha256()
-    sha256.update(file)
+    # Stream the upload into the blob store. Content that's already stored isn't written again
+    blob = save_blob(request.stream, extension.lower())
 
-    content = db.session.execute(
-        db.session.query(MissionContent).filter_by(hash=sha256.hexdigest())
-    ).first()
+    content = db.session.execute(db.session.query(MissionContent).filter_by(hash=blob.hash)).first()
     if not content:
         content = MissionContent()
         content.mime_type = request.content_type
@@ -1763,10 +1797,10 @@ def upload_content():
         content.submitter = username or "anonymous"
         content.uid = str(uuid.uuid4())
         content.creator_uid = creator_uid
-        content.size = request.content_length
+        content.size = blob.size
         content.expiration = -1
         content.keywords = keywords if keywords else []
-        content.hash = sha256.hexdigest()
+        content.hash = blob.hash
         content_pk = db.session.execute(insert(MissionContent).values(**content.serialize()))
         content_pk = content_pk.inserted_primary_key[0]
         db.session.commit()
@@ -1782,12 +1816,6 @@ def upload_content():
             db.session.add(content)
             db.session.commit()
 
-    # Save the content even if it exists in the database in case it was deleted from disk
-    os.makedirs(os.path.join(app.config.get("OTS_DATA_FOLDER"), "missions"), exist_ok=True)
-    with open(os.path.join(app.config.get("OTS_DATA_FOLDER"), "missions", file_name), "wb") as f:
-        f.write(file)
-        f.flush()
-
     response = {
         "UID": content.uid,
         "SubmissionDateTime": iso8601_string_from_datetime(content.submission_time),
@@ -2226,28 +2254,23 @@ def get_mission_cots(mission_name: str = None, mission_guid: str = None):
     if isinstance(permission_granted, flask.Response):
         return permission_granted
 
-    if mission_name:
-        cots = db.session.execute(db.session.query(CoT).filter_by(mission_name=mission_name)).all()
-    elif mission_guid:
+    if not mission_name and mission_guid:
         mission = db.session.execute(db.session.query(Mission).filter_by(guid=mission_guid)).first()
-        if mission:
-            mission_name = mission[0].name
-            cots = db.session.execute(
-                db.session.query(CoT).filter_by(mission_name=mission_name)
-            ).all()
-        else:
-            cots = []
-    else:
-        cots = []
-
-    events = Element("events")
+        mission_name = mission[0].name if mission else None
+    if not mission_name:
+        return Response(response="<events></events>", status=200, mimetype="application/xml")
 
-    for cot in cots:
-        events.append(fromstring(cot[0].xml))
+    try:
+        query = time_window(
+            select(CoT.xml).where(CoT.mission_name == mission_name),
+            request.args,
+            CoT.timestamp,
+            id_column=CoT.id,
+        )
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
 
-    return Response(
-        response=tostring(events).decode("utf-8"), status=200, mimetype="application/xml"
-    )
+    return stream_xml_events(query)
 
 
 @mission_marti_api.route("/Marti/api/missions/<mission_name>/layers")
@@ -1,6 +1,9 @@
+import base64
+import binascii
 import datetime
 import hashlib
 import json
+import math
 import os
 import platform
 import traceback
@@ -10,19 +13,24 @@ from urllib.parse import urlparse
 import bleach
 import pika
 import psutil
+import sqlalchemy
 import sqlalchemy.exc
 import yaml
-from flask import Blueprint
+from cryptography import x509
+from flask import Blueprint, Response
 from flask import current_app as app
-from flask import jsonify, request, send_from_directory, session
+from flask import jsonify, request, send_from_directory, session, stream_with_context
 from flask_babel import gettext
 from flask_ldap3_login import AuthenticationResponseStatus
-from flask_security import auth_required, current_user, verify_password
-from sqlalchemy import String, Text, Unicode, UnicodeText, func, select
+from flask_security import auth_required, current_user, roles_required, verify_password
+from sqlalchemy import String, Text, Unicode, UnicodeText, and_, func, or_, select, text
 
 from opentakserver import __version__ as version
+from opentakserver import bulk_certificates, revocation
 from opentakserver.certificate_authority import CertificateAuthority
+from opentakserver.downloads import send_download
 from opentakserver.extensions import babel, db, ldap_manager, logger
+from opentakserver.http_client import http_client
 from opentakserver.models.Alert import Alert
 from opentakserver.models.APSchedulerJobs import APSchedulerJobs
 from opentakserver.models.CasEvac import CasEvac
@@ -39,6 +47,10 @@ from opentakserver.models.RBLine import RBLine
 from opentakserver.models.Token import Token
 from opentakserver.models.user import User
 from opentakserver.models.ZMIST import ZMIST
+from opentakserver.presence import registry as presence
+from opentakserver.serialization import apply_profile
+from opentakserver.spatial import bbox_condition, bbox_filter, parse_bbox
+from opentakserver.streaming import json_array, json_object, stream_json
 
 api_blueprint = Blueprint("api_blueprint", __name__)
 
@@ -53,7 +65,67 @@ def search(query, model, field):
     return query
 
 
+def encode_cursor(sort_value, primary_key) -> str:
+    """Encodes the sort key and primary key of the last row on a page into an opaque cursor for ``?after=``"""
+    if isinstance(sort_value, datetime.datetime):
+        value = {"v": sort_value.isoformat(), "t": "datetime"}
+    else:
+        value = {"v": sort_value, "t": None}
+    value["k"] = primary_key
+    return base64.urlsafe_b64encode(json.dumps(value).encode("utf-8")).decode("utf-8")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Reverses ``encode_cursor()``. Raises ``ValueError`` if the cursor is invalid"""
+    try:
+        value = json.loads(base64.urlsafe_b64decode(cursor.encode("utf-8")))
+        sort_value = value["v"]
+        if value["t"] == "datetime" and sort_value is not None:
+            sort_value = datetime.datetime.fromisoformat(sort_value)
+        return sort_value, value["k"]
+    except (binascii.Error, json.JSONDecodeError, KeyError, TypeError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+
+def count_rows(query: db.Query, model, total_mode: str) -> int | None:
+    """Counts the rows of a query according to the ``total`` request arg.
+
+    ``exact`` runs ``COUNT(*)``, ``none`` skips counting and ``approximate`` uses the planner's row estimate from
+    ``pg_class`` on PostgreSQL when the query has no filters, otherwise it falls back to an exact count.
+    """
+    if total_mode == "none":
+        return None
+
+    if (
+        total_mode == "approximate"
+        and db.engine.dialect.name == "postgresql"
+        and query.whereclause is None
+    ):
+        estimate = db.session.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table_name)"),
+            {"table_name": model.__tablename__},
+        ).scalar()
+        # reltuples is -1 if the table has never been vacuumed or analyzed
+        if estimate is not None and estimate >= 0:
+            return estimate
+
+    return query.order_by(None).count()
+
+
 def paginate(query: db.Query, model=None):
+    """Paginates a query and returns the serialized rows.
+
+    Supports two modes. ``page`` and ``per_page`` use OFFSET pagination. Passing ``after`` (the ``next_cursor`` value
+    of the previous response) switches to keyset pagination on the sort column and primary key, which stays fast on
+    large tables like ``cot`` and ``points`` no matter how deep the page is.
+
+    :param page: The page number
+    :param per_page: The number of results per page
+    :param after: An opaque cursor returned as ``next_cursor``
+    :param sort_by: The column to sort by
+    :param sort_direction: ``asc`` or ``desc``
+    :param total: ``exact`` (default for page mode), ``approximate``, or ``none`` (default for cursor mode)
+    """
     try:
         page = int(request.args.get("page")) if "page" in request.args else 1
         per_page = int(request.args.get("per_page")) if "per_page" in request.args else 10
@@ -64,26 +136,35 @@ def paginate(query: db.Query, model=None):
             {"Content-Type": "application/json"},
         )
 
+    after = request.args.get("after")
+    total_mode = request.args.get("total", "none" if after is not None else "exact")
+    if total_mode not in ("exact", "approximate", "none"):
+        return (
+            jsonify(
+                {"success": False, "error": gettext("Invalid total: %(total)s", total=total_mode)}
+            ),
+            400,
+        )
+
+    if not model:
+        model = query.column_descriptions[0]["entity"]
+
+    primary_key = sqlalchemy.inspect(model).primary_key[0]
+    sort_expr = None
+    descending = request.args.get("sort_direction") == "desc"
+
     try:
-        if model:
-            sort_by = request.args.get("sort_by")
-            sort_direction = request.args.get("sort_direction")
-            if sort_by:
-                column = getattr(model, sort_by)
-                # Sort string columns case-insensitively so "alice" sorts next
-                # to "Alice" instead of after every uppercase entry (Postgres
-                # default collation is byte-ordered: Z < a).
-                try:
-                    is_string_col = isinstance(
-                        column.type, (String, Text, Unicode, UnicodeText)
-                    )
-                except AttributeError:
-                    is_string_col = False
-                sort_expr = func.lower(column) if is_string_col else column
-                if sort_direction == "desc":
-                    query = query.order_by(sort_expr.desc())
-                else:
-                    query = query.order_by(sort_expr.asc())
+        sort_by = request.args.get("sort_by")
+        if sort_by:
+            column = getattr(model, sort_by)
+            # Sort string columns case-insensitively so "alice" sorts next
+            # to "Alice" instead of after every uppercase entry (Postgres
+            # default collation is byte-ordered: Z < a).
+            try:
+                is_string_col = isinstance(column.type, (String, Text, Unicode, UnicodeText))
+            except AttributeError:
+                is_string_col = False
+            sort_expr = func.lower(column) if is_string_col else column
     except BaseException as e:
         return (
             jsonify(
@@ -97,28 +178,116 @@ def paginate(query: db.Query, model=None):
             400,
         )
 
-    pagination = db.paginate(query, page=page, per_page=per_page)
-    rows = pagination.items
+    if after is not None:
+        return keyset_paginate(
+            query, model, primary_key, sort_expr, descending, after, per_page, total_mode
+        )
+
+    if sort_expr is not None:
+        query = query.order_by(sort_expr.desc() if descending else sort_expr.asc())
+
+    # session.execute() drops the loader options of a legacy Query, so paginate its statement instead
+    statement = query.statement if isinstance(query, db.Query) else query
+    pagination = db.paginate(statement, page=page, per_page=per_page, count=total_mode == "exact")
 
     results = {
-        "results": [],
+        "results": serialize_unique(pagination.items),
         "total_pages": pagination.pages,
         "current_page": page,
         "per_page": per_page,
-        "total": 0,
+        "total": pagination.total if total_mode == "exact" else None,
     }
 
-    for row in rows:
-        mission = row.to_json()
-        # Filter out duplicate results caused by missions belonging to multiple groups
-        if mission not in results["results"]:
-            results["results"].append(row.to_json())
+    if total_mode == "approximate":
+        results["total"] = count_rows(query, model, total_mode)
+        results["total_pages"] = math.ceil(results["total"] / per_page) if per_page else 0
+
+    return jsonify(results)
+
+
+def keyset_paginate(
+    query: db.Query,
+    model,
+    primary_key,
+    sort_expr,
+    descending: bool,
+    after: str,
+    per_page: int,
+    total_mode: str,
+):
+    unfiltered_query = query
 
-    results["total"] = pagination.total
+    if after:
+        try:
+            last_sort_value, last_primary_key = decode_cursor(after)
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+
+        after_primary_key = (
+            primary_key < last_primary_key if descending else primary_key > last_primary_key
+        )
+        if sort_expr is None:
+            query = query.filter(after_primary_key)
+        elif last_sort_value is None:
+            # NULLs sort last in both directions, so only NULLs come after a NULL
+            query = query.filter(sort_expr.is_(None), after_primary_key)
+        else:
+            query = query.filter(
+                or_(
+                    sort_expr < last_sort_value if descending else sort_expr > last_sort_value,
+                    and_(sort_expr == last_sort_value, after_primary_key),
+                    sort_expr.is_(None),
+                )
+            )
+
+    order_by = [primary_key.desc() if descending else primary_key.asc()]
+    if sort_expr is not None:
+        # Without an explicit NULLS LAST, PostgreSQL puts NULLs first when descending and SQLite puts them first when
+        # ascending
+        order_by.insert(0, (sort_expr.desc() if descending else sort_expr.asc()).nulls_last())
+
+    # Select the sort key and primary key alongside the row so the next cursor can be built from them
+    cursor_columns = [primary_key]
+    if sort_expr is not None:
+        cursor_columns.insert(0, sort_expr.label("sort_value"))
+    rows = query.add_columns(*cursor_columns).order_by(*order_by).limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last_row = rows[-1]
+        next_cursor = encode_cursor(last_row[1] if sort_expr is not None else None, last_row[-1])
+
+    results = {
+        "results": serialize_unique([row[0] for row in rows]),
+        "per_page": per_page,
+        "next_cursor": next_cursor,
+        "total": count_rows(unfiltered_query, model, total_mode),
+    }
+    results["total_pages"] = (
+        math.ceil(results["total"] / per_page)
+        if results["total"] is not None and per_page
+        else None
+    )
 
     return jsonify(results)
 
 
+def serialize_unique(rows) -> list:
+    """Serializes rows with ``to_json()``, skipping duplicates caused by joins (i.e. missions belonging to
+    multiple groups) by their primary key"""
+    results = []
+    seen = set()
+    for row in rows:
+        identity = sqlalchemy.inspect(row).identity
+        if identity in seen:
+            continue
+        seen.add(identity)
+        results.append(row.to_json())
+
+    return results
+
+
 def change_config_setting(setting, value):
     try:
         with open(
@@ -249,10 +418,8 @@ def status():
         "machine": platform.machine(),
     }
 
-    online_euds = db.session.execute(select(EUD).filter(EUD.last_status == "Connected")).all()
-
     response = {
-        "online_euds": len(online_euds),
+        "online_euds": presence.count(),
         "system_boot_time": system_boot_time.strftime("%Y-%m-%d %H:%M:%SZ"),
         "system_uptime": system_uptime.total_seconds(),
         "ots_start_time": app.start_time.strftime("%Y-%m-%d %H:%M:%SZ"),
@@ -266,6 +433,7 @@ def status():
         "uname": uname,
         "os_release": os_release,
         "python_version": platform.python_version(),
+        "http_client": http_client.stats(),
     }
 
     return jsonify(response)
@@ -299,6 +467,8 @@ def certificate():
 
             ca = CertificateAuthority(logger, app)
             filenames = ca.issue_certificate(username, False)
+            with open(ca.path("certs", username, username + ".pem"), "rb") as f:
+                serial_number = revocation.serial_number(f.read())
 
             for filename in filenames:
                 file_hash = hashlib.sha256(
@@ -359,6 +529,7 @@ def certificate():
                 cert.user_cert_filename = user_filename
                 cert.cert_password = app.config.get("OTS_CA_PASSWORD")
                 cert.data_package_id = data_package.id if data_package else None
+                cert.serial_number = serial_number
 
                 db.session.add(cert)
                 db.session.commit()
@@ -377,6 +548,135 @@ def certificate():
         return paginate(query)
 
 
+@api_blueprint.route("/api/certificate/revoke", methods=["POST"])
+@roles_required("administrator")
+def revoke_certificate():
+    """Revoke the certificates issued to a common name
+
+    The SSL streaming port and the Marti API refuse them within ``OTS_REVOCATION_REFRESH_SECONDS``, and they're listed
+    in the full and delta CRLs and OCSP responses right away.
+
+    :param common_name: The common name, usually a username
+    """
+    common_name = request.json.get("common_name") if request.is_json else None
+    if not common_name:
+        return jsonify({"success": False, "error": gettext("Please specify a common name")}), 400
+
+    certificates = (
+        db.session.execute(select(Certificate).where(Certificate.common_name == common_name))
+        .scalars()
+        .all()
+    )
+
+    # Certificates issued before serial numbers were recorded, or by the CLI, only have their PEM
+    ca = CertificateAuthority(logger, app)
+    pem_path = ca.path("certs", common_name, common_name + ".pem")
+    if bulk_certificates.COMMON_NAME.match(common_name) and os.path.exists(pem_path):
+        with open(pem_path, "rb") as f:
+            pem = f.read()
+        serial_number = revocation.serial_number(pem)
+
+        for certificate in certificates:
+            if not certificate.serial_number:
+                certificate.serial_number = serial_number
+
+        if serial_number not in [certificate.serial_number for certificate in certificates]:
+            certificate = Certificate()
+            certificate.common_name = common_name
+            certificate.expiration_date = x509.load_pem_x509_certificate(pem).not_valid_after_utc
+            certificate.server_address = urlparse(request.url_root).hostname
+            certificate.server_port = app.config.get("OTS_SSL_STREAMING_PORT")
+            certificate.truststore_filename = ca.path("truststore-root.p12")
+            certificate.user_cert_filename = pem_path
+            certificate.cert_password = app.config.get("OTS_CA_PASSWORD")
+            certificate.serial_number = serial_number
+            db.session.add(certificate)
+            certificates.append(certificate)
+
+    certificates = [certificate for certificate in certificates if certificate.serial_number]
+    if not certificates:
+        return (
+            jsonify(
+                {
+                    "success": False,
+                    "error": gettext(
+                        "No certificates found for %(common_name)s", common_name=common_name
+                    ),
+                }
+            ),
+            404,
+        )
+
+    serial_numbers = revocation.revoke(certificates)
+    return jsonify({"success": True, "serial_numbers": serial_numbers})
+
+
+@api_blueprint.route("/api/certificate/bulk", methods=["POST"])
+@roles_required("administrator")
+def bulk_certificate():
+    """Issue certificates and enrollment packages for many common names at once
+
+    Accepts ``{"common_names": [...], "overwrite": false}`` as JSON or a CSV file named ``csv`` with common names in the
+    first column. Common names that already have a valid certificate are skipped unless ``overwrite`` is true. Progress
+    is streamed as newline delimited JSON with one line per common name and its certificate's serial number, which is
+    recorded in the certificates table. The last line has the filename of a zip with
+    every enrollment package, which can be downloaded from ``/api/certificate/bulk/<filename>``.
+    """
+    if not CertificateAuthority(logger, app).check_if_ca_exists():
+        return jsonify({"success": False, "error": gettext("The CA has not been created")}), 400
+
+    if "csv" in request.files:
+        common_names = bulk_certificates.read_common_names(
+            request.files["csv"].read().decode("utf-8-sig")
+        )
+        overwrite = request.form.get("overwrite", "false").lower() == "true"
+    elif request.is_json and isinstance(request.json.get("common_names"), list):
+        common_names = bulk_certificates.read_common_names(
+            [str(common_name) for common_name in request.json.get("common_names")]
+        )
+        overwrite = bool(request.json.get("overwrite"))
+    else:
+        return jsonify({"success": False, "error": gettext("Please specify common names")}), 400
+
+    if not common_names:
+        return jsonify({"success": False, "error": gettext("Please specify common names")}), 400
+
+    server_address = urlparse(request.url_root).hostname
+    # Named after the list of common names so re-running the same batch replaces its archive
+    filename = hashlib.sha256("\n".join(sorted(common_names)).encode("utf-8")).hexdigest() + ".zip"
+
+    def progress():
+        succeeded = []
+        results = bulk_certificates.issue_certificates(common_names, server_address, overwrite)
+        for done, result in enumerate(results, start=1):
+            if result.status != bulk_certificates.ERROR:
+                succeeded.append(result.common_name)
+                bulk_certificates.record_certificate(result, server_address)
+            yield json.dumps(result.to_json() | {"done": done, "total": len(common_names)}) + "\n"
+
+        bulk_certificates.write_archive(
+            succeeded, os.path.join(app.config.get("OTS_CA_FOLDER"), "bulk", filename)
+        )
+        yield json.dumps(
+            {
+                "success": len(succeeded) == len(common_names),
+                "filename": filename,
+                "issued": len(succeeded),
+                "errors": len(common_names) - len(succeeded),
+            }
+        ) + "\n"
+
+    return Response(stream_with_context(progress()), mimetype="application/x-ndjson")
+
+
+@api_blueprint.route("/api/certificate/bulk/<filename>")
+@roles_required("administrator")
+def download_bulk_certificates(filename):
+    return send_download(
+        os.path.join(app.config.get("OTS_CA_FOLDER"), "bulk"), filename, as_attachment=True
+    )
+
+
 @api_blueprint.route("/api/me")
 @auth_required()
 def me():
@@ -399,7 +699,7 @@ def query_cot():
     :param page: The page number
     :param per_page: The number of results per page
     """
-    query = db.session.query(CoT)
+    query = apply_profile(db.session.query(CoT), "cot")
     query = search(query, CoT, "how")
     query = search(query, CoT, "type")
     query = search(query, CoT, "sender_callsign")
@@ -419,7 +719,7 @@ def query_alerts():
     :param page: The page number
     :param per_page: The number of results per page
     """
-    query = db.session.query(Alert)
+    query = apply_profile(db.session.query(Alert), "alert")
     query = search(query, Alert, "uid")
     query = search(query, Alert, "sender_uid")
     query = search(query, Alert, "alert_type")
@@ -434,13 +734,23 @@ def query_points():
 
     :param uid: The point's UID
     :param callsign: The point's callsign
+    :param left: Western edge of a bounding box. Requires bottom, right, and top
+    :param bottom: Southern edge of a bounding box
+    :param right: Eastern edge of a bounding box
+    :param top: Northern edge of a bounding box
     :param page: The page number
     :param per_page: The number of results per page
     """
-    query = db.session.query(Point)
+    try:
+        bbox = parse_bbox(request.args)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    query = apply_profile(db.session.query(Point), "point")
 
     query = search(query, EUD, "uid")
     query = search(query, EUD, "callsign")
+    query = bbox_filter(query, bbox)
 
     return paginate(query, Point)
 
@@ -502,19 +812,17 @@ def get_euds():
     :param callsign: The EUD's callsign
     :param uid: The EUD's callsign
     :param username: The username that the EUD belongs to
+    :param online: Only return EUDs that are currently connected
     :param page: The page number
     :param per_page: The number of results per page
     """
 
     if request.args.get("all"):
-        all_euds = []
-        euds = EUD.query.with_entities(EUD.uid, EUD.callsign).all()
-        for eud in euds:
-            if eud[0] and eud[1]:
-                all_euds.append({"uid": eud[0], "callsign": eud[1]})
-        return jsonify(all_euds)
+        # Comparing to "" also skips NULLs
+        euds = select(EUD.uid, EUD.callsign).where(EUD.uid != "", EUD.callsign != "")
+        return stream_json(json_array(euds, lambda eud: {"uid": eud.uid, "callsign": eud.callsign}))
 
-    query = db.session.query(EUD)
+    query = apply_profile(db.session.query(EUD), "eud")
 
     if "username" in request.args.keys():
         query = query.join(User, User.id == EUD.user_id)
@@ -523,6 +831,9 @@ def get_euds():
     query = search(query, EUD, "uid")
     query = search(query, User, "username")
 
+    if request.args.get("online", "").lower() in ["true", "1", "yes"]:
+        query = query.filter(EUD.uid.in_([online.uid for online in presence.online()]))
+
     return paginate(query, EUD)
 
 
@@ -541,43 +852,55 @@ def get_truststore():
 @api_blueprint.route("/api/map_state")
 @auth_required()
 def get_map_state():
-    """Gets the latest data to be displayed on the web UI's map"""
+    """Gets the latest data to be displayed on the web UI's map
+
+    :param left: Western edge of a bounding box. Requires bottom, right, and top
+    :param bottom: Southern edge of a bounding box
+    :param right: Eastern edge of a bounding box
+    :param top: Northern edge of a bounding box
+    """
     try:
-        results = {"euds": [], "markers": [], "rb_lines": [], "casevacs": []}
-
-        euds = db.session.execute(db.session.query(EUD)).all()
-        for eud in euds:
-            results["euds"].append(eud[0].to_json())
-
-        markers = db.session.execute(
-            db.session.query(Marker)
-            .join(CoT)
-            .filter(CoT.stale >= datetime.datetime.now(datetime.timezone.utc))
-        ).all()
-        for marker in markers:
-            results["markers"].append(marker[0].to_json())
-
-        rb_lines = db.session.execute(
-            db.session.query(RBLine)
-            .join(CoT)
-            .filter(CoT.stale >= datetime.datetime.now(datetime.timezone.utc))
-        ).all()
-        for rb_line in rb_lines:
-            results["rb_lines"].append(rb_line[0].to_json())
-
-        casevacs = db.session.execute(
-            db.session.query(CasEvac)
-            .join(CoT)
-            .filter(CoT.stale >= datetime.datetime.now(datetime.timezone.utc))
-        ).all()
-        for casevac in casevacs:
-            results["casevacs"].append(casevac[0].to_json())
+        bbox = parse_bbox(request.args)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
 
-    except BaseException as e:
-        logger.error(traceback.format_exc())
-        return jsonify({"success": False, "error": str(e)}), 500
+    now = datetime.datetime.now(datetime.timezone.utc)
 
-    return jsonify(results)
+    euds = apply_profile(select(EUD), "eud")
+    if bbox:
+        # Only the EUD's latest position counts, found with ix_points_device_uid_timestamp
+        latest_point = (
+            select(Point.id)
+            .where(Point.device_uid == EUD.uid)
+            .order_by(Point.timestamp.desc())
+            .limit(1)
+            .correlate(EUD)
+            .scalar_subquery()
+        )
+        euds = euds.join(Point, Point.id == latest_point).where(bbox_condition(bbox))
+
+    markers = apply_profile(select(Marker), "marker").join(CoT).where(CoT.stale >= now)
+    if bbox:
+        markers = bbox_filter(markers.join(Point, Marker.point_id == Point.id), bbox)
+
+    rb_lines = apply_profile(select(RBLine), "rb_line").join(CoT).where(CoT.stale >= now)
+    if bbox:
+        rb_lines = bbox_filter(rb_lines.join(Point, RBLine.point_id == Point.id), bbox)
+
+    casevacs = apply_profile(select(CasEvac), "casevac").join(CoT).where(CoT.stale >= now)
+    if bbox:
+        casevacs = bbox_filter(casevacs.join(Point, CasEvac.point_id == Point.id), bbox)
+
+    return stream_json(
+        json_object(
+            {
+                "euds": json_array(euds),
+                "markers": json_array(markers),
+                "rb_lines": json_array(rb_lines),
+                "casevacs": json_array(casevacs),
+            }
+        )
+    )
 
 
 @api_blueprint.route("/api/icon")
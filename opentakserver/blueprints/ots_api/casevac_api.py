@@ -15,12 +15,15 @@ from opentakserver.extensions import db, logger, socketio
 from opentakserver.forms.casevac_form import CasEvacForm
 from opentakserver.forms.zmist_form import ZmistForm
 from opentakserver.functions import *
+from opentakserver.group_routing import user_mask
 from opentakserver.models.CasEvac import CasEvac
 from opentakserver.models.CoT import CoT
 from opentakserver.models.EUD import EUD
 from opentakserver.models.Group import Group
 from opentakserver.models.Point import Point
 from opentakserver.models.ZMIST import ZMIST
+from opentakserver.serialization import apply_profile
+from opentakserver.socketio_rooms import emit_map_event
 
 casevac_api_blueprint = Blueprint("casevac_api_blueprint", __name__)
 
@@ -28,7 +31,7 @@ casevac_api_blueprint = Blueprint("casevac_api_blueprint", __name__)
 @casevac_api_blueprint.route("/api/casevac", methods=["GET"])
 @auth_required()
 def query_casevac():
-    query = db.session.query(CasEvac)
+    query = apply_profile(db.session.query(CasEvac), "casevac")
 
     query = search(query, EUD, "callsign")
     query = search(query, CasEvac, "sender_uid")
@@ -110,7 +113,9 @@ def add_casevac():
     route_cot(cot.xml, current_user)
 
     casevac.zmist = zmist
-    socketio.emit("casevac", casevac.to_json(), namespace="/socket.io")
+    emit_map_event(
+        socketio, "casevac", casevac.to_json(), user_mask(current_user.id, Group.IN), point
+    )
 
     return jsonify({"success": True}), 200
 
@@ -5,7 +5,7 @@ from datetime import datetime, timezone
 
 from flask import Blueprint
 from flask import current_app as app
-from flask import jsonify, request, send_from_directory
+from flask import jsonify, request
 from flask_babel import gettext
 from flask_security import auth_required
 from sqlalchemy import update
@@ -13,10 +13,12 @@ from werkzeug.datastructures import ImmutableMultiDict
 
 from opentakserver.blueprints.marti_api.data_package_marti_api import data_package_share
 from opentakserver.blueprints.ots_api.api import paginate, search
+from opentakserver.downloads import send_download
 from opentakserver.extensions import db, logger
 from opentakserver.forms.data_package_form import DataPackageUpdateForm
 from opentakserver.models.Certificate import Certificate
 from opentakserver.models.DataPackage import DataPackage
+from opentakserver.models.MissionContent import MissionContent
 
 data_package_api = Blueprint("data_package_api", __name__)
 
@@ -88,9 +90,15 @@ def delete_data_package():
         )
         db.session.delete(data_package[0])
         db.session.commit()
-        os.remove(
-            os.path.join(app.config.get("UPLOAD_FOLDER"), "{}.zip".format(data_package[0].hash))
-        )
+
+        # Mission content with the same hash shares the file in the blob store
+        shared = db.session.execute(
+            db.session.query(MissionContent.id).filter_by(hash=data_package[0].hash)
+        ).first()
+        if not shared:
+            os.remove(
+                os.path.join(app.config.get("UPLOAD_FOLDER"), "{}.zip".format(data_package[0].hash))
+            )
 
         if data_package[0].certificate:
             Certificate.query.filter_by(id=data_package[0].certificate.id).delete()
@@ -156,7 +164,7 @@ def data_package_download():
     download_name = data_package[0].filename
     name, extension = os.path.splitext(download_name)
 
-    return send_from_directory(
+    return send_download(
         app.config.get("UPLOAD_FOLDER"),
         f"{file_hash}{extension}",
         as_attachment=True,
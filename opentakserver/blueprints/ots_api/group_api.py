@@ -1,7 +1,6 @@
 import traceback
 
 import bleach
-import pika
 import sqlalchemy.exc
 from flask import Blueprint, Response
 from flask import current_app as app
@@ -12,12 +11,32 @@ from flask_security import auth_required, roles_required
 
 from opentakserver.blueprints.ots_api.api import paginate, search
 from opentakserver.extensions import db, ldap_manager, logger
+from opentakserver.group_changes import Binding, changes, group_change
+from opentakserver.group_routing import user_mask
 from opentakserver.models.Group import Group
 from opentakserver.models.GroupUser import GroupUser
+from opentakserver.presence import registry
 
 group_api = Blueprint("group_api", __name__)
 
 
+def online_uids(user) -> list[str]:
+    # EUD handlers bind an EUD's groups when it connects and unbind them when it disconnects, so
+    # only online EUDs need their bindings changed
+    return [eud.uid for eud in user.euds if registry.is_online(eud.uid)]
+
+
+def user_masks(user) -> dict[str, int]:
+    """The new IN mask for every EUD of user
+
+    The registry is empty until the first heartbeats after the web process restarts, so this goes
+    to all of them. Their handlers re-read the user's groups when they get it, and it's dropped for
+    EUDs that aren't connected.
+    """
+    mask = user_mask(user.id, Group.IN)
+    return {eud.uid: mask for eud in user.euds}
+
+
 @group_api.route("/api/groups")
 @roles_required("administrator")
 def get_groups():
@@ -222,23 +241,15 @@ def remove_user_from_group():
         ).delete()
         db.session.commit()
 
-        rabbit_credentials = pika.PlainCredentials(
-            app.config.get("OTS_RABBITMQ_USERNAME"), app.config.get("OTS_RABBITMQ_PASSWORD")
-        )
-        rabbit_host = app.config.get("OTS_RABBITMQ_SERVER_ADDRESS")
-        rabbit_connection = pika.BlockingConnection(
-            pika.ConnectionParameters(host=rabbit_host, credentials=rabbit_credentials)
+        uids = online_uids(user)
+        group = group[0]
+        change = group_change(
+            unbind=[Binding(uid, group.name, direction, group.bitpos) for uid in uids],
+            masks=user_masks(user),
         )
-        channel = rabbit_connection.channel()
-        for eud in user.euds:
-            channel.queue_unbind(
-                exchange="groups", queue=eud.uid, routing_key=f"{group_name}.{direction}"
-            )
-
-        channel.close()
-        rabbit_connection.close()
+        app.group_change_controller.submit(change)
 
-        return jsonify({"success": True})
+        return jsonify({"success": True, "change_id": change.change_id})
     except BaseException as e:
         logger.error(f"Failed to remove {username} from {group_name}: {e}")
         logger.debug(traceback.format_exc())
@@ -364,6 +375,8 @@ def add_user_to_group():
     if direction != "IN" and direction != "OUT":
         return jsonify({"success": False, "error": gettext("Direction must be IN or OUT")}), 400
 
+    bind = []
+    masks = {}
     for username in users:
         user = app.security.datastore.find_user(username=username)
         if not user:
@@ -401,8 +414,16 @@ def add_user_to_group():
             db.session.commit()
         except sqlalchemy.exc.IntegrityError:
             db.session.rollback()
+            continue
 
-    return jsonify({"success": True})
+        # Connected EUDs only subscribe to their OUT groups
+        if direction == Group.OUT:
+            bitpos = group[0].bitpos
+            bind.extend(Binding(uid, group_name, direction, bitpos) for uid in online_uids(user))
+        masks.update(user_masks(user))
+
+    change = app.group_change_controller.submit(group_change(bind, masks=masks))
+    return jsonify({"success": True, "change_id": change.change_id})
 
 
 @group_api.route("/api/groups", methods=["DELETE"])
@@ -449,9 +470,22 @@ def delete_group():
 
         group = group[0]
 
+        members = db.session.execute(db.session.query(GroupUser).filter_by(group_id=group.id))
+        unbind = []
+        users = {}
+        for member in members.scalars():
+            uids = online_uids(member.user)
+            unbind.extend(Binding(uid, group.name, member.direction, group.bitpos) for uid in uids)
+            users[member.user_id] = member.user
+
         GroupUser.query.filter_by(group_id=group.id).delete()
         db.session.delete(group)
         db.session.commit()
+
+        masks = {}
+        for user in users.values():
+            masks.update(user_masks(user))
+        change = app.group_change_controller.submit(group_change(unbind=unbind, masks=masks))
     except BaseException as e:
         logger.error(f"Failed to delete {request.args.get('group_name')}: {e}")
         logger.debug(traceback.format_exc())
@@ -469,4 +503,28 @@ def delete_group():
             500,
         )
 
-    return jsonify({"success": True})
+    return jsonify({"success": True, "change_id": change.change_id})
+
+
+@group_api.route("/api/groups/changes/<change_id>")
+@roles_required("administrator")
+def get_group_change(change_id: str):
+    """Get the status of a group membership change
+
+    :return: 404 if the change doesn't exist or is too old to be tracked. The change's status, which is pending,
+             applying, done, or failed, otherwise.
+    :rtype: Response
+    """
+    change = changes.get(change_id)
+    if not change:
+        return (
+            jsonify(
+                {
+                    "success": False,
+                    "error": gettext("No such group change: %(change_id)s", change_id=change_id),
+                }
+            ),
+            404,
+        )
+
+    return jsonify(change.to_json())
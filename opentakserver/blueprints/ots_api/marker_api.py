@@ -17,9 +17,13 @@ from sqlalchemy.exc import IntegrityError
 from opentakserver.blueprints.ots_api.api import paginate, route_cot, search
 from opentakserver.extensions import db, logger, socketio
 from opentakserver.functions import *
+from opentakserver.group_routing import user_mask
 from opentakserver.models.CoT import CoT
+from opentakserver.models.Group import Group
 from opentakserver.models.Marker import Marker
 from opentakserver.models.Point import Point
+from opentakserver.serialization import apply_profile
+from opentakserver.socketio_rooms import emit_map_event
 
 marker_api_blueprint = Blueprint("marker_api_blueprint", __name__)
 
@@ -27,11 +31,23 @@ marker_api_blueprint = Blueprint("marker_api_blueprint", __name__)
 @marker_api_blueprint.route("/api/markers", methods=["GET"])
 @auth_required()
 def get_markers():
-    query = db.session.query(Marker)
+    query = apply_profile(db.session.query(Marker), "marker")
     query = search(query, Marker, "uid")
     query = search(query, Marker, "affiliation")
     query = search(query, Marker, "callsign")
 
+    try:
+        if "start" in request.args:
+            query = query.filter(
+                Marker.production_timestamp >= datetime_from_iso8601_string(request.args["start"])
+            )
+        if "end" in request.args:
+            query = query.filter(
+                Marker.production_timestamp <= datetime_from_iso8601_string(request.args["end"])
+            )
+    except ValueError:
+        return jsonify({"success": False, "error": gettext("Invalid start or end time")}), 400
+
     return paginate(query)
 
 
@@ -138,6 +154,9 @@ def add_marker():
         point.le = float(request.json["le"]) if "le" in request.json.keys() else 9999999.0
         point.timestamp = datetime.now(timezone.utc)
 
+        marker.production_timestamp = point.timestamp
+        marker.production_time = iso8601_string_from_datetime(point.timestamp)
+
         with app.app_context():
             event = ET.Element("event")
             event.set("type", cot_type)
@@ -258,7 +277,13 @@ def add_marker():
             marker = db.session.execute(db.session.query(Marker).filter_by(uid=marker.uid)).first()[
                 0
             ]
-            socketio.emit("marker", marker.to_json(), namespace="/socket.io")
+            emit_map_event(
+                socketio,
+                "marker",
+                marker.to_json(),
+                user_mask(current_user.id, Group.IN),
+                marker.point,
+            )
 
             return jsonify({"success": True})
 
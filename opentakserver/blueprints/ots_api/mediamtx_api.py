@@ -7,7 +7,7 @@ import uuid
 from urllib.parse import urlparse
 
 import bleach
-import requests
+import httpx
 import sqlalchemy.exc
 from ffmpeg import FFmpeg
 from flask import Blueprint
@@ -17,11 +17,12 @@ from flask_babel import gettext
 from flask_ldap3_login import AuthenticationResponseStatus
 from flask_security import auth_required, current_user, verify_password
 from flask_security.utils import parse_auth_token
-from sqlalchemy import update
+from sqlalchemy import select, update
 from werkzeug.datastructures import ImmutableMultiDict
 
 from opentakserver.extensions import db, ldap_manager, logger
 from opentakserver.forms.MediaMTXPathConfig import MediaMTXPathConfig
+from opentakserver.http_client import http_client
 from opentakserver.models.VideoRecording import VideoRecording
 from opentakserver.models.VideoStream import VideoStream
 
@@ -63,41 +64,46 @@ def mediamtx_webhook():
         path = bleach.clean(request.args.get("path"))
 
         if path == "startup":
-            paths = VideoStream.query.all()
-            for path in paths:
-                r = requests.post(
-                    "{}/v3/config/paths/add/{}".format(
-                        app.config.get("OTS_MEDIAMTX_API_ADDRESS"), path.path
-                    ),
-                    json=json.loads(path.mediamtx_settings),
-                )
-                logger.debug("Init added {} {}".format(path, r.status_code))
+            api_address = app.config.get("OTS_MEDIAMTX_API_ADDRESS")
+            paths = [
+                (video_stream.path, json.loads(video_stream.mediamtx_settings))
+                for video_stream in VideoStream.query.all()
+            ]
+
+            def add_path(path):
+                name, settings = path
+                try:
+                    r = http_client.post(f"{api_address}/v3/config/paths/add/{name}", json=settings)
+                    logger.debug("Init added {} {}".format(name, r.status_code))
+                except httpx.HTTPError as e:
+                    logger.error("Failed to add path {} to mediamtx: {}".format(name, e))
+
+            http_client.map(add_path, paths)
 
             # Get all paths from MediaMTX and make sure they're in OTS's database
-            r = requests.get("{}/v3/paths/list".format(app.config.get("OTS_MEDIAMTX_API_ADDRESS")))
-            paths = r.json()
-            for path in paths["items"]:
-                video_stream = (
-                    db.session.query(VideoStream).where(VideoStream.path == path["name"]).first()
+            r = http_client.get(f"{api_address}/v3/paths/list")
+            known_paths = set(db.session.execute(select(VideoStream.path)).scalars())
+            new_paths = [
+                path
+                for path in r.json()["items"]
+                if path["name"] not in known_paths and path["source"]
+            ]
+
+            if new_paths:
+                r = http_client.get(f"{api_address}/v3/config/global/get")
+                port = r.json()["rtspAddress"].replace(":", "")
+                path_settings = http_client.map(
+                    lambda path: http_client.get(
+                        f"{api_address}/v3/config/paths/get/{path['name']}"
+                    ).json(),
+                    new_paths,
                 )
-                if not video_stream:
-                    if not path["source"]:
-                        continue
+
+                for path, settings in zip(new_paths, path_settings):
                     video_stream = VideoStream()
                     video_stream.protocol = get_stream_protocol(path["source"]["type"])
-
-                    r = requests.get(
-                        "{}/v3/config/global/get".format(app.config.get("OTS_MEDIAMTX_API_ADDRESS"))
-                    )
-                    video_stream.port = r.json()["rtspAddress"].replace(":", "")
-
-                    r = requests.get(
-                        "{}/v3/config/paths/get/{}".format(
-                            app.config.get("OTS_MEDIAMTX_API_ADDRESS"), path["name"]
-                        )
-                    )
-                    video_stream.mediamtx_settings = json.dumps(r.json())
-
+                    video_stream.port = port
+                    video_stream.mediamtx_settings = json.dumps(settings)
                     video_stream.path = path["name"]
                     video_stream.alias = path["name"]
                     video_stream.rtsp_reliable = 1
@@ -110,7 +116,7 @@ def mediamtx_webhook():
                     video_stream.generate_xml(urlparse(request.url_root).hostname)
 
                     db.session.add(video_stream)
-                    db.session.commit()
+                db.session.commit()
 
     elif event == "connect":
         connection_type = bleach.clean(request.args.get("connection_type"))
@@ -128,7 +134,7 @@ def mediamtx_webhook():
             video_stream.ready = event == "ready"
             db.session.add(video_stream)
             db.session.commit()
-            r = requests.patch(
+            r = http_client.patch(
                 "{}/v3/config/paths/patch/{}".format(
                     app.config.get("OTS_MEDIAMTX_API_ADDRESS"), path
                 ),
@@ -360,14 +366,14 @@ def add_update_stream():
                 logger.debug("set {} to {}".format(key, value))
 
         if request.path.endswith("update"):
-            r = requests.patch(
+            r = http_client.patch(
                 "{}/v3/config/paths/patch/{}".format(
                     app.config.get("OTS_MEDIAMTX_API_ADDRESS"), path
                 ),
                 json=settings,
             )
         else:
-            r = requests.post(
+            r = http_client.post(
                 "{}/v3/config/paths/add/{}".format(
                     app.config.get("OTS_MEDIAMTX_API_ADDRESS"), path
                 ),
@@ -403,7 +409,7 @@ def delete_stream():
         if not path:
             return jsonify({"success": False, "error": gettext("Please specify a path name")}), 400
 
-        r = requests.delete(
+        r = http_client.delete(
             "{}/v3/config/paths/delete/{}".format(app.config.get("OTS_MEDIAMTX_API_ADDRESS"), path)
         )
         logger.debug("Delete status code: {}".format(r.status_code))
@@ -416,7 +422,7 @@ def delete_stream():
 
         video.delete()
         db.session.commit()
-    except requests.exceptions.ConnectionError as e:
+    except httpx.ConnectError as e:
         logger.error(traceback.format_exc())
         return jsonify({"success": False, "error": gettext("MediaMTX is not running")}), 500
 
@@ -514,7 +520,7 @@ def external_auth():
 
                     db.session.add(v)
                     db.session.commit()
-                    r = requests.post(
+                    r = http_client.post(
                         "{}/v3/config/paths/add/{}".format(
                             app.config.get("OTS_MEDIAMTX_API_ADDRESS"), v.path
                         ),
@@ -535,7 +541,7 @@ def external_auth():
                         video = (
                             db.session.query(VideoStream).filter(VideoStream.path == v.path).first()
                         )
-                        r = requests.post(
+                        r = http_client.post(
                             "{}/v3/config/paths/add/{}".format(
                                 app.config.get("OTS_MEDIAMTX_API_ADDRESS"), v.path
                             ),
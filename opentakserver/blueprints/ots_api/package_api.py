@@ -1,6 +1,8 @@
-import csv
+import contextlib
 import datetime
 import os
+import tempfile
+import threading
 import zipfile
 
 import bleach
@@ -15,6 +17,7 @@ from werkzeug.utils import secure_filename
 from opentakserver.blueprints.marti_api.certificate_enrollment_api import basic_auth
 from opentakserver.blueprints.marti_api.marti_api import verify_client_cert
 from opentakserver.blueprints.ots_api.api import paginate, search
+from opentakserver.downloads import send_download
 from opentakserver.extensions import db, logger
 from opentakserver.forms.package_form import PackageForm, PackageUpdateForm
 from opentakserver.models.Packages import Packages
@@ -28,7 +31,7 @@ def download_package(package_name, atak_version=None):
     cert = verify_client_cert()
     if not cert:
         return "", 401
-    return send_from_directory(
+    return send_download(
         os.path.join(app.config.get("OTS_DATA_FOLDER"), "packages"), secure_filename(package_name)
     )
 
@@ -99,60 +102,72 @@ def get_product_infz_with_version(atak_version: str):
     )
 
 
-def create_product_infz(atak_version: str | None):
-    product_infz_file = os.path.join(app.config.get("OTS_DATA_FOLDER"), "packages", "product.infz")
-    product_inf_file = os.path.join(app.config.get("OTS_DATA_FOLDER"), "packages", "product.inf")
-
-    if atak_version:
-        atak_version = bleach.clean(atak_version)
-        product_infz_file = os.path.join(
-            app.config.get("OTS_DATA_FOLDER"), "packages", atak_version, "product.infz"
-        )
-        product_inf_file = os.path.join(
-            app.config.get("OTS_DATA_FOLDER"), "packages", atak_version, "product.inf"
-        )
-        os.makedirs(
-            os.path.join(app.config.get("OTS_DATA_FOLDER"), "packages", atak_version), exist_ok=True
-        )
+_product_infz_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def _file_lock(path: str):
+    """Holds an exclusive lock on path so only one process regenerates product.infz at a time"""
+    with open(path, "a+") as lock:
+        try:
+            import fcntl
+        except ModuleNotFoundError:
+            # Windows
+            import msvcrt
+
+            lock.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK gives up after 10 seconds
+                    continue
+            try:
+                yield
+            finally:
+                lock.seek(0)
+                msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
 
-    if os.path.exists(product_infz_file):
-        os.remove(product_infz_file)
 
-    query = db.session.query(Packages)
+def create_product_infz(atak_version: str | None):
+    """
+    Writes product.infz, the plugin repository index, from the product.inf entries saved with each package. The zip
+    is written to a temp file and renamed into place so EUDs never download a partial index. Regenerations are
+    serialized by a lock within the process and a file lock between processes.
+    """
+    packages_folder = os.path.join(app.config.get("OTS_DATA_FOLDER"), "packages")
     if atak_version:
-        query = query.where(Packages.atak_version == atak_version)
-    packages = db.session.execute(query).all()
-
-    with zipfile.ZipFile(product_infz_file, mode="a", compression=zipfile.ZIP_DEFLATED) as zipf:
-
-        with open(product_inf_file, "w") as inf:
-            csv_writer = csv.writer(inf)
-
-            for package in packages:
-                package = package[0]
-                csv_writer.writerow(
-                    [
-                        package.platform,
-                        package.plugin_type,
-                        package.package_name,
-                        package.name,
-                        package.version,
-                        package.revision_code,
-                        package.file_name,
-                        package.icon_filename,
-                        package.description,
-                        package.apk_hash,
-                        package.os_requirement,
-                        package.tak_prereq,
-                        package.file_size,
-                    ]
-                )
-
-                if package.icon:
-                    zipf.writestr(package.icon_filename, package.icon)
-
-        zipf.write(product_inf_file, arcname="product.inf")
-        os.remove(product_inf_file)
+        atak_version = bleach.clean(atak_version)
+        packages_folder = os.path.join(packages_folder, atak_version)
+    os.makedirs(packages_folder, exist_ok=True)
+
+    with _product_infz_lock, _file_lock(os.path.join(packages_folder, ".product.infz.lock")):
+        query = sqlalchemy.select(
+            Packages.product_inf_entry, Packages.icon_filename, Packages.icon
+        ).order_by(Packages.id)
+        if atak_version:
+            query = query.where(Packages.atak_version == atak_version)
+
+        fd, temp_path = tempfile.mkstemp(dir=packages_folder, prefix=".product.infz-")
+        try:
+            with os.fdopen(fd, "wb") as f, zipfile.ZipFile(f, "w", zipfile.ZIP_DEFLATED) as zipf:
+                entries = []
+                for entry, icon_filename, icon in db.session.execute(query):
+                    entries.append(entry or "")
+                    if icon:
+                        # Icons are PNGs which are already compressed
+                        zipf.writestr(icon_filename, icon, compress_type=zipfile.ZIP_STORED)
+
+                zipf.writestr("product.inf", "".join(entries))
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, os.path.join(packages_folder, "product.infz"))
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
 
 
 @packages_blueprint.route("/api/packages/repositories.inf")
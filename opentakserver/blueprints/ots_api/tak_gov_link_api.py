@@ -3,7 +3,6 @@ import re
 import traceback
 from datetime import datetime, timezone
 
-import httpx
 from flask import Blueprint
 from flask import current_app as app
 from flask import jsonify, request
@@ -13,6 +12,7 @@ from opentakserver import __version__ as version
 from opentakserver.blueprints.ots_api.api import change_config_setting
 from opentakserver.blueprints.ots_api.package_api import create_product_infz
 from opentakserver.extensions import db, logger
+from opentakserver.http_client import http_client
 from opentakserver.models.Packages import Packages
 
 tak_gov_link_blueprint = Blueprint("tak_gov_link_blueprint", __name__)
@@ -22,13 +22,12 @@ HEADERS = {"User-Agent": f"OpenTAKServer {version}"}
 
 def get_new_access_token():
     try:
-        client = httpx.Client(http2=True)
         refresh_payload = {
             "client_id": "tak-gov-eud",
             "grant_type": "refresh_token",
             "refresh_token": app.config.get("OTS_TAK_GOV_REFRESH_TOKEN"),
         }
-        response = client.post(
+        response = http_client.post(
             "https://auth.tak.gov/auth/realms/TPC/protocol/openid-connect/token",
             data=refresh_payload,
             headers=HEADERS,
@@ -63,16 +62,13 @@ def link_tak_gov_account():
     """
 
     try:
-        # Use httpx since it supports http/2.0
-        client = httpx.Client(http2=True)
-
         # Step 1: Get the device_code and user_code
         payload = {
             "client_id": "tak-gov-eud",
             "scope": "openid offline_access email profile",
             "grant_type": "urn:ietf:params:oauth:grant-type:device_code",
         }
-        response = client.post(
+        response = http_client.post(
             "https://auth.tak.gov/auth/realms/TPC/protocol/openid-connect/auth/device",
             headers=HEADERS,
             data=payload,
@@ -117,14 +113,12 @@ def get_initial_tak_gov_token():
         return jsonify({"success": False, "error": "device_code is required"}), 400
 
     try:
-        client = httpx.Client(http2=True)
-
         payload = {
             "grant_type": "urn:ietf:params:oauth:grant-type:device_code",
             "device_code": device_code,
             "client_id": "tak-gov-eud",
         }
-        r = client.post(
+        r = http_client.post(
             "https://auth.tak.gov/auth/realms/TPC/protocol/openid-connect/token",
             data=payload,
             headers=HEADERS,
@@ -192,13 +186,12 @@ def get_plugins_list():
     if not token["success"]:
         return jsonify(token), 500
 
-    client = httpx.Client(http2=True)
-    HEADERS["Authorization"] = f"Bearer {token['access_token']}"
+    headers = {**HEADERS, "Authorization": f"Bearer {token['access_token']}"}
     params = {"product": product, "product_version": product_version}
 
     try:
-        response = client.get(
-            "https://tak.gov/eud_api/software/v1/plugins", params=params, headers=HEADERS
+        response = http_client.get(
+            "https://tak.gov/eud_api/software/v1/plugins", params=params, headers=headers
         )
         return jsonify(response.json())
     except BaseException as e:
@@ -247,9 +240,8 @@ def get_plugin_icon():
     if not token["success"]:
         return jsonify(token), 500
 
-    client = httpx.Client(http2=True)
-    HEADERS["Authorization"] = f"Bearer {token['access_token']}"
-    response = client.get(icon_url, headers=HEADERS)
+    headers = {**HEADERS, "Authorization": f"Bearer {token['access_token']}"}
+    response = http_client.get(icon_url, headers=headers)
     logger.warning(response.content)
     logger.warning(response.text)
     logger.warning(response.headers)
@@ -289,13 +281,12 @@ def download_plugin():
     if exising_plugin:
         return jsonify({"success": False, "error": f"Plugin {package_name} already exists"}), 400
 
-    client = httpx.Client(http2=True)
     token = get_new_access_token()
     if not token["success"]:
         return jsonify(token), 500
 
-    HEADERS["Authorization"] = f"Bearer {token['access_token']}"
-    response = client.get(apk_url, headers=HEADERS, follow_redirects=True)
+    headers = {**HEADERS, "Authorization": f"Bearer {token['access_token']}"}
+    response = http_client.get(apk_url, headers=headers)
     if response.status_code != 200:
         return jsonify(response.content), response.status_code
 
@@ -307,7 +298,7 @@ def download_plugin():
 
     icon = None
     icon_filename = None
-    icon_response = client.get(request.json.get("icon_url"), headers=HEADERS, follow_redirects=True)
+    icon_response = http_client.get(request.json.get("icon_url"), headers=headers)
     # Some plugins don't have icons and will return a 404
     if icon_response.status_code == 200:
         icon = icon_response.content
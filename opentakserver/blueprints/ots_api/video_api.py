@@ -10,6 +10,7 @@ from flask_babel import gettext
 from flask_security import auth_required
 
 from opentakserver.blueprints.ots_api.api import paginate, search
+from opentakserver.downloads import send_download
 from opentakserver.extensions import db, logger
 from opentakserver.models.VideoRecording import VideoRecording
 from opentakserver.models.VideoStream import VideoStream
@@ -84,7 +85,7 @@ def download_recording():
 
         if request.method == "GET":
             filename = pathlib.Path(recording.segment_path)
-            return send_from_directory(filename.parent, filename.name)
+            return send_download(filename.parent, filename.name)
         elif request.method == "DELETE":
             os.remove(recording.segment_path)
             db.session.delete(recording)
@@ -1,14 +1,60 @@
 import functools
+from dataclasses import dataclass
 
 from flask import Blueprint, request
 from flask_security import current_user
 from flask_socketio import disconnect
 
 from opentakserver.extensions import logger, socketio
+from opentakserver.group_routing import user_mask
+from opentakserver.models.Group import Group
+from opentakserver.socketio_rooms import NAMESPACE, group_rooms, viewer_groups, viewport_rooms
+from opentakserver.spatial import parse_bbox
 
 ots_socketio_blueprint = Blueprint("ots_socketio_blueprint", __name__)
 
 
+@dataclass
+class Viewer:
+    user_id: int
+    administrator: bool
+    bbox: tuple[float, float, float, float] | None = None
+
+
+# Socket.IO session ID -> the web UI connected with it, so its rooms can be updated when its user's groups change
+viewers: dict[str, Viewer] = {}
+
+
+def update_rooms(sid: str, viewer: Viewer) -> int:
+    """Moves a web UI into the rooms of its user's current groups and its viewport
+
+    :return: The number of map rooms it's in
+    """
+    # Web UIs see what the user's EUDs would receive, which is everything sent to their OUT groups
+    groups = viewer_groups(user_mask(viewer.user_id, Group.OUT), viewer.administrator)
+    map_rooms = set(viewport_rooms(groups, viewer.bbox))
+    new_rooms = set(group_rooms(groups)) | map_rooms
+    old_rooms = {
+        room
+        for room in socketio.server.rooms(sid, namespace=NAMESPACE)
+        if room.startswith(("group:", "map:"))
+    }
+    for room in old_rooms - new_rooms:
+        socketio.server.leave_room(sid, room, namespace=NAMESPACE)
+    for room in new_rooms - old_rooms:
+        socketio.server.enter_room(sid, room, namespace=NAMESPACE)
+    return len(map_rooms)
+
+
+def refresh_rooms():
+    """Updates the rooms of every connected web UI after group memberships change. Needs an app context"""
+    for sid, viewer in list(viewers.items()):
+        if socketio.server.manager.is_connected(sid, NAMESPACE):
+            update_rooms(sid, viewer)
+        else:
+            viewers.pop(sid, None)
+
+
 def authenticated_only(f):
     @functools.wraps(f)
     def wrapped(*args, **kwargs):
@@ -37,6 +83,36 @@ def administrator_only(f):
 @authenticated_only
 def connect(data):
     logger.debug("got a socketio connection from {}".format(current_user.username))
+    viewer = Viewer(current_user.id, current_user.has_role("administrator"))
+    viewers[request.sid] = viewer
+    update_rooms(request.sid, viewer)
+
+
+@socketio.on("disconnect", namespace="/socket.io")
+def on_disconnect(*args):
+    viewers.pop(request.sid, None)
+
+
+@socketio.on("viewport", namespace="/socket.io")
+@authenticated_only
+def viewport(data):
+    """Only sends map updates inside the client's viewport from now on
+
+    :param data: An object with left, bottom, right, and top. An empty object is the whole world
+    """
+    try:
+        if not isinstance(data, dict):
+            raise ValueError("The viewport must be an object with left, bottom, right, and top")
+        bbox = parse_bbox(data)
+    except (TypeError, ValueError) as e:
+        return {"success": False, "error": str(e)}
+
+    viewer = viewers.setdefault(
+        request.sid, Viewer(current_user.id, current_user.has_role("administrator"))
+    )
+    viewer.bbox = bbox
+    # Group rooms are recomputed too in case the user's groups changed since they connected
+    return {"success": True, "rooms": update_rooms(request.sid, viewer)}
 
 
 @socketio.on("message", namespace="/socket.io")
@@ -6,18 +6,18 @@ from xml.etree.ElementTree import tostring
 import adsbxcot
 import aiscot
 import pika
-import requests
 from bs4 import BeautifulSoup
 from flask import Blueprint
 from flask import current_app as app
 from sqlalchemy import delete
+from sqlalchemy.orm import joinedload
 
 from opentakserver.extensions import apscheduler, db, logger
 from opentakserver.functions import (
-    datetime_from_iso8601_string,
     generate_delete_cot,
     iso8601_string_from_datetime,
 )
+from opentakserver.http_client import http_client
 from opentakserver.models.Alert import Alert
 from opentakserver.models.CasEvac import CasEvac
 from opentakserver.models.Certificate import Certificate
@@ -57,7 +57,9 @@ def get_adsb_data():
             adsb_lon = app.config.get("OTS_ADSB_LON")
             adsb_radius = app.config.get("OTS_ADSB_RADIUS")
 
-            r = requests.get(f"{adsb_api_url}/{adsb_lat}/{adsb_lon}/{adsb_radius}", headers=headers)
+            r = http_client.get(
+                f"{adsb_api_url}/{adsb_lat}/{adsb_lon}/{adsb_radius}", headers=headers
+            )
 
             logger.debug(r.text)
             logger.debug(r.status_code)
@@ -143,25 +145,25 @@ def delete_video_recordings():
         db.session.commit()
 
         try:
-            r = requests.get(
-                "{}/v3/recordings/list".format(app.config.get("OTS_MEDIAMTX_API_ADDRESS"))
-            )
+            api_address = app.config.get("OTS_MEDIAMTX_API_ADDRESS")
+            r = http_client.get("{}/v3/recordings/list".format(api_address))
             if r.status_code == 200:
-                recordings = r.json()
-                for path in recordings["items"]:
-                    for recording in path["segments"]:
-                        r = requests.delete(
-                            "{}/v3/recordings/deletesegment".format(
-                                app.config.get("OTS_MEDIAMTX_API_ADDRESS"),
-                            ),
-                            params={"start": recording["start"], "path": path["name"]},
-                        )
-                        if r.status_code != 200:
-                            logger.error(
-                                "Failed to delete {} from {}: {}".format(
-                                    recording["start"], path["name"], r.text
-                                )
-                            )
+                segments = [
+                    (path["name"], recording["start"])
+                    for path in r.json()["items"]
+                    for recording in path["segments"]
+                ]
+
+                def delete_segment(segment):
+                    path, start = segment
+                    r = http_client.delete(
+                        "{}/v3/recordings/deletesegment".format(api_address),
+                        params={"start": start, "path": path},
+                    )
+                    if r.status_code != 200:
+                        logger.error("Failed to delete {} from {}: {}".format(start, path, r.text))
+
+                http_client.map(delete_segment, segments)
         except BaseException as e:
             logger.error("Failed to delete recordings: {}".format(e))
 
@@ -218,7 +220,7 @@ def get_aishub_data():
                 params["mmsi"] = app.config.get("OTS_AISHUB_MMSI_LIST")
             if app.config.get("OTS_AISHUB_IMO_LIST"):
                 params["imo"] = app.config.get("OTS_AISHUB_IMO_LIST")
-            r = requests.get("https://data.aishub.net/ws.php", params=params)
+            r = http_client.get("https://data.aishub.net/ws.php", params=params)
 
             if r.status_code != 200:
                 logger.error(f"Failed to get AIS data: {r.text}")
@@ -291,35 +293,33 @@ def delete_old_data():
         )
         channel = rabbit_connection.channel()
 
-        # I wish I hadn't made the marker's timestamp field a string...
-        markers = db.session.execute(db.session.query(Marker)).all()
-        groups = db.session.execute(db.session.query(Group)).scalars()
+        markers = db.session.execute(
+            db.session.query(Marker)
+            .options(joinedload(Marker.cot))
+            .where(Marker.production_timestamp <= timestamp)
+        ).all()
+        groups = db.session.execute(db.session.query(Group)).scalars().all()
         for marker in markers:
             marker = marker[0]
-            if datetime_from_iso8601_string(marker.production_time) <= timestamp:
-                cot = generate_delete_cot(marker.uid, marker.cot.type)
-                for group in groups:
-                    channel.basic_publish(
-                        exchange="groups",
-                        routing_key=f"{group.name}.{Group.OUT}",
-                        body=json.dumps(
-                            {"cot": tostring(cot).decode("utf-8"), "uid": app.config["OTS_NODE_ID"]}
-                        ),
-                        properties=pika.BasicProperties(
-                            expiration=app.config.get("OTS_RABBITMQ_TTL")
-                        ),
-                    )
-                    channel.basic_publish(
-                        exchange="firehose",
-                        routing_key="",
-                        body=json.dumps(
-                            {"cot": tostring(cot).decode("utf-8"), "uid": app.config["OTS_NODE_ID"]}
-                        ),
-                        properties=pika.BasicProperties(
-                            expiration=app.config.get("OTS_RABBITMQ_TTL")
-                        ),
-                    )
-                db.session.delete(marker)
+            cot = generate_delete_cot(marker.uid, marker.cot.type)
+            for group in groups:
+                channel.basic_publish(
+                    exchange="groups",
+                    routing_key=f"{group.name}.{Group.OUT}",
+                    body=json.dumps(
+                        {"cot": tostring(cot).decode("utf-8"), "uid": app.config["OTS_NODE_ID"]}
+                    ),
+                    properties=pika.BasicProperties(expiration=app.config.get("OTS_RABBITMQ_TTL")),
+                )
+                channel.basic_publish(
+                    exchange="firehose",
+                    routing_key="",
+                    body=json.dumps(
+                        {"cot": tostring(cot).decode("utf-8"), "uid": app.config["OTS_NODE_ID"]}
+                    ),
+                    properties=pika.BasicProperties(expiration=app.config.get("OTS_RABBITMQ_TTL")),
+                )
+            db.session.delete(marker)
 
         alerts = db.session.execute(
             db.session.query(Alert).where(Alert.start_time <= timestamp)
@@ -0,0 +1,248 @@
+"""Issues certificates and enrollment packages for a list of common names in parallel
+
+Key generation dominates the cost of issuing a certificate, so common names are issued in a pool of worker processes,
+one per core by default, and the CA key is loaded once per worker. Workers are started with spawn rather than fork so
+they don't inherit the server's greenlets, sockets, or DB connections. A common name that already has a certificate
+from the current CA and both enrollment packages is skipped unless overwrite is set or the certificate was revoked, so
+re-running an interrupted batch only issues what's missing. Results carry the serial number of each common name's
+certificate so the caller can record it in the certificates table. The enrollment packages of every common name can
+then be collected into one zip.
+"""
+
+import csv
+import datetime
+import io
+import multiprocessing
+import os
+import re
+import tempfile
+import traceback
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+
+from cryptography import x509
+from cryptography.exceptions import InvalidSignature
+from flask import Flask
+from flask import current_app as app
+from sqlalchemy import select
+
+from opentakserver.certificate_authority import CertificateAuthority
+from opentakserver.extensions import db, logger
+from opentakserver.models.Certificate import Certificate
+from opentakserver.revocation import revoked_certificates, serial_hex
+
+# Common names are used as folder and file names
+COMMON_NAME = re.compile(r"^[\w@-][\w@.-]{0,63}$")
+
+# The settings workers need to issue certificates and build enrollment packages
+CONFIG_KEYS = (
+    "OTS_CA_FOLDER",
+    "OTS_CA_NAME",
+    "OTS_CA_PASSWORD",
+    "OTS_CA_SUBJECT",
+    "OTS_CA_EXPIRATION_TIME",
+    "OTS_MARTI_HTTPS_PORT",
+    "OTS_SSL_STREAMING_PORT",
+)
+
+ISSUED = "issued"
+EXISTS = "exists"
+ERROR = "error"
+
+
+@dataclass
+class IssueResult:
+    common_name: str
+    status: str
+    error: str | None = None
+    serial_number: str | None = None
+    expiration_date: datetime.datetime | None = None
+
+    def to_json(self):
+        return {
+            "common_name": self.common_name,
+            "status": self.status,
+            "error": self.error,
+            "serial_number": self.serial_number,
+        }
+
+
+def read_common_names(source: str | Iterable[str]) -> list[str]:
+    """Returns the unique common names in a CSV file's first column, or in a list
+
+    Blank lines, lines starting with # and a common_name or callsign header are skipped.
+    """
+    if isinstance(source, str):
+        source = [row[0] if row else "" for row in csv.reader(io.StringIO(source))]
+
+    common_names = []
+    for common_name in source:
+        common_name = common_name.strip()
+        if not common_name or common_name.startswith("#"):
+            continue
+        if not common_names and common_name.lower() in ("common_name", "callsign"):
+            continue
+        if common_name not in common_names:
+            common_names.append(common_name)
+    return common_names
+
+
+def enrollment_packages(ca_folder: str, common_name: str) -> list[str]:
+    folder = os.path.join(ca_folder, "certs", common_name)
+    return [
+        os.path.join(folder, "{}_CONFIG.zip".format(common_name)),
+        os.path.join(folder, "{}_CONFIG_iTAK.zip".format(common_name)),
+    ]
+
+
+def is_issued(
+    authority: CertificateAuthority, common_name: str, revoked: frozenset[int] = frozenset()
+) -> bool:
+    """True when common_name has an unexpired cert from the current CA and its enrollment packages
+
+    :param revoked: Revoked serial numbers. Workers can't read the database, so the caller passes them in
+    """
+    cert_path = authority.path("certs", common_name, common_name + ".pem")
+    files = [cert_path, authority.path("certs", common_name, common_name + ".p12")]
+    files += enrollment_packages(authority.path(), common_name)
+    if not all(os.path.exists(path) for path in files):
+        return False
+
+    with open(cert_path, "rb") as f:
+        certificate = x509.load_pem_x509_certificate(f.read())
+    try:
+        certificate.verify_directly_issued_by(authority.load_ca().certificate)
+    except (ValueError, TypeError, InvalidSignature):
+        return False
+    if certificate.serial_number in revoked:
+        return False
+    return certificate.not_valid_after_utc > datetime.datetime.now(datetime.timezone.utc)
+
+
+_authority: CertificateAuthority | None = None
+_revoked: frozenset[int] = frozenset()
+
+
+def _init_worker(config: dict, revoked: frozenset[int]):
+    global _authority, _revoked
+    worker_app = Flask(__name__)
+    worker_app.config.update(config)
+    _authority = CertificateAuthority(logger, worker_app)
+    _revoked = revoked
+
+
+def _issue(common_name: str, server_address: str, overwrite: bool) -> IssueResult:
+    try:
+        if not overwrite and is_issued(_authority, common_name, _revoked):
+            status = EXISTS
+        else:
+            _authority.issue_certificate(common_name, server_address=server_address)
+            status = ISSUED
+
+        with open(_authority.path("certs", common_name, common_name + ".pem"), "rb") as f:
+            certificate = x509.load_pem_x509_certificate(f.read())
+        return IssueResult(
+            common_name,
+            status,
+            serial_number=serial_hex(certificate.serial_number),
+            expiration_date=certificate.not_valid_after_utc,
+        )
+    except BaseException as e:
+        logger.error(traceback.format_exc())
+        return IssueResult(common_name, ERROR, str(e))
+
+
+def issue_certificates(
+    common_names: Iterable[str],
+    server_address: str,
+    overwrite: bool = False,
+    workers: int | None = None,
+) -> Iterator[IssueResult]:
+    """Issues certificates and enrollment packages, yielding a result as each common name finishes
+
+    :param server_address: The address EUDs connect to, written to the packages' preferences
+    :param overwrite: Issue new certificates even for common names that already have one
+    :param workers: The number of worker processes, defaults to the number of cores
+    """
+    common_names = list(common_names)
+    for common_name in common_names:
+        if not COMMON_NAME.match(common_name):
+            yield IssueResult(common_name, ERROR, "Invalid common name")
+    common_names = [common_name for common_name in common_names if COMMON_NAME.match(common_name)]
+    if not common_names:
+        return
+
+    config = {key: app.config.get(key) for key in CONFIG_KEYS}
+    # Revoked certs are issued again instead of being bundled into the new enrollment packages
+    revoked = frozenset(revoked_certificates.revoked())
+    workers = min(workers or os.cpu_count() or 1, len(common_names))
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(config, revoked),
+    ) as pool:
+        futures = [
+            pool.submit(_issue, common_name, server_address, overwrite)
+            for common_name in common_names
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def record_certificate(result: IssueResult, server_address: str) -> Certificate | None:
+    """Adds a row to the certificates table for result's cert so it can be listed and revoked
+
+    Certs that already have a row, like ones that were skipped because they exist, aren't added again.
+    """
+    if not result.serial_number:
+        return None
+
+    existing = db.session.execute(
+        select(Certificate).where(Certificate.serial_number == result.serial_number)
+    ).scalar()
+    if existing:
+        return existing
+
+    ca_folder = app.config.get("OTS_CA_FOLDER")
+    certificate = Certificate()
+    certificate.common_name = result.common_name
+    certificate.expiration_date = result.expiration_date
+    certificate.server_address = server_address
+    certificate.server_port = app.config.get("OTS_SSL_STREAMING_PORT")
+    certificate.truststore_filename = os.path.join(ca_folder, "truststore-root.p12")
+    certificate.user_cert_filename = os.path.join(
+        ca_folder, "certs", result.common_name, result.common_name + ".pem"
+    )
+    certificate.cert_password = app.config.get("OTS_CA_PASSWORD")
+    certificate.serial_number = result.serial_number
+    db.session.add(certificate)
+    db.session.commit()
+    return certificate
+
+
+def write_archive(common_names: Iterable[str], path: str) -> str:
+    """Writes the enrollment packages of common_names to one zip with a folder per common name
+
+    The zip is written to a temp file and renamed so a download never sees a partial archive.
+    """
+    ca_folder = app.config.get("OTS_CA_FOLDER")
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+
+    fd, temp_path = tempfile.mkstemp(dir=folder, prefix=".bulk-")
+    try:
+        # The packages are zips already, compressing them again would only cost CPU time
+        with os.fdopen(fd, "wb") as temp, zipfile.ZipFile(temp, "w", zipfile.ZIP_STORED) as zipf:
+            for common_name in common_names:
+                for package in enrollment_packages(ca_folder, common_name):
+                    if os.path.exists(package):
+                        zipf.write(package, "{}/{}".format(common_name, os.path.basename(package)))
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return path
@@ -0,0 +1,267 @@
+"""An in process certificate authority built on the cryptography library
+
+Keys, CSRs, certificates, PKCS#12 bundles and CRLs are built in memory instead of by shelling out to openssl and
+round-tripping through temp files. The CA key is decrypted once per process and kept until ca.pem or the key file
+changes, so signing a CSR costs one RSA signature. Extensions match the [ v3_ca ], [ client ] and [ server ] sections of
+ca_config.cfg, and PKCS#12 files use the same legacy SHA1/3DES encryption as ``openssl pkcs12 -legacy`` because ATAK and
+WinTAK can't read the newer AES based ones.
+"""
+
+import datetime
+import ipaddress
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Iterable
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.serialization import pkcs12
+from cryptography.x509.oid import ExtendedKeyUsageOID, NameOID
+
+KEY_SIZE = 2048
+# Matches default_crl_days in ca_config.cfg
+CRL_DAYS = 730
+
+NAME_OIDS = {
+    "C": NameOID.COUNTRY_NAME,
+    "ST": NameOID.STATE_OR_PROVINCE_NAME,
+    "L": NameOID.LOCALITY_NAME,
+    "O": NameOID.ORGANIZATION_NAME,
+    "OU": NameOID.ORGANIZATIONAL_UNIT_NAME,
+    "CN": NameOID.COMMON_NAME,
+    "emailAddress": NameOID.EMAIL_ADDRESS,
+}
+
+
+@dataclass
+class CA:
+    certificate: x509.Certificate
+    key: rsa.RSAPrivateKey
+
+
+def parse_subject(subject: str) -> x509.Name:
+    """Parses an openssl style subject like /C=WW/O=ZZ/CN=opentakserver"""
+    attributes = []
+    for part in re.split(r"(?<!\\)/", subject):
+        if not part:
+            continue
+        name, _, value = part.partition("=")
+        if name not in NAME_OIDS or not value:
+            raise ValueError(f"Invalid subject: {subject}")
+        attributes.append(x509.NameAttribute(NAME_OIDS[name], value.replace("\\/", "/")))
+    return x509.Name(attributes)
+
+
+def generate_key() -> rsa.RSAPrivateKey:
+    return rsa.generate_private_key(public_exponent=65537, key_size=KEY_SIZE)
+
+
+def build_csr(key: rsa.RSAPrivateKey, subject: x509.Name) -> x509.CertificateSigningRequest:
+    return x509.CertificateSigningRequestBuilder().subject_name(subject).sign(key, hashes.SHA256())
+
+
+def create_ca_certificate(
+    key: rsa.RSAPrivateKey, subject: x509.Name, days: int
+) -> x509.Certificate:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return (
+        x509.CertificateBuilder()
+        .subject_name(subject)
+        .issuer_name(subject)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now)
+        .not_valid_after(now + datetime.timedelta(days=days))
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .add_extension(
+            x509.KeyUsage(
+                digital_signature=False,
+                content_commitment=False,
+                key_encipherment=False,
+                data_encipherment=False,
+                key_agreement=False,
+                key_cert_sign=True,
+                crl_sign=True,
+                encipher_only=False,
+                decipher_only=False,
+            ),
+            critical=True,
+        )
+        .add_extension(x509.SubjectKeyIdentifier.from_public_key(key.public_key()), critical=False)
+        .sign(key, hashes.SHA256())
+    )
+
+
+def sign_csr(
+    ca: CA, csr: x509.CertificateSigningRequest, days: int, server: bool = False
+) -> x509.Certificate:
+    """Signs csr with the [ client ] or [ server ] extensions from ca_config.cfg
+
+    Server certs get a subjectAltName of their common name, as an IP address when it is one.
+    """
+    if not csr.is_signature_valid:
+        raise ValueError("CSR signature is invalid")
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    usages = [ExtendedKeyUsageOID.CLIENT_AUTH]
+    if server:
+        usages.append(ExtendedKeyUsageOID.SERVER_AUTH)
+
+    builder = (
+        x509.CertificateBuilder()
+        .subject_name(csr.subject)
+        .issuer_name(ca.certificate.subject)
+        .public_key(csr.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now)
+        .not_valid_after(now + datetime.timedelta(days=days))
+        .add_extension(x509.BasicConstraints(ca=False, path_length=None), critical=True)
+        .add_extension(
+            x509.KeyUsage(
+                digital_signature=True,
+                content_commitment=False,
+                key_encipherment=True,
+                data_encipherment=False,
+                key_agreement=False,
+                key_cert_sign=False,
+                crl_sign=False,
+                encipher_only=False,
+                decipher_only=False,
+            ),
+            critical=True,
+        )
+        .add_extension(x509.ExtendedKeyUsage(usages), critical=True)
+        .add_extension(x509.SubjectKeyIdentifier.from_public_key(csr.public_key()), critical=False)
+        .add_extension(
+            x509.AuthorityKeyIdentifier.from_issuer_public_key(ca.key.public_key()), critical=False
+        )
+    )
+
+    if server:
+        common_name = csr.subject.get_attributes_for_oid(NameOID.COMMON_NAME)[0].value
+        try:
+            alt_name = x509.IPAddress(ipaddress.ip_address(common_name))
+        except ValueError:
+            alt_name = x509.DNSName(common_name)
+        builder = builder.add_extension(x509.SubjectAlternativeName([alt_name]), critical=False)
+
+    return builder.sign(ca.key, hashes.SHA256())
+
+
+def build_crl(
+    ca: CA,
+    revoked: Iterable[tuple[int, datetime.datetime]] = (),
+    days: int = CRL_DAYS,
+    crl_number: int = 1,
+    delta_of: int | None = None,
+) -> x509.CertificateRevocationList:
+    """Builds a CRL from (serial number, revocation date) pairs
+
+    :param delta_of: The CRL number of the base CRL when building a delta CRL
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    builder = (
+        x509.CertificateRevocationListBuilder()
+        .issuer_name(ca.certificate.subject)
+        .last_update(now)
+        .next_update(now + datetime.timedelta(days=days))
+        .add_extension(x509.CRLNumber(crl_number), critical=False)
+        .add_extension(
+            x509.AuthorityKeyIdentifier.from_issuer_public_key(ca.key.public_key()), critical=False
+        )
+    )
+    if delta_of is not None:
+        builder = builder.add_extension(x509.DeltaCRLIndicator(delta_of), critical=True)
+    for serial_number, revocation_date in revoked:
+        builder = builder.add_revoked_certificate(
+            x509.RevokedCertificateBuilder()
+            .serial_number(serial_number)
+            .revocation_date(revocation_date)
+            .build()
+        )
+    return builder.sign(ca.key, hashes.SHA256())
+
+
+def legacy_encryption(password: str) -> serialization.KeySerializationEncryption:
+    # The equivalent of openssl pkcs12 -legacy, ATAK can't read PKCS#12 files encrypted with AES
+    return (
+        serialization.PrivateFormat.PKCS12.encryption_builder()
+        .kdf_rounds(2048)
+        .key_cert_algorithm(pkcs12.PBES.PBESv1SHA1And3KeyTripleDESCBC)
+        .hmac_hash(hashes.SHA1())
+        .build(password.encode())
+    )
+
+
+def pkcs12_bundle(
+    name: str, key: rsa.RSAPrivateKey, certificate: x509.Certificate, password: str
+) -> bytes:
+    return pkcs12.serialize_key_and_certificates(
+        name.encode(), key, certificate, None, legacy_encryption(password)
+    )
+
+
+def truststore(name: str, certificate: x509.Certificate, password: str) -> bytes:
+    """A PKCS#12 file with only the CA cert, marked as trusted the way openssl -addtrust does for Java"""
+    return pkcs12.serialize_java_truststore(
+        [pkcs12.PKCS12Certificate(certificate, name.encode())], legacy_encryption(password)
+    )
+
+
+def certificate_pem(certificate: x509.Certificate) -> bytes:
+    return certificate.public_bytes(serialization.Encoding.PEM)
+
+
+def private_key_pem(key: rsa.RSAPrivateKey, password: str | None = None) -> bytes:
+    if password:
+        encryption = serialization.BestAvailableEncryption(password.encode())
+    else:
+        encryption = serialization.NoEncryption()
+    return key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, encryption
+    )
+
+
+def public_key_pem(key: rsa.RSAPrivateKey) -> bytes:
+    return key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+
+
+_ca_lock = threading.Lock()
+_ca_cache: dict[tuple, CA] = {}
+
+
+def _file_stamp(path: str) -> tuple:
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+def load_ca(certificate_path: str, key_path: str, password: str) -> CA:
+    """Returns the CA, only reading and decrypting the key again when one of the files changes"""
+    cache_key = (
+        certificate_path,
+        key_path,
+        _file_stamp(certificate_path),
+        _file_stamp(key_path),
+        password,
+    )
+    with _ca_lock:
+        ca = _ca_cache.get(cache_key)
+        if ca is None:
+            with open(certificate_path, "rb") as f:
+                certificate = x509.load_pem_x509_certificate(f.read())
+            with open(key_path, "rb") as f:
+                key = serialization.load_pem_private_key(f.read(), password.encode())
+            ca = CA(certificate, key)
+            _ca_cache.clear()
+            _ca_cache[cache_key] = ca
+        return ca
+
+
+def clear_cache():
+    with _ca_lock:
+        _ca_cache.clear()
@@ -1,20 +1,18 @@
-import io
 import os
-import random
-import re
 import shutil
-import subprocess
-import traceback
 import uuid
 import zipfile
 from pathlib import Path
 from shutil import copyfile, rmtree
 from urllib.parse import urlparse
 
+from cryptography import x509
+from cryptography.hazmat.primitives import serialization
 from flask import request
 from jinja2 import Template
 
-from .ca_config import ca_config, server_config
+from . import ca_engine
+from .ca_config import ca_config
 
 
 class CertificateAuthority:
@@ -23,92 +21,60 @@ class CertificateAuthority:
         self.logger = logger
         self.app = app
 
+    def path(self, *parts):
+        return os.path.join(self.app.config.get("OTS_CA_FOLDER"), *parts)
+
+    def write_file(self, path, data, mode=None):
+        with open(path, "wb") as f:
+            f.write(data)
+        if mode is not None:
+            os.chmod(path, mode)
+
+    def load_ca(self) -> ca_engine.CA:
+        return ca_engine.load_ca(
+            self.path("ca.pem"),
+            self.path("ca-do-not-share.key"),
+            self.app.config.get("OTS_CA_PASSWORD"),
+        )
+
     def create_ca(self):
         if not self.check_if_ca_exists():
             self.logger.info("Creating CA...")
             os.makedirs(self.app.config.get("OTS_CA_FOLDER"), exist_ok=True)
 
-            f = open(os.path.join(self.app.config.get("OTS_CA_FOLDER"), "ca_config.cfg"), "w")
+            # Kept so admins can still manage the CA with openssl ca
+            f = open(self.path("ca_config.cfg"), "w")
             f.write(ca_config)
             f.close()
 
-            subject = self.app.config.get("OTS_CA_SUBJECT") + "/CN={}".format(
-                self.app.config.get("OTS_CA_NAME")
+            subject = ca_engine.parse_subject(
+                self.app.config.get("OTS_CA_SUBJECT")
+                + "/CN={}".format(self.app.config.get("OTS_CA_NAME"))
             )
+            password = self.app.config.get("OTS_CA_PASSWORD")
 
-            command = "openssl req -new -sha256 -x509 -days {} -extensions v3_ca -keyout {} -out {} -passout pass:{} -config {} -subj {}".format(
-                self.app.config.get("OTS_CA_EXPIRATION_TIME"),
-                os.path.join(self.app.config.get("OTS_CA_FOLDER"), "ca-do-not-share.key"),
-                os.path.join(self.app.config.get("OTS_CA_FOLDER"), "ca.pem"),
-                self.app.config.get("OTS_CA_PASSWORD"),
-                os.path.join(self.app.config.get("OTS_CA_FOLDER"), "ca_config.cfg"),
-                subject,
+            key = ca_engine.generate_key()
+            certificate = ca_engine.create_ca_certificate(
+                key, subject, self.app.config.get("OTS_CA_EXPIRATION_TIME")
             )
+            ca = ca_engine.CA(certificate, key)
 
-            self.logger.debug(command)
-
-            exit_code = subprocess.call(command, shell=True)
-
-            if exit_code:
-                raise Exception("Failed to create ca.pem. Exit code {}".format(exit_code))
-
-            command = "openssl x509 -in {} -addtrust clientAuth -addtrust serverAuth -setalias {} -out {}".format(
-                os.path.join(self.app.config.get("OTS_CA_FOLDER"), "ca.pem"),
-                self.app.config.get("OTS_CA_NAME"),
-                os.path.join(self.app.config.get("OTS_CA_FOLDER"), "ca-trusted.pem"),
+            self.write_file(
+                self.path("ca-do-not-share.key"), ca_engine.private_key_pem(key, password), 0o600
+            )
+            self.write_file(self.path("ca.pem"), ca_engine.certificate_pem(certificate))
+            self.write_file(self.path("ca-trusted.pem"), ca_engine.certificate_pem(certificate))
+            self.write_file(
+                self.path("truststore-root.p12"),
+                ca_engine.truststore(self.app.config.get("OTS_CA_NAME"), certificate, password),
             )
 
-            self.logger.debug(command)
-
-            exit_code = subprocess.call(command, shell=True)
-
-            if exit_code:
-                raise Exception("Failed to add trust to CA. Exit code {}".format(exit_code))
-
-            use_legacy = not subprocess.call("openssl list -providers", shell=True)
-
-            if use_legacy:
-                command = "openssl pkcs12 -legacy -export -in {} -out {} -passout pass:{} -nokeys -caname {}".format(
-                    os.path.join(self.app.config.get("OTS_CA_FOLDER"), "ca-trusted.pem"),
-                    os.path.join(self.app.config.get("OTS_CA_FOLDER"), "truststore-root.p12"),
-                    self.app.config.get("OTS_CA_PASSWORD"),
-                    self.app.config.get("OTS_CA_NAME"),
-                )
-            else:
-                command = "openssl pkcs12 -export -in {} -out {} -passout pass:{} -nokeys -caname {}".format(
-                    os.path.join(self.app.config.get("OTS_CA_FOLDER"), "ca-trusted.pem"),
-                    os.path.join(self.app.config.get("OTS_CA_FOLDER"), "truststore-root.p12"),
-                    self.app.config.get("OTS_CA_PASSWORD"),
-                    self.app.config.get("OTS_CA_NAME"),
-                )
-
-            self.logger.debug(command)
-
-            exit_code = subprocess.call(command, shell=True)
-
-            if exit_code:
-                raise Exception("Failed to export truststore. Exit code {}".format(exit_code))
-
-            Path(os.path.join(self.app.config.get("OTS_CA_FOLDER"), "crl_index.txt")).touch()
-            f = open(os.path.join(self.app.config.get("OTS_CA_FOLDER"), "crl_index.txt.attr"), "w")
+            Path(self.path("crl_index.txt")).touch()
+            f = open(self.path("crl_index.txt.attr"), "w")
             f.write("unique_subject = no")
             f.close()
 
-            command = "cd {} && openssl ca -config {} -gencrl -keyfile {} -passin pass:{} -cert {} -out {}".format(
-                self.app.config.get("OTS_CA_FOLDER"),
-                os.path.join(self.app.config.get("OTS_CA_FOLDER"), "ca_config.cfg"),
-                os.path.join(self.app.config.get("OTS_CA_FOLDER"), "ca-do-not-share.key"),
-                self.app.config.get("OTS_CA_PASSWORD"),
-                os.path.join(self.app.config.get("OTS_CA_FOLDER"), "ca.pem"),
-                os.path.join(self.app.config.get("OTS_CA_FOLDER"), "ca.crl"),
-            )
-
-            self.logger.debug(command)
-
-            exit_code = subprocess.call(command, shell=True)
-
-            if exit_code:
-                raise Exception("Failed to create crl. Exit code {}".format(exit_code))
+            self.generate_crl(ca)
 
             self.logger.debug("Creating server cert...")
             self.issue_certificate("opentakserver", True)
@@ -119,229 +85,95 @@ class CertificateAuthority:
         else:
             self.logger.debug("CA already exists")
 
-    def issue_certificate(self, common_name, server=False):
-        if not os.path.exists(os.path.join(self.app.config.get("OTS_CA_FOLDER"), "ca.pem")):
-            raise FileNotFoundError("ca.pem not found")
-
-        if os.path.exists(os.path.join(self.app.config.get("OTS_CA_FOLDER"), "certs", common_name)):
-            shutil.rmtree(os.path.join(self.app.config.get("OTS_CA_FOLDER"), "certs", common_name))
+    def generate_crl(self, ca=None, revoked=()):
+        """Writes ca.crl
 
-        os.makedirs(os.path.join(self.app.config.get("OTS_CA_FOLDER"), "certs", common_name))
+        :param revoked: (serial number, revocation date) pairs
+        """
+        crl = ca_engine.build_crl(ca or self.load_ca(), revoked)
+        self.write_file(self.path("ca.crl"), crl.public_bytes(serialization.Encoding.PEM))
 
-        subject = self.app.config.get("OTS_CA_SUBJECT") + "/CN={}".format(common_name)
-
-        command = "openssl req -new -newkey rsa:2048 -sha256 -keyout {} -passout pass:{} -out {} -subj {} -config {}".format(
-            os.path.join(
-                self.app.config.get("OTS_CA_FOLDER"), "certs", common_name, common_name + ".key"
-            ),
-            self.app.config.get("OTS_CA_PASSWORD"),
-            os.path.join(
-                self.app.config.get("OTS_CA_FOLDER"), "certs", common_name, common_name + ".csr"
-            ),
-            subject,
-            os.path.join(self.app.config.get("OTS_CA_FOLDER"), "ca_config.cfg"),
-        )
+    def issue_certificate(self, common_name, server=False, server_address=None):
+        if not os.path.exists(self.path("ca.pem")):
+            raise FileNotFoundError("ca.pem not found")
 
-        self.logger.debug(command)
+        if os.path.exists(self.path("certs", common_name)):
+            shutil.rmtree(self.path("certs", common_name))
 
-        exit_code = subprocess.call(command, shell=True)
-        if exit_code:
-            raise Exception("Failed to create csr. Exit code {}".format(exit_code))
+        os.makedirs(self.path("certs", common_name))
 
-        csr = open(
-            os.path.join(
-                self.app.config.get("OTS_CA_FOLDER"), "certs", common_name, common_name + ".csr"
-            ),
-            "r",
+        password = self.app.config.get("OTS_CA_PASSWORD")
+        subject = ca_engine.parse_subject(
+            self.app.config.get("OTS_CA_SUBJECT") + "/CN={}".format(common_name)
         )
-        csr_bytes = csr.read().encode()
-        csr.close()
-
-        self.sign_csr(csr_bytes, common_name, server)
-
-        use_legacy = not subprocess.call("openssl list -providers", shell=True)
-
-        if use_legacy:
-            command = "openssl pkcs12 -legacy -export -in {}.pem -inkey {}.key -out {}.p12 -name {} -CAfile {} -passin pass:{} -passout pass:{}".format(
-                os.path.join(
-                    self.app.config.get("OTS_CA_FOLDER"), "certs", common_name, common_name
-                ),
-                os.path.join(
-                    self.app.config.get("OTS_CA_FOLDER"), "certs", common_name, common_name
-                ),
-                os.path.join(
-                    self.app.config.get("OTS_CA_FOLDER"), "certs", common_name, common_name
-                ),
-                common_name,
-                os.path.join(self.app.config.get("OTS_CA_FOLDER"), "ca.pem"),
-                self.app.config.get("OTS_CA_PASSWORD"),
-                self.app.config.get("OTS_CA_PASSWORD"),
-            )
-        else:
-            command = "openssl pkcs12 -export -in {}.pem -inkey {}.key -out {}.p12 -name {} -CAfile {} -passin pass:{} -passout pass:{}".format(
-                os.path.join(
-                    self.app.config.get("OTS_CA_FOLDER"), "certs", common_name, common_name
-                ),
-                os.path.join(
-                    self.app.config.get("OTS_CA_FOLDER"), "certs", common_name, common_name
-                ),
-                os.path.join(
-                    self.app.config.get("OTS_CA_FOLDER"), "certs", common_name, common_name
-                ),
-                common_name,
-                os.path.join(self.app.config.get("OTS_CA_FOLDER"), "ca.pem"),
-                self.app.config.get("OTS_CA_PASSWORD"),
-                self.app.config.get("OTS_CA_PASSWORD"),
-            )
 
-        self.logger.debug(command)
+        key = ca_engine.generate_key()
+        csr = ca_engine.build_csr(key, subject)
+        certificate, cert_bytes = self.sign(csr, common_name, server)
 
-        exit_code = subprocess.call(command, shell=True)
-        if exit_code:
-            raise Exception("Failed to export p12 key. Exit code {}".format(exit_code))
-
-        os.chmod(
-            os.path.join(
-                self.app.config.get("OTS_CA_FOLDER"), "certs", common_name, common_name + ".key"
-            ),
+        self.write_file(
+            self.path("certs", common_name, common_name + ".key"),
+            ca_engine.private_key_pem(key, password),
             0o620,
         )
-
-        command = "openssl rsa -in {} -passin pass:{} -out {}".format(
-            os.path.join(
-                self.app.config.get("OTS_CA_FOLDER"), "certs", common_name, common_name + ".key"
-            ),
-            os.path.join(self.app.config.get("OTS_CA_PASSWORD")),
-            os.path.join(
-                self.app.config.get("OTS_CA_FOLDER"),
-                "certs",
-                common_name,
-                common_name + ".nopass.key",
-            ),
+        self.write_file(
+            self.path("certs", common_name, common_name + ".nopass.key"),
+            ca_engine.private_key_pem(key),
+        )
+        self.write_file(
+            self.path("certs", common_name, common_name + ".p12"),
+            ca_engine.pkcs12_bundle(common_name, key, certificate, password),
         )
-
-        self.logger.debug(command)
-
-        exit_code = subprocess.call(command, shell=True)
-        if exit_code:
-            raise Exception("Failed to remove server key password. Exit code {}".format(exit_code))
 
         if not server:
-            return self.generate_zip(common_name)
+            return self.generate_zip(common_name, server_address)
         else:
             # Generate public key for PyJWT to validate tokens
-            command = "openssl x509 -pubkey -in {} -out {}".format(
-                os.path.join(
-                    self.app.config.get("OTS_CA_FOLDER"), "certs", common_name, common_name + ".pem"
-                ),
-                os.path.join(
-                    self.app.config.get("OTS_CA_FOLDER"), "certs", common_name, common_name + ".pub"
-                ),
+            self.write_file(
+                self.path("certs", common_name, common_name + ".pub"),
+                ca_engine.public_key_pem(key),
             )
 
-            self.logger.debug(command)
-
-            exit_code = subprocess.call(command, shell=True)
-            if exit_code:
-                raise Exception(
-                    "Failed to generate server's public key. Exit code {}".format(exit_code)
-                )
-
     def sign_csr(self, csr_bytes, common_name, server=False):
-        os.makedirs(
-            os.path.join(self.app.config.get("OTS_CA_FOLDER"), "certs", common_name), exist_ok=True
-        )
-        f = open(
-            os.path.join(
-                self.app.config.get("OTS_CA_FOLDER"), "certs", common_name, common_name + ".csr"
-            ),
-            "wb",
-        )
-        f.write(csr_bytes)
-        f.close()
+        try:
+            csr = x509.load_pem_x509_csr(csr_bytes)
+        except ValueError as e:
+            raise Exception("Failed to load csr: {}".format(e))
 
-        if server:
-            if re.match("^[0-9]{1,3}.[0-9]{1,3}.[0-9]{1,3}.[0-9]{1,3}$", common_name):
-                alt_name_field = "IP.1"
-            else:
-                alt_name_field = "DNS.1"
-
-            f = open(
-                os.path.join(
-                    self.app.config.get("OTS_CA_FOLDER"),
-                    "certs",
-                    common_name,
-                    "{}_config.cfg".format(common_name),
-                ),
-                "w",
-            )
+        certificate, cert_bytes = self.sign(csr, common_name, server)
+        return cert_bytes
 
-            f.write(server_config.render(alt_name_field=alt_name_field, common_name=common_name))
+    def sign(self, csr, common_name, server=False):
+        """Signs csr and writes the CSR and certificate to the common name's folder
 
-            f.close()
+        Server certs are written followed by the CA cert so they can be used as a chain.
+        """
+        os.makedirs(self.path("certs", common_name), exist_ok=True)
 
-            config_file = os.path.join(
-                self.app.config.get("OTS_CA_FOLDER"),
-                "certs",
-                common_name,
-                "{}_config.cfg".format(common_name),
-            )
-            extensions = "server"
-        else:
-            config_file = os.path.join(self.app.config.get("OTS_CA_FOLDER"), "ca_config.cfg")
-            extensions = "client"
-
-        command = "openssl x509 -sha256 -req -days {} -in {} -CA {} -CAkey {} -out {} -set_serial {} -passin pass:{} -extensions {} -extfile {}".format(
-            self.app.config.get("OTS_CA_EXPIRATION_TIME"),
-            os.path.join(
-                self.app.config.get("OTS_CA_FOLDER"), "certs", common_name, common_name + ".csr"
-            ),
-            os.path.join(self.app.config.get("OTS_CA_FOLDER"), "ca.pem"),
-            os.path.join(self.app.config.get("OTS_CA_FOLDER"), "ca-do-not-share.key"),
-            os.path.join(
-                self.app.config.get("OTS_CA_FOLDER"), "certs", common_name, common_name + ".pem"
-            ),
-            random.randint(10000, 100000),
-            self.app.config.get("OTS_CA_PASSWORD"),
-            extensions,
-            config_file,
+        ca = self.load_ca()
+        certificate = ca_engine.sign_csr(
+            ca, csr, self.app.config.get("OTS_CA_EXPIRATION_TIME"), server
         )
 
-        self.logger.debug(command)
-
-        exit_code = subprocess.call(command, shell=True)
-        if exit_code:
-            raise Exception("Failed to sign csr. Exit code {}".format(exit_code))
+        self.write_file(
+            self.path("certs", common_name, common_name + ".csr"),
+            csr.public_bytes(serialization.Encoding.PEM),
+        )
 
+        cert_bytes = ca_engine.certificate_pem(certificate)
         if server:
-            with open(os.path.join(self.app.config.get("OTS_CA_FOLDER"), "ca.pem"), "r") as ca_file:
-                f = open(
-                    os.path.join(
-                        self.app.config.get("OTS_CA_FOLDER"),
-                        "certs",
-                        common_name,
-                        common_name + ".pem",
-                    ),
-                    "a",
-                )
-                f.write(ca_file.read())
-                f.close()
-
-        f = open(
-            os.path.join(
-                self.app.config.get("OTS_CA_FOLDER"), "certs", common_name, common_name + ".pem"
-            ),
-            "r",
-        )
-        cert_bytes = f.read().encode()
-        f.close()
+            cert_bytes += ca_engine.certificate_pem(ca.certificate)
+        self.write_file(self.path("certs", common_name, common_name + ".pem"), cert_bytes)
 
-        return cert_bytes
+        self.logger.debug("Signed certificate for {}".format(common_name))
+        return certificate, cert_bytes
 
     def check_if_ca_exists(self):
         return os.path.exists(os.path.join(self.app.config.get("OTS_CA_FOLDER"), "ca.pem"))
 
-    def generate_zip(self, common_name):
+    def generate_zip(self, common_name, server_address=None):
+        # Bulk issuance runs outside of a request and passes the address in
+        server_address = server_address or urlparse(request.url_root).hostname
         truststore = os.path.join(self.app.config.get("OTS_CA_FOLDER"), "truststore-root.p12")
         user_p12 = os.path.join(
             self.app.config.get("OTS_CA_FOLDER"), "certs", common_name, "{}.p12".format(common_name)
@@ -402,7 +234,7 @@ class CertificateAuthority:
                     """)
 
         pref = pref_file_template.render(
-            server=urlparse(request.url_root).hostname,
+            server=server_address,
             marti_port=self.app.config.get("OTS_MARTI_HTTPS_PORT"),
             server_filename="truststore-root.p12",
             user_filename=f"{common_name}.p12",
@@ -411,14 +243,14 @@ class CertificateAuthority:
         )
         man = manifest_file_template.render(
             uid=random_id,
-            server=urlparse(request.url_root).hostname,
+            server=server_address,
             server_filename="truststore-root.p12",
             user_filename=f"{common_name}.p12",
             folder=folder,
         )
         man_parent = manifest_file_parent_template.render(
             uid=new_uid,
-            server=urlparse(request.url_root).hostname,
+            server=server_address,
             folder=parent_folder,
             internal_dp_name=common_name,
         )
@@ -512,7 +344,7 @@ class CertificateAuthority:
         f = open(os.path.join(user_file_path, "config.pref"), "w")
         f.write(
             itak_preferences.render(
-                server=urlparse(request.url_root).hostname,
+                server=server_address,
                 ssl_port=self.app.config.get("OTS_SSL_STREAMING_PORT"),
                 cert_password=self.app.config.get("OTS_CA_PASSWORD"),
                 common_name=common_name,
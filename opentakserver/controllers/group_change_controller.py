@@ -0,0 +1,72 @@
+import traceback
+from collections import deque
+
+from opentakserver.blueprints.ots_socketio import refresh_rooms
+from opentakserver.controllers.rabbitmq_client import RabbitMQClient
+from opentakserver.group_changes import GroupChange, apply, changes
+from opentakserver.socketio_rooms import ALL_GROUPS, NAMESPACE, group_rooms
+
+
+class GroupChangeController(RabbitMQClient):
+    """Applies group changes submitted by web requests to the groups exchange's bindings"""
+
+    def __init__(self, context):
+        # Changes submitted before the channel opens, or while it's being reopened
+        self.waiting: deque[GroupChange] = deque()
+        self.in_flight: dict[str, GroupChange] = {}
+        super().__init__(context)
+        self.logger.info("Starting group change controller...")
+
+    def on_channel_open(self, channel):
+        self.rabbit_channel = channel
+        self.rabbit_channel.add_on_close_callback(self.on_channel_closed)
+        while self.waiting:
+            self.apply(self.waiting.popleft())
+
+    def on_channel_closed(self, channel, reason):
+        self.logger.error(f"Group change channel closed: {reason}")
+        for change in list(self.in_flight.values()):
+            self.finish(change, str(reason))
+        self.in_flight.clear()
+
+        if self.rabbit_connection.is_open:
+            self.rabbit_connection.channel(on_open_callback=self.on_channel_open)
+
+    def submit(self, change: GroupChange) -> GroupChange:
+        """Queues change to be applied from the ioloop thread, can be called from any thread"""
+        changes.add(change)
+        self.rabbit_connection.ioloop.add_callback_threadsafe(lambda: self.apply(change))
+        return change
+
+    def apply(self, change: GroupChange):
+        if not self.rabbit_channel or not self.rabbit_channel.is_open:
+            self.waiting.append(change)
+            return
+
+        try:
+            self.in_flight[change.change_id] = change
+            apply(self.rabbit_channel, change, self.finish)
+        except BaseException as e:
+            self.logger.error(f"Failed to apply group change {change.change_id}: {e}")
+            self.logger.debug(traceback.format_exc())
+            self.finish(change, str(e))
+
+    def finish(self, change: GroupChange, error: str | None = None):
+        self.in_flight.pop(change.change_id, None)
+        changes.finish(change, error)
+        if not error:
+            self.logger.debug(
+                f"Applied group change {change.change_id}: {len(change.bind)} bound, "
+                f"{len(change.unbind)} unbound"
+            )
+            try:
+                # Web UIs of users whose OUT groups changed move to their new groups' rooms
+                with self.context:
+                    refresh_rooms()
+            except BaseException as e:
+                self.logger.error(f"Failed to update Socket.IO rooms: {e}")
+                self.logger.debug(traceback.format_exc())
+        # Group changes are only shown to administrators
+        self.socketio.emit(
+            "group_change", change.to_json(), namespace=NAMESPACE, to=group_rooms([ALL_GROUPS])
+        )
@@ -0,0 +1,68 @@
+import json
+import traceback
+
+from opentakserver.controllers.rabbitmq_client import RabbitMQClient
+from opentakserver.map_deltas import FRAME_EVENT, MAP_UPDATES_EXCHANGE, MapDeltas, encode, msgpack
+from opentakserver.socketio_rooms import NAMESPACE, location_rooms
+
+
+class MapDeltaController(RabbitMQClient):
+    """Collects map updates from cot_parser and emits them to the web UI as delta frames"""
+
+    def __init__(self, context):
+        config = context.app.config
+        self.tick_rate = config.get("OTS_MAP_DELTA_TICK_RATE")
+        self.binary = config.get("OTS_MAP_DELTA_MSGPACK")
+        self.deltas = MapDeltas(config.get("OTS_MAP_DELTA_KEYFRAME_SECONDS"))
+        self.queue = None
+        self.ticking = False
+        super().__init__(context)
+        self.logger.info("Starting map delta controller...")
+        if self.binary and msgpack is None:
+            self.logger.warning("OTS_MAP_DELTA_MSGPACK is enabled but msgpack isn't installed")
+
+    def on_channel_open(self, channel):
+        self.rabbit_channel = channel
+        self.rabbit_channel.exchange_declare(
+            MAP_UPDATES_EXCHANGE, durable=False, exchange_type="fanout"
+        )
+        self.rabbit_channel.queue_declare(queue="", exclusive=True, callback=self.on_queue_declared)
+        self.rabbit_channel.add_on_close_callback(self.on_close)
+
+        # on_channel_open runs again whenever the channel is reopened, but tick() keeps rescheduling itself
+        if self.tick_rate and not self.ticking:
+            self.ticking = True
+            self.rabbit_connection.ioloop.call_later(1 / self.tick_rate, self.tick)
+
+    def on_queue_declared(self, frame):
+        self.queue = frame.method.queue
+        self.rabbit_channel.queue_bind(exchange=MAP_UPDATES_EXCHANGE, queue=self.queue)
+        self.rabbit_channel.basic_consume(
+            queue=self.queue, on_message_callback=self.on_message, auto_ack=True
+        )
+
+    def on_message(self, unused_channel, basic_deliver, properties, body):
+        try:
+            message = json.loads(body)
+            data = message["data"]
+            rooms = location_rooms(message["mask"], data.get("latitude"), data.get("longitude"))
+
+            if self.tick_rate:
+                self.deltas.update(message["event"], data, rooms)
+            else:
+                # Ticks are disabled, send every update as soon as it comes in like before
+                self.socketio.emit(message["event"], data, namespace=NAMESPACE, to=rooms)
+        except BaseException as e:
+            self.logger.error(f"Failed to process map update: {e}")
+            self.logger.debug(traceback.format_exc())
+
+    def tick(self):
+        try:
+            for rooms, frame in self.deltas.frames():
+                self.socketio.emit(
+                    FRAME_EVENT, encode(frame, self.binary), namespace=NAMESPACE, to=rooms
+                )
+        except BaseException as e:
+            self.logger.error(f"Failed to send map deltas: {e}")
+            self.logger.debug(traceback.format_exc())
+        self.rabbit_connection.ioloop.call_later(1 / self.tick_rate, self.tick)
@@ -22,6 +22,7 @@ from opentakserver.models.Meshtastic import MeshtasticChannel
 from opentakserver.models.Point import Point
 from opentakserver.models.Team import Team
 from opentakserver.proto import atak_pb2
+from opentakserver.socketio_rooms import emit_group_event, emit_map_event
 
 
 class MeshtasticController(RabbitMQClient):
@@ -323,7 +324,8 @@ class MeshtasticController(RabbitMQClient):
         eud.meshtastic_macaddr = self.meshtastic_devices[from_id]["macaddr"]
 
         with self.context:
-            socketio.emit("eud", eud.to_json(), namespace="/socket.io")
+            # Meshtastic nodes are public, like other data the server generates itself
+            emit_group_event(socketio, "eud", eud.to_json(), None)
 
         with self.context:
             team = db.session.execute(
@@ -422,7 +424,7 @@ class MeshtasticController(RabbitMQClient):
                 db.session.add(point)
                 db.session.commit()
 
-                socketio.emit("point", point.to_json(), namespace="/socket.io")
+                emit_map_event(socketio, "point", point.to_json(), None, point)
 
             return self.cot(pb, from_id, to_id, portnum)
         except BaseException as e:
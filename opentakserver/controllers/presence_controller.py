@@ -0,0 +1,64 @@
+import json
+import traceback
+
+from opentakserver.controllers.rabbitmq_client import RabbitMQClient
+from opentakserver.presence import DISCONNECTED, PRESENCE_EXCHANGE, registry
+from opentakserver.socketio_rooms import emit_group_event
+
+
+class PresenceController(RabbitMQClient):
+    """Feeds the presence exchange into opentakserver.presence.registry and notifies the web UI of changes"""
+
+    def __init__(self, context):
+        registry.ttl = context.app.config.get("OTS_PRESENCE_TTL_SECONDS")
+        self.queue = None
+        self.expiring = False
+        super().__init__(context)
+        self.logger.info("Starting presence controller...")
+
+    def on_channel_open(self, channel):
+        self.rabbit_channel = channel
+        self.rabbit_channel.exchange_declare(
+            PRESENCE_EXCHANGE, durable=False, exchange_type="fanout"
+        )
+        self.rabbit_channel.queue_declare(queue="", exclusive=True, callback=self.on_queue_declared)
+        self.rabbit_channel.add_on_close_callback(self.on_close)
+
+        # Check for expired sessions even when no messages are coming in. expire() reschedules itself, so only start it
+        # the first time the channel opens
+        if not self.expiring:
+            self.expiring = True
+            self.rabbit_connection.ioloop.call_later(registry.ttl, self.expire)
+
+    def on_queue_declared(self, frame):
+        self.queue = frame.method.queue
+        self.rabbit_channel.queue_bind(exchange=PRESENCE_EXCHANGE, queue=self.queue)
+        self.rabbit_channel.basic_consume(
+            queue=self.queue, on_message_callback=self.on_message, auto_ack=True
+        )
+
+    def on_message(self, unused_channel, basic_deliver, properties, body):
+        try:
+            message = json.loads(body)
+            if registry.apply(message):
+                online = message.get("event") != DISCONNECTED
+                self.emit(message["uid"], online, message.get("group_mask"))
+        except BaseException as e:
+            self.logger.error(f"Failed to process presence message: {e}")
+            self.logger.debug(traceback.format_exc())
+
+    def expire(self):
+        for session in registry.expire():
+            self.emit(session.uid, False, session.group_mask)
+        self.rabbit_connection.ioloop.call_later(registry.ttl / 2, self.expire)
+
+    def emit(self, uid: str, online: bool, group_mask: int | None):
+        # Only the web UIs that can see one of the EUD's groups are told about it. Without a mask, only administrators
+        if group_mask is None:
+            group_mask = 0
+        emit_group_event(
+            self.socketio,
+            "presence",
+            {"uid": uid, "online": online, "online_euds": registry.count()},
+            group_mask,
+        )
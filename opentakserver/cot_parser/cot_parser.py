@@ -1,6 +1,5 @@
 import base64
 import datetime
-from datetime import timedelta, timezone
 import logging
 import os
 import platform
@@ -9,6 +8,7 @@ import sys
 import time
 import traceback
 import uuid
+from datetime import timedelta, timezone
 from logging.handlers import TimedRotatingFileHandler
 
 import bleach
@@ -24,14 +24,16 @@ from flask_security import SQLAlchemyUserDatastore
 from flask_security.models import fsqla
 from flask_socketio import SocketIO
 from meshtastic import BROADCAST_NUM, mesh_pb2, mqtt_pb2, portnums_pb2
-from opentakserver.models.GroupUser import GroupUser
 from pika.channel import Channel
 from sqlalchemy import exc, insert, select, update
 
+from opentakserver import group_routing, map_deltas
 from opentakserver.defaultconfig import DefaultConfig
 from opentakserver.extensions import db, logger
 from opentakserver.functions import *
 from opentakserver.functions import datetime_from_iso8601_string
+from opentakserver.group_routing import ANON_MASK, GROUP_MASK_EXCHANGE, user_mask
+from opentakserver.map_deltas import MAP_UPDATES_EXCHANGE
 from opentakserver.models.Alert import Alert
 from opentakserver.models.CasEvac import CasEvac
 from opentakserver.models.Certificate import Certificate
@@ -62,6 +64,8 @@ from opentakserver.models.VideoStream import VideoStream
 from opentakserver.models.WebAuthn import WebAuthn
 from opentakserver.models.ZMIST import ZMIST
 from opentakserver.proto import atak_pb2
+from opentakserver.serialization import apply_profile
+from opentakserver.socketio_rooms import emit_group_event, emit_map_event
 
 
 class CoTController:
@@ -86,6 +90,12 @@ class CoTController:
             pika.ConnectionParameters(host=rabbit_host, credentials=rabbit_credentials)
         )
         self.rabbit_channel = self.rabbit_connection.channel()
+        self.rabbit_channel.exchange_declare(
+            GROUP_MASK_EXCHANGE, durable=True, exchange_type="headers"
+        )
+        self.rabbit_channel.exchange_declare(
+            MAP_UPDATES_EXCHANGE, durable=False, exchange_type="fanout"
+        )
         self.rabbit_channel.queue_declare(queue="cot_parser")
         self.rabbit_channel.queue_bind(
             exchange="cot_parser", queue="cot_parser", routing_key="cot_parser"
@@ -132,7 +142,7 @@ class CoTController:
                 # We'll ignore this error and not insert this CoT so the EUD table can be populated
                 return None
 
-    def parse_point(self, event, uid, cot_id):
+    def parse_point(self, event, uid, cot_id, mask=None):
         # hae = Height above the WGS ellipsoid in meters
         # ce = Circular 1-sigma or a circular area about the location in meters
         # le = Linear 1-sigma error or an altitude range about the location in meters
@@ -141,9 +151,9 @@ class CoTController:
             p = Point()
             p.uid = event.attrs["uid"]
             p.device_uid = uid
-            p.ce = point.attrs["ce"]
-            p.hae = point.attrs["hae"]
-            p.le = point.attrs["le"]
+            p.ce = float(point.attrs["ce"])
+            p.hae = float(point.attrs["hae"])
+            p.le = float(point.attrs["le"])
             p.latitude = float(point.attrs["lat"])
             p.longitude = float(point.attrs["lon"])
             p.timestamp = datetime_from_iso8601_string(event.attrs["time"])
@@ -156,12 +166,12 @@ class CoTController:
             track = event.find("track")
             if track:
                 if "course" in track.attrs and track.attrs["course"] != "9999999.0":
-                    p.course = track.attrs["course"]
+                    p.course = float(track.attrs["course"])
                 else:
                     p.course = 0
 
                 if "speed" in track.attrs and track.attrs["speed"] != "9999999.0":
-                    p.speed = track.attrs["speed"]
+                    p.speed = float(track.attrs["speed"])
                 else:
                     p.speed = 0
 
@@ -169,10 +179,10 @@ class CoTController:
             sensor = event.find("sensor")
             if sensor:
                 if "azimuth" in sensor.attrs:
-                    p.azimuth = sensor.attrs["azimuth"]
+                    p.azimuth = float(sensor.attrs["azimuth"])
                 # Camera's field of view
                 if "fov" in sensor.attrs:
-                    p.fov = sensor.attrs["fov"]
+                    p.fov = float(sensor.attrs["fov"])
 
             precision_location = event.find("precisionlocation")
             if precision_location and "geolocationsrc" in precision_location.attrs:
@@ -185,7 +195,7 @@ class CoTController:
             status = event.find("status")
             if status:
                 if "battery" in status.attrs:
-                    p.battery = status.attrs["battery"]
+                    p.battery = float(status.attrs["battery"])
 
             with self.context:
                 res = self.db.session.execute(
@@ -246,16 +256,23 @@ class CoTController:
                 )
 
                 self.db.session.commit()
-                # Get the point from the DB with its related CoT
-                p = self.db.session.execute(
-                    select(Point).filter(Point.id == res.inserted_primary_key[0])
-                ).first()[0]
 
                 # This CoT is a position update for an EUD. Send it to socketio clients so it can be seen on the UI map
                 # OpenTAK ICU position updates don't include the <takv> tag, but we still want to send the updated position
                 # to the UI's map
                 if event.find("takv") or event.find("__video"):
-                    self.socketio.emit("point", p.to_json(), namespace="/socket.io")
+                    # Built from the parsed CoT instead of selecting the point again with its CoT and EUD
+                    point_json = p.to_json()
+                    point_json["how"] = event.attrs.get("how")
+                    point_json["type"] = event.attrs.get("type")
+                    point_json["callsign"] = callsign
+                    map_deltas.publish(
+                        self.rabbit_channel,
+                        "point",
+                        point_json,
+                        mask,
+                        self.context.app.config.get("OTS_RABBITMQ_TTL"),
+                    )
 
                 if self.context.app.config.get("OTS_ENABLE_MESHTASTIC"):
                     try:
@@ -606,7 +623,7 @@ class CoTController:
 
                     self.db.session.commit()
 
-    def parse_alert(self, event, uid, point_pk, cot_pk):
+    def parse_alert(self, event, uid, point_pk, cot_pk, mask=None):
         emergency = event.find("emergency")
         if emergency:
             if "type" in emergency.attrs:
@@ -622,7 +639,7 @@ class CoTController:
                 with self.context:
                     self.db.session.add(alert)
                     self.db.session.commit()
-                    self.socketio.emit("alert", alert.to_json(), namespace="/socket.io")
+                    emit_map_event(self.socketio, "alert", alert.to_json(), mask, alert.point)
             elif "cancel" in emergency.attrs:
                 with self.context:
                     try:
@@ -633,12 +650,12 @@ class CoTController:
                         ).first()[0]
                         alert.cancel_time = datetime_from_iso8601_string(event.attrs["start"])
                         self.db.session.commit()
-                        self.socketio.emit("alert", alert.to_json(), namespace="/socket.io")
+                        emit_map_event(self.socketio, "alert", alert.to_json(), mask, alert.point)
                     except BaseException as e:
                         self.logger.error("Failed to set alert cancel time: {}".format(e))
                         self.logger.debug(traceback.format_exc())
 
-    def parse_casevac(self, event, uid, point_pk, cot_pk):
+    def parse_casevac(self, event, uid, point_pk, cot_pk, mask=None):
         medevac = event.find("_medevac_")
         if medevac:
             zmist = medevac.find("zMist")
@@ -683,14 +700,16 @@ class CoTController:
 
                 try:
                     casevac: CasEvac = self.db.session.execute(
-                        self.db.session.query(CasEvac).filter_by(uid=event.attrs["uid"])
+                        apply_profile(self.db.session.query(CasEvac), "casevac").filter_by(
+                            uid=event.attrs["uid"]
+                        )
                     ).first()[0]
-                    self.socketio.emit("casevac", casevac.to_json(), namespace="/socket.io")
+                    emit_map_event(self.socketio, "casevac", casevac.to_json(), mask, casevac.point)
                 except BaseException as e:
                     self.logger.error(f"Failed to emit CasEvac: {e}")
                     self.logger.debug(traceback.format_exc())
 
-    def parse_marker(self, event, uid, point_pk, cot_pk):
+    def parse_marker(self, event, uid, point_pk, cot_pk, mask=None):
         if (
             (
                 re.match("^a-[fhupansjk]-[ZPAGSUF]", event.attrs["type"])
@@ -771,14 +790,21 @@ class CoTController:
                         if "production_time" in link.attrs
                         else iso8601_string_from_datetime(datetime.now(timezone.utc))
                     )
+                    try:
+                        marker.production_timestamp = datetime_from_iso8601_string(
+                            marker.production_time
+                        )
+                    except ValueError:
+                        marker.production_timestamp = datetime.now(timezone.utc)
                     marker.relation = link.attrs["relation"] if "relation" in link.attrs else None
                     marker.relation_type = (
                         link.attrs["relation_type"] if "relation_type" in link.attrs else None
                     )
                     marker.parent_uid = link.attrs["uid"] if "uid" in link.attrs else None
                 else:
+                    marker.production_timestamp = datetime.now(timezone.utc)
                     marker.production_time = iso8601_string_from_datetime(
-                        datetime.now(timezone.utc)
+                        marker.production_timestamp
                     )
 
                 marker.point_id = point_pk
@@ -803,16 +829,18 @@ class CoTController:
                         self.db.session.commit()
                         self.logger.debug("updated marker")
                         marker = self.db.session.execute(
-                            self.db.session.query(Marker).filter(Marker.uid == marker.uid)
+                            apply_profile(self.db.session.query(Marker), "marker").filter(
+                                Marker.uid == marker.uid
+                            )
                         ).first()[0]
 
-                    self.socketio.emit("marker", marker.to_json(), namespace="/socket.io")
+                    emit_map_event(self.socketio, "marker", marker.to_json(), mask, marker.point)
 
             except BaseException as e:
                 self.logger.error("Failed to parse marker: {}".format(e))
                 self.logger.debug(traceback.format_exc())
 
-    def parse_rbline(self, event, uid, point_pk, cot_pk):
+    def parse_rbline(self, event, uid, point_pk, cot_pk, mask=None):
         if re.match("^u-rb", event.attrs["type"]):
             self.logger.debug("Got an R&B line")
             rb_line = RBLine()
@@ -877,7 +905,7 @@ class CoTController:
                         self.logger.debug("Updated R&B line: {}".format(rb_line.uid))
 
                     rb_line.point = start_point
-                    self.socketio.emit("rb_line", rb_line.to_json(), namespace="/socket.io")
+                    emit_map_event(self.socketio, "rb_line", rb_line.to_json(), mask, start_point)
 
     def parse_stats(self, event, uid):
         stats = event.find("stats")
@@ -970,41 +998,19 @@ class CoTController:
 
             message = json.dumps({"uid": uid, "cot": tostring(event).decode("utf-8")})
             if self.rabbit_channel and not self.rabbit_channel.is_closed and user_id:
+                # The EUD handler unbinds the uid's queue from its groups when it disconnects
                 with self.context:
-                    group_query = db.session.query(GroupUser).filter_by(
-                        user_id=user_id, direction=Group.OUT, enabled=True
-                    )
-                    groups = db.session.execute(group_query).all()
-                    for group in groups:
-                        group = group[0]
-                        self.rabbit_channel.basic_publish(
-                            exchange="groups",
-                            routing_key=f"{group.group.name}.{group.direction}",
-                            body=message,
-                            properties=pika.BasicProperties(
-                                expiration=app.config.get("OTS_RABBITMQ_TTL")
-                            ),
-                        )
-
-                        self.rabbit_channel.queue_bind(
-                            queue=uid,
-                            exchange="groups",
-                            routing_key=f"{group.group.name}.{group.direction}",
-                        )
-
-                        self.logger.debug(
-                            f"Unbound {uid} from {group.group.name}.{group.direction}"
-                        )
+                    mask = user_mask(user_id, Group.OUT)
+                group_routing.publish(
+                    self.rabbit_channel, mask, message, app.config.get("OTS_RABBITMQ_TTL")
+                )
             elif (
                 self.rabbit_channel
                 and not self.rabbit_channel.is_closing
                 and not self.rabbit_channel.is_closed
             ):
-                self.rabbit_channel.basic_publish(
-                    exchange="groups",
-                    routing_key=f"__ANON__.{Group.OUT}",
-                    body=message,
-                    properties=pika.BasicProperties(expiration=app.config.get("OTS_RABBITMQ_TTL")),
+                group_routing.publish(
+                    self.rabbit_channel, ANON_MASK, message, app.config.get("OTS_RABBITMQ_TTL")
                 )
 
                 self.rabbit_channel.queue_unbind(
@@ -1139,7 +1145,21 @@ class CoTController:
                     ),
                 )
 
-    def route_cot(self, event, uid: str, user_id: int):
+    def sender_mask(self, uid: str | None, user_id: int | None, mask: int | None) -> int | None:
+        """The groups that a CoT from uid is sent to. None for CoTs generated by the server"""
+        if not uid:
+            return None
+        if not user_id:
+            # Publish all CoT messages received by TCP to the __ANON__ group
+            return ANON_MASK
+        if mask is None:
+            # The EUD handler normally sends the mask of the user's IN groups with the CoT.
+            # Defaults to the __ANON__ group if the user doesn't belong to any IN groups
+            with self.context:
+                return user_mask(user_id, Group.IN)
+        return mask
+
+    def route_cot(self, event, uid: str, user_id: int, mask: int | None = None):
         if not uid or uid == self.context.app.config.get("OTS_NODE_ID"):
             # This is a server generated CoT (i.e. ADS-B scheduled job) which was already properly routed
             return
@@ -1172,44 +1192,14 @@ class CoTController:
 
                 # CoT messages belonging to Data Sync missions (i.e. <dest mission="mission name" /> are handled by cot_parser
 
-        if not destinations and not user_id:
-            # Publish all CoT messages received by TCP and that have no destination to the __ANON__ group
-            self.rabbit_channel.basic_publish(
-                exchange="groups",
-                routing_key="__ANON__.OUT",
-                body=json.dumps({"uid": uid, "cot": str(event)}),
-                properties=pika.BasicProperties(expiration=app.config.get("OTS_RABBITMQ_TTL")),
-            )
-            return
-
         if not destinations:
-            with self.context:
-                group_memberships = db.session.execute(
-                    db.session.query(GroupUser).filter_by(
-                        user_id=user_id, direction=Group.IN, enabled=True
-                    )
-                ).all()
-                if not group_memberships:
-                    # Default to the __ANON__ group if the user doesn't belong to any IN groups
-                    self.rabbit_channel.basic_publish(
-                        exchange="groups",
-                        routing_key="__ANON__.OUT",
-                        body=json.dumps({"uid": uid, "cot": str(event)}),
-                        properties=pika.BasicProperties(
-                            expiration=self.context.app.config.get("OTS_RABBITMQ_TTL")
-                        ),
-                    )
-
-                for membership in group_memberships:
-                    membership = membership[0]
-                    self.rabbit_channel.basic_publish(
-                        exchange="groups",
-                        routing_key=f"{membership.group.name}.{Group.OUT}",
-                        body=json.dumps({"uid": uid, "cot": str(event)}),
-                        properties=pika.BasicProperties(
-                            expiration=self.context.app.config.get("OTS_RABBITMQ_TTL")
-                        ),
-                    )
+            # One publish reaches every EUD in any of the sender's groups, once
+            group_routing.publish(
+                self.rabbit_channel,
+                self.sender_mask(uid, user_id, mask),
+                json.dumps({"uid": uid, "cot": str(event)}),
+                self.context.app.config.get("OTS_RABBITMQ_TTL"),
+            )
 
     def on_message(
         self,
@@ -1239,17 +1229,19 @@ class CoTController:
                 uid = None
 
             if event:
+                # Web UIs only get map updates from groups that they can see
+                mask = self.sender_mask(uid, body.get("user_id"), body.get("groups"))
                 cot_pk = self.insert_cot(soup, event, uid)
-                point_pk = self.parse_point(event, uid, cot_pk)
+                point_pk = self.parse_point(event, uid, cot_pk, mask)
                 self.parse_geochat(event, cot_pk, point_pk)
                 self.parse_video(event, cot_pk)
-                self.parse_alert(event, uid, point_pk, cot_pk)
-                self.parse_casevac(event, uid, point_pk, cot_pk)
-                self.parse_marker(event, uid, point_pk, cot_pk)
-                self.parse_rbline(event, uid, point_pk, cot_pk)
+                self.parse_alert(event, uid, point_pk, cot_pk, mask)
+                self.parse_casevac(event, uid, point_pk, cot_pk, mask)
+                self.parse_marker(event, uid, point_pk, cot_pk, mask)
+                self.parse_rbline(event, uid, point_pk, cot_pk, mask)
                 self.parse_stats(event, uid)
                 self.generate_mission_change(uid, event)
-                self.route_cot(event, uid, body.get("user_id"))
+                self.route_cot(event, uid, body.get("user_id"), mask)
                 self.rabbit_channel.basic_ack(delivery_tag=basic_deliver.delivery_tag)
 
                 # EUD went offline
@@ -1258,7 +1250,7 @@ class CoTController:
                     try:
                         with self.context:
                             eud = self.db.session.execute(
-                                self.db.session.query(EUD).filter_by(uid=uid)
+                                apply_profile(self.db.session.query(EUD), "eud").filter_by(uid=uid)
                             ).first()
                             if eud:
                                 eud = eud[0]
@@ -1273,7 +1265,7 @@ class CoTController:
                                 # Tells the UI what kind of EUD this is, ie ATAK/WinTAK/iTAK or OpenTAK ICU
                                 if not eud_json["last_point"]:
                                     eud_json["type"] = event.attrs["type"]
-                                self.socketio.emit("eud", eud.to_json(), namespace="/socket.io")
+                                emit_group_event(self.socketio, "eud", eud.to_json(), mask)
                     except BaseException as e:
                         self.logger.error("Failed to update EUD: {}".format(e))
                         self.logger.debug(traceback.format_exc())
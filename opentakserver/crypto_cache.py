@@ -0,0 +1,148 @@
+"""Caches the CA certificate and server keys that are used to verify client certs and sign or verify JWTs
+
+Files are parsed once and parsed again when their mtime, size, or inode changes, so a rotated CA or server cert is picked
+up without a restart. Client certs that passed chain verification are kept in a bounded LRU keyed by the SHA256 of the
+PEM and the CA it was verified against, so repeat requests from the same EUD skip verification entirely. They're still
+checked against the in-memory set of revoked serial numbers on every request.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from flask import current_app as app
+from jwt.algorithms import RSAAlgorithm
+from OpenSSL import crypto
+from OpenSSL.crypto import X509
+
+from opentakserver.revocation import revoked_certificates
+
+VERIFIED_CERT_CACHE_SIZE = 1024
+
+
+@dataclass
+class CertificateAuthority:
+    store: crypto.X509Store
+    fingerprint: str
+
+
+class FileCache:
+    """Parses files with loader and keeps the result until the file changes"""
+
+    def __init__(self, loader: Callable[[bytes], Any]):
+        self.loader = loader
+        self._lock = threading.Lock()
+        self._entries: dict[str, tuple[tuple, Any]] = {}
+
+    def get(self, path: str) -> Any:
+        stat = os.stat(path)
+        stamp = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+        with self._lock:
+            entry = self._entries.get(path)
+        if entry and entry[0] == stamp:
+            return entry[1]
+
+        with open(path, "rb") as f:
+            value = self.loader(f.read())
+
+        with self._lock:
+            self._entries[path] = (stamp, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class VerifiedCertCache:
+    """A thread safe LRU of client certs that passed verification"""
+
+    def __init__(self, max_size: int = VERIFIED_CERT_CACHE_SIZE):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._certs: OrderedDict[tuple[str, str], X509] = OrderedDict()
+
+    def get(self, key: tuple[str, str]) -> X509 | None:
+        with self._lock:
+            cert = self._certs.get(key)
+            if cert is not None:
+                self._certs.move_to_end(key)
+            return cert
+
+    def put(self, key: tuple[str, str], cert: X509):
+        with self._lock:
+            self._certs[key] = cert
+            self._certs.move_to_end(key)
+            while len(self._certs) > self.max_size:
+                self._certs.popitem(last=False)
+
+    def discard(self, key: tuple[str, str]):
+        with self._lock:
+            self._certs.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._certs.clear()
+
+
+def load_certificate_authority(pem: bytes) -> CertificateAuthority:
+    store = crypto.X509Store()
+    store.add_cert(crypto.load_certificate(crypto.FILETYPE_PEM, pem))
+    return CertificateAuthority(store, hashlib.sha256(pem).hexdigest())
+
+
+def load_rsa_key(pem: bytes):
+    # Parses the PEM the same way PyJWT does so the key can be passed to jwt.encode() and decode()
+    return RSAAlgorithm(RSAAlgorithm.SHA256).prepare_key(pem)
+
+
+certificate_authorities = FileCache(load_certificate_authority)
+rsa_keys = FileCache(load_rsa_key)
+verified_certs = VerifiedCertCache()
+
+
+def certificate_authority() -> CertificateAuthority:
+    return certificate_authorities.get(os.path.join(app.config.get("OTS_CA_FOLDER"), "ca.pem"))
+
+
+def server_private_key():
+    return rsa_keys.get(
+        os.path.join(
+            app.config.get("OTS_CA_FOLDER"), "certs", "opentakserver", "opentakserver.nopass.key"
+        )
+    )
+
+
+def server_public_key():
+    return rsa_keys.get(
+        os.path.join(app.config.get("OTS_CA_FOLDER"), "certs", "opentakserver", "opentakserver.pub")
+    )
+
+
+def verify_certificate(pem: str) -> X509 | None:
+    """Returns the parsed cert if it was signed by the CA, hasn't expired, and hasn't been revoked"""
+    ca = certificate_authority()
+    key = (ca.fingerprint, hashlib.sha256(pem.encode("utf-8")).hexdigest())
+
+    cert = verified_certs.get(key)
+    if cert is not None:
+        if not cert.has_expired() and not revoked_certificates.is_revoked(cert.get_serial_number()):
+            return cert
+        verified_certs.discard(key)
+        return None
+
+    try:
+        cert = crypto.load_certificate(crypto.FILETYPE_PEM, pem)
+        crypto.X509StoreContext(ca.store, cert).verify_certificate()
+    except (crypto.Error, crypto.X509StoreContextError):
+        return None
+
+    if revoked_certificates.is_revoked(cert.get_serial_number()):
+        return None
+
+    verified_certs.put(key, cert)
+    return cert
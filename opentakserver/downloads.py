@@ -0,0 +1,96 @@
+"""Serves large files like data packages, plugin APKs, and video recordings
+
+Responses support Range and If-Range requests so interrupted downloads can resume where they stopped instead of
+starting over. When ``OTS_DOWNLOAD_OFFLOAD`` is set, the file is handed off to the reverse proxy with an
+``X-Accel-Redirect`` or ``X-Sendfile`` header and the proxy does the transfer. Otherwise files are sent with the WSGI
+server's ``wsgi.file_wrapper`` when it has one, which lets servers like gunicorn use sendfile(). gevent's server doesn't
+have one so files are read in large blocks to keep the number of reads and greenlet switches down.
+"""
+
+import os
+from urllib.parse import quote
+
+from flask import current_app as app
+from flask import request
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+from werkzeug.utils import send_file
+from werkzeug.wsgi import FileWrapper
+
+BLOCK_SIZE = 1024 * 1024
+
+X_ACCEL_REDIRECT = "x-accel-redirect"
+X_SENDFILE = "x-sendfile"
+
+
+def file_wrapper(file, buffer_size: int = BLOCK_SIZE) -> FileWrapper:
+    return FileWrapper(file, max(buffer_size, BLOCK_SIZE))
+
+
+def content_disposition(download_name: str, as_attachment: bool) -> str:
+    disposition = "attachment" if as_attachment else "inline"
+    try:
+        download_name.encode("ascii")
+        escaped = download_name.replace("\\", "\\\\").replace('"', '\\"')
+        return f'{disposition}; filename="{escaped}"'
+    except UnicodeEncodeError:
+        return f"{disposition}; filename*=UTF-8''{quote(download_name, safe='')}"
+
+
+def x_accel_redirect_location(path: str) -> str | None:
+    """The nginx internal location for path, or None if it isn't in OTS_DATA_FOLDER"""
+    data_folder = os.path.realpath(app.config.get("OTS_DATA_FOLDER"))
+    path = os.path.realpath(path)
+    if os.path.commonpath([data_folder, path]) != data_folder:
+        return None
+
+    relative_path = os.path.relpath(path, data_folder).replace(os.sep, "/")
+    prefix = app.config.get("OTS_X_ACCEL_REDIRECT_PREFIX", "/ots_data/").rstrip("/")
+    return f"{prefix}/{quote(relative_path)}"
+
+
+def send_download(
+    directory: str,
+    filename: str,
+    download_name: str | None = None,
+    as_attachment: bool = False,
+    mimetype: str | None = None,
+):
+    """A drop-in replacement for send_from_directory() for large files
+
+    :raises NotFound: If the file doesn't exist or is outside of directory
+    """
+    path = safe_join(os.fspath(directory), os.fspath(filename))
+    if path is None or not os.path.isfile(path):
+        raise NotFound()
+
+    download_name = download_name or os.path.basename(path)
+    offload = (app.config.get("OTS_DOWNLOAD_OFFLOAD") or "").lower()
+
+    if offload == X_ACCEL_REDIRECT:
+        location = x_accel_redirect_location(path)
+        if location:
+            # nginx serves the file and handles Range, If-Range, and sendfile itself
+            response = app.response_class(mimetype=mimetype or "application/octet-stream")
+            if not mimetype:
+                # Let nginx pick the type from the file's extension
+                del response.headers["Content-Type"]
+            response.headers["X-Accel-Redirect"] = location
+            response.headers["Content-Disposition"] = content_disposition(
+                download_name, as_attachment
+            )
+            return response
+
+    request.environ.setdefault("wsgi.file_wrapper", file_wrapper)
+    return send_file(
+        path,
+        request.environ,
+        mimetype=mimetype,
+        as_attachment=as_attachment,
+        download_name=download_name,
+        conditional=True,
+        etag=True,
+        max_age=app.get_send_file_max_age,
+        use_x_sendfile=offload == X_SENDFILE,
+        response_class=app.response_class,
+    )
@@ -34,6 +34,21 @@ from opentakserver.PasswordValidator import PasswordValidator
 from opentakserver.defaultconfig import DefaultConfig
 from opentakserver.extensions import logger as ots_logger, db, ldap_manager
 from opentakserver.functions import iso8601_string_from_datetime, datetime_from_iso8601_string
+from opentakserver.group_routing import (
+    ANON_BITPOS,
+    ANON_MASK,
+    GROUP_MASK_EXCHANGE,
+    binding_arguments,
+    user_mask,
+)
+from opentakserver.presence import (
+    CONNECTED,
+    DISCONNECTED,
+    HEARTBEAT,
+    PRESENCE_EXCHANGE,
+    presence_message,
+)
+from opentakserver.socketio_rooms import NAMESPACE, group_rooms, room_groups
 
 # These unused imports are required by SQLAlchemy, don't remove them
 from opentakserver.models.Alert import Alert
@@ -86,6 +101,9 @@ class EudHandler(socketserver.BaseRequestHandler):
     bound_queues = []
     phone_number = None
     group_memberships = []
+    # Bitmask of the user's IN groups, sent to cot_parser with every CoT
+    group_mask = None
+    session_id = None
 
     def __init__(self, request: socket, client_address, server):
         super().__init__(request, client_address, server)
@@ -158,6 +176,8 @@ class EudHandler(socketserver.BaseRequestHandler):
         return False
 
     def setup(self):
+        # Identifies this connection in the presence registry
+        self.session_id = uuid.uuid4().hex
         self.create_app()
 
         # RabbitMQ
@@ -204,6 +224,7 @@ class EudHandler(socketserver.BaseRequestHandler):
             properties=pika.BasicProperties(expiration=self.app.config.get("OTS_RABBITMQ_TTL")),
         )
 
+        self.publish_presence(DISCONNECTED)
         self.unbind_rabbitmq_queues()
 
         if (
@@ -282,6 +303,15 @@ class EudHandler(socketserver.BaseRequestHandler):
         self.rabbit_channel.exchange_declare(
             "flask-socketio", durable=False, exchange_type="fanout"
         )
+        self.rabbit_channel.exchange_declare(
+            PRESENCE_EXCHANGE, durable=False, exchange_type="fanout"
+        )
+        self.rabbit_channel.exchange_declare(
+            GROUP_MASK_EXCHANGE, durable=True, exchange_type="headers"
+        )
+        self.rabbit_connection.ioloop.call_later(
+            self.app.config.get("OTS_PRESENCE_HEARTBEAT_SECONDS"), self.presence_heartbeat
+        )
 
         for message in self.cached_messages:
             self.publish_cot(message)
@@ -290,23 +320,8 @@ class EudHandler(socketserver.BaseRequestHandler):
 
         # Publish the EUD info to flask-socketio for the web UI map
         if self.eud:
-            message = {
-                "method": "emit",
-                "event": "eud",
-                "data": self.eud.to_json(),
-                "namespace": "/socket.io",
-                "room": None,
-                "skip_sid": [],
-                "callback": None,
-                "binary": False,
-                "host_id": uuid.uuid4().hex,
-            }
-            self.rabbit_channel.basic_publish(
-                "flask-socketio",
-                "",
-                json.dumps(message),
-                properties=pika.BasicProperties(expiration=self.app.config.get("OTS_RABBITMQ_TTL")),
-            )
+            self.publish_presence(CONNECTED)
+            self.publish_eud()
 
     def on_channel_close(self, channel: Channel, error):
         self.logger.error(f"RabbitMQ channel closed for {self.callsign}, shut it down")
@@ -329,7 +344,11 @@ class EudHandler(socketserver.BaseRequestHandler):
     def on_message(self, unused_channel, basic_deliver, properties, body):
         try:
             body = json.loads(body)
-            if body["uid"] != self.uid:
+            if "group_mask" in body:
+                # The user's groups were changed
+                self.group_mask = body["group_mask"]
+                self.sync_group_bindings()
+            elif body["uid"] != self.uid:
                 self.request.send(body["cot"].encode())
         except BaseException as e:
             self.logger.error(f"{self.callsign}: {e}, closing socket")
@@ -476,7 +495,12 @@ class EudHandler(socketserver.BaseRequestHandler):
         self.rabbit_channel.basic_publish(
             exchange="cot_parser",
             body=json.dumps(
-                {"uid": self.uid, "cot": str(event), "user_id": self.user.id if self.user else None}
+                {
+                    "uid": self.uid,
+                    "cot": str(event),
+                    "user_id": self.user.id if self.user else None,
+                    "groups": self.group_mask,
+                }
             ),
             routing_key="cot_parser",
             properties=pika.BasicProperties(expiration=self.app.config.get("OTS_RABBITMQ_TTL")),
@@ -525,6 +549,7 @@ class EudHandler(socketserver.BaseRequestHandler):
 
                     with self.app.app_context():
                         if self.is_ssl:
+                            self.group_mask = user_mask(self.user.id, Group.IN)
                             group_memberships = db.session.execute(
                                 db.session.query(GroupUser).filter_by(
                                     user_id=self.user.id, direction=Group.OUT
@@ -537,6 +562,7 @@ class EudHandler(socketserver.BaseRequestHandler):
                                 self.rabbit_channel.queue_bind(
                                     exchange="groups", queue=self.uid, routing_key="__ANON__.OUT"
                                 )
+                                self.bind_group_mask(ANON_BITPOS)
                                 if {
                                     "exchange": "groups",
                                     "routing_key": "__ANON__.OUT",
@@ -561,6 +587,7 @@ class EudHandler(socketserver.BaseRequestHandler):
                                             queue=self.uid,
                                             routing_key=f"{membership.group.name}.OUT",
                                         )
+                                        self.bind_group_mask(membership.group.bitpos)
 
                                     if {
                                         "exchange": "groups",
@@ -625,9 +652,11 @@ class EudHandler(socketserver.BaseRequestHandler):
                             self.logger.debug(
                                 f"{self.callsign} is connected via TCP, adding them to the __ANON__ group"
                             )
+                            self.group_mask = ANON_MASK
                             self.rabbit_channel.queue_bind(
                                 exchange="groups", queue=self.uid, routing_key="__ANON__.OUT"
                             )
+                            self.bind_group_mask(ANON_BITPOS)
                             self.bound_queues.append(
                                 {
                                     "exchange": "groups",
@@ -735,25 +764,148 @@ class EudHandler(socketserver.BaseRequestHandler):
                 # Also save the EUD's info for on_channel_open to publish
                 self.eud = eud
                 if self.rabbit_channel:
-                    message = {
-                        "method": "emit",
-                        "event": "eud",
-                        "data": eud.to_json(),
-                        "namespace": "/socket.io",
-                        "room": None,
-                        "skip_sid": None,
-                        "callback": None,
-                        "binary": False,
-                        "host_id": uuid.uuid4().hex,
-                    }
-                    self.rabbit_channel.basic_publish(
-                        exchange="flask-socketio",
-                        routing_key="",
-                        body=json.dumps(message).encode(),
-                        properties=pika.BasicProperties(
-                            expiration=self.app.config.get("OTS_RABBITMQ_TTL")
-                        ),
-                    )
+                    self.publish_presence(CONNECTED)
+                    self.publish_eud()
+
+    def publish_eud(self):
+        # Only the web UIs that can see one of this EUD's groups get it
+        message = {
+            "method": "emit",
+            "event": "eud",
+            "data": self.eud.to_json(),
+            "namespace": NAMESPACE,
+            "room": group_rooms(room_groups(self.group_mask)),
+            "skip_sid": None,
+            "callback": None,
+            "binary": False,
+            "host_id": uuid.uuid4().hex,
+        }
+        self.rabbit_channel.basic_publish(
+            exchange="flask-socketio",
+            routing_key="",
+            body=json.dumps(message).encode(),
+            properties=pika.BasicProperties(expiration=self.app.config.get("OTS_RABBITMQ_TTL")),
+        )
+
+    def publish_presence(self, event: str):
+        if (
+            not self.uid
+            or not self.rabbit_channel
+            or self.rabbit_channel.is_closing
+            or self.rabbit_channel.is_closed
+        ):
+            return
+
+        self.rabbit_channel.basic_publish(
+            exchange=PRESENCE_EXCHANGE,
+            routing_key="",
+            body=json.dumps(
+                presence_message(
+                    event,
+                    self.session_id,
+                    self.uid,
+                    self.callsign,
+                    self.user.username if self.user else None,
+                    self.group_mask,
+                )
+            ),
+            properties=pika.BasicProperties(
+                expiration=str(self.app.config.get("OTS_PRESENCE_TTL_SECONDS") * 1000)
+            ),
+        )
+
+    def presence_heartbeat(self):
+        # Runs on the pika ioloop thread every OTS_PRESENCE_HEARTBEAT_SECONDS until the EUD disconnects
+        if self.shutdown:
+            return
+
+        try:
+            self.publish_presence(HEARTBEAT)
+        except BaseException as e:
+            self.logger.error(f"Failed to publish presence heartbeat: {e}")
+
+        self.rabbit_connection.ioloop.call_later(
+            self.app.config.get("OTS_PRESENCE_HEARTBEAT_SECONDS"), self.presence_heartbeat
+        )
+
+    def bind_group_mask(self, bitpos: int):
+        # Receive CoTs from senders in this group on the group_mask exchange
+        arguments = binding_arguments(bitpos)
+        self.rabbit_channel.queue_bind(
+            exchange=GROUP_MASK_EXCHANGE, queue=self.uid, arguments=arguments
+        )
+        self.bound_queues.append(
+            {
+                "exchange": GROUP_MASK_EXCHANGE,
+                "routing_key": None,
+                "queue": self.uid,
+                "arguments": arguments,
+            }
+        )
+
+    def sync_group_bindings(self):
+        """Re-reads the user's OUT groups and binds or unbinds this EUD's queue to match
+
+        The web process only changes the bindings of EUDs that its presence registry knows are online, which misses
+        EUDs that connected before it restarted.
+        """
+        if (
+            not self.is_ssl
+            or not self.user
+            or not self.uid
+            or not self.rabbit_channel
+            or not self.rabbit_channel.is_open
+        ):
+            return
+
+        with self.app.app_context():
+            memberships = db.session.execute(
+                db.session.query(Group.name, Group.bitpos, GroupUser.enabled)
+                .join(GroupUser, GroupUser.group_id == Group.id)
+                .filter(GroupUser.user_id == self.user.id, GroupUser.direction == Group.OUT)
+            ).all()
+
+        # Users without any OUT groups are in the __ANON__ group, like when the EUD connects
+        if memberships:
+            groups = {name: bitpos for name, bitpos, enabled in memberships if enabled}
+        else:
+            groups = {"__ANON__": ANON_BITPOS}
+        routing_keys = {f"{name}.OUT" for name in groups}
+        arguments = [binding_arguments(bitpos) for bitpos in groups.values()]
+
+        for bind in list(self.bound_queues):
+            if bind["queue"] != self.uid:
+                continue
+            if (bind["exchange"] == "groups" and bind["routing_key"] not in routing_keys) or (
+                bind["exchange"] == GROUP_MASK_EXCHANGE and bind["arguments"] not in arguments
+            ):
+                self.rabbit_channel.queue_unbind(
+                    exchange=bind["exchange"],
+                    queue=self.uid,
+                    routing_key=bind["routing_key"],
+                    arguments=bind.get("arguments"),
+                )
+                self.bound_queues.remove(bind)
+
+        # Binding is idempotent, so bind everything in case a group was re-enabled
+        for name, bitpos in groups.items():
+            self.rabbit_channel.queue_bind(
+                exchange="groups", queue=self.uid, routing_key=f"{name}.OUT"
+            )
+            self.rabbit_channel.queue_bind(
+                exchange=GROUP_MASK_EXCHANGE, queue=self.uid, arguments=binding_arguments(bitpos)
+            )
+            for bind in (
+                {"exchange": "groups", "routing_key": f"{name}.OUT", "queue": self.uid},
+                {
+                    "exchange": GROUP_MASK_EXCHANGE,
+                    "routing_key": None,
+                    "queue": self.uid,
+                    "arguments": binding_arguments(bitpos),
+                },
+            ):
+                if bind not in self.bound_queues:
+                    self.bound_queues.append(bind)
 
     def unbind_rabbitmq_queues(self):
         if (
@@ -769,5 +921,8 @@ class EudHandler(socketserver.BaseRequestHandler):
 
             for bind in self.bound_queues:
                 self.rabbit_channel.queue_unbind(
-                    exchange=bind["exchange"], queue=bind["queue"], routing_key=bind["routing_key"]
+                    exchange=bind["exchange"],
+                    queue=bind["queue"],
+                    routing_key=bind["routing_key"],
+                    arguments=bind.get("arguments"),
                 )
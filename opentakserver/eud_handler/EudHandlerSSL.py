@@ -1,6 +1,7 @@
 import traceback
 
 from opentakserver.eud_handler.EudHandler import EudHandler
+from opentakserver.revocation import revoked_certificates
 
 
 class EudHandlerSSL(EudHandler):
@@ -18,7 +19,17 @@ class EudHandlerSSL(EudHandler):
             self.request.settimeout(10)
             self.request.do_handshake()
             self.request.settimeout(None)
-            for c in self.request.getpeercert()["subject"]:
+            peer_cert = self.request.getpeercert()
+
+            with self.app.app_context():
+                if revoked_certificates.is_revoked(int(peer_cert["serialNumber"], 16)):
+                    self.logger.warning(
+                        "Rejecting revoked certificate {}".format(peer_cert["serialNumber"])
+                    )
+                    self.close_connection()
+                    return
+
+            for c in peer_cert["subject"]:
                 if c[0][0] == "commonName":
                     self.common_name = c[0][1]
                     self.logger.debug("Got common name {}".format(self.common_name))
@@ -24,3 +24,7 @@ migrate = Migrate()
 ldap_manager = LDAP3LoginManager()
 
 babel = Babel()
+
+# Imported for their session listeners, which bump the HTTP cache versions and keep mission summaries up to date in
+# every process that writes to the database
+from opentakserver.models import CacheVersion, MissionSummary  # noqa: E402, F401
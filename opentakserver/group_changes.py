@@ -0,0 +1,194 @@
+"""Group membership changes that are applied to RabbitMQ bindings outside of web requests
+
+Changing a user's groups means binding or unbinding every one of their EUDs' queues on the ``groups`` exchange. Instead
+of making those broker round trips itself, a web request builds one ``GroupChange`` and submits it to the
+``GroupChangeController`` in the web process. The controller sends every queue declaration and binding of the change on
+its own channel without waiting for each reply, binding OUT groups on the ``group_mask`` exchange as well, and sends
+the EUDs' handlers their users' new IN group masks. ``changes`` keeps the status of recent changes so an admin can check
+when a change has been applied, and the web UI gets a ``group_change`` socket.io event when it's done.
+"""
+
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, NamedTuple
+
+from opentakserver.group_routing import GROUP_MASK_EXCHANGE, binding_arguments
+from opentakserver.models.Group import Group
+
+GROUPS_EXCHANGE = "groups"
+
+PENDING = "pending"
+APPLYING = "applying"
+DONE = "done"
+FAILED = "failed"
+
+
+def routing_key(group_name: str, direction: str) -> str:
+    return f"{group_name}.{direction}"
+
+
+class Binding(NamedTuple):
+    uid: str
+    group_name: str
+    direction: str
+    bitpos: int
+
+    @property
+    def routing_key(self) -> str:
+        return routing_key(self.group_name, self.direction)
+
+    @property
+    def receives(self) -> bool:
+        # Only OUT groups are bound on the group_mask exchange
+        return self.direction == Group.OUT and self.bitpos is not None
+
+
+def unique(items: Iterable) -> list:
+    return list(dict.fromkeys(items))
+
+
+@dataclass
+class GroupChange:
+    """The bindings to add and remove for one membership change
+
+    ``masks`` maps UIDs to the new mask of their user's IN groups
+    """
+
+    bind: list[Binding]
+    unbind: list[Binding]
+    masks: dict[str, int] = field(default_factory=dict)
+    change_id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    status: str = PENDING
+    applied: int = 0
+    error: str | None = None
+    created: float = field(default_factory=time.time)
+    finished: float | None = None
+
+    def queues(self) -> list[str]:
+        return unique(binding.uid for binding in self.bind + self.unbind)
+
+    def operations(self) -> int:
+        bindings = self.bind + self.unbind
+        return len(self.queues()) + len(bindings) + sum(binding.receives for binding in bindings)
+
+    def to_json(self):
+        return {
+            "change_id": self.change_id,
+            "status": self.status,
+            "bind": len(self.bind),
+            "unbind": len(self.unbind),
+            "masks": len(self.masks),
+            "applied": self.applied,
+            "operations": self.operations(),
+            "error": self.error,
+            "created": self.created,
+            "finished": self.finished,
+        }
+
+
+def group_change(
+    bind: Iterable[Binding] = (),
+    unbind: Iterable[Binding] = (),
+    masks: dict[str, int] | None = None,
+) -> GroupChange:
+    """Builds a change, dropping duplicate bindings
+
+    A binding in both lists is only unbound, so the last thing a request asked for wins.
+    """
+    unbind = unique(unbind)
+    removed = set(unbind)
+    bind = [binding for binding in unique(bind) if binding not in removed]
+    return GroupChange(bind=bind, unbind=unbind, masks=masks or {})
+
+
+def apply(channel, change: GroupChange, on_done: Callable[[GroupChange], None]):
+    """Sends every operation of change on an async pika channel without waiting for replies
+
+    Queues are declared first because binding or unbinding a queue that doesn't exist closes the
+    channel. pika sends the RPCs in order and on_done is called from the ioloop once the broker has
+    confirmed all of them.
+    """
+    change.status = APPLYING
+    # The dms exchange is bound to every EUD's queue by UID
+    for uid, mask in change.masks.items():
+        channel.basic_publish(
+            exchange="dms", routing_key=uid, body=json.dumps({"uid": None, "group_mask": mask})
+        )
+
+    total = change.operations()
+    if not total:
+        on_done(change)
+        return
+
+    def on_ok(unused_frame):
+        change.applied += 1
+        if change.applied == total:
+            on_done(change)
+
+    for uid in change.queues():
+        channel.queue_declare(queue=uid, callback=on_ok)
+
+    for binding in change.bind:
+        channel.queue_bind(
+            queue=binding.uid,
+            exchange=GROUPS_EXCHANGE,
+            routing_key=binding.routing_key,
+            callback=on_ok,
+        )
+        if binding.receives:
+            channel.queue_bind(
+                queue=binding.uid,
+                exchange=GROUP_MASK_EXCHANGE,
+                arguments=binding_arguments(binding.bitpos),
+                callback=on_ok,
+            )
+
+    for binding in change.unbind:
+        channel.queue_unbind(
+            queue=binding.uid,
+            exchange=GROUPS_EXCHANGE,
+            routing_key=binding.routing_key,
+            callback=on_ok,
+        )
+        if binding.receives:
+            channel.queue_unbind(
+                queue=binding.uid,
+                exchange=GROUP_MASK_EXCHANGE,
+                arguments=binding_arguments(binding.bitpos),
+                callback=on_ok,
+            )
+
+
+class GroupChanges:
+    """The most recent group changes, by change ID"""
+
+    def __init__(self, size: int = 1000):
+        self.size = size
+        self._lock = threading.Lock()
+        self._changes: OrderedDict[str, GroupChange] = OrderedDict()
+
+    def add(self, change: GroupChange):
+        with self._lock:
+            self._changes[change.change_id] = change
+            while len(self._changes) > self.size:
+                self._changes.popitem(last=False)
+
+    def get(self, change_id: str) -> GroupChange | None:
+        with self._lock:
+            return self._changes.get(change_id)
+
+    def finish(self, change: GroupChange, error: str | None = None):
+        change.status = FAILED if error else DONE
+        change.error = error
+        change.finished = time.time()
+
+    def clear(self):
+        with self._lock:
+            self._changes.clear()
+
+
+changes = GroupChanges()
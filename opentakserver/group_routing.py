@@ -0,0 +1,73 @@
+"""Routes CoTs to groups with one publish using the groups' bit positions
+
+A sender's groups are a bitmask with the ``bitpos`` bit of each group set. The message is published once to the
+``group_mask`` headers exchange with a ``group.<bitpos>`` header for every set bit. Each EUD's queue is bound once per
+OUT group with ``x-match: any`` and that group's header, so RabbitMQ delivers a message to every queue whose groups
+intersect the sender's, and only once per queue no matter how many groups they share.
+
+EUD handlers work out the mask of their user's IN groups when the EUD connects and send it to cot_parser in the message
+envelope. When an admin or the EUD changes the user's groups, the new mask is sent to the EUD handler over the dms
+exchange.
+"""
+
+from typing import Iterable
+
+import pika
+from sqlalchemy import select
+
+from opentakserver.extensions import db
+from opentakserver.models.Group import Group
+from opentakserver.models.GroupUser import GroupUser
+
+GROUP_MASK_EXCHANGE = "group_mask"
+
+# The __ANON__ group is always bit 2
+ANON_BITPOS = 2
+ANON_MASK = 1 << ANON_BITPOS
+
+
+def group_mask(bit_positions: Iterable[int]) -> int:
+    mask = 0
+    for bitpos in bit_positions:
+        mask |= 1 << bitpos
+    return mask
+
+
+def mask_bits(mask: int) -> list[int]:
+    return [bitpos for bitpos in range(mask.bit_length()) if mask & (1 << bitpos)]
+
+
+def header(bitpos: int) -> str:
+    return f"group.{bitpos}"
+
+
+def mask_headers(mask: int) -> dict[str, int]:
+    return {header(bitpos): 1 for bitpos in mask_bits(mask)}
+
+
+def binding_arguments(bitpos: int) -> dict:
+    """The arguments that bind a queue to one group on the group_mask exchange"""
+    return {"x-match": "any", header(bitpos): 1}
+
+
+def user_mask(user_id: int, direction: str) -> int:
+    """The mask of a user's enabled groups in one direction, or __ANON__ if they don't have any"""
+    bit_positions = db.session.execute(
+        select(Group.bitpos)
+        .join(GroupUser, GroupUser.group_id == Group.id)
+        .where(
+            GroupUser.user_id == user_id,
+            GroupUser.direction == direction,
+            GroupUser.enabled == True,  # noqa: E712
+        )
+    ).scalars()
+    return group_mask(bit_positions) or ANON_MASK
+
+
+def publish(channel, mask: int, body: str, expiration: str | None = None):
+    channel.basic_publish(
+        exchange=GROUP_MASK_EXCHANGE,
+        routing_key="",
+        body=body,
+        properties=pika.BasicProperties(headers=mask_headers(mask), expiration=expiration),
+    )
@@ -0,0 +1,156 @@
+"""Conditional GET support for endpoints that ATAK and iTAK poll on a timer
+
+Responses are cached per endpoint, principal, and request arguments. Every response gets an ETag built from the
+``cache_versions`` rows of the scopes it depends on, so a cached body is reused until a write to one of those tables
+bumps the version. Clients that send a matching ``If-None-Match`` get a 304 without the view running at all.
+
+Usage::
+
+    @app.route("/Marti/api/contacts/all")
+    @conditional("euds")
+    def get_all_contacts():
+        ...
+"""
+
+import functools
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable
+
+from flask import current_app as app
+from flask import make_response, request
+from sqlalchemy import select
+
+from opentakserver.extensions import db
+from opentakserver.models.CacheVersion import SCOPES, CacheVersion
+
+
+@dataclass
+class CachedResponse:
+    etag: str
+    body: bytes
+    mimetype: str
+
+
+class ResponseCache:
+    """A thread safe LRU cache of response bodies"""
+
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple, CachedResponse] = OrderedDict()
+
+    def get(self, key: tuple) -> CachedResponse | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: tuple, entry: CachedResponse):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+response_cache = ResponseCache()
+
+
+def get_versions(scopes: tuple[str, ...]) -> tuple[tuple, datetime | None]:
+    """Returns the version of every scope and when the newest one changed"""
+    rows = db.session.execute(
+        select(CacheVersion.name, CacheVersion.version, CacheVersion.updated).where(
+            CacheVersion.name.in_(scopes)
+        )
+    ).all()
+
+    versions = {name: 0 for name in scopes}
+    last_modified = None
+    for name, version, updated in rows:
+        versions[name] = version
+        if updated and (not last_modified or updated > last_modified):
+            last_modified = updated
+
+    if last_modified and not last_modified.tzinfo:
+        last_modified = last_modified.replace(tzinfo=timezone.utc)
+
+    return tuple(sorted(versions.items())), last_modified
+
+
+def ensure_cache_versions():
+    """Creates any missing rows in the cache_versions table"""
+    existing = set(db.session.execute(select(CacheVersion.name)).scalars())
+    for name in SCOPES:
+        if name not in existing:
+            db.session.add(CacheVersion(name=name, version=0))
+    db.session.commit()
+
+
+def conditional(
+    *scopes: str,
+    principal: Callable[..., object] | None = None,
+    extra: Callable[[], object] | None = None,
+):
+    """Adds ETag and Last-Modified headers to a view and caches its response body
+
+    :param scopes: The cache scopes in ``TABLE_SCOPES`` that the response depends on
+    :param principal: Called with the view's kwargs. Returns a string identifying who the response was built for,
+                      None to skip the cache and call the view, or anything else to return as the response (i.e. a
+                      401 when the client isn't allowed to see the resource)
+    :param extra: Returns anything else the response depends on that isn't in the database
+    """
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key_principal = principal(**kwargs) if principal else ""
+            if key_principal is None:
+                return view(*args, **kwargs)
+            if not isinstance(key_principal, str):
+                return key_principal
+
+            versions, last_modified = get_versions(scopes)
+            key = (
+                request.endpoint,
+                key_principal,
+                tuple(sorted(kwargs.items())),
+                tuple(sorted(request.args.items(multi=True))),
+            )
+            etag = hashlib.sha1(
+                repr((key, versions, extra() if extra else None)).encode("utf-8")
+            ).hexdigest()
+
+            if request.if_none_match.contains(etag):
+                response = app.response_class(status=304)
+            else:
+                cached = response_cache.get(key)
+                if cached and cached.etag == etag:
+                    response = app.response_class(cached.body, mimetype=cached.mimetype)
+                else:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200 or response.is_streamed:
+                        return response
+                    response_cache.put(
+                        key, CachedResponse(etag, response.get_data(), response.mimetype)
+                    )
+
+            response.set_etag(etag)
+            if last_modified:
+                response.last_modified = last_modified
+            # Clients may keep the response but have to revalidate it every time
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
+
+        return wrapper
+
+    return decorator
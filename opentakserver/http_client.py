@@ -0,0 +1,167 @@
+"""A shared, connection pooled HTTP client for MediaMTX, TAK.gov, the ADS-B and AIS feeds, and other outbound calls
+
+Connections are kept alive and reused, HTTP/2 is used when the server supports it, and every request has a timeout.
+Requests that fail because a connection couldn't be made, or because the server was briefly unavailable, are retried
+with exponential backoff. Requests that may have reached the server are only retried when their method is idempotent.
+``map()`` runs calls concurrently, at most ``OTS_HTTP_MAX_CONCURRENCY`` at a time. Latency is recorded per host and
+shown on /api/status.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Iterable, TypeVar
+
+import httpx
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+@dataclass
+class HostStats:
+    requests: int = 0
+    errors: int = 0
+    retries: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+    def to_json(self):
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "average_ms": (
+                round(self.total_seconds / self.requests * 1000, 1) if self.requests else 0
+            ),
+            "max_ms": round(self.max_seconds * 1000, 1),
+        }
+
+
+class HttpClient:
+    def __init__(
+        self,
+        timeout: float = 10.0,
+        retries: int = 2,
+        backoff: float = 0.5,
+        max_connections: int = 20,
+        max_concurrency: int = 8,
+        transport: httpx.BaseTransport | None = None,
+    ):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_connections = max_connections
+        self.max_concurrency = max_concurrency
+        self.transport = transport
+        self._lock = threading.Lock()
+        self._client: httpx.Client | None = None
+        self._stats: dict[str, HostStats] = {}
+
+    def init_app(self, app):
+        self.timeout = app.config.get("OTS_HTTP_TIMEOUT", self.timeout)
+        self.retries = app.config.get("OTS_HTTP_RETRIES", self.retries)
+        self.backoff = app.config.get("OTS_HTTP_RETRY_BACKOFF", self.backoff)
+        self.max_connections = app.config.get("OTS_HTTP_MAX_CONNECTIONS", self.max_connections)
+        self.max_concurrency = app.config.get("OTS_HTTP_MAX_CONCURRENCY", self.max_concurrency)
+        # The next request opens a client with the new settings
+        self.close()
+
+    @property
+    def client(self) -> httpx.Client:
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(
+                    http2=True,
+                    timeout=self.timeout,
+                    follow_redirects=True,
+                    transport=self.transport,
+                    limits=httpx.Limits(
+                        max_connections=self.max_connections,
+                        max_keepalive_connections=self.max_connections,
+                    ),
+                )
+            return self._client
+
+    def request(self, method: str, url: str, retries: int | None = None, **kwargs):
+        """Sends a request with the shared client. Takes the same keyword arguments as httpx"""
+        method = method.upper()
+        retries = self.retries if retries is None else retries
+        host = host_of(url)
+
+        attempt = 0
+        while True:
+            start = time.monotonic()
+            try:
+                response = self.client.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                self._record(host, time.monotonic() - start, error=True)
+                # Nothing was sent if the connection couldn't be made, so any method can be retried
+                not_sent = isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout))
+                if attempt >= retries or not (not_sent or method in IDEMPOTENT_METHODS):
+                    raise
+            else:
+                self._record(host, time.monotonic() - start, error=response.status_code >= 500)
+                if (
+                    attempt >= retries
+                    or response.status_code not in RETRY_STATUS_CODES
+                    or method not in IDEMPOTENT_METHODS
+                ):
+                    return response
+                response.close()
+
+            time.sleep(self.backoff * 2**attempt)
+            attempt += 1
+            with self._lock:
+                self._stats[host].retries += 1
+
+    def get(self, url: str, **kwargs) -> httpx.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> httpx.Response:
+        return self.request("POST", url, **kwargs)
+
+    def patch(self, url: str, **kwargs) -> httpx.Response:
+        return self.request("PATCH", url, **kwargs)
+
+    def delete(self, url: str, **kwargs) -> httpx.Response:
+        return self.request("DELETE", url, **kwargs)
+
+    def map(self, fn: Callable[[T], R], items: Iterable[T]) -> list[R]:
+        """Calls fn with every item concurrently, at most max_concurrency at a time, in order"""
+        items = list(items)
+        if len(items) <= 1:
+            return [fn(item) for item in items]
+
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(items))) as executor:
+            return list(executor.map(fn, items))
+
+    def stats(self) -> dict[str, dict]:
+        with self._lock:
+            return {host: stats.to_json() for host, stats in self._stats.items()}
+
+    def close(self):
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None:
+            client.close()
+
+    def _record(self, host: str, seconds: float, error: bool):
+        with self._lock:
+            stats = self._stats.setdefault(host, HostStats())
+            stats.requests += 1
+            stats.errors += error
+            stats.total_seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+
+
+def host_of(url: str) -> str:
+    url = httpx.URL(url)
+    return f"{url.host}:{url.port}" if url.port else url.host
+
+
+http_client = HttpClient()
@@ -0,0 +1,112 @@
+"""Batches map updates for the web UI into delta frames sent a few times a second
+
+cot_parser publishes every EUD position it parses to the ``map_updates`` fanout exchange instead of emitting it to
+Socket.IO. The ``MapDeltaController`` in the web process keeps the latest state of each uid and, every
+``1 / OTS_MAP_DELTA_TICK_RATE`` seconds, emits one ``map_delta`` frame for each set of rooms that had updates:
+
+    {"tick": 42, "point": [{"uid": "ANDROID-1234", "latitude": 38.8977, "battery": 80.0}, ...]}
+
+Only the fields that changed since the uid was last sent are included, along with its uid. Everything is sent again
+when the item moves into different rooms and at least every ``OTS_MAP_DELTA_KEYFRAME_SECONDS``, so web UIs that just
+connected or panned their viewport fill in the rest from /api/map_state and then keep up. Frames are msgpack encoded
+binary when ``OTS_MAP_DELTA_MSGPACK`` is enabled and msgpack is installed.
+
+Batching is opt-in. With the default ``OTS_MAP_DELTA_TICK_RATE`` of 0, every update is emitted on its own as soon as it
+arrives, like before.
+"""
+
+import json
+import time
+from dataclasses import dataclass
+
+import pika
+
+try:
+    import msgpack
+except ModuleNotFoundError:
+    msgpack = None
+
+MAP_UPDATES_EXCHANGE = "map_updates"
+FRAME_EVENT = "map_delta"
+
+
+@dataclass
+class SentState:
+    rooms: tuple[str, ...]
+    data: dict
+    keyframe_at: float
+
+
+def publish(channel, event: str, data: dict, mask: int | None, expiration: str | None = None):
+    """Sends a map update to the web process. mask is None for data that every user can see"""
+    channel.basic_publish(
+        exchange=MAP_UPDATES_EXCHANGE,
+        routing_key="",
+        body=json.dumps({"event": event, "data": data, "mask": mask}),
+        properties=pika.BasicProperties(expiration=expiration),
+    )
+
+
+def encode(frame: dict, binary: bool = False) -> dict | bytes:
+    if binary and msgpack is not None:
+        return msgpack.packb(frame)
+    return frame
+
+
+class MapDeltas:
+    """The latest state of every uid with an update waiting for the next tick
+
+    Not thread safe, MapDeltaController only uses it from its ioloop thread.
+    """
+
+    def __init__(self, keyframe_seconds: float = 30.0):
+        self.keyframe_seconds = keyframe_seconds
+        self.tick = 0
+        self._pending: dict[tuple[str, str], tuple[tuple[str, ...], dict]] = {}
+        self._sent: dict[tuple[str, str], SentState] = {}
+        self._pruned_at = time.monotonic()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def update(self, event: str, data: dict, rooms: list[str]):
+        """Replaces any update to data["uid"] that's waiting for the next tick"""
+        self._pending[(event, data["uid"])] = (tuple(rooms), data)
+
+    def frames(self, now: float | None = None) -> list[tuple[list[str], dict]]:
+        """Takes the waiting updates and returns the frame to emit to each set of rooms"""
+        now = time.monotonic() if now is None else now
+        self.tick += 1
+
+        frames: dict[tuple[str, ...], dict] = {}
+        for (event, uid), (rooms, data) in self._pending.items():
+            sent = self._sent.get((event, uid))
+            if sent is None or sent.rooms != rooms or self._expired(sent, now):
+                delta = data
+                keyframe_at = now
+            else:
+                delta = {key: value for key, value in data.items() if sent.data.get(key) != value}
+                if not delta:
+                    continue
+                delta["uid"] = uid
+                keyframe_at = sent.keyframe_at
+
+            self._sent[(event, uid)] = SentState(rooms, data, keyframe_at)
+            frame = frames.setdefault(rooms, {"tick": self.tick})
+            frame.setdefault(event, []).append(delta)
+
+        self._pending.clear()
+        self._prune(now)
+        return [(list(rooms), frame) for rooms, frame in frames.items()]
+
+    def _expired(self, sent: SentState, now: float) -> bool:
+        return now - sent.keyframe_at >= self.keyframe_seconds
+
+    def _prune(self, now: float):
+        # Anything sent before the last keyframe interval gets a full update next time anyway
+        if now - self._pruned_at < self.keyframe_seconds:
+            return
+        self._pruned_at = now
+        expired = [key for key, sent in self._sent.items() if self._expired(sent, now)]
+        for key in expired:
+            del self._sent[key]
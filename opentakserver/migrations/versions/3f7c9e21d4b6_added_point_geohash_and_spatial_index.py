@@ -0,0 +1,79 @@
+"""Added point geohash and spatial index
+
+Revision ID: 3f7c9e21d4b6
+Revises: ab2538a160a0
+Create Date: 2026-10-19 16:21:37.104283
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+from opentakserver.spatial import geohash_encode
+
+# revision identifiers, used by Alembic.
+revision = "3f7c9e21d4b6"
+down_revision = "ab2538a160a0"
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+
+def upgrade():
+    with op.batch_alter_table("points", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("geohash", sa.String(length=12), nullable=True))
+        batch_op.create_index(batch_op.f("ix_points_geohash"), ["geohash"], unique=False)
+
+    conn = op.get_bind()
+    points = sa.table(
+        "points",
+        sa.column("id", sa.Integer),
+        sa.column("latitude", sa.Float),
+        sa.column("longitude", sa.Float),
+        sa.column("geohash", sa.String),
+    )
+
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(points.c.id, points.c.latitude, points.c.longitude)
+            .where(
+                points.c.id > last_id,
+                points.c.latitude.is_not(None),
+                points.c.longitude.is_not(None),
+            )
+            .order_by(points.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+
+        conn.execute(
+            points.update()
+            .where(points.c.id == sa.bindparam("point_id"))
+            .values(geohash=sa.bindparam("point_geohash")),
+            [
+                {"point_id": row.id, "point_geohash": geohash_encode(row.latitude, row.longitude)}
+                for row in rows
+            ],
+        )
+        last_id = rows[-1].id
+
+    if conn.dialect.name == "postgresql":
+        op.create_index(
+            "ix_points_location",
+            "points",
+            [sa.text("point(longitude, latitude)")],
+            unique=False,
+            postgresql_using="gist",
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        op.drop_index("ix_points_location", table_name="points", postgresql_using="gist")
+
+    with op.batch_alter_table("points", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_points_geohash"))
+        batch_op.drop_column("geohash")
@@ -0,0 +1,33 @@
+"""Added cache versions
+
+Revision ID: 5a1f0c6e2b84
+Revises: 8d2e4b7a1c90
+Create Date: 2026-10-19 18:12:05.337162
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5a1f0c6e2b84"
+down_revision = "8d2e4b7a1c90"
+branch_labels = None
+depends_on = None
+
+SCOPES = ["data_packages", "euds", "groups", "missions"]
+
+
+def upgrade():
+    cache_versions = op.create_table(
+        "cache_versions",
+        sa.Column("name", sa.String(length=255), nullable=False),
+        sa.Column("version", sa.BigInteger(), nullable=False),
+        sa.Column("updated", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("name"),
+    )
+    op.bulk_insert(cache_versions, [{"name": name, "version": 0} for name in SCOPES])
+
+
+def downgrade():
+    op.drop_table("cache_versions")
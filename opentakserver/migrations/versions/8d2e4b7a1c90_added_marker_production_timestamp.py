@@ -0,0 +1,79 @@
+"""Added marker production_timestamp
+
+Revision ID: 8d2e4b7a1c90
+Revises: 3f7c9e21d4b6
+Create Date: 2026-10-19 17:03:52.611840
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+from opentakserver.functions import datetime_from_iso8601_string
+
+# revision identifiers, used by Alembic.
+revision = "8d2e4b7a1c90"
+down_revision = "3f7c9e21d4b6"
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+
+def upgrade():
+    with op.batch_alter_table("markers", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("production_timestamp", sa.DateTime(), nullable=True))
+
+    conn = op.get_bind()
+    markers = sa.table(
+        "markers",
+        sa.column("id", sa.Integer),
+        sa.column("production_time", sa.String),
+        sa.column("production_timestamp", sa.DateTime),
+    )
+
+    # Backfill in batches so large tables don't have to fit in memory
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(markers.c.id, markers.c.production_time)
+            .where(markers.c.id > last_id, markers.c.production_time.is_not(None))
+            .order_by(markers.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+
+        values = []
+        for row in rows:
+            try:
+                values.append(
+                    {
+                        "marker_id": row.id,
+                        "timestamp": datetime_from_iso8601_string(row.production_time),
+                    }
+                )
+            except ValueError:
+                # Leave unparseable timestamps as NULL
+                pass
+
+        if values:
+            conn.execute(
+                markers.update()
+                .where(markers.c.id == sa.bindparam("marker_id"))
+                .values(production_timestamp=sa.bindparam("timestamp")),
+                values,
+            )
+        last_id = rows[-1].id
+
+    # Create the index after the backfill so it's built once
+    with op.batch_alter_table("markers", schema=None) as batch_op:
+        batch_op.create_index(
+            batch_op.f("ix_markers_production_timestamp"), ["production_timestamp"], unique=False
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("markers", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_markers_production_timestamp"))
+        batch_op.drop_column("production_timestamp")
@@ -0,0 +1,119 @@
+"""Added indexes for hot queries
+
+Revision ID: ab2538a160a0
+Revises: 00442761c803
+Create Date: 2026-10-19 14:02:11.482913
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "ab2538a160a0"
+down_revision = "00442761c803"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("cot", schema=None) as batch_op:
+        batch_op.create_index("ix_cot_uid_start", ["uid", "start"], unique=False)
+        batch_op.create_index(batch_op.f("ix_cot_mission_name"), ["mission_name"], unique=False)
+        batch_op.create_index(batch_op.f("ix_cot_stale"), ["stale"], unique=False)
+        batch_op.create_index(batch_op.f("ix_cot_timestamp"), ["timestamp"], unique=False)
+
+    with op.batch_alter_table("points", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_points_device_uid_timestamp", ["device_uid", "timestamp"], unique=False
+        )
+        batch_op.create_index(batch_op.f("ix_points_timestamp"), ["timestamp"], unique=False)
+
+    with op.batch_alter_table("mission_changes", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_mission_changes_mission_name_server_time",
+            ["mission_name", "server_time"],
+            unique=False,
+        )
+        batch_op.create_index(
+            batch_op.f("ix_mission_changes_timestamp"), ["timestamp"], unique=False
+        )
+
+    with op.batch_alter_table("mission_uids", schema=None) as batch_op:
+        batch_op.create_index(
+            batch_op.f("ix_mission_uids_mission_name"), ["mission_name"], unique=False
+        )
+        batch_op.create_index(batch_op.f("ix_mission_uids_timestamp"), ["timestamp"], unique=False)
+
+    with op.batch_alter_table("mission_roles", schema=None) as batch_op:
+        batch_op.create_index(
+            batch_op.f("ix_mission_roles_createTime"), ["createTime"], unique=False
+        )
+
+    with op.batch_alter_table("groups_users", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_groups_users_user_id_direction_enabled",
+            ["user_id", "direction", "enabled"],
+            unique=False,
+        )
+
+    with op.batch_alter_table("icons", schema=None) as batch_op:
+        batch_op.create_index(batch_op.f("ix_icons_filename"), ["filename"], unique=False)
+
+    with op.batch_alter_table("euds", schema=None) as batch_op:
+        batch_op.create_index(batch_op.f("ix_euds_last_status"), ["last_status"], unique=False)
+        batch_op.create_index(
+            batch_op.f("ix_euds_last_event_time"), ["last_event_time"], unique=False
+        )
+
+    with op.batch_alter_table("geochat", schema=None) as batch_op:
+        batch_op.create_index(batch_op.f("ix_geochat_chatroom_id"), ["chatroom_id"], unique=False)
+        batch_op.create_index(batch_op.f("ix_geochat_timestamp"), ["timestamp"], unique=False)
+
+    with op.batch_alter_table("alerts", schema=None) as batch_op:
+        batch_op.create_index(batch_op.f("ix_alerts_start_time"), ["start_time"], unique=False)
+
+    with op.batch_alter_table("rb_lines", schema=None) as batch_op:
+        batch_op.create_index(batch_op.f("ix_rb_lines_timestamp"), ["timestamp"], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table("rb_lines", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_rb_lines_timestamp"))
+
+    with op.batch_alter_table("alerts", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_alerts_start_time"))
+
+    with op.batch_alter_table("geochat", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_geochat_timestamp"))
+        batch_op.drop_index(batch_op.f("ix_geochat_chatroom_id"))
+
+    with op.batch_alter_table("euds", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_euds_last_event_time"))
+        batch_op.drop_index(batch_op.f("ix_euds_last_status"))
+
+    with op.batch_alter_table("icons", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_icons_filename"))
+
+    with op.batch_alter_table("groups_users", schema=None) as batch_op:
+        batch_op.drop_index("ix_groups_users_user_id_direction_enabled")
+
+    with op.batch_alter_table("mission_roles", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_mission_roles_createTime"))
+
+    with op.batch_alter_table("mission_uids", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_mission_uids_timestamp"))
+        batch_op.drop_index(batch_op.f("ix_mission_uids_mission_name"))
+
+    with op.batch_alter_table("mission_changes", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_mission_changes_timestamp"))
+        batch_op.drop_index("ix_mission_changes_mission_name_server_time")
+
+    with op.batch_alter_table("points", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_points_timestamp"))
+        batch_op.drop_index("ix_points_device_uid_timestamp")
+
+    with op.batch_alter_table("cot", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_cot_timestamp"))
+        batch_op.drop_index(batch_op.f("ix_cot_stale"))
+        batch_op.drop_index(batch_op.f("ix_cot_mission_name"))
+        batch_op.drop_index("ix_cot_uid_start")
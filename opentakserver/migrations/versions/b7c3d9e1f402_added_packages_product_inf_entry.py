@@ -0,0 +1,67 @@
+"""Added packages product_inf_entry
+
+Revision ID: b7c3d9e1f402
+Revises: 5a1f0c6e2b84
+Create Date: 2026-10-19 19:41:27.804315
+
+"""
+
+import csv
+import io
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "b7c3d9e1f402"
+down_revision = "5a1f0c6e2b84"
+branch_labels = None
+depends_on = None
+
+COLUMNS = [
+    "platform",
+    "plugin_type",
+    "package_name",
+    "name",
+    "version",
+    "revision_code",
+    "file_name",
+    "icon_filename",
+    "description",
+    "apk_hash",
+    "os_requirement",
+    "tak_prereq",
+    "file_size",
+]
+
+
+def upgrade():
+    with op.batch_alter_table("packages", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("product_inf_entry", sa.TEXT(), nullable=True))
+
+    conn = op.get_bind()
+    packages = sa.table(
+        "packages",
+        sa.column("id", sa.Integer),
+        sa.column("product_inf_entry", sa.TEXT),
+        *[sa.column(column) for column in COLUMNS],
+    )
+
+    values = []
+    for row in conn.execute(sa.select(packages.c.id, *[packages.c[c] for c in COLUMNS])):
+        entry = io.StringIO()
+        csv.writer(entry).writerow([row._mapping[column] for column in COLUMNS])
+        values.append({"package_id": row.id, "entry": entry.getvalue()})
+
+    if values:
+        conn.execute(
+            packages.update()
+            .where(packages.c.id == sa.bindparam("package_id"))
+            .values(product_inf_entry=sa.bindparam("entry")),
+            values,
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("packages", schema=None) as batch_op:
+        batch_op.drop_column("product_inf_entry")
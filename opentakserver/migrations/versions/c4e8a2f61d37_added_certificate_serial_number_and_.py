@@ -0,0 +1,36 @@
+"""Added certificate serial_number and revoked_at
+
+Revision ID: c4e8a2f61d37
+Revises: b7c3d9e1f402
+Create Date: 2026-10-19 21:12:05.317902
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "c4e8a2f61d37"
+down_revision = "b7c3d9e1f402"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("certificates", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("serial_number", sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column("revoked_at", sa.DateTime(), nullable=True))
+        batch_op.create_index(
+            batch_op.f("ix_certificates_serial_number"), ["serial_number"], unique=False
+        )
+        batch_op.create_index(
+            batch_op.f("ix_certificates_revoked_at"), ["revoked_at"], unique=False
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("certificates", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_certificates_revoked_at"))
+        batch_op.drop_index(batch_op.f("ix_certificates_serial_number"))
+        batch_op.drop_column("revoked_at")
+        batch_op.drop_column("serial_number")
@@ -0,0 +1,42 @@
+"""Added mission_summaries
+
+Revision ID: d91f3b7a5c28
+Revises: c4e8a2f61d37
+Create Date: 2026-10-19 22:40:11.204518
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "d91f3b7a5c28"
+down_revision = "c4e8a2f61d37"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "mission_summaries",
+        sa.Column("mission_name", sa.String(length=255), nullable=False),
+        sa.Column("summary", sa.JSON(), nullable=False),
+        sa.Column("updated", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["mission_name"], ["missions.name"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("mission_name"),
+    )
+    with op.batch_alter_table("missions", schema=None) as batch_op:
+        batch_op.create_index(batch_op.f("ix_missions_tool"), ["tool"], unique=False)
+
+    with op.batch_alter_table("groups_missions", schema=None) as batch_op:
+        batch_op.create_index(batch_op.f("ix_groups_missions_group_id"), ["group_id"], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table("groups_missions", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_groups_missions_group_id"))
+
+    with op.batch_alter_table("missions", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_missions_tool"))
+
+    op.drop_table("mission_summaries")
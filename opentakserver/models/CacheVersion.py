@@ -0,0 +1,97 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import BigInteger, DateTime, String, event, update
+from sqlalchemy.orm import Mapped, Session, mapped_column
+
+from opentakserver.extensions import db
+
+# Which cache scopes are invalidated by writes to each table
+TABLE_SCOPES = {
+    "euds": ("euds",),
+    "teams": ("euds",),
+    "groups": ("groups", "missions"),
+    "groups_users": ("groups", "missions"),
+    "groups_missions": ("missions",),
+    "missions": ("missions",),
+    "mission_changes": ("missions",),
+    "mission_content": ("missions",),
+    "mission_content_mission": ("missions",),
+    "mission_roles": ("missions",),
+    "mission_uids": ("missions",),
+    "mission_logs": ("missions",),
+    "data_packages": ("data_packages",),
+}
+
+SCOPES = sorted({scope for scopes in TABLE_SCOPES.values() for scope in scopes})
+
+
+class CacheVersion(db.Model):
+    """A counter per cache scope that's incremented on every write to a table in that scope.
+
+    Responses cached by ``opentakserver.http_cache`` use these versions in their ETags. The counters live in the
+    database so writes made by cot_parser and the EUD handlers invalidate the web server's cache too. They're bumped
+    after the write commits, so a response cached in between is replaced on the next request.
+    """
+
+    __tablename__ = "cache_versions"
+
+    name: Mapped[str] = mapped_column(String(255), primary_key=True)
+    version: Mapped[int] = mapped_column(BigInteger, default=0)
+    updated: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+
+
+def bump_cache_versions(connection, tables):
+    scopes = {scope for table in tables for scope in TABLE_SCOPES.get(table, ())}
+    if not scopes:
+        return
+
+    connection.execute(
+        update(CacheVersion)
+        .where(CacheVersion.name.in_(scopes))
+        .values(version=CacheVersion.version + 1, updated=datetime.now(timezone.utc))
+    )
+
+
+def _written(session, tables):
+    session.info.setdefault("cache_tables", set()).update(
+        table for table in tables if table in TABLE_SCOPES
+    )
+
+
+@event.listens_for(Session, "after_flush")
+def _after_flush(session, flush_context):
+    _written(
+        session,
+        {
+            getattr(instance, "__tablename__", None)
+            for instance in (*session.new, *session.dirty, *session.deleted)
+        },
+    )
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _do_orm_execute(orm_execute_state):
+    # Catches bulk insert(Model), update(Model), and delete(Model) statements that don't go through a flush
+    if not (
+        orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete
+    ):
+        return
+
+    table = getattr(orm_execute_state.statement, "table", None)
+    if table is not None:
+        _written(orm_execute_state.session, {table.name})
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    # Bump the versions in their own short transaction so writers don't hold locks on the few
+    # cache_versions rows for as long as their own transaction runs
+    tables = session.info.pop("cache_tables", None)
+    if tables:
+        with session.get_bind(CacheVersion).begin() as connection:
+            bump_cache_versions(connection, tables)
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.pop("cache_tables", None)
@@ -29,6 +29,9 @@ class Certificate(db.Model):
     user_cert_filename: Mapped[str] = mapped_column(String(255))
     csr: Mapped[str] = mapped_column(String(255), nullable=True)
     cert_password: Mapped[str] = mapped_column(String(255))
+    # Hex, the same way openssl prints them
+    serial_number: Mapped[str] = mapped_column(String(64), nullable=True, index=True)
+    revoked_at: Mapped[datetime] = mapped_column(DateTime, nullable=True, index=True)
     user = relationship("User", back_populates="certificate", uselist=False)
     eud = relationship("EUD", cascade="all, delete", back_populates="certificate", uselist=False)
     data_package = relationship("DataPackage", back_populates="certificate", uselist=False)
@@ -43,6 +46,8 @@ class Certificate(db.Model):
             "user_cert_filename": self.user_cert_filename,
             "cert_password": self.cert_password,
             "eud_uid": self.eud_uid,
+            "serial_number": self.serial_number,
+            "revoked_at": self.revoked_at,
         }
 
     def to_json(self):
@@ -56,4 +61,8 @@ class Certificate(db.Model):
             "data_package_filename": self.data_package.filename if self.data_package else None,
             "data_package_hash": self.data_package.hash if self.data_package else None,
             "eud_uid": self.eud_uid,
+            "serial_number": self.serial_number,
+            "revoked_at": (
+                iso8601_string_from_datetime(self.revoked_at) if self.revoked_at else None
+            ),
         }
@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import JSON, TEXT, DateTime, ForeignKey, Integer, String
+from sqlalchemy import JSON, TEXT, DateTime, ForeignKey, Index, Integer, String
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from opentakserver.extensions import db
@@ -9,6 +9,7 @@ from opentakserver.functions import iso8601_string_from_datetime
 
 class CoT(db.Model):
     __tablename__ = "cot"
+    __table_args__ = (Index("ix_cot_uid_start", "uid", "start"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     how: Mapped[str] = mapped_column(String(255), nullable=True)
@@ -20,12 +21,12 @@ class CoT(db.Model):
         String(255), ForeignKey("euds.uid", ondelete="CASCADE"), nullable=True
     )
     recipients: Mapped[JSON] = mapped_column(JSON, nullable=True)
-    timestamp: Mapped[datetime] = mapped_column(DateTime)
+    timestamp: Mapped[datetime] = mapped_column(DateTime, index=True)
     start: Mapped[datetime] = mapped_column(DateTime)
-    stale: Mapped[datetime] = mapped_column(DateTime)
+    stale: Mapped[datetime] = mapped_column(DateTime, index=True)
     xml: Mapped[str] = mapped_column(TEXT)
     mission_name: Mapped[str] = mapped_column(
-        String(255), ForeignKey("missions.name"), nullable=True
+        String(255), ForeignKey("missions.name"), nullable=True, index=True
     )
     eud = relationship("EUD", back_populates="cots", uselist=False)
     alert = relationship(
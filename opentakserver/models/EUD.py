@@ -24,8 +24,8 @@ class EUD(db.Model):
     platform: Mapped[str] = mapped_column(String(255), nullable=True)
     version: Mapped[str] = mapped_column(String(255), nullable=True)
     phone_number: Mapped[int] = mapped_column(BigInteger, nullable=True)
-    last_event_time: Mapped[datetime] = mapped_column(DateTime, nullable=True)
-    last_status: Mapped[str] = mapped_column(String(255), nullable=True)
+    last_event_time: Mapped[datetime] = mapped_column(DateTime, nullable=True, index=True)
+    last_status: Mapped[str] = mapped_column(String(255), nullable=True, index=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("user.id"), nullable=True)
     team_id: Mapped[int] = mapped_column(Integer, ForeignKey("teams.id"), nullable=True)
     team_role: Mapped[str] = mapped_column(String(255), nullable=True)
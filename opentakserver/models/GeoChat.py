@@ -10,10 +10,10 @@ class GeoChat(db.Model):
     __tablename__ = "geochat"
 
     uid: Mapped[str] = mapped_column(String(255), primary_key=True)
-    chatroom_id: Mapped[str] = mapped_column(String(255), ForeignKey("chatrooms.id"))
+    chatroom_id: Mapped[str] = mapped_column(String(255), ForeignKey("chatrooms.id"), index=True)
     sender_uid: Mapped[str] = mapped_column(String(255), ForeignKey("euds.uid", ondelete="CASCADE"))
     remarks: Mapped[str] = mapped_column(String(255))
-    timestamp: Mapped[datetime] = mapped_column(DateTime)
+    timestamp: Mapped[datetime] = mapped_column(DateTime, index=True)
     point_id: Mapped[int] = mapped_column(Integer, ForeignKey("points.id"))
     cot_id: Mapped[int] = mapped_column(Integer, ForeignKey("cot.id"))
     point = relationship("Point", cascade="all", back_populates="geochat", uselist=False)
@@ -13,7 +13,9 @@ class GroupMission(db.Model):
     mission_name: Mapped[String] = mapped_column(
         String(255), ForeignKey("missions.name"), primary_key=True
     )
-    group_id: Mapped[Integer] = mapped_column(Integer, ForeignKey("groups.id"), primary_key=True)
+    group_id: Mapped[Integer] = mapped_column(
+        Integer, ForeignKey("groups.id"), primary_key=True, index=True
+    )
     mission = relationship("Mission", cascade="all, delete", viewonly=True)
     group = relationship("Group", cascade="all, delete", viewonly=True)
 
@@ -1,6 +1,6 @@
 from dataclasses import dataclass
 
-from sqlalchemy import Boolean, ForeignKey, Integer, String
+from sqlalchemy import Boolean, ForeignKey, Index, Integer, String
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from opentakserver.extensions import db
@@ -9,6 +9,9 @@ from opentakserver.extensions import db
 @dataclass
 class GroupUser(db.Model):
     __tablename__ = "groups_users"
+    __table_args__ = (
+        Index("ix_groups_users_user_id_direction_enabled", "user_id", "direction", "enabled"),
+    )
 
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("user.id"), primary_key=True)
     group_id: Mapped[Integer] = mapped_column(Integer, ForeignKey("groups.id"), primary_key=True)
@@ -13,7 +13,7 @@ class Icon(db.Model):
 
     id: Mapped[int] = mapped_column(INTEGER, primary_key=True)
     iconset_uid: Mapped[str] = mapped_column(String(255), nullable=True)
-    filename: Mapped[str] = mapped_column(String(255), nullable=True)
+    filename: Mapped[str] = mapped_column(String(255), nullable=True, index=True)
     groupName: Mapped[str] = mapped_column(String(255), nullable=True)
     type2525b: Mapped[str] = mapped_column(String(255), nullable=True)
     useCnt: Mapped[int] = mapped_column(Integer, nullable=True)
@@ -1,6 +1,7 @@
 from dataclasses import dataclass
+from datetime import datetime
 
-from sqlalchemy import Boolean, ForeignKey, Integer, String
+from sqlalchemy import Boolean, DateTime, ForeignKey, Integer, String
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from opentakserver.extensions import db
@@ -26,6 +27,8 @@ class Marker(db.Model):
     iconset_path: Mapped[str] = mapped_column(String(255), nullable=True)
     parent_callsign: Mapped[str] = mapped_column(String(255), nullable=True)
     production_time: Mapped[str] = mapped_column(String(255), nullable=True)
+    # Same as production_time but as a datetime so it can be indexed and compared in SQL
+    production_timestamp: Mapped[datetime] = mapped_column(DateTime, nullable=True, index=True)
     relation: Mapped[str] = mapped_column(String(255), nullable=True)
     relation_type: Mapped[str] = mapped_column(String(255), nullable=True)
     location_source: Mapped[str] = mapped_column(String(255), nullable=True)
@@ -64,6 +67,7 @@ class Marker(db.Model):
             "relation": self.relation,
             "relation_type": self.relation_type,
             "production_time": self.production_time,
+            "production_timestamp": self.production_timestamp,
             "location_source": self.location_source,
             "mil_std_2525c": self.mil_std_2525c,
         }
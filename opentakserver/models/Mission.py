@@ -11,6 +11,12 @@ from opentakserver.functions import iso8601_string_from_datetime
 from opentakserver.models.MissionRole import MissionRole
 
 
+def qr_code(mission_name: str) -> str:
+    """The connection string that the web UI shows as a QR code for joining a mission"""
+    url = request.url_root.replace("http://", "").replace("https://", "").replace("/", "")
+    return f"{url}:{app.config.get('OTS_SSL_STREAMING_PORT')}:ssl,{url}-{app.config.get('OTS_MARTI_HTTPS_PORT')}-ssl-{mission_name},{mission_name}"
+
+
 @dataclass
 class Mission(db.Model):
     __tablename__ = "missions"
@@ -26,7 +32,7 @@ class Mission(db.Model):
     bbox: Mapped[str] = mapped_column(String(255), nullable=True)
     path: Mapped[str] = mapped_column(String(255), nullable=True)
     classification: Mapped[str] = mapped_column(String(255), nullable=True)
-    tool: Mapped[str] = mapped_column(String(255), nullable=True)
+    tool: Mapped[str] = mapped_column(String(255), nullable=True, index=True)
     group: Mapped[str] = mapped_column(String(255), nullable=True)
     default_role: Mapped[str] = mapped_column(String(255), nullable=True)
     keywords: Mapped[JSON] = mapped_column(JSON, nullable=True)
@@ -95,7 +101,6 @@ class Mission(db.Model):
         }
 
     def to_json(self):
-        url = request.url_root.replace("http://", "").replace("https://", "").replace("/", "")
         json = {
             "name": self.name,
             "description": self.description or "",
@@ -121,7 +126,7 @@ class Mission(db.Model):
                 self.password_protected if self.password_protected is not None else False
             ),
             "missionChanges": [mission_change.to_json() for mission_change in self.mission_changes],
-            "qr_code": f"{url}:{app.config.get('OTS_SSL_STREAMING_PORT')}:ssl,{url}-{app.config.get('OTS_MARTI_HTTPS_PORT')}-ssl-{self.name},{self.name}",
+            "qr_code": qr_code(self.name),
             "owner": self.owner.to_json() if self.owner else None,
             "groups": [],
         }
@@ -4,7 +4,7 @@ from dataclasses import dataclass
 from xml.etree.ElementTree import Element, SubElement
 
 from bs4 import BeautifulSoup
-from sqlalchemy import Boolean, DateTime, ForeignKey, Integer, String
+from sqlalchemy import Boolean, DateTime, ForeignKey, Index, Integer, String
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from opentakserver.extensions import db, logger
@@ -17,6 +17,9 @@ from opentakserver.models.MissionUID import MissionUID
 @dataclass
 class MissionChange(db.Model):
     __tablename__ = "mission_changes"
+    __table_args__ = (
+        Index("ix_mission_changes_mission_name_server_time", "mission_name", "server_time"),
+    )
 
     CREATE_MISSION = "CREATE_MISSION"
     DELETE_MISSION = "DELETE_MISSION"
@@ -33,7 +36,7 @@ class MissionChange(db.Model):
     isFederatedChange: Mapped[bool] = mapped_column(Boolean)
     change_type: Mapped[str] = mapped_column(String(255))
     mission_name: Mapped[str] = mapped_column(String(255), ForeignKey("missions.name"))
-    timestamp: Mapped[datetime] = mapped_column(DateTime)
+    timestamp: Mapped[datetime] = mapped_column(DateTime, index=True)
     creator_uid: Mapped[str] = mapped_column(String(255))
     server_time: Mapped[datetime] = mapped_column(DateTime)
     mission_uid: Mapped[str] = mapped_column(
@@ -78,6 +81,34 @@ class MissionChange(db.Model):
         return json
 
 
+def squash_mission_changes(changes: list[MissionChange]) -> list[MissionChange]:
+    """Collapses changes to the same mission UID or content hash into the latest one
+
+    Content that was added and removed again within ``changes`` is dropped entirely. Changes that aren't about a
+    UID or content, like CREATE_MISSION, are kept as is. ``changes`` must be sorted oldest first.
+    """
+    first = {}
+    latest = {}
+    squashed = []
+    for change in changes:
+        key = change.mission_uid or change.content_uid
+        if not key:
+            squashed.append(change)
+            continue
+        first.setdefault(key, change)
+        latest[key] = change
+
+    for key, change in latest.items():
+        if (
+            first[key].change_type == MissionChange.ADD_CONTENT
+            and change.change_type == MissionChange.REMOVE_CONTENT
+        ):
+            continue
+        squashed.append(change)
+
+    return sorted(squashed, key=lambda c: (c.server_time, c.id or 0))
+
+
 def generate_mission_change_cot(
     mission_name: str,
     mission: Mission = None,
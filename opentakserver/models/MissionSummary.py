@@ -0,0 +1,121 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import JSON, DateTime, ForeignKey, Select, String, delete, event, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Mapped, Session, mapped_column
+
+from opentakserver.extensions import db
+from opentakserver.models.Mission import Mission, qr_code
+
+# Tables a mission's summary is built from. Their rows only invalidate their own mission's summary
+MISSION_TABLES = {
+    "missions",
+    "mission_changes",
+    "mission_content_mission",
+    "mission_roles",
+    "mission_uids",
+    "groups_missions",
+}
+# Rows that can be shared by every mission, so writes to these invalidate every summary
+SHARED_TABLES = {"mission_content", "groups"}
+
+
+class MissionSummary(db.Model):
+    """A mission's ``to_marti_json()``, stored so /Marti/api/missions doesn't rebuild it every time
+
+    Summaries are built the first time a mission is listed and deleted in the same transaction as
+    any write to the tables they're built from, so they're rebuilt on the next listing. Like the
+    listing's ETag, they don't change when only the owner's EUD does.
+    """
+
+    __tablename__ = "mission_summaries"
+
+    mission_name: Mapped[str] = mapped_column(
+        String(255), ForeignKey("missions.name", ondelete="CASCADE"), primary_key=True
+    )
+    summary: Mapped[JSON] = mapped_column(JSON)
+    updated: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+
+
+def summary_query() -> Select:
+    """Selects the name and summary of every mission. Summaries are None until they're built"""
+    return select(Mission.name, MissionSummary.summary).outerjoin(
+        MissionSummary, MissionSummary.mission_name == Mission.name
+    )
+
+
+def mission_summaries(statement: Select) -> list[dict]:
+    """Runs a query from summary_query() and returns its summaries, building any that are missing"""
+    rows = db.session.execute(statement).all()
+    missing = [name for name, summary in rows if summary is None]
+    built = build_mission_summaries(missing) if missing else {}
+
+    summaries = []
+    for name, summary in rows:
+        summary = summary if summary is not None else built.get(name)
+        if summary is not None:
+            summary["qr_code"] = qr_code(name)
+            summaries.append(summary)
+    return summaries
+
+
+def build_mission_summaries(mission_names: list[str], batch_size: int = 500) -> dict[str, dict]:
+    # Imported here because serialization imports the other models
+    from opentakserver.serialization import apply_profile
+
+    now = datetime.now(timezone.utc)
+    built = {}
+    for i in range(0, len(mission_names), batch_size):
+        query = select(Mission).where(Mission.name.in_(mission_names[i : i + batch_size]))
+        for mission in db.session.execute(apply_profile(query, "mission")).scalars():
+            summary = mission.to_marti_json()
+            # Depends on the address the request was made to
+            del summary["qr_code"]
+            built[mission.name] = summary
+            db.session.add(MissionSummary(mission_name=mission.name, summary=summary, updated=now))
+
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another request stored the same summaries first
+        db.session.rollback()
+    return {name: dict(summary) for name, summary in built.items()}
+
+
+def invalidate_mission_summaries(connection, mission_names=None):
+    """Deletes the summaries of mission_names, or all of them when mission_names is None"""
+    statement = delete(MissionSummary.__table__)
+    if mission_names is not None:
+        if not mission_names:
+            return
+        statement = statement.where(MissionSummary.__table__.c.mission_name.in_(mission_names))
+    connection.execute(statement)
+
+
+@event.listens_for(Session, "after_flush")
+def _after_flush(session, flush_context):
+    mission_names = set()
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        table = getattr(instance, "__tablename__", None)
+        if table in SHARED_TABLES:
+            invalidate_mission_summaries(session.connection())
+            return
+        elif table == "missions":
+            mission_names.add(instance.name)
+        elif table in MISSION_TABLES and getattr(instance, "mission_name", None):
+            mission_names.add(instance.mission_name)
+
+    invalidate_mission_summaries(session.connection(), mission_names)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _do_orm_execute(orm_execute_state):
+    # Bulk insert(Model), update(Model), and delete(Model) don't say which missions they touch
+    if not (
+        orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete
+    ):
+        return
+
+    table = getattr(orm_execute_state.statement, "table", None)
+    if table is not None and table.name in MISSION_TABLES | SHARED_TABLES:
+        invalidate_mission_summaries(orm_execute_state.session.connection())
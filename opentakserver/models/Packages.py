@@ -1,5 +1,7 @@
 import base64
+import csv
 import hashlib
+import io
 import os.path
 from datetime import datetime, timezone
 from pathlib import Path
@@ -9,7 +11,7 @@ from androguard.core.apk import APK
 from bs4 import BeautifulSoup
 from flask import current_app as app
 from flask import request
-from sqlalchemy import Boolean, DateTime, Integer, LargeBinary, String
+from sqlalchemy import TEXT, Boolean, DateTime, Integer, LargeBinary, String, event
 from sqlalchemy.orm import Mapped, mapped_column
 from werkzeug.utils import secure_filename
 
@@ -40,6 +42,8 @@ class Packages(db.Model):
     install_on_connection: Mapped[bool] = mapped_column(Boolean, default=False, nullable=True)
     publish_time: Mapped[datetime] = mapped_column(DateTime)
     atak_version: Mapped[str] = mapped_column(String(255), nullable=True)
+    # This package's line in product.inf, kept up to date so the index can be written without rebuilding every line
+    product_inf_entry: Mapped[str] = mapped_column(TEXT, nullable=True)
 
     def from_wtform(self, form: PackageForm):
         self.platform = form.platform.data
@@ -89,6 +93,27 @@ class Packages(db.Model):
 
         self.platform = plugin["platform"]
 
+    def product_inf_row(self) -> str:
+        row = io.StringIO()
+        csv.writer(row).writerow(
+            [
+                self.platform,
+                self.plugin_type,
+                self.package_name,
+                self.name,
+                self.version,
+                self.revision_code,
+                self.file_name,
+                self.icon_filename,
+                self.description,
+                self.apk_hash,
+                self.os_requirement,
+                self.tak_prereq,
+                self.file_size,
+            ]
+        )
+        return row.getvalue()
+
     def serialize(self):
         return {
             "platform": self.platform,
@@ -109,10 +134,12 @@ class Packages(db.Model):
             "install_on_connection": self.install_on_connection,
             "publish_time": self.publish_time,
             "atak_version": self.atak_version,
+            "product_inf_entry": self.product_inf_row(),
         }
 
     def to_json(self):
         return_value = self.serialize()
+        del return_value["product_inf_entry"]
         return_value["publish_time"] = iso8601_string_from_datetime(self.publish_time)
         return_value["icon"] = (
             f"data:image/png;base64,{base64.b64encode(self.icon).decode('utf-8')}"
@@ -120,3 +147,9 @@ class Packages(db.Model):
             else None
         )
         return return_value
+
+
+@event.listens_for(Packages, "before_insert")
+@event.listens_for(Packages, "before_update")
+def _update_product_inf_entry(mapper, connection, target: Packages):
+    target.product_inf_entry = target.product_inf_row()
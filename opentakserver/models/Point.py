@@ -1,16 +1,18 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import DateTime, Float, ForeignKey, Integer, String
+from sqlalchemy import DateTime, Float, ForeignKey, Index, Integer, String
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from opentakserver.extensions import db
 from opentakserver.forms.point_form import PointForm
 from opentakserver.functions import iso8601_string_from_datetime
+from opentakserver.spatial import point_geohash
 
 
 class Point(db.Model):
     __tablename__ = "points"
+    __table_args__ = (Index("ix_points_device_uid_timestamp", "device_uid", "timestamp"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     uid: Mapped[str] = mapped_column(String(255))
@@ -19,6 +21,10 @@ class Point(db.Model):
     )
     latitude: Mapped[float] = mapped_column(Float, nullable=True)
     longitude: Mapped[float] = mapped_column(Float, nullable=True)
+    # Filled in from latitude and longitude on insert, used by spatial.bbox_filter()
+    geohash: Mapped[str] = mapped_column(
+        String(12), nullable=True, index=True, default=point_geohash
+    )
     ce: Mapped[float] = mapped_column(Float, nullable=True)
     hae: Mapped[float] = mapped_column(Float, nullable=True)
     le: Mapped[float] = mapped_column(Float, nullable=True)
@@ -26,7 +32,7 @@ class Point(db.Model):
     speed: Mapped[float] = mapped_column(Float, nullable=True)
     location_source: Mapped[str] = mapped_column(String(255), nullable=True)
     battery: Mapped[float] = mapped_column(Float, nullable=True)
-    timestamp: Mapped[datetime] = mapped_column(DateTime)
+    timestamp: Mapped[datetime] = mapped_column(DateTime, index=True)
     azimuth: Mapped[float] = mapped_column(Float, nullable=True)
     # Camera field of view from TAK ICU and OpenTAK ICU
     fov: Mapped[float] = mapped_column(Float, nullable=True)
@@ -1,15 +1,14 @@
 import hashlib
 import json
-import os
 import time
 import traceback
 from dataclasses import dataclass
 
 import jwt
-from flask import current_app as app
 from sqlalchemy import BigInteger, Boolean, ForeignKey, Integer, String
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
+from opentakserver.crypto_cache import server_private_key, server_public_key
 from opentakserver.extensions import db, logger
 
 
@@ -83,63 +82,44 @@ class Token(db.Model):
         if self.expiration:
             token["exp"] = self.expiration
 
-        with open(
-            os.path.join(
-                app.config.get("OTS_CA_FOLDER"),
-                "certs",
-                "opentakserver",
-                "opentakserver.nopass.key",
-            ),
-            "rb",
-        ) as key:
-            encoded_token = jwt.encode(token, key.read(), algorithm="RS256")
-            return encoded_token
+        return jwt.encode(token, server_private_key(), algorithm="RS256")
 
     @staticmethod
     def verify_token(token: str) -> bool:
-        with open(
-            os.path.join(
-                app.config.get("OTS_CA_FOLDER"), "certs", "opentakserver", "opentakserver.pub"
-            ),
-            "r",
-        ) as key:
-            try:
-                # Will raise InvalidTokenError on bad signature, expired, or before the nbf date
-                decoded_token: dict = jwt.decode(
-                    token, key.read(), algorithms=["RS256"], audience="OpenTAKServer"
-                )
-
-                sha256 = hashlib.sha256()
-                sha256.update(json.dumps(decoded_token).encode())
-                token_hash = sha256.hexdigest()
-
-                token_from_db = db.session.query(Token).filter_by(token_hash=token_hash).first()
-                if not token_from_db:
-                    logger.error(f"Token not in db: {token_hash}")
-                    return False
-
-                if token_from_db.disabled:
-                    logger.error("Token disabled")
-                    return False
-
-                if (
-                    "max" in decoded_token.keys()
-                    and token_from_db.total_uses >= decoded_token["max"]
-                ):
-                    logger.error(f"Too many uses for token {token_hash}")
-                    return False
-
-                token_from_db.total_uses += 1
-                db.session.add(token_from_db)
-                db.session.commit()
-
-                return True
-
-            except jwt.exceptions.InvalidTokenError as e:
-                logger.error(f"Invalid token: {e}")
-                logger.debug(traceback.format_exc())
+        try:
+            # Will raise InvalidTokenError on bad signature, expired, or before the nbf date
+            decoded_token: dict = jwt.decode(
+                token, server_public_key(), algorithms=["RS256"], audience="OpenTAKServer"
+            )
+
+            sha256 = hashlib.sha256()
+            sha256.update(json.dumps(decoded_token).encode())
+            token_hash = sha256.hexdigest()
+
+            token_from_db = db.session.query(Token).filter_by(token_hash=token_hash).first()
+            if not token_from_db:
+                logger.error(f"Token not in db: {token_hash}")
+                return False
+
+            if token_from_db.disabled:
+                logger.error("Token disabled")
                 return False
-            except BaseException as e:
-                logger.error(f"Failed to decode token: {e}")
-                logger.debug(traceback.format_exc())
+
+            if "max" in decoded_token.keys() and token_from_db.total_uses >= decoded_token["max"]:
+                logger.error(f"Too many uses for token {token_hash}")
                 return False
+
+            token_from_db.total_uses += 1
+            db.session.add(token_from_db)
+            db.session.commit()
+
+            return True
+
+        except jwt.exceptions.InvalidTokenError as e:
+            logger.error(f"Invalid token: {e}")
+            logger.debug(traceback.format_exc())
+            return False
+        except BaseException as e:
+            logger.error(f"Failed to decode token: {e}")
+            logger.debug(traceback.format_exc())
+            return False
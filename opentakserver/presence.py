@@ -0,0 +1,175 @@
+"""Registry of EUDs that are currently connected to one of the EUD servers
+
+Every EUD handler process publishes presence messages to the ``presence`` fanout exchange when an EUD identifies itself,
+every ``OTS_PRESENCE_HEARTBEAT_SECONDS`` while the connection is open, and when it disconnects. The
+``PresenceController`` in the web process feeds those messages into ``registry``. Sessions that stop sending heartbeats,
+for example because their handler process died, expire after ``OTS_PRESENCE_TTL_SECONDS``.
+
+Sessions are kept in an ``OrderedDict`` sorted by when they were last seen, so heartbeats and expiry are both O(1) per
+session and counts are a ``len()``.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+PRESENCE_EXCHANGE = "presence"
+
+CONNECTED = "connected"
+HEARTBEAT = "heartbeat"
+DISCONNECTED = "disconnected"
+
+
+@dataclass
+class PresenceSession:
+    session_id: str
+    uid: str
+    callsign: str | None
+    username: str | None
+    connected_at: float
+    last_seen: float
+    # The EUD's IN groups, web UIs that can see one of them are told when it goes online or offline
+    group_mask: int | None = None
+
+
+def presence_message(
+    event: str,
+    session_id: str,
+    uid: str,
+    callsign: str | None = None,
+    username: str | None = None,
+    group_mask: int | None = None,
+) -> dict:
+    """Builds the body of a message for the presence exchange"""
+    return {
+        "event": event,
+        "session_id": session_id,
+        "uid": uid,
+        "callsign": callsign,
+        "username": username,
+        "group_mask": group_mask,
+        "time": time.time(),
+    }
+
+
+class PresenceRegistry:
+    def __init__(self, ttl: float = 90):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # session_id -> PresenceSession, least recently seen first
+        self._sessions: OrderedDict[str, PresenceSession] = OrderedDict()
+        # uid -> session IDs. An EUD can briefly have two sessions while it reconnects
+        self._uids: dict[str, set[str]] = {}
+        # Sessions of UIDs that expired since the last expire() call, so reads can expire sessions without losing the
+        # events
+        self._offline: list[PresenceSession] = []
+        # Incremented every time an EUD goes online or offline, used in ETags
+        self.version = 0
+
+    def apply(self, message: dict, now: float | None = None) -> bool:
+        """Applies a message from the presence exchange
+
+        :return: True if the uid went online or offline
+        """
+        now = time.time() if now is None else now
+        event = message.get("event")
+        session_id = message.get("session_id")
+        uid = message.get("uid")
+        if not session_id or not uid:
+            return False
+
+        with self._lock:
+            self._expire(now)
+            was_online = uid in self._uids
+
+            if event == DISCONNECTED:
+                self._remove(session_id)
+                return was_online and uid not in self._uids
+
+            session = self._sessions.get(session_id)
+            if session:
+                session.last_seen = now
+                session.callsign = message.get("callsign") or session.callsign
+                session.username = message.get("username") or session.username
+                # Heartbeats carry the current mask, so group changes are picked up
+                if message.get("group_mask") is not None:
+                    session.group_mask = message["group_mask"]
+                self._sessions.move_to_end(session_id)
+            else:
+                self._sessions[session_id] = PresenceSession(
+                    session_id=session_id,
+                    uid=uid,
+                    callsign=message.get("callsign"),
+                    username=message.get("username"),
+                    connected_at=now,
+                    last_seen=now,
+                    group_mask=message.get("group_mask"),
+                )
+                if not was_online:
+                    self.version += 1
+                self._uids.setdefault(uid, set()).add(session_id)
+
+            return not was_online
+
+    def expire(self, now: float | None = None) -> list[PresenceSession]:
+        """Removes sessions that haven't sent a heartbeat within the TTL
+
+        :return: The last session of each UID that went offline
+        """
+        with self._lock:
+            self._expire(time.time() if now is None else now)
+            # Skip UIDs that came back online after they expired
+            offline = {session.uid: session for session in self._offline}
+            self._offline.clear()
+            return [session for uid, session in offline.items() if uid not in self._uids]
+
+    def count(self) -> int:
+        with self._lock:
+            self._expire(time.time())
+            return len(self._uids)
+
+    def is_online(self, uid: str) -> bool:
+        with self._lock:
+            self._expire(time.time())
+            return uid in self._uids
+
+    def online(self) -> list[PresenceSession]:
+        """The most recently seen session of every online EUD"""
+        with self._lock:
+            self._expire(time.time())
+            latest = {}
+            for session in self._sessions.values():
+                latest[session.uid] = session
+            return list(latest.values())
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+            self._uids.clear()
+            self._offline.clear()
+            self.version += 1
+
+    def _expire(self, now: float):
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_seen <= self.ttl:
+                break
+            self._remove(session.session_id)
+            if session.uid not in self._uids:
+                self._offline.append(session)
+
+    def _remove(self, session_id: str):
+        session = self._sessions.pop(session_id, None)
+        if not session:
+            return
+
+        sessions = self._uids.get(session.uid)
+        if sessions is not None:
+            sessions.discard(session_id)
+            if not sessions:
+                del self._uids[session.uid]
+                self.version += 1
+
+
+registry = PresenceRegistry()
@@ -0,0 +1,288 @@
+"""Certificate revocation backed by the serial_number and revoked_at columns of the certificates table
+
+Revoked serial numbers are kept in an in-memory set that is loaded once and then topped up with only the rows revoked
+since the last refresh, so the SSL streaming port can check every client cert without reading a CRL file or querying the
+database per connection. Revoking a cert signs a new full CRL (ca.crl), which is the only one the reverse proxy reads,
+and a delta CRL (ca-delta.crl) listing what was revoked since an earlier full CRL for clients that only download deltas.
+The delta starts over from the current full CRL once it grows past OTS_DELTA_CRL_MAX_ENTRIES. OCSP responses are signed
+by the CA and cached until they expire or the set of revoked serials changes.
+"""
+
+import datetime
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.x509 import ocsp
+from flask import current_app as app
+from sqlalchemy import select
+
+from opentakserver import ca_engine
+from opentakserver.certificate_authority import CertificateAuthority
+from opentakserver.extensions import db, logger
+from opentakserver.models.Certificate import Certificate
+
+BASE_CRL = "ca.crl"
+DELTA_CRL = "ca-delta.crl"
+OCSP_CACHE_SIZE = 4096
+# Rows revoked shortly before the last refresh are read again in case they committed late
+REFRESH_OVERLAP = datetime.timedelta(seconds=60)
+
+
+def serial_hex(serial_number: int) -> str:
+    return format(serial_number, "x")
+
+
+def serial_number(pem: bytes) -> str:
+    """Returns the serial number of the first cert in pem as hex"""
+    return serial_hex(x509.load_pem_x509_certificate(pem).serial_number)
+
+
+def as_utc(value: datetime.datetime) -> datetime.datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=datetime.timezone.utc)
+    return value
+
+
+class RevocationSet:
+    """Revoked serial numbers and when they were revoked"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._revoked: dict[int, datetime.datetime] = {}
+        self._since: datetime.datetime | None = None
+        self._refreshed = None
+        # Incremented whenever a serial is added so cached OCSP responses can tell they're stale
+        self.version = 0
+
+    def refresh(self):
+        """Reads the rows revoked since the last refresh"""
+        query = select(Certificate.serial_number, Certificate.revoked_at).where(
+            Certificate.serial_number.is_not(None), Certificate.revoked_at.is_not(None)
+        )
+        with self._lock:
+            since = self._since
+        if since is not None:
+            query = query.where(Certificate.revoked_at >= since - REFRESH_OVERLAP)
+
+        rows = db.session.execute(query).all()
+        with self._lock:
+            for serial, revoked_at in rows:
+                serial = int(serial, 16)
+                if serial not in self._revoked:
+                    self._revoked[serial] = as_utc(revoked_at)
+                    self.version += 1
+                if self._since is None or revoked_at > self._since:
+                    self._since = revoked_at
+            self._refreshed = time.monotonic()
+
+    def refresh_if_stale(self):
+        refreshed = self._refreshed
+        max_age = app.config.get("OTS_REVOCATION_REFRESH_SECONDS")
+        if refreshed is None or time.monotonic() - refreshed >= max_age:
+            self.refresh()
+
+    def is_revoked(self, serial: int) -> bool:
+        self.refresh_if_stale()
+        return serial in self._revoked
+
+    def revoked(self) -> dict[int, datetime.datetime]:
+        self.refresh_if_stale()
+        with self._lock:
+            return dict(self._revoked)
+
+    def clear(self):
+        with self._lock:
+            self._revoked.clear()
+            self._since = None
+            self._refreshed = None
+            self.version += 1
+        with _ocsp_lock:
+            _ocsp_cache.clear()
+
+
+revoked_certificates = RevocationSet()
+
+
+def revoke(certificates: list[Certificate]) -> list[str]:
+    """Marks certificates as revoked and signs a new CRL
+
+    :return: The serial numbers that were revoked
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    serial_numbers = []
+    for certificate in certificates:
+        if certificate.revoked_at is None:
+            certificate.revoked_at = now
+        serial_numbers.append(certificate.serial_number)
+    db.session.commit()
+
+    revoked_certificates.refresh()
+    write_crls()
+    return serial_numbers
+
+
+def load_crl(path: str) -> x509.CertificateRevocationList | None:
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return x509.load_pem_x509_crl(f.read())
+
+
+def crl_number(crl: x509.CertificateRevocationList | None) -> int:
+    if crl is None:
+        return 0
+    try:
+        return crl.extensions.get_extension_for_class(x509.CRLNumber).value.crl_number
+    except x509.ExtensionNotFound:
+        return 0
+
+
+def write_file(path: str, data: bytes):
+    # The reverse proxy may be reading the old file, so it's replaced rather than overwritten
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".crl-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def delta_base(crl: x509.CertificateRevocationList) -> int:
+    """The CRL number of the full CRL that a delta CRL applies to"""
+    return crl.extensions.get_extension_for_class(x509.DeltaCRLIndicator).value.crl_number
+
+
+def write_crls(rebuild: bool = False):
+    """Signs a full CRL with every revoked serial and a delta CRL with what was revoked since an earlier full CRL
+
+    The delta keeps applying to the same full CRL as more certs are revoked. It starts over from the new full CRL when
+    there isn't a delta yet, when rebuild is set, or when it would have more than OTS_DELTA_CRL_MAX_ENTRIES entries.
+    """
+    authority = CertificateAuthority(logger, app)
+    ca = authority.load_ca()
+    revoked = revoked_certificates.revoked()
+
+    base = load_crl(authority.path(BASE_CRL))
+    delta = load_crl(authority.path(DELTA_CRL))
+    number = max(crl_number(base), crl_number(delta)) + 1
+
+    # nginx only checks client certs against the full CRL, so it's signed again on every revocation
+    crl = ca_engine.build_crl(ca, revoked.items(), crl_number=number)
+    write_file(authority.path(BASE_CRL), crl.public_bytes(serialization.Encoding.PEM))
+    logger.info("Wrote CRL {} with {} revoked certificates".format(number, len(revoked)))
+
+    if delta is not None:
+        delta_of = delta_base(delta)
+        entries = {entry.serial_number: entry.revocation_date_utc for entry in delta}
+        since = delta.last_update_utc - REFRESH_OVERLAP
+    elif base is not None:
+        delta_of = crl_number(base)
+        entries = {}
+        since = base.last_update_utc - REFRESH_OVERLAP
+    else:
+        delta_of = None
+
+    if delta_of is not None:
+        entries.update(
+            (serial, revoked_at) for serial, revoked_at in revoked.items() if revoked_at >= since
+        )
+
+    if rebuild or delta_of is None or len(entries) > app.config.get("OTS_DELTA_CRL_MAX_ENTRIES"):
+        if delta is not None:
+            os.remove(authority.path(DELTA_CRL))
+        return
+
+    crl = ca_engine.build_crl(ca, entries.items(), crl_number=number + 1, delta_of=delta_of)
+    write_file(authority.path(DELTA_CRL), crl.public_bytes(serialization.Encoding.PEM))
+    logger.info("Wrote delta CRL {} with {} revoked certificates".format(number + 1, len(entries)))
+
+
+def issuer_hashes(certificate: x509.Certificate, algorithm: hashes.HashAlgorithm):
+    """Returns the issuer hashes OCSP requests for certs signed by certificate will have"""
+    name_hash = hashes.Hash(algorithm)
+    name_hash.update(certificate.subject.public_bytes())
+    # The hash covers the subjectPublicKey BIT STRING which, for RSA, is the PKCS1 encoded key
+    key_hash = hashes.Hash(algorithm)
+    key_hash.update(
+        certificate.public_key().public_bytes(
+            serialization.Encoding.DER, serialization.PublicFormat.PKCS1
+        )
+    )
+    return name_hash.finalize(), key_hash.finalize()
+
+
+def unsuccessful(status: ocsp.OCSPResponseStatus) -> bytes:
+    response = ocsp.OCSPResponseBuilder.build_unsuccessful(status)
+    return response.public_bytes(serialization.Encoding.DER)
+
+
+_ocsp_lock = threading.Lock()
+_ocsp_cache: OrderedDict[tuple, tuple[int, datetime.datetime, bytes]] = OrderedDict()
+
+
+def ocsp_response(request_der: bytes) -> tuple[bytes, int]:
+    """Answers a DER encoded OCSP request
+
+    Serials that were never revoked get a good status, so certs issued before serial numbers were
+    recorded keep working. Nonces are ignored so responses can be cached, like in the RFC 5019
+    lightweight profile.
+
+    :return: The DER encoded response and how many seconds it can be cached for
+    """
+    try:
+        request = ocsp.load_der_ocsp_request(request_der)
+    except ValueError:
+        return unsuccessful(ocsp.OCSPResponseStatus.MALFORMED_REQUEST), 0
+
+    ca = CertificateAuthority(logger, app).load_ca()
+    algorithm = request.hash_algorithm
+    requested = (request.issuer_name_hash, request.issuer_key_hash)
+    if issuer_hashes(ca.certificate, algorithm) != requested:
+        return unsuccessful(ocsp.OCSPResponseStatus.UNAUTHORIZED), 0
+
+    revoked = revoked_certificates.revoked()
+    version = revoked_certificates.version
+    now = datetime.datetime.now(datetime.timezone.utc)
+    key = (request.issuer_key_hash, algorithm.name, request.serial_number)
+
+    with _ocsp_lock:
+        cached = _ocsp_cache.get(key)
+        if cached is not None and cached[0] == version and cached[1] > now:
+            _ocsp_cache.move_to_end(key)
+            return cached[2], int((cached[1] - now).total_seconds())
+
+    revoked_at = revoked.get(request.serial_number)
+    max_age = app.config.get("OTS_OCSP_MAX_AGE_SECONDS")
+    next_update = now + datetime.timedelta(seconds=max_age)
+    response = (
+        ocsp.OCSPResponseBuilder()
+        .add_response_by_hash(
+            issuer_name_hash=request.issuer_name_hash,
+            issuer_key_hash=request.issuer_key_hash,
+            serial_number=request.serial_number,
+            algorithm=algorithm,
+            cert_status=ocsp.OCSPCertStatus.REVOKED if revoked_at else ocsp.OCSPCertStatus.GOOD,
+            this_update=now,
+            next_update=next_update,
+            revocation_time=revoked_at,
+            revocation_reason=None,
+        )
+        .responder_id(ocsp.OCSPResponderEncoding.HASH, ca.certificate)
+        .sign(ca.key, hashes.SHA256())
+        .public_bytes(serialization.Encoding.DER)
+    )
+
+    with _ocsp_lock:
+        _ocsp_cache[key] = (version, next_update, response)
+        _ocsp_cache.move_to_end(key)
+        while len(_ocsp_cache) > OCSP_CACHE_SIZE:
+            _ocsp_cache.popitem(last=False)
+    return response, max_age
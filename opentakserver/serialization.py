@@ -0,0 +1,124 @@
+"""Serialization profiles
+
+Each profile lists the relationships that a model's ``to_json()`` touches so they can be loaded up front instead of
+firing one lazy load per relationship per row. Many-to-one relationships use ``joinedload``. Relationships where the
+foreign key is on the other table (i.e. ``CoT.point``) use ``selectinload`` so ``LIMIT``/``OFFSET`` pagination still
+counts parent rows.
+
+Usage::
+
+    query = apply_profile(db.session.query(EUD), "eud")
+"""
+
+from sqlalchemy.orm import joinedload, selectinload
+
+from opentakserver.models.Alert import Alert
+from opentakserver.models.CasEvac import CasEvac
+from opentakserver.models.Certificate import Certificate
+from opentakserver.models.CoT import CoT
+from opentakserver.models.DataPackage import DataPackage
+from opentakserver.models.EUD import EUD
+from opentakserver.models.GeoChat import GeoChat
+from opentakserver.models.Marker import Marker
+from opentakserver.models.Mission import Mission
+from opentakserver.models.MissionChange import MissionChange
+from opentakserver.models.Point import Point
+from opentakserver.models.RBLine import RBLine
+
+
+def eud_options() -> list:
+    """Everything used by ``EUD.to_json()``"""
+    return [
+        joinedload(EUD.user),
+        joinedload(EUD.team),
+        selectinload(EUD.certificate).joinedload(Certificate.data_package),
+        selectinload(EUD.data_packages).joinedload(DataPackage.user),
+    ]
+
+
+def point_options() -> list:
+    """Everything used by ``Point.to_json()``"""
+    return [joinedload(Point.cot), joinedload(Point.eud)]
+
+
+def alert_options() -> list:
+    """Everything used by ``Alert.to_json()``"""
+    return [joinedload(Alert.point).options(*point_options()), joinedload(Alert.eud)]
+
+
+def marker_options() -> list:
+    """Everything used by ``Marker.to_json()``"""
+    return [
+        joinedload(Marker.icon),
+        joinedload(Marker.cot),
+        joinedload(Marker.point).options(*point_options()),
+    ]
+
+
+def rb_line_options() -> list:
+    """Everything used by ``RBLine.to_json()``"""
+    return [joinedload(RBLine.point).options(*point_options())]
+
+
+def casevac_options() -> list:
+    """Everything used by ``CasEvac.to_json()``"""
+    return [
+        selectinload(CasEvac.zmist),
+        joinedload(CasEvac.cot),
+        joinedload(CasEvac.eud).options(*eud_options()),
+        joinedload(CasEvac.point).options(*point_options()),
+    ]
+
+
+def geochat_options() -> list:
+    """Everything used by ``GeoChat.to_json()``"""
+    return [joinedload(GeoChat.point).options(*point_options())]
+
+
+def cot_options() -> list:
+    """Everything used by ``CoT.to_json()``"""
+    return [
+        joinedload(CoT.eud).options(*eud_options()),
+        selectinload(CoT.alert).options(*alert_options()),
+        selectinload(CoT.point).options(*point_options()),
+        selectinload(CoT.casevac).options(*casevac_options()),
+        selectinload(CoT.video),
+        selectinload(CoT.geochat).options(*geochat_options()),
+    ]
+
+
+def mission_options() -> list:
+    """Everything used by ``Mission.to_marti_json()``"""
+    return [
+        selectinload(Mission.uids),
+        selectinload(Mission.contents),
+        selectinload(Mission.mission_changes).options(
+            joinedload(MissionChange.content_resource), joinedload(MissionChange.uid)
+        ),
+        joinedload(Mission.owner).options(*eud_options()),
+        selectinload(Mission.groups),
+    ]
+
+
+# One profile per endpoint/socket.io event. The key is the name passed to apply_profile()
+PROFILES = {
+    "alert": alert_options,
+    "casevac": casevac_options,
+    "cot": cot_options,
+    "eud": eud_options,
+    "geochat": geochat_options,
+    "marker": marker_options,
+    "mission": mission_options,
+    "point": point_options,
+    "rb_line": rb_line_options,
+}
+
+
+def apply_profile(query, profile: str):
+    """Adds the loader options of a serialization profile to a ``Query`` or ``Select``
+
+    :param query: The query to add the options to
+    :param profile: One of the keys in ``PROFILES``
+    :return: The query with the loader options applied
+    """
+    return query.options(*PROFILES[profile]())
@@ -0,0 +1,76 @@
+"""Socket.IO rooms that scope map updates to the groups and viewport of each web UI
+
+Map events are emitted to ``map:<group>:<cell>`` rooms, one for every group in the sender's group mask and every prefix
+of the item's geohash up to ``TILE_PRECISION`` characters, including the empty prefix that covers the whole world.
+A browser joins the rooms for its user's groups and the geohash cells covering its viewport, so it only receives updates
+for what it can see on screen. Until it sends a ``viewport`` event it's in the whole world rooms. python-socketio sends
+each message to a client once no matter how many of its rooms it was emitted to.
+
+Events without a location, like ``eud``, go to ``group:<group>`` rooms. ``<group>`` is a group's bitpos, ``all`` for
+administrators who see every group, or ``public`` for things the server generates itself, like ADS-B and AIS tracks,
+which every user sees.
+"""
+
+from typing import Iterable
+
+from opentakserver.group_routing import mask_bits
+from opentakserver.spatial import geohash_cover, geohash_encode
+
+NAMESPACE = "/socket.io"
+# Geohash cells of 5 characters are about 4.9km by 4.9km
+TILE_PRECISION = 5
+
+ALL_GROUPS = "all"
+PUBLIC = "public"
+
+
+def room_groups(mask: int | None) -> list:
+    """The groups that an item sent with mask is emitted to. A mask of None is public"""
+    if mask is None:
+        return [PUBLIC]
+    return [ALL_GROUPS, *mask_bits(mask)]
+
+
+def viewer_groups(mask: int, administrator: bool = False) -> list:
+    """The groups whose rooms a web UI joins"""
+    if administrator:
+        return [ALL_GROUPS, PUBLIC]
+    return [PUBLIC, *mask_bits(mask)]
+
+
+def group_rooms(groups: Iterable) -> list[str]:
+    return [f"group:{group}" for group in groups]
+
+
+def map_rooms(groups: Iterable, cells: Iterable[str]) -> list[str]:
+    cells = list(cells)
+    return [f"map:{group}:{cell}" for group in groups for cell in cells]
+
+
+def location_rooms(mask: int | None, latitude: float | None, longitude: float | None) -> list[str]:
+    """The map rooms of an item at latitude and longitude, or whole world rooms without one"""
+    if latitude is None or longitude is None:
+        return map_rooms(room_groups(mask), [""])
+
+    geohash = geohash_encode(float(latitude), float(longitude), TILE_PRECISION)
+    return map_rooms(room_groups(mask), [geohash[:i] for i in range(TILE_PRECISION + 1)])
+
+
+def viewport_rooms(groups: list, bbox: tuple[float, float, float, float] | None) -> list[str]:
+    """The map rooms that a web UI joins to see the groups inside bbox. None is the whole world"""
+    if bbox is None:
+        return map_rooms(groups, [""])
+    cells = sorted({cell[:TILE_PRECISION] for cell in geohash_cover(*bbox)})
+    return map_rooms(groups, cells)
+
+
+def emit_map_event(socketio, event: str, data: dict, mask: int | None, point=None):
+    """Emits a map item to the web UIs that can see it. point has a latitude and longitude"""
+    latitude = getattr(point, "latitude", None)
+    longitude = getattr(point, "longitude", None)
+    socketio.emit(event, data, namespace=NAMESPACE, to=location_rooms(mask, latitude, longitude))
+
+
+def emit_group_event(socketio, event: str, data: dict, mask: int | None):
+    """Emits an event without a location to the web UIs that can see one of the sender's groups"""
+    socketio.emit(event, data, namespace=NAMESPACE, to=group_rooms(room_groups(mask)))
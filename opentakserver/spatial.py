@@ -0,0 +1,198 @@
+"""Bounding box queries on the points table
+
+PostgreSQL uses a GiST index on ``point(longitude, latitude)`` so PostGIS isn't required. Every other database uses
+the ``points.geohash`` column. A bounding box is covered by a small set of geohash cells and each cell becomes a range
+scan on the B-tree index of that column, followed by an exact latitude/longitude check.
+
+Usage::
+
+    bbox = parse_bbox(request.args)
+    query = bbox_filter(db.session.query(Point), bbox)
+"""
+
+import math
+
+from sqlalchemy import and_, func, or_
+
+from opentakserver.extensions import db
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 12
+# Upper limit of geohash cells used to cover a bounding box, one range scan per cell
+MAX_COVER_CELLS = 32
+
+
+def geohash_encode(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    """Encodes a latitude and longitude as a geohash"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    bit_count = 0
+    even = True
+
+    while len(geohash) < precision:
+        if even:
+            mid = (lon_range[0] + lon_range[1]) / 2
+            if longitude >= mid:
+                bits = (bits << 1) | 1
+                lon_range[0] = mid
+            else:
+                bits <<= 1
+                lon_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                bits = (bits << 1) | 1
+                lat_range[0] = mid
+            else:
+                bits <<= 1
+                lat_range[1] = mid
+
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return "".join(geohash)
+
+
+def point_geohash(context) -> str | None:
+    """Column default for ``Point.geohash``. Works for ORM flushes and ``insert(Point).values(...)``"""
+    params = context.get_current_parameters()
+    latitude = params.get("latitude")
+    longitude = params.get("longitude")
+    if latitude is None or longitude is None:
+        return None
+
+    try:
+        return geohash_encode(float(latitude), float(longitude))
+    except (TypeError, ValueError):
+        return None
+
+
+def cell_size(precision: int) -> tuple[float, float]:
+    """Returns the height and width in degrees of a geohash cell"""
+    lon_bits = math.ceil(precision * 5 / 2)
+    lat_bits = math.floor(precision * 5 / 2)
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def geohash_cover(left: float, bottom: float, right: float, top: float) -> list[str]:
+    """Returns the geohash cells that cover a bounding box. Boxes that cross the antimeridian have left > right"""
+    if left > right:
+        return sorted(
+            set(geohash_cover(left, bottom, 180.0, top) + geohash_cover(-180.0, bottom, right, top))
+        )
+
+    cells = [""]
+    for precision in range(1, GEOHASH_PRECISION + 1):
+        height, width = cell_size(precision)
+        rows = math.floor((top + 90) / height) - math.floor((bottom + 90) / height) + 1
+        columns = math.floor((right + 180) / width) - math.floor((left + 180) / width) + 1
+        if rows * columns > MAX_COVER_CELLS:
+            break
+
+        cover = set()
+        for row in range(rows):
+            latitude = min(bottom + row * height, top)
+            for column in range(columns):
+                longitude = min(left + column * width, right)
+                cover.add(geohash_encode(latitude, longitude, precision))
+            cover.add(geohash_encode(latitude, right, precision))
+        for column in range(columns):
+            cover.add(geohash_encode(top, min(left + column * width, right), precision))
+        cover.add(geohash_encode(top, right, precision))
+        cells = sorted(cover)
+
+    return cells
+
+
+def next_prefix(prefix: str) -> str | None:
+    """The smallest geohash that sorts after every geohash starting with prefix"""
+    while prefix:
+        index = BASE32.index(prefix[-1])
+        if index < len(BASE32) - 1:
+            return prefix[:-1] + BASE32[index + 1]
+        prefix = prefix[:-1]
+    return None
+
+
+def geohash_ranges(cells: list[str]) -> list[tuple[str, str | None]]:
+    """Turns geohash cells into [start, end) ranges, merging neighbours that are adjacent in sort order"""
+    ranges = []
+    for cell in sorted(cells):
+        end = next_prefix(cell)
+        if ranges and ranges[-1][1] == cell:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((cell, end))
+    return ranges
+
+
+def parse_bbox(args) -> tuple[float, float, float, float] | None:
+    """Reads left, bottom, right, and top from request args
+
+    :return: None when no bounding box was requested
+    :raises ValueError: When the bounding box is incomplete or invalid
+    """
+    names = ("left", "bottom", "right", "top")
+    values = [args.get(name) for name in names]
+    if all(value is None for value in values):
+        return None
+    if any(value is None for value in values):
+        raise ValueError("left, bottom, right, and top are all required")
+
+    left, bottom, right, top = (float(value) for value in values)
+    if not (-180 <= left <= 180 and -180 <= right <= 180):
+        raise ValueError("left and right must be between -180 and 180")
+    if not (-90 <= bottom <= 90 and -90 <= top <= 90) or bottom > top:
+        raise ValueError("bottom and top must be between -90 and 90 and bottom must be <= top")
+
+    return left, bottom, right, top
+
+
+def bbox_condition(bbox: tuple[float, float, float, float], model=None):
+    """Returns a WHERE clause matching points inside the bounding box"""
+    if model is None:
+        # Keep this import here to avoid a circular import
+        from opentakserver.models.Point import Point
+
+        model = Point
+
+    left, bottom, right, top = bbox
+
+    if db.engine.dialect.name == "postgresql" and left <= right:
+        location = func.point(model.longitude, model.latitude)
+        box = func.box(func.point(left, bottom), func.point(right, top))
+        return location.op("<@")(box)
+
+    ranges = []
+    for start, end in geohash_ranges(geohash_cover(left, bottom, right, top)):
+        if not start:
+            # The box is too large to narrow down, fall back to the lat/lon check
+            ranges = []
+            break
+        if end:
+            ranges.append(and_(model.geohash >= start, model.geohash < end))
+        else:
+            ranges.append(model.geohash >= start)
+
+    if left <= right:
+        longitude = model.longitude.between(left, right)
+    else:
+        longitude = or_(model.longitude >= left, model.longitude <= right)
+
+    exact = and_(model.latitude.between(bottom, top), longitude)
+    if ranges:
+        return and_(or_(*ranges), exact)
+    return exact
+
+
+def bbox_filter(query, bbox: tuple[float, float, float, float] | None, model=None):
+    """Filters a ``Query`` or ``Select`` that includes the points table by a bounding box"""
+    if bbox is None:
+        return query
+    return query.filter(bbox_condition(bbox, model))
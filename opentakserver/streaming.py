@@ -0,0 +1,157 @@
+"""Helpers for streaming large query results into a response without loading every row first
+
+Rows are fetched with ``yield_per`` so PostgreSQL uses a server-side cursor and only one batch is in memory at a time.
+JSON responses are written one batch of rows at a time and gzipped as they're sent when the client accepts gzip.
+"""
+
+import datetime
+import re
+import zlib
+from typing import Any, Callable, Iterator
+
+from flask import Response, request, stream_with_context
+from flask_babel import gettext
+from sqlalchemy import select
+
+from opentakserver.extensions import db
+from opentakserver.functions import datetime_from_iso8601_string
+from opentakserver.json_provider import dumps
+
+BATCH_SIZE = 500
+XML_DECLARATION = re.compile(r"^\s*<\?xml[^>]*\?>\s*")
+
+
+def time_window(statement, args, column, end_column=None, id_column=None):
+    """Applies the secago, start, end, and limit request arguments to a select() statement
+
+    Rows are ordered oldest first by column. When there's a limit, only the newest rows are returned.
+
+    :param column: The timestamp column that secago, start, and the ordering apply to
+    :param end_column: The column that end applies to, defaults to column
+    :param id_column: The primary key of the selected table, required for limit
+    :raises ValueError: If one of the arguments is invalid, with a translated error message
+    """
+    end_column = column if end_column is None else end_column
+
+    sec_ago = args.get("secago")
+    if sec_ago:
+        try:
+            sec_ago = int(sec_ago)
+        except ValueError:
+            raise ValueError(gettext("Invalid secago value: %(sec_ago)s", sec_ago=sec_ago))
+        statement = statement.where(
+            column >= datetime.datetime.now(datetime.UTC) - datetime.timedelta(seconds=sec_ago)
+        )
+
+    try:
+        if args.get("start"):
+            statement = statement.where(column >= datetime_from_iso8601_string(args.get("start")))
+        if args.get("end"):
+            statement = statement.where(end_column <= datetime_from_iso8601_string(args.get("end")))
+    except ValueError:
+        raise ValueError(gettext("Invalid start or end time"))
+
+    limit = args.get("limit")
+    if limit and id_column is not None:
+        try:
+            limit = int(limit)
+            if limit < 1:
+                raise ValueError
+        except ValueError:
+            raise ValueError(gettext("Invalid limit: %(limit)s", limit=limit))
+        # Wrapped in a derived table because MySQL doesn't allow LIMIT directly in an IN subquery
+        newest = (
+            statement.with_only_columns(id_column).order_by(column.desc()).limit(limit).subquery()
+        )
+        statement = statement.where(id_column.in_(select(newest.c[0])))
+
+    return statement.order_by(column)
+
+
+def iter_rows(statement, batch_size: int = BATCH_SIZE):
+    """Yields the first column of every row, batch_size rows at a time"""
+    result = db.session.execute(statement.execution_options(yield_per=batch_size))
+    for partition in result.partitions():
+        for row in partition:
+            yield row[0]
+
+
+def xml_events(statement, batch_size: int = BATCH_SIZE) -> Iterator[bytes]:
+    """Wraps the stored XML documents selected by statement in an <events> tag without re-parsing them"""
+    yield b"<events>"
+    chunk = []
+    for xml in iter_rows(statement, batch_size):
+        if not xml:
+            continue
+        chunk.append(XML_DECLARATION.sub("", xml, count=1))
+        if len(chunk) >= batch_size:
+            yield "".join(chunk).encode("utf-8")
+            chunk = []
+    if chunk:
+        yield "".join(chunk).encode("utf-8")
+    yield b"</events>"
+
+
+def stream_xml_events(statement, batch_size: int = BATCH_SIZE) -> Response:
+    """A chunked application/xml response of the stored XML selected by statement"""
+    return Response(
+        stream_with_context(xml_events(statement, batch_size)),
+        status=200,
+        mimetype="application/xml",
+    )
+
+
+def entity_json(row) -> Any:
+    return row[0].to_json()
+
+
+def json_array(
+    statement, to_json: Callable[[Any], Any] = entity_json, batch_size: int = BATCH_SIZE
+) -> Iterator[bytes]:
+    """Yields a JSON array of to_json(row) for every row selected by statement, one batch at a time
+
+    By default rows are expected to be one ORM entity, i.e. ``select(EUD)``, and are serialized with its to_json()
+    """
+    yield b"["
+    separator = b""
+    result = db.session.execute(statement.execution_options(yield_per=batch_size))
+    for partition in result.partitions():
+        yield separator + b",".join(dumps(to_json(row)) for row in partition)
+        separator = b","
+    yield b"]"
+
+
+def json_object(members: dict) -> Iterator[bytes]:
+    """Yields a JSON object. Values that are iterators, like json_array(), are streamed as they are"""
+    separator = b"{"
+    for key, value in members.items():
+        yield separator + dumps(key) + b":"
+        if isinstance(value, Iterator):
+            yield from value
+        else:
+            yield dumps(value)
+        separator = b","
+    yield b"{}" if separator == b"{" else b"}"
+
+
+def gzip_chunks(chunks: Iterator[bytes], level: int = 6) -> Iterator[bytes]:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def stream_json(chunks: Iterator[bytes]) -> Response:
+    """A chunked application/json response of chunks, gzipped if the client accepts it
+
+    Errors after the first chunk can't change the status code, so the client gets truncated JSON instead of a 500.
+    """
+    headers = {"Vary": "Accept-Encoding"}
+    if request.accept_encodings.quality("gzip") > 0:
+        chunks = gzip_chunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+    return Response(
+        stream_with_context(chunks), status=200, mimetype="application/json", headers=headers
+    )
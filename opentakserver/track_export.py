@@ -0,0 +1,221 @@
+"""Streaming KML/KMZ export of EUD tracks for /Marti/ExportMissionKML
+
+Points are read from the database in chunks and each chunk is simplified and written out before the next one is read,
+so memory use doesn't depend on the length of the track. Simplification is done in two passes:
+
+1. Time bucketing keeps at most one point per ``bucket_seconds``
+2. Douglas-Peucker drops points that are within ``tolerance_meters`` of the line between their neighbours
+
+Every chunk becomes its own ``<gx:Track>`` inside a single ``<gx:MultiTrack>``. The first point of each chunk repeats the
+last point of the previous one so there are no gaps on the map. A time gap longer than ``multitrack_threshold`` minutes
+also starts a new track.
+"""
+
+import io
+import math
+import zipfile
+from typing import Iterable, Iterator
+from xml.sax.saxutils import escape, quoteattr
+
+import numpy as np
+
+from opentakserver.functions import iso8601_string_from_datetime
+
+CHUNK_SIZE = 5000
+# Meters per degree of latitude
+METERS_PER_DEGREE = 111_320.0
+
+KML_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<kml xmlns="http://www.opengis.net/kml/2.2" xmlns:gx="http://www.google.com/kml/ext/2.2">'
+)
+
+
+def time_bucket(seconds: np.ndarray, bucket_seconds: float) -> np.ndarray:
+    """Returns a mask that keeps the first point in every time bucket"""
+    if bucket_seconds <= 0 or len(seconds) == 0:
+        return np.ones(len(seconds), dtype=bool)
+
+    buckets = np.floor(seconds / bucket_seconds)
+    keep = np.empty(len(seconds), dtype=bool)
+    keep[0] = True
+    keep[1:] = buckets[1:] != buckets[:-1]
+    return keep
+
+
+def douglas_peucker(x: np.ndarray, y: np.ndarray, tolerance: float) -> np.ndarray:
+    """Returns a mask of the points to keep. x and y must be in the same planar units as tolerance"""
+    count = len(x)
+    keep = np.zeros(count, dtype=bool)
+    if count == 0:
+        return keep
+
+    keep[0] = keep[-1] = True
+    if tolerance <= 0:
+        keep[:] = True
+        return keep
+
+    stack = [(0, count - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+
+        dx = x[end] - x[start]
+        dy = y[end] - y[start]
+        px = x[start + 1 : end] - x[start]
+        py = y[start + 1 : end] - y[start]
+        length = math.hypot(dx, dy)
+        if length == 0:
+            distances = np.hypot(px, py)
+        else:
+            distances = np.abs(dx * py - dy * px) / length
+
+        index = int(np.argmax(distances))
+        if distances[index] > tolerance:
+            index += start + 1
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+
+    return keep
+
+
+def simplify(chunk: list, bucket_seconds: float, tolerance_meters: float) -> list:
+    """Simplifies a list of (timestamp, longitude, latitude) tuples"""
+    if len(chunk) < 3:
+        return chunk
+
+    seconds = np.fromiter((row[0].timestamp() for row in chunk), dtype=float, count=len(chunk))
+    keep = time_bucket(seconds, bucket_seconds)
+    # Always keep the last point so consecutive chunks join up
+    keep[-1] = True
+    indexes = np.flatnonzero(keep)
+
+    longitudes = np.fromiter((chunk[i][1] for i in indexes), dtype=float, count=len(indexes))
+    latitudes = np.fromiter((chunk[i][2] for i in indexes), dtype=float, count=len(indexes))
+
+    # Equirectangular projection is accurate enough at the scale of the tolerance
+    scale = np.cos(np.radians(np.mean(latitudes)))
+    x = longitudes * METERS_PER_DEGREE * scale
+    y = latitudes * METERS_PER_DEGREE
+    indexes = indexes[douglas_peucker(x, y, tolerance_meters)]
+
+    return [chunk[i] for i in indexes]
+
+
+def segments(
+    rows: Iterable,
+    optimize: bool,
+    bucket_seconds: float,
+    tolerance_meters: float,
+    multitrack_threshold: float | None,
+) -> Iterator[list]:
+    """Splits (timestamp, longitude, latitude) rows into simplified chunks of at most CHUNK_SIZE points"""
+    max_gap = multitrack_threshold * 60 if multitrack_threshold else None
+    chunk = []
+    previous = None
+
+    for row in rows:
+        last = chunk[-1] if chunk else previous
+        if (
+            max_gap
+            and last is not None
+            and row[0] is not None
+            and last[0] is not None
+            and (row[0] - last[0]).total_seconds() > max_gap
+        ):
+            if chunk:
+                yield simplify(chunk, bucket_seconds, tolerance_meters) if optimize else chunk
+            chunk = []
+            previous = None
+
+        if not chunk and previous is not None:
+            chunk.append(previous)
+        chunk.append(row)
+
+        if len(chunk) >= CHUNK_SIZE:
+            yield simplify(chunk, bucket_seconds, tolerance_meters) if optimize else chunk
+            previous = chunk[-1]
+            chunk = []
+
+    if len(chunk) > 1 or (chunk and previous is None):
+        yield simplify(chunk, bucket_seconds, tolerance_meters) if optimize else chunk
+
+
+def kml_chunks(
+    rows: Iterable,
+    uid: str,
+    callsign: str | None,
+    icon_href: str | None,
+    optimize: bool,
+    bucket_seconds: float,
+    tolerance_meters: float,
+    multitrack_threshold: float | None,
+) -> Iterator[str]:
+    """Yields a KML document one track at a time"""
+    yield KML_HEADER
+    yield f"<Document><name>{escape(uid or '')}</name>"
+    if icon_href:
+        yield (
+            '<Style id="track"><IconStyle><scale>1.0</scale><heading>0.0</heading>'
+            f"<Icon><href>{escape(icon_href)}</href></Icon></IconStyle></Style>"
+        )
+
+    yield "<Placemark>"
+    yield f"<name>{escape(callsign or uid or '')}</name>"
+    if icon_href:
+        yield "<styleUrl>#track</styleUrl>"
+    yield "<gx:MultiTrack><gx:interpolate>0</gx:interpolate>"
+
+    for segment in segments(rows, optimize, bucket_seconds, tolerance_meters, multitrack_threshold):
+        parts = [f"<gx:Track id={quoteattr(uid or '')}><altitudeMode>clampToGround</altitudeMode>"]
+        parts.extend(
+            f"<when>{iso8601_string_from_datetime(timestamp)}</when>" for timestamp, _, _ in segment
+        )
+        parts.extend(
+            f"<gx:coord>{longitude} {latitude} 0</gx:coord>" for _, longitude, latitude in segment
+        )
+        parts.append("</gx:Track>")
+        yield "".join(parts)
+
+    yield "</gx:MultiTrack></Placemark></Document></kml>"
+
+
+class _StreamBuffer(io.RawIOBase):
+    """A write only file object that hands its contents to a generator as they're written"""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def kmz_chunks(kml: Iterable[str], files: dict[str, str] | None = None) -> Iterator[bytes]:
+    """Zips a KML document as it's being generated. ``files`` maps paths in the KMZ to paths on disk"""
+    buffer = _StreamBuffer()
+    # ZipFile writes data descriptors instead of seeking back when the file object isn't seekable
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as kmz:
+        with kmz.open("doc.kml", "w") as doc:
+            for chunk in kml:
+                doc.write(chunk.encode("utf-8"))
+                data = buffer.drain()
+                if data:
+                    yield data
+
+        for archive_name, path in (files or {}).items():
+            kmz.write(path, archive_name)
+            yield buffer.drain()
+
+    yield buffer.drain()
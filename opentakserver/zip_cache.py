@@ -0,0 +1,226 @@
+"""Builds zip files out of a cached, pre-compressed part and a small part that's generated for every request
+
+Device profiles send every EUD the same map sources, plugin APKs, data packages, and truststore along with a couple of
+small files that are different for every request. The shared files are compressed once into a zip in
+``OTS_DATA_FOLDER/cache/zips`` named after a hash of their names, paths, sizes, and mtimes, so the cached zip is rebuilt
+whenever one of them changes. Responses are the cached zip's entries as is, followed by the per-request entries and
+a new central directory, which is just a file copy and a few KB of deflate.
+
+Usage::
+
+    cached = static_zip([("maps/osm.xml", "/path/to/osm.xml"), ...])
+    response = Response(cached.stream({"MANIFEST/manifest.xml": manifest}), mimetype="application/zip")
+"""
+
+import hashlib
+import os
+import struct
+import tempfile
+import threading
+import time
+import zipfile
+import zlib
+from dataclasses import dataclass
+from typing import Iterator
+
+from flask import current_app as app
+
+BLOCK_SIZE = 1024 * 1024
+MAX_CACHED_ZIPS = 16
+ZIP_LIMIT = 0xFFFFFFFF
+
+CENTRAL_DIRECTORY = struct.Struct("<4s4B4HL2L5H2L")
+END_OF_CENTRAL_DIRECTORY = struct.Struct("<4s4H2LH")
+
+
+def _encode_name(info: zipfile.ZipInfo) -> tuple[bytes, int]:
+    try:
+        return info.filename.encode("ascii"), info.flag_bits & ~0x800
+    except UnicodeEncodeError:
+        return info.filename.encode("utf-8"), info.flag_bits | 0x800
+
+
+def _central_directory_record(info: zipfile.ZipInfo) -> bytes:
+    name, flag_bits = _encode_name(info)
+    dt = info.date_time
+    dos_date = (dt[0] - 1980) << 9 | dt[1] << 5 | dt[2]
+    dos_time = dt[3] << 11 | dt[4] << 5 | (dt[5] // 2)
+    return (
+        CENTRAL_DIRECTORY.pack(
+            b"PK\001\002",
+            info.create_version,
+            info.create_system,
+            info.extract_version,
+            info.reserved,
+            flag_bits,
+            info.compress_type,
+            dos_time,
+            dos_date,
+            info.CRC,
+            info.compress_size,
+            info.file_size,
+            len(name),
+            0,
+            0,
+            0,
+            info.internal_attr,
+            info.external_attr,
+            info.header_offset,
+        )
+        + name
+    )
+
+
+def _deflate(name: str, data: bytes, offset: int) -> tuple[zipfile.ZipInfo, bytes]:
+    info = zipfile.ZipInfo(name, time.localtime(time.time())[:6])
+    info.compress_type = zipfile.ZIP_DEFLATED
+    info.external_attr = 0o600 << 16
+    info.file_size = len(data)
+    info.CRC = zlib.crc32(data)
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    compressed = compressor.compress(data) + compressor.flush()
+    info.compress_size = len(compressed)
+    info.header_offset = offset
+    return info, info.FileHeader(False) + compressed
+
+
+@dataclass
+class CachedZip:
+    path: str
+    entries: list[zipfile.ZipInfo]
+    # Where the central directory starts, everything before it is copied into responses as is
+    data_length: int
+
+    def names(self) -> list[str]:
+        return [entry.filename for entry in self.entries]
+
+    def stream(self, files: dict[str, bytes]) -> "ZipStream":
+        """The cached entries followed by files, which are compressed for this response only"""
+        offset = self.data_length
+        entries = list(self.entries)
+        chunks = []
+        for name, data in files.items():
+            info, chunk = _deflate(name, data, offset)
+            entries.append(info)
+            chunks.append(chunk)
+            offset += len(chunk)
+
+        central_directory = b"".join(_central_directory_record(entry) for entry in entries)
+        if offset + len(central_directory) > ZIP_LIMIT or len(entries) > 0xFFFF:
+            raise ValueError("Zip files larger than 4 GB are not supported")
+
+        end = END_OF_CENTRAL_DIRECTORY.pack(
+            b"PK\005\006", 0, 0, len(entries), len(entries), len(central_directory), offset, 0
+        )
+        return ZipStream(self, b"".join(chunks) + central_directory + end)
+
+
+class ZipStream:
+    """A response body that can be iterated once
+
+    The cached zip is opened right away so it can still be read after _prune() deletes it.
+    """
+
+    def __init__(self, cached: CachedZip, tail: bytes):
+        self.cached = cached
+        self.tail = tail
+        self.length = cached.data_length + len(tail)
+        self.file = open(cached.path, "rb")
+
+    def __iter__(self) -> Iterator[bytes]:
+        try:
+            remaining = self.cached.data_length
+            while remaining > 0:
+                chunk = self.file.read(min(BLOCK_SIZE, remaining))
+                if not chunk:
+                    raise IOError(f"{self.cached.path} is shorter than expected")
+                remaining -= len(chunk)
+                yield chunk
+            yield self.tail
+        finally:
+            self.close()
+
+    def close(self):
+        # Called by werkzeug when the response is done, even if it was never iterated
+        self.file.close()
+
+    def getvalue(self) -> bytes:
+        return b"".join(self)
+
+
+_lock = threading.Lock()
+_cache: dict[str, CachedZip] = {}
+
+
+def cache_folder() -> str:
+    folder = os.path.join(app.config.get("OTS_DATA_FOLDER"), "cache", "zips")
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def cache_key(files: list[tuple[str, str]]) -> str:
+    sha256 = hashlib.sha256()
+    for name, path in files:
+        stat = os.stat(path)
+        sha256.update(repr((name, os.path.realpath(path), stat.st_mtime_ns, stat.st_size)).encode())
+    return sha256.hexdigest()
+
+
+def _load(path: str) -> CachedZip:
+    with zipfile.ZipFile(path) as zipf:
+        entries = zipf.infolist()
+        data_length = zipf.start_dir
+    return CachedZip(path, entries, data_length)
+
+
+def _build(path: str, files: list[tuple[str, str]]):
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".build-")
+    try:
+        with os.fdopen(fd, "wb") as f, zipfile.ZipFile(f, "w", zipfile.ZIP_DEFLATED) as zipf:
+            for name, source in files:
+                zipf.write(source, name)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def _prune(folder: str, keep: str):
+    cached = sorted(
+        (os.path.join(folder, name) for name in os.listdir(folder) if name.endswith(".zip")),
+        key=os.path.getmtime,
+        reverse=True,
+    )
+    for path in cached[MAX_CACHED_ZIPS:]:
+        if path != keep:
+            _cache.pop(os.path.basename(path).removesuffix(".zip"), None)
+            os.remove(path)
+
+
+def static_zip(files: list[tuple[str, str]]) -> CachedZip:
+    """Returns the cached zip of files, building it if any of the files changed
+
+    :param files: (name in the zip, path on disk) of every file
+    """
+    key = cache_key(files)
+    with _lock:
+        cached = _cache.get(key)
+        if cached:
+            try:
+                # _prune() keeps the most recently used zips
+                os.utime(cached.path)
+                return cached
+            except FileNotFoundError:
+                pass
+
+        folder = cache_folder()
+        path = os.path.join(folder, f"{key}.zip")
+        try:
+            cached = _load(path)
+        except (OSError, zipfile.BadZipFile):
+            _build(path, files)
+            cached = _load(path)
+            _prune(folder, path)
+
+        _cache[key] = cached
+        return cached
@@ -1,9 +1,34 @@
+import importlib
+import pkgutil
+from contextlib import contextmanager
+
 import pytest
 import sqlalchemy
+import yaml
+from flask import Flask
 from flask_security import hash_password
+from flask_security.models import fsqla_v3 as fsqla
+from sqlalchemy import event
+
+# opentakserver.app monkey patches the standard library with gevent, so it has to be imported before the modules that
+# start threads or process pools
+from opentakserver.app import create_app  # isort: skip
+
+import opentakserver.models
+from opentakserver import ca_engine, crypto_cache
+from opentakserver.certificate_authority import CertificateAuthority
+from opentakserver.defaultconfig import DefaultConfig
+from opentakserver.extensions import babel, db, logger
+from opentakserver.revocation import revoked_certificates
 
-from opentakserver.app import create_app
-from opentakserver.extensions import db, logger
+try:
+    fsqla.FsModels.set_db_info(db)
+except sqlalchemy.exc.InvalidRequestError:
+    pass
+
+# Import every model so all relationships can be resolved and db.create_all() creates every table
+for module in pkgutil.iter_modules(opentakserver.models.__path__):
+    importlib.import_module(f"opentakserver.models.{module.name}")
 
 
 class AuthActions:
@@ -55,6 +80,93 @@ class AuthActions:
         return self.client.post(path, headers=headers)
 
 
+@contextmanager
+def sqlite_app(database_uri: str = "sqlite://"):
+    """A bare Flask app with every table created, for tests that don't need the whole server
+
+    Tables are dropped when the context exits. Config, routes and request contexts can be added to
+    the app that's yielded.
+    """
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = database_uri
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def db_app(tmp_path):
+    """A sqlite_app() with its database in tmp_path"""
+    with sqlite_app(f"sqlite:///{tmp_path / 'ots.db'}") as app:
+        yield app
+
+
+CA_CONFIG = {
+    "OTS_CA_NAME": "OpenTAKServer-CA",
+    "OTS_CA_PASSWORD": "atakatak",
+    "OTS_CA_EXPIRATION_TIME": 3650,
+    "OTS_CA_SUBJECT": "/C=WW/ST=XX/L=YY/O=ZZ/OU=OpenTAKServer",
+    "OTS_MARTI_HTTPS_PORT": 8443,
+    "OTS_SSL_STREAMING_PORT": 8089,
+    "OTS_REVOCATION_REFRESH_SECONDS": 30,
+    "OTS_DELTA_CRL_MAX_ENTRIES": 2,
+    "OTS_OCSP_MAX_AGE_SECONDS": 300,
+}
+
+
+@pytest.fixture
+def ca_app(db_app, tmp_path):
+    """A new CA in tmp_path / "ca" with db_app configured to use it
+
+    :return: The CertificateAuthority and its folder
+    """
+    ca_engine.clear_cache()
+    crypto_cache.certificate_authorities.clear()
+    crypto_cache.rsa_keys.clear()
+    crypto_cache.verified_certs.clear()
+    revoked_certificates.clear()
+
+    folder = tmp_path / "ca"
+    db_app.config.update(CA_CONFIG, OTS_CA_FOLDER=str(folder))
+    authority = CertificateAuthority(logger, db_app)
+    authority.create_ca()
+    return authority, folder
+
+
+@pytest.fixture(scope="session")
+def make_sqlite_app():
+    """sqlite_app() for fixtures that share one database across a module"""
+    return sqlite_app
+
+
+@pytest.fixture
+def sqlite_server(tmp_path, monkeypatch):
+    """The whole server from create_app() with its database in SQLite instead of PostgreSQL
+
+    Override the ``app`` fixture with this one to use it with ``client`` and ``auth``.
+    """
+    monkeypatch.setattr(DefaultConfig, "OTS_DATA_FOLDER", str(tmp_path))
+    with open(tmp_path / "config.yml", "w") as config:
+        yaml.safe_dump({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'ots.db'}"}, config)
+
+    app = create_app()
+    app.config["TESTING"] = True
+    # create_app() only sets up the rest of the extensions for the web server, the error messages need Babel
+    babel.init_app(app)
+    with app.app_context():
+        db.create_all()
+        app.security.datastore.find_or_create_role(name="administrator")
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
 @pytest.fixture
 def app():
     app = create_app()
@@ -75,3 +187,31 @@ def client(app):
 @pytest.fixture
 def auth(app, client):
     return AuthActions(app, client)
+
+
+class QueryCounter:
+    """Counts every SQL statement sent to the database while it's listening"""
+
+    def __init__(self):
+        self.count = 0
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+        self.statements.append(statement)
+
+
+@pytest.fixture
+def count_queries(app):
+    @contextmanager
+    def counter():
+        with app.app_context():
+            engine = db.engine
+        query_counter = QueryCounter()
+        event.listen(engine, "before_cursor_execute", query_counter)
+        try:
+            yield query_counter
+        finally:
+            event.remove(engine, "before_cursor_execute", query_counter)
+
+    return counter
@@ -0,0 +1,75 @@
+import hashlib
+import io
+import os
+
+import pytest
+from flask import Flask
+
+from opentakserver import blob_store
+from opentakserver.blob_store import find_blob, save_blob
+
+
+class ChunkedReader(io.RawIOBase):
+    """Produces size bytes without holding them all in memory, and records the largest read"""
+
+    def __init__(self, size):
+        self.remaining = size
+        self.largest_read = 0
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        size = self.remaining if size < 0 else min(size, self.remaining)
+        self.largest_read = max(self.largest_read, size)
+        self.remaining -= size
+        return b"x" * size
+
+
+@pytest.fixture
+def store_app(tmp_path):
+    app = Flask(__name__)
+    app.config["UPLOAD_FOLDER"] = str(tmp_path)
+    with app.app_context():
+        yield tmp_path
+
+
+def test_save_blob(store_app):
+    blob = save_blob(b"mission content", ".txt")
+    assert blob.hash == hashlib.sha256(b"mission content").hexdigest()
+    assert blob.size == len(b"mission content")
+    assert blob.created
+    assert blob.path == os.path.join(store_app, f"{blob.hash}.txt")
+    with open(blob.path, "rb") as f:
+        assert f.read() == b"mission content"
+    assert os.stat(blob.path).st_mode & 0o777 == 0o644
+
+    # No temp files are left behind
+    assert os.listdir(store_app) == [f"{blob.hash}.txt"]
+
+
+def test_identical_content_is_stored_once(store_app):
+    first = save_blob(io.BytesIO(b"same"), ".zip")
+    mtime = os.stat(first.path).st_mtime_ns
+
+    second = save_blob(io.BytesIO(b"same"), ".zip")
+    assert second.hash == first.hash
+    assert not second.created
+    assert os.stat(second.path).st_mtime_ns == mtime
+    assert len(os.listdir(store_app)) == 1
+
+
+def test_streams_in_chunks(store_app):
+    reader = ChunkedReader(5 * blob_store.CHUNK_SIZE + 17)
+    blob = save_blob(reader)
+    assert blob.size == 5 * blob_store.CHUNK_SIZE + 17
+    assert reader.largest_read == blob_store.CHUNK_SIZE
+
+
+def test_find_blob(store_app):
+    blob = save_blob(b"kml", ".kml")
+    assert find_blob(blob.hash, ".kml") == blob.path
+    # iTAK renames files so the extension in the database doesn't always match
+    assert find_blob(blob.hash, "") == blob.path
+    assert find_blob("0" * 64) is None
+    assert find_blob("../../etc/passwd") is None
@@ -0,0 +1,81 @@
+import zipfile
+
+from opentakserver import bulk_certificates
+from opentakserver.bulk_certificates import (
+    issue_certificates,
+    read_common_names,
+    record_certificate,
+    write_archive,
+)
+from opentakserver.extensions import db
+from opentakserver.models.Certificate import Certificate
+from opentakserver.revocation import revoke, revoked_certificates, serial_number
+
+
+def test_read_common_names():
+    assert read_common_names("common_name,team\nalpha,Cyan\n\n# comment\nbravo\nalpha\n") == [
+        "alpha",
+        "bravo",
+    ]
+    assert read_common_names([" alpha ", "", "bravo"]) == ["alpha", "bravo"]
+
+
+def test_issue_certificates(ca_app):
+    authority, folder = ca_app
+    results = list(issue_certificates(["alpha", "bravo", "../etc"], "tak.example.com", workers=2))
+    statuses = {result.common_name: result.status for result in results}
+    assert statuses == {
+        "alpha": bulk_certificates.ISSUED,
+        "bravo": bulk_certificates.ISSUED,
+        "../etc": bulk_certificates.ERROR,
+    }
+
+    path = write_archive(["alpha", "bravo"], str(folder / "bulk" / "units.zip"))
+    with zipfile.ZipFile(path) as zipf:
+        assert sorted(zipf.namelist()) == [
+            "alpha/alpha_CONFIG.zip",
+            "alpha/alpha_CONFIG_iTAK.zip",
+            "bravo/bravo_CONFIG.zip",
+            "bravo/bravo_CONFIG_iTAK.zip",
+        ]
+        with zipfile.ZipFile(zipf.open("alpha/alpha_CONFIG_iTAK.zip")) as itak:
+            assert b"tak.example.com:8089:ssl" in itak.read("config.pref")
+
+    # Re-running only issues what's missing
+    pem = (folder / "certs" / "alpha" / "alpha.pem").read_bytes()
+    results = list(issue_certificates(["alpha", "charlie"], "tak.example.com"))
+    statuses = {result.common_name: result.status for result in results}
+    assert statuses == {"alpha": bulk_certificates.EXISTS, "charlie": bulk_certificates.ISSUED}
+    assert (folder / "certs" / "alpha" / "alpha.pem").read_bytes() == pem
+
+    results = list(issue_certificates(["alpha"], "tak.example.com", overwrite=True))
+    assert results[0].status == bulk_certificates.ISSUED
+    assert (folder / "certs" / "alpha" / "alpha.pem").read_bytes() != pem
+
+
+def test_results_are_recorded(ca_app):
+    authority, folder = ca_app
+    results = list(issue_certificates(["alpha"], "tak.example.com"))
+    results += list(issue_certificates(["alpha"], "tak.example.com"))
+    pem = (folder / "certs" / "alpha" / "alpha.pem").read_bytes()
+    assert [result.serial_number for result in results] == [serial_number(pem)] * 2
+
+    for result in results:
+        record_certificate(result, "tak.example.com")
+
+    certificate = db.session.execute(db.select(Certificate)).scalar_one()
+    assert certificate.common_name == "alpha"
+    assert certificate.serial_number == serial_number(pem)
+    assert certificate.server_port == 8089
+    assert certificate.expiration_date
+
+
+def test_revoked_certs_are_issued_again(ca_app):
+    authority, folder = ca_app
+    result = next(issue_certificates(["alpha"], "tak.example.com"))
+    revoke([record_certificate(result, "tak.example.com")])
+
+    result = next(issue_certificates(["alpha"], "tak.example.com"))
+    assert result.status == bulk_certificates.ISSUED
+    pem = (folder / "certs" / "alpha" / "alpha.pem").read_bytes()
+    assert not revoked_certificates.is_revoked(int(serial_number(pem), 16))
@@ -0,0 +1,92 @@
+import datetime
+
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.serialization import pkcs12
+from cryptography.x509.oid import ExtendedKeyUsageOID, NameOID
+from OpenSSL import crypto
+
+from opentakserver import ca_engine
+
+
+def verify(ca_pem, cert_pem):
+    store = crypto.X509Store()
+    store.add_cert(crypto.load_certificate(crypto.FILETYPE_PEM, ca_pem))
+    cert = crypto.load_certificate(crypto.FILETYPE_PEM, cert_pem)
+    crypto.X509StoreContext(store, cert).verify_certificate()
+
+
+def test_parse_subject():
+    name = ca_engine.parse_subject("/C=WW/O=ZZ/OU=Open\\/TAK/CN=opentakserver")
+    assert name.get_attributes_for_oid(NameOID.ORGANIZATIONAL_UNIT_NAME)[0].value == "Open/TAK"
+    assert name.get_attributes_for_oid(NameOID.COMMON_NAME)[0].value == "opentakserver"
+    with pytest.raises(ValueError):
+        ca_engine.parse_subject("/XX=nope")
+
+
+def test_create_ca(ca_app):
+    ca, folder = ca_app
+    ca_pem = (folder / "ca.pem").read_bytes()
+    ca_cert = x509.load_pem_x509_certificate(ca_pem)
+    assert ca_cert.extensions.get_extension_for_class(x509.BasicConstraints).value.ca
+
+    store = pkcs12.load_pkcs12((folder / "truststore-root.p12").read_bytes(), b"atakatak")
+    assert store.additional_certs[0].certificate == ca_cert
+    assert store.additional_certs[0].friendly_name == b"OpenTAKServer-CA"
+
+    crl = x509.load_pem_x509_crl((folder / "ca.crl").read_bytes())
+    assert crl.is_signature_valid(ca_cert.public_key())
+
+    # The server cert is followed by the CA so it can be used as a chain
+    server_pem = (folder / "certs" / "opentakserver" / "opentakserver.pem").read_bytes()
+    server_cert, chain_ca = x509.load_pem_x509_certificates(server_pem)
+    assert chain_ca == ca_cert
+    verify(ca_pem, server_pem)
+    san = server_cert.extensions.get_extension_for_class(x509.SubjectAlternativeName).value
+    assert san.get_values_for_type(x509.DNSName) == ["opentakserver"]
+    assert (folder / "certs" / "opentakserver" / "opentakserver.pub").exists()
+    assert (folder / "certs" / "opentakserver" / "opentakserver.nopass.key").exists()
+
+
+def test_sign_csr(ca_app):
+    ca, folder = ca_app
+    key = ca_engine.generate_key()
+    csr = ca_engine.build_csr(key, ca_engine.parse_subject("/CN=EUD-1"))
+    pem = ca.sign_csr(csr.public_bytes(serialization.Encoding.PEM), "EUD-1")
+
+    verify((folder / "ca.pem").read_bytes(), pem)
+    cert = x509.load_pem_x509_certificate(pem)
+    usages = cert.extensions.get_extension_for_class(x509.ExtendedKeyUsage).value
+    assert list(usages) == [ExtendedKeyUsageOID.CLIENT_AUTH]
+    assert (folder / "certs" / "EUD-1" / "EUD-1.csr").exists()
+
+    other = ca.sign_csr(csr.public_bytes(serialization.Encoding.PEM), "EUD-1")
+    assert x509.load_pem_x509_certificate(other).serial_number != cert.serial_number
+
+
+def test_ca_key_is_loaded_once(ca_app, monkeypatch):
+    ca, folder = ca_app
+    first = ca.load_ca()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("CA key was decrypted again")
+
+    monkeypatch.setattr(serialization, "load_pem_private_key", fail)
+    assert ca.load_ca() is first
+
+
+def test_issue_and_revoke(ca_app):
+    ca, folder = ca_app
+    ca.issue_certificate("opentakserver", True)
+    bundle = pkcs12.load_pkcs12(
+        (folder / "certs" / "opentakserver" / "opentakserver.p12").read_bytes(), b"atakatak"
+    )
+    assert bundle.key is not None
+    assert bundle.cert.friendly_name == b"opentakserver"
+
+    revoked_at = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+    ca.generate_crl(revoked=[(bundle.cert.certificate.serial_number, revoked_at)])
+    crl = x509.load_pem_x509_crl((folder / "ca.crl").read_bytes())
+    entry = crl.get_revoked_certificate_by_serial_number(bundle.cert.certificate.serial_number)
+    assert entry.revocation_date_utc == revoked_at
@@ -0,0 +1,127 @@
+import datetime
+import os
+
+import jwt
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+
+from opentakserver import crypto_cache
+from opentakserver.extensions import db
+from opentakserver.models.Certificate import Certificate
+from opentakserver.revocation import revoked_certificates, serial_hex
+
+
+def make_cert(common_name, key, issuer_name=None, issuer_key=None, days=365):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    subject = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name)])
+    builder = (
+        x509.CertificateBuilder()
+        .subject_name(subject)
+        .issuer_name(issuer_name or subject)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=days))
+    )
+    if not issuer_key:
+        builder = builder.add_extension(x509.BasicConstraints(ca=True, path_length=None), True)
+    return builder.sign(issuer_key or key, hashes.SHA256())
+
+
+def pem(cert):
+    return cert.public_bytes(serialization.Encoding.PEM)
+
+
+def write_ca(folder, common_name):
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    cert = make_cert(common_name, key)
+    with open(os.path.join(folder, "ca.pem"), "wb") as f:
+        f.write(pem(cert))
+    # Rotating the CA in place must be noticed even within the same mtime tick
+    os.utime(os.path.join(folder, "ca.pem"), ns=(0, len(common_name)))
+    return cert, key
+
+
+def test_verified_certs_are_cached(ca_app, monkeypatch):
+    authority, folder = ca_app
+    ca_cert, ca_key = write_ca(folder, "ca-1")
+    client_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    client_pem = pem(make_cert("alpha", client_key, ca_cert.subject, ca_key)).decode()
+
+    cert = crypto_cache.verify_certificate(client_pem)
+    assert cert.get_subject().commonName == "alpha"
+
+    def fail(*args, **kwargs):
+        raise AssertionError("Cert was verified again")
+
+    monkeypatch.setattr(crypto_cache.crypto, "X509StoreContext", fail)
+    assert crypto_cache.verify_certificate(client_pem) is cert
+
+
+def test_revoked_certs_are_refused(ca_app):
+    authority, folder = ca_app
+    ca_cert, ca_key = write_ca(folder, "ca-1")
+    client_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    client_cert = make_cert("alpha", client_key, ca_cert.subject, ca_key)
+    client_pem = pem(client_cert).decode()
+    assert crypto_cache.verify_certificate(client_pem)
+
+    certificate = Certificate()
+    certificate.common_name = "alpha"
+    certificate.expiration_date = client_cert.not_valid_after_utc
+    certificate.server_address = "tak.example.com"
+    certificate.server_port = 8089
+    certificate.truststore_filename = "truststore-root.p12"
+    certificate.user_cert_filename = "alpha.pem"
+    certificate.cert_password = "atakatak"
+    certificate.serial_number = serial_hex(client_cert.serial_number)
+    certificate.revoked_at = datetime.datetime.now(datetime.timezone.utc)
+    db.session.add(certificate)
+    db.session.commit()
+    revoked_certificates.refresh()
+
+    # Even though it's in the verified cert cache
+    assert crypto_cache.verify_certificate(client_pem) is None
+    assert crypto_cache.verify_certificate(client_pem) is None
+
+
+def test_ca_rotation(ca_app):
+    authority, folder = ca_app
+    ca_cert, ca_key = write_ca(folder, "ca-1")
+    client_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    client_pem = pem(make_cert("alpha", client_key, ca_cert.subject, ca_key)).decode()
+    assert crypto_cache.verify_certificate(client_pem)
+
+    write_ca(folder, "ca-two")
+    assert crypto_cache.verify_certificate(client_pem) is None
+    assert crypto_cache.verify_certificate("not a cert") is None
+
+
+def test_server_keys(ca_app):
+    authority, folder = ca_app
+    os.makedirs(os.path.join(folder, "certs", "opentakserver"), exist_ok=True)
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    base = os.path.join(folder, "certs", "opentakserver", "opentakserver")
+    with open(base + ".nopass.key", "wb") as f:
+        f.write(
+            key.private_bytes(
+                serialization.Encoding.PEM,
+                serialization.PrivateFormat.TraditionalOpenSSL,
+                serialization.NoEncryption(),
+            )
+        )
+    # Like the output of openssl x509 -pubkey, the public key followed by the cert
+    with open(base + ".pub", "wb") as f:
+        f.write(
+            key.public_key().public_bytes(
+                serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+            )
+        )
+        f.write(pem(make_cert("opentakserver", key)))
+
+    token = jwt.encode({"sub": "eud-1"}, crypto_cache.server_private_key(), algorithm="RS256")
+    assert crypto_cache.server_private_key() is crypto_cache.server_private_key()
+    decoded = jwt.decode(token, crypto_cache.server_public_key(), algorithms=["RS256"])
+    assert decoded == {"sub": "eud-1"}
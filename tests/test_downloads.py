@@ -0,0 +1,107 @@
+import os
+import time
+
+import pytest
+from flask import Flask
+
+from opentakserver import downloads
+from opentakserver.downloads import send_download
+
+SIZE = 8 * downloads.BLOCK_SIZE + 123
+
+
+@pytest.fixture
+def download_app(tmp_path):
+    packages = tmp_path / "packages"
+    packages.mkdir()
+    with open(packages / "plugin.apk", "wb") as f:
+        f.write(os.urandom(SIZE))
+
+    app = Flask(__name__)
+    app.config["OTS_DATA_FOLDER"] = str(tmp_path)
+    app.config["OTS_DOWNLOAD_OFFLOAD"] = ""
+    app.config["OTS_X_ACCEL_REDIRECT_PREFIX"] = "/ots_data/"
+
+    @app.route("/download/<name>")
+    def download(name):
+        return send_download(str(packages), name, download_name="Plugin ✓.apk", as_attachment=True)
+
+    yield app, packages / "plugin.apk"
+
+
+def test_full_download(download_app):
+    app, path = download_app
+    response = app.test_client().get("/download/plugin.apk")
+    assert response.status_code == 200
+    assert response.headers["Accept-Ranges"] == "bytes"
+    assert response.headers["ETag"]
+    assert "attachment" in response.headers["Content-Disposition"]
+    assert response.get_data() == path.read_bytes()
+
+
+def test_resume_with_range_and_if_range(download_app):
+    app, path = download_app
+    client = app.test_client()
+    data = path.read_bytes()
+    etag = client.head("/download/plugin.apk").headers["ETag"]
+
+    # The first download stopped after 1000 bytes
+    response = client.get(
+        "/download/plugin.apk", headers={"Range": "bytes=1000-", "If-Range": etag}
+    )
+    assert response.status_code == 206
+    assert response.headers["Content-Range"] == f"bytes 1000-{SIZE - 1}/{SIZE}"
+    assert data[:1000] + response.get_data() == data
+
+    response = client.get("/download/plugin.apk", headers={"Range": "bytes=-10"})
+    assert response.status_code == 206
+    assert response.get_data() == data[-10:]
+
+    response = client.get("/download/plugin.apk", headers={"Range": f"bytes={SIZE}-"})
+    assert response.status_code == 416
+
+    # The file changed since the first attempt so the whole file is sent again
+    os.utime(path, (time.time() + 10, time.time() + 10))
+    response = client.get(
+        "/download/plugin.apk", headers={"Range": "bytes=1000-", "If-Range": etag}
+    )
+    assert response.status_code == 200
+    assert len(response.get_data()) == SIZE
+
+
+def test_large_blocks(download_app):
+    app, path = download_app
+    response = app.test_client().get("/download/plugin.apk", buffered=False)
+    chunks = [len(chunk) for chunk in response.response]
+    response.close()
+
+    assert sum(chunks) == SIZE
+    assert len(chunks) == 9
+    assert max(chunks) == downloads.BLOCK_SIZE
+
+
+def test_missing_files(download_app):
+    app, path = download_app
+    client = app.test_client()
+    assert client.get("/download/nothing.apk").status_code == 404
+    assert client.get("/download/..%2F..%2Fetc%2Fpasswd").status_code == 404
+
+
+def test_x_accel_redirect(download_app):
+    app, path = download_app
+    app.config["OTS_DOWNLOAD_OFFLOAD"] = "x-accel-redirect"
+    response = app.test_client().get("/download/plugin.apk")
+    assert response.status_code == 200
+    assert response.headers["X-Accel-Redirect"] == "/ots_data/packages/plugin.apk"
+    assert response.headers["Content-Disposition"] == (
+        "attachment; filename*=UTF-8''Plugin%20%E2%9C%93.apk"
+    )
+    assert response.get_data() == b""
+
+
+def test_x_sendfile(download_app):
+    app, path = download_app
+    app.config["OTS_DOWNLOAD_OFFLOAD"] = "x-sendfile"
+    response = app.test_client().get("/download/plugin.apk")
+    assert response.headers["X-Sendfile"] == str(path)
+    assert response.get_data() == b""
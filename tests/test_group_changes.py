@@ -0,0 +1,121 @@
+import contextlib
+import logging
+
+from opentakserver.controllers import group_change_controller
+from opentakserver.controllers.group_change_controller import GroupChangeController
+from opentakserver.group_changes import (
+    APPLYING,
+    DONE,
+    FAILED,
+    Binding,
+    GroupChanges,
+    apply,
+    group_change,
+)
+
+
+class FakeChannel:
+    """Records RPCs like an async pika channel and confirms them when flush() is called"""
+
+    def __init__(self):
+        self.sent = []
+        self.published = []
+        self.callbacks = []
+
+    def basic_publish(self, exchange, routing_key, body):
+        self.published.append((exchange, routing_key, body))
+
+    def queue_declare(self, queue, callback=None):
+        self.sent.append(("declare", queue))
+        self.callbacks.append(callback)
+
+    def queue_bind(self, queue, exchange, routing_key=None, arguments=None, callback=None):
+        self.sent.append(("bind", queue, exchange, routing_key or arguments))
+        self.callbacks.append(callback)
+
+    def queue_unbind(self, queue, exchange=None, routing_key=None, arguments=None, callback=None):
+        self.sent.append(("unbind", queue, exchange, routing_key or arguments))
+        self.callbacks.append(callback)
+
+    def flush(self):
+        callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            callback(None)
+
+
+def test_group_change_drops_duplicates():
+    cyan = Binding("uid-1", "Cyan", "OUT", 3)
+    red = Binding("uid-2", "Red", "OUT", 4)
+    blue = Binding("uid-2", "Blue", "IN", 5)
+    change = group_change(bind=[cyan, cyan, red], unbind=[red, blue])
+    assert change.bind == [cyan]
+    assert change.unbind == [red, blue]
+    assert change.queues() == ["uid-1", "uid-2"]
+    # OUT groups are also bound on the group_mask exchange
+    assert change.operations() == 2 + 3 + 2
+
+
+def test_apply_sends_everything_before_waiting():
+    tracker = GroupChanges()
+    change = group_change(
+        bind=[Binding(f"uid-{i}", "Cyan", "OUT", 3) for i in range(100)],
+        unbind=[Binding(f"uid-{i}", "Red", "IN", 4) for i in range(100)],
+        masks={"uid-0": 0b10000},
+    )
+    tracker.add(change)
+    done = []
+    channel = FakeChannel()
+
+    apply(channel, change, lambda c: (tracker.finish(c), done.append(c)))
+    # Every RPC is sent up front, queues are declared before they're bound
+    assert len(channel.sent) == 400
+    assert channel.sent[0] == ("declare", "uid-0")
+    assert channel.sent[100] == ("bind", "uid-0", "groups", "Cyan.OUT")
+    assert channel.sent[101] == ("bind", "uid-0", "group_mask", {"x-match": "any", "group.3": 1})
+    assert channel.sent[300] == ("unbind", "uid-0", "groups", "Red.IN")
+    assert channel.published == [("dms", "uid-0", '{"uid": null, "group_mask": 16}')]
+    assert change.status == APPLYING
+    assert not done
+
+    channel.flush()
+    assert done == [change]
+    assert tracker.get(change.change_id).status == DONE
+    assert change.to_json()["applied"] == 400
+
+
+def test_tracker():
+    tracker = GroupChanges(size=2)
+    empty = group_change()
+    finished = []
+    apply(FakeChannel(), empty, finished.append)
+    assert finished == [empty]
+
+    failed = group_change(unbind=[Binding("uid-1", "Cyan", "IN", 3)])
+    tracker.add(empty)
+    tracker.add(failed)
+    tracker.finish(failed, "CHANNEL_ERROR")
+    assert tracker.get(failed.change_id).status == FAILED
+    assert tracker.get(failed.change_id).error == "CHANNEL_ERROR"
+
+    # Only the most recent changes are kept
+    tracker.add(group_change())
+    assert tracker.get(empty.change_id) is None
+
+
+def test_only_administrators_are_told_about_changes(monkeypatch):
+    emitted = []
+
+    class FakeSocketIO:
+        def emit(self, event, data, namespace=None, to=None):
+            emitted.append((event, to))
+
+    monkeypatch.setattr(group_change_controller, "refresh_rooms", lambda: None)
+    # Skip __init__, it connects to RabbitMQ
+    controller = GroupChangeController.__new__(GroupChangeController)
+    controller.in_flight = {}
+    controller.context = contextlib.nullcontext()
+    controller.socketio = FakeSocketIO()
+    controller.logger = logging.getLogger()
+
+    controller.finish(group_change())
+    assert emitted == [("group_change", ["group:all"])]
@@ -0,0 +1,119 @@
+import json
+
+from opentakserver.eud_handler.EudHandler import EudHandler
+from opentakserver.extensions import db
+from opentakserver.group_routing import (
+    ANON_MASK,
+    GROUP_MASK_EXCHANGE,
+    binding_arguments,
+    group_mask,
+    mask_bits,
+    mask_headers,
+    user_mask,
+)
+from opentakserver.models.Group import Group
+from opentakserver.models.GroupUser import GroupUser
+from opentakserver.models.user import User
+
+
+class FakeChannel:
+    is_open = True
+
+    def __init__(self):
+        self.sent = []
+
+    def queue_bind(self, queue, exchange, routing_key=None, arguments=None):
+        self.sent.append(("bind", exchange, routing_key or arguments))
+
+    def queue_unbind(self, queue, exchange=None, routing_key=None, arguments=None):
+        self.sent.append(("unbind", exchange, routing_key or arguments))
+
+
+def add_group(name):
+    group = Group()
+    group.name = name
+    group.type = Group.SYSTEM
+    db.session.add(group)
+    db.session.commit()
+    return group
+
+
+def test_masks():
+    mask = group_mask([2, 5, 70])
+    assert mask_bits(mask) == [2, 5, 70]
+    assert mask_headers(mask) == {"group.2": 1, "group.5": 1, "group.70": 1}
+    assert group_mask([]) == 0
+
+    # A queue bound to any of the sender's groups matches the message's headers
+    for bitpos in (2, 5, 70):
+        arguments = binding_arguments(bitpos)
+        assert arguments["x-match"] == "any"
+        assert set(arguments) - {"x-match"} <= set(mask_headers(mask))
+    assert not set(binding_arguments(3)) - {"x-match"} <= set(mask_headers(mask))
+
+
+def test_user_mask(db_app):
+    user = User(username="alpha", password="password", active=True, fs_uniquifier="alpha")
+    db.session.add(user)
+    groups = [add_group(name) for name in ("Cyan", "Red", "Blue")]
+
+    assert user_mask(user.id, Group.IN) == ANON_MASK
+
+    cyan, red, blue = groups
+    for group, direction, enabled in (
+        (cyan, Group.IN, True),
+        (red, Group.IN, False),
+        (blue, Group.OUT, True),
+    ):
+        membership = GroupUser()
+        membership.user_id = user.id
+        membership.group_id = group.id
+        membership.direction = direction
+        membership.enabled = enabled
+        db.session.add(membership)
+    db.session.commit()
+
+    assert user_mask(user.id, Group.IN) == 1 << cyan.bitpos
+    assert user_mask(user.id, Group.OUT) == 1 << blue.bitpos
+
+
+def test_handler_syncs_bindings_on_group_change(db_app):
+    user = User(username="bravo", password="password", active=True, fs_uniquifier="bravo")
+    db.session.add(user)
+    red, blue = add_group("Red"), add_group("Blue")
+    membership = GroupUser()
+    membership.user_id = user.id
+    membership.group_id = blue.id
+    membership.direction = Group.OUT
+    membership.enabled = True
+    db.session.add(membership)
+    db.session.commit()
+
+    # Skip __init__, it needs a socket. The queue is still bound to Red, which the user just left
+    handler = EudHandler.__new__(EudHandler)
+    handler.app = db_app
+    handler.is_ssl = True
+    handler.user = user
+    handler.uid = "uid-1"
+    handler.rabbit_channel = FakeChannel()
+    handler.bound_queues = [
+        {"exchange": "groups", "routing_key": "Red.OUT", "queue": "uid-1"},
+        {
+            "exchange": GROUP_MASK_EXCHANGE,
+            "routing_key": None,
+            "queue": "uid-1",
+            "arguments": binding_arguments(red.bitpos),
+        },
+        {"exchange": "dms", "routing_key": "uid-1", "queue": "uid-1"},
+    ]
+
+    mask = 1 << blue.bitpos
+    handler.on_message(None, None, None, json.dumps({"uid": None, "group_mask": mask}))
+    assert handler.group_mask == mask
+    assert handler.rabbit_channel.sent == [
+        ("unbind", "groups", "Red.OUT"),
+        ("unbind", GROUP_MASK_EXCHANGE, binding_arguments(red.bitpos)),
+        ("bind", "groups", "Blue.OUT"),
+        ("bind", GROUP_MASK_EXCHANGE, binding_arguments(blue.bitpos)),
+    ]
+    assert [bind["routing_key"] for bind in handler.bound_queues] == ["uid-1", "Blue.OUT", None]
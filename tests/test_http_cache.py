@@ -0,0 +1,97 @@
+import pytest
+from flask import jsonify
+from sqlalchemy import update
+
+from opentakserver.extensions import db
+from opentakserver.http_cache import conditional, ensure_cache_versions, get_versions
+from opentakserver.models.EUD import EUD
+
+calls = {"contacts": 0}
+
+
+@pytest.fixture(scope="module")
+def cache_app(make_sqlite_app):
+    with make_sqlite_app() as app:
+
+        @app.route("/contacts")
+        @conditional("euds")
+        def contacts():
+            calls["contacts"] += 1
+            return jsonify([eud.uid for eud in db.session.execute(db.select(EUD)).scalars()])
+
+        @app.route("/denied")
+        @conditional("euds", principal=lambda: (jsonify({"success": False}), 401))
+        def denied():
+            return jsonify([])
+
+        ensure_cache_versions()
+        yield app
+
+
+def add_eud(uid):
+    eud = EUD()
+    eud.uid = uid
+    db.session.add(eud)
+    db.session.commit()
+
+
+def test_not_modified(cache_app):
+    client = cache_app.test_client()
+    add_eud("http-cache-1")
+
+    response = client.get("/contacts")
+    assert response.status_code == 200
+    assert response.json == ["http-cache-1"]
+    etag = response.headers["ETag"]
+    assert response.headers["Last-Modified"]
+
+    calls_before = calls["contacts"]
+    response = client.get("/contacts", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert calls["contacts"] == calls_before
+
+    # A client without the ETag gets the cached body without the view running
+    response = client.get("/contacts")
+    assert response.status_code == 200
+    assert response.json == ["http-cache-1"]
+    assert calls["contacts"] == calls_before
+
+
+def test_writes_invalidate(cache_app):
+    client = cache_app.test_client()
+    etag = client.get("/contacts").headers["ETag"]
+
+    add_eud("http-cache-2")
+    response = client.get("/contacts", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert "http-cache-2" in response.json
+    etag = response.headers["ETag"]
+
+    # Bulk updates that don't go through a flush also bump the version
+    db.session.execute(update(EUD).where(EUD.uid == "http-cache-2").values(callsign="BRAVO"))
+    db.session.commit()
+    response = client.get("/contacts", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_versions_are_bumped_after_commit(cache_app):
+    before = get_versions(("euds",))[0]
+
+    eud = EUD()
+    eud.uid = "http-cache-3"
+    db.session.add(eud)
+    db.session.flush()
+    # The writer's transaction doesn't touch cache_versions
+    assert get_versions(("euds",))[0] == before
+    db.session.rollback()
+    assert get_versions(("euds",))[0] == before
+
+    add_eud("http-cache-3")
+    assert get_versions(("euds",))[0] != before
+
+
+def test_principal_can_reject(cache_app):
+    response = cache_app.test_client().get("/denied")
+    assert response.status_code == 401
+    assert "ETag" not in response.headers
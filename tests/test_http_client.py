@@ -0,0 +1,72 @@
+import threading
+import time
+
+import httpx
+import pytest
+
+from opentakserver.http_client import HttpClient
+
+
+def client_for(handler, **kwargs):
+    return HttpClient(backoff=0, transport=httpx.MockTransport(handler), **kwargs)
+
+
+def test_retries_idempotent_requests():
+    attempts = []
+
+    def handler(request):
+        attempts.append(request.method)
+        if len(attempts) < 3:
+            return httpx.Response(503)
+        return httpx.Response(200, json={"ok": True})
+
+    client = client_for(handler)
+    response = client.get("http://mediamtx:9997/v3/paths/list")
+    assert response.json() == {"ok": True}
+    assert attempts == ["GET", "GET", "GET"]
+
+    stats = client.stats()["mediamtx:9997"]
+    assert stats["requests"] == 3
+    assert stats["errors"] == 2
+    assert stats["retries"] == 2
+
+    # A POST may have reached the server, so it's only retried if the connection failed
+    attempts.clear()
+    assert client.post("http://mediamtx:9997/v3/config/paths/add/cam").status_code == 503
+    assert attempts == ["POST"]
+
+
+def test_retries_connection_errors():
+    attempts = []
+
+    def handler(request):
+        attempts.append(request.method)
+        raise httpx.ConnectError("Connection refused", request=request)
+
+    client = client_for(handler, retries=1)
+    with pytest.raises(httpx.ConnectError):
+        client.post("https://tak.gov/token")
+    assert attempts == ["POST", "POST"]
+    assert client.stats()["tak.gov"]["errors"] == 2
+
+
+def test_map_runs_concurrently_in_order():
+    running = 0
+    most_running = 0
+    lock = threading.Lock()
+
+    def handler(request):
+        nonlocal running, most_running
+        with lock:
+            running += 1
+            most_running = max(most_running, running)
+        time.sleep(0.05)
+        with lock:
+            running -= 1
+        return httpx.Response(200, text=request.url.path)
+
+    client = client_for(handler, max_concurrency=4)
+    paths = [f"/v3/config/paths/get/cam{i}" for i in range(12)]
+    results = client.map(lambda path: client.get(f"http://mediamtx:9997{path}").text, paths)
+    assert results == paths
+    assert 1 < most_running <= 4
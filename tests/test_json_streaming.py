@@ -0,0 +1,87 @@
+import datetime
+import gzip
+import json
+import math
+
+import pytest
+from flask import jsonify
+from sqlalchemy import select
+
+from opentakserver.extensions import db
+from opentakserver.json_provider import ORJSONProvider
+from opentakserver.models.EUD import EUD
+from opentakserver.streaming import json_array, json_object
+
+
+@pytest.fixture
+def json_app(db_app):
+    app = db_app
+    app.json = ORJSONProvider(app)
+
+    @app.route("/jsonify")
+    def json_response():
+        return jsonify(
+            {
+                "time": datetime.datetime(2024, 1, 2, 3, 4, 5, 123456),
+                "mask": 1 << 70,
+                "b": 1,
+                "a": 2,
+            }
+        )
+
+    return app
+
+
+@pytest.fixture
+def app(sqlite_server):
+    with sqlite_server.app_context():
+        for i in range(5):
+            db.session.add(EUD(uid=f"uid-{i}", callsign=f"callsign-{i}"))
+        # Left out of the list for the web UI's search box
+        db.session.add(EUD(uid="uid-5", callsign=""))
+        db.session.commit()
+    return sqlite_server
+
+
+def test_provider(json_app):
+    response = json_app.test_client().get("/jsonify")
+    # Keys are sorted like Flask's default provider. Integers wider than 64 bits fall back to json
+    assert response.json == {
+        "a": 2,
+        "b": 1,
+        "mask": 1 << 70,
+        "time": "2024-01-02T03:04:05.123456Z",
+    }
+    assert (
+        json_app.json.dumps({"b": 1, "a": datetime.date(2024, 1, 2)}) == '{"a":"2024-01-02","b":1}'
+    )
+    assert math.isnan(json_app.json.loads(b'{"a": NaN}')["a"])
+
+
+def test_eud_list(auth):
+    expected = [{"uid": f"uid-{i}", "callsign": f"callsign-{i}"} for i in range(5)]
+
+    response = auth.get("/api/eud?all=1")
+    assert response.headers.get("Content-Encoding") is None
+    assert response.is_streamed
+    assert sorted(json.loads(response.data), key=lambda eud: eud["uid"]) == expected
+
+    response = auth.get("/api/eud?all=1", headers={**auth.headers, "Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    euds = json.loads(gzip.decompress(response.data))
+    assert sorted(euds, key=lambda eud: eud["uid"]) == expected
+
+
+def test_map_state(auth):
+    response = auth.get("/api/map_state")
+    assert response.is_streamed
+    map_state = json.loads(response.data)
+    assert map_state.keys() == {"euds", "markers", "rb_lines", "casevacs"}
+    assert sorted(eud["uid"] for eud in map_state["euds"]) == [f"uid-{i}" for i in range(6)]
+    assert map_state["markers"] == []
+
+
+def test_empty_array(db_app):
+    assert b"".join(json_array(select(EUD))) == b"[]"
+    assert b"".join(json_object({})) == b"{}"
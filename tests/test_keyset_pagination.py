@@ -0,0 +1,39 @@
+import pytest
+
+from opentakserver.blueprints.ots_api.api import paginate
+from opentakserver.extensions import db
+from opentakserver.models.EUD import EUD
+
+CALLSIGNS = ["alpha", None, "bravo", None, "charlie", "echo", None, "delta"]
+
+
+@pytest.fixture
+def euds(db_app):
+    for i, callsign in enumerate(CALLSIGNS):
+        eud = EUD()
+        eud.uid = f"keyset-{i}"
+        eud.callsign = callsign
+        db.session.add(eud)
+    db.session.commit()
+    return db_app
+
+
+def walk(app, sort_direction):
+    uids = []
+    after = ""
+    while after is not None:
+        path = f"/?sort_by=callsign&sort_direction={sort_direction}&per_page=3&after={after}"
+        with app.test_request_context(path):
+            page = paginate(db.session.query(EUD)).json
+        uids += [eud["uid"] for eud in page["results"]]
+        after = page["next_cursor"]
+    return uids
+
+
+@pytest.mark.parametrize("sort_direction", ["asc", "desc"])
+def test_nulls_are_not_skipped(euds, sort_direction):
+    uids = walk(euds, sort_direction)
+
+    assert sorted(uids) == sorted(f"keyset-{i}" for i in range(len(CALLSIGNS)))
+    # NULL callsigns come last in both directions
+    assert set(uids[-3:]) == {"keyset-1", "keyset-3", "keyset-6"}
@@ -0,0 +1,166 @@
+import json
+
+import pytest
+
+from opentakserver import map_deltas
+from opentakserver.controllers.map_delta_controller import MapDeltaController
+from opentakserver.map_deltas import MAP_UPDATES_EXCHANGE, MapDeltas, encode, publish
+
+ROOMS = ["map:all:", "map:0:"]
+OTHER_ROOMS = ["map:all:", "map:1:"]
+
+
+def point(uid="ANDROID-1", latitude=38.8977, longitude=-77.0365, battery=80.0):
+    return {
+        "uid": uid,
+        "latitude": latitude,
+        "longitude": longitude,
+        "battery": battery,
+        "callsign": "ALPHA",
+    }
+
+
+class FakeChannel:
+    def __init__(self):
+        self.published = []
+
+    def basic_publish(self, exchange, routing_key, body, properties):
+        self.published.append((exchange, routing_key, body, properties))
+
+    def exchange_declare(self, *args, **kwargs):
+        pass
+
+    def queue_declare(self, *args, **kwargs):
+        pass
+
+    def add_on_close_callback(self, callback):
+        pass
+
+
+class FakeIOLoop:
+    def __init__(self):
+        self.scheduled = []
+
+    def call_later(self, delay, callback):
+        self.scheduled.append((delay, callback))
+
+
+class FakeConnection:
+    def __init__(self):
+        self.ioloop = FakeIOLoop()
+
+
+def test_first_update_is_sent_in_full():
+    deltas = MapDeltas()
+    deltas.update("point", point(), ROOMS)
+
+    assert deltas.frames(now=0) == [(ROOMS, {"tick": 1, "point": [point()]})]
+    assert len(deltas) == 0
+
+
+def test_only_changed_fields_are_sent():
+    deltas = MapDeltas()
+    deltas.update("point", point(), ROOMS)
+    deltas.frames(now=0)
+
+    deltas.update("point", point(latitude=38.9), ROOMS)
+    delta = {"uid": "ANDROID-1", "latitude": 38.9}
+    assert deltas.frames(now=1) == [(ROOMS, {"tick": 2, "point": [delta]})]
+
+
+def test_unchanged_updates_are_not_sent():
+    deltas = MapDeltas()
+    deltas.update("point", point(), ROOMS)
+    deltas.frames(now=0)
+
+    deltas.update("point", point(), ROOMS)
+    assert deltas.frames(now=1) == []
+
+
+def test_latest_update_per_uid_wins():
+    deltas = MapDeltas()
+    deltas.update("point", point(battery=80.0), ROOMS)
+    deltas.update("point", point(battery=70.0), ROOMS)
+    deltas.update("point", point(uid="ANDROID-2"), ROOMS)
+
+    frames = deltas.frames(now=0)
+    assert len(frames) == 1
+    assert frames[0][1]["point"] == [point(battery=70.0), point(uid="ANDROID-2")]
+
+
+def test_one_frame_per_set_of_rooms():
+    deltas = MapDeltas()
+    deltas.update("point", point(), ROOMS)
+    deltas.update("point", point(uid="ANDROID-2"), OTHER_ROOMS)
+    deltas.update("marker", point(uid="marker-1"), ROOMS)
+
+    frames = {tuple(rooms): frame for rooms, frame in deltas.frames(now=0)}
+    assert frames[tuple(ROOMS)] == {
+        "tick": 1,
+        "point": [point()],
+        "marker": [point(uid="marker-1")],
+    }
+    assert frames[tuple(OTHER_ROOMS)] == {"tick": 1, "point": [point(uid="ANDROID-2")]}
+
+
+def test_changing_rooms_sends_everything():
+    deltas = MapDeltas()
+    deltas.update("point", point(), ROOMS)
+    deltas.frames(now=0)
+
+    deltas.update("point", point(latitude=40.0), OTHER_ROOMS)
+    assert deltas.frames(now=1) == [(OTHER_ROOMS, {"tick": 2, "point": [point(latitude=40.0)]})]
+
+
+def test_keyframes():
+    deltas = MapDeltas(keyframe_seconds=30)
+    deltas.update("point", point(), ROOMS)
+    deltas.frames(now=0)
+
+    deltas.update("point", point(battery=70.0), ROOMS)
+    assert deltas.frames(now=10)[0][1]["point"] == [{"uid": "ANDROID-1", "battery": 70.0}]
+
+    deltas.update("point", point(battery=60.0), ROOMS)
+    assert deltas.frames(now=30)[0][1]["point"] == [point(battery=60.0)]
+
+
+def test_old_state_is_pruned():
+    deltas = MapDeltas(keyframe_seconds=30)
+    deltas._pruned_at = 0
+    deltas.update("point", point(), ROOMS)
+    deltas.frames(now=0)
+    assert len(deltas._sent) == 1
+
+    deltas.frames(now=30)
+    assert len(deltas._sent) == 0
+
+
+def test_publish():
+    channel = FakeChannel()
+    publish(channel, "point", point(), 0b1, "1000")
+
+    exchange, routing_key, body, properties = channel.published[0]
+    assert exchange == MAP_UPDATES_EXCHANGE
+    assert json.loads(body) == {"event": "point", "data": point(), "mask": 1}
+    assert properties.expiration == "1000"
+
+
+def test_encode():
+    frame = {"tick": 1, "point": [point()]}
+    assert encode(frame) is frame
+
+    if map_deltas.msgpack is None:
+        pytest.skip("msgpack isn't installed")
+    assert map_deltas.msgpack.unpackb(encode(frame, binary=True)) == frame
+
+
+def test_reopened_channel_keeps_one_tick_loop():
+    # Skip __init__, it connects to RabbitMQ
+    controller = MapDeltaController.__new__(MapDeltaController)
+    controller.tick_rate = 4
+    controller.ticking = False
+    controller.rabbit_connection = FakeConnection()
+
+    controller.on_channel_open(FakeChannel())
+    controller.on_channel_open(FakeChannel())
+    assert controller.rabbit_connection.ioloop.scheduled == [(0.25, controller.tick)]
@@ -0,0 +1,40 @@
+import datetime
+
+from opentakserver.models.MissionChange import (
+    MissionChange,
+    squash_mission_changes,
+)
+
+START = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def change(i, change_type, mission_uid=None, content_uid=None):
+    mission_change = MissionChange()
+    mission_change.id = i
+    mission_change.change_type = change_type
+    mission_change.mission_uid = mission_uid
+    mission_change.content_uid = content_uid
+    mission_change.server_time = START + datetime.timedelta(seconds=i)
+    return mission_change
+
+
+def test_squash_keeps_latest_change_per_uid():
+    changes = [
+        change(1, MissionChange.CREATE_MISSION),
+        change(2, MissionChange.ADD_CONTENT, mission_uid="marker-1"),
+        change(3, MissionChange.ADD_CONTENT, content_uid="hash-1"),
+        change(4, MissionChange.CHANGE, mission_uid="marker-1"),
+        change(5, MissionChange.CHANGE, mission_uid="marker-1"),
+    ]
+    assert [c.id for c in squash_mission_changes(changes)] == [1, 3, 5]
+
+
+def test_squash_drops_content_added_and_removed():
+    changes = [
+        change(1, MissionChange.ADD_CONTENT, content_uid="hash-1"),
+        change(2, MissionChange.ADD_CONTENT, mission_uid="marker-1"),
+        change(3, MissionChange.REMOVE_CONTENT, content_uid="hash-1"),
+        # Removing content that was added before the window still has to reach the client
+        change(4, MissionChange.REMOVE_CONTENT, mission_uid="marker-2"),
+    ]
+    assert [c.id for c in squash_mission_changes(changes)] == [2, 4]
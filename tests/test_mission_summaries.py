@@ -0,0 +1,85 @@
+import pytest
+from sqlalchemy import select
+
+from opentakserver.extensions import db
+from opentakserver.models.Group import Group
+from opentakserver.models.GroupMission import GroupMission
+from opentakserver.models.Mission import Mission
+from opentakserver.models.MissionSummary import (
+    MissionSummary,
+    mission_summaries,
+    summary_query,
+)
+
+
+@pytest.fixture
+def app(db_app):
+    db_app.config["OTS_SSL_STREAMING_PORT"] = 8089
+    db_app.config["OTS_MARTI_HTTPS_PORT"] = 8443
+
+    with db_app.test_request_context("https://ots.example.com/Marti/api/missions"):
+        yield db_app
+
+
+def add_missions():
+    group = Group()
+    group.name = "Cyan"
+    group.type = Group.SYSTEM
+    db.session.add(group)
+    for name, tool, password_protected in (
+        ("alpha", "public", None),
+        ("bravo", "public", True),
+        ("charlie", "VBM", False),
+    ):
+        db.session.add(
+            Mission(name=name, tool=tool, password_protected=password_protected, expiration=-1)
+        )
+    db.session.commit()
+    return group
+
+
+def stored():
+    return set(db.session.execute(select(MissionSummary.mission_name)).scalars())
+
+
+def test_summaries_are_built_once(app):
+    add_missions()
+    summaries = mission_summaries(summary_query().order_by(Mission.name))
+    assert [summary["name"] for summary in summaries] == ["alpha", "bravo", "charlie"]
+    assert (
+        summaries[0]["qr_code"] == "ots.example.com:8089:ssl,ots.example.com-8443-ssl-alpha,alpha"
+    )
+    assert stored() == {"alpha", "bravo", "charlie"}
+
+    # The stored summary doesn't include the request dependent QR code
+    summary = db.session.get(MissionSummary, "alpha").summary
+    assert "qr_code" not in summary
+    assert mission_summaries(summary_query().where(Mission.name == "alpha")) == [summaries[0]]
+
+
+def test_writes_invalidate_summaries(app):
+    group = add_missions()
+    mission_summaries(summary_query())
+
+    db.session.add(GroupMission(mission_name="alpha", group_id=group.id))
+    db.session.commit()
+    assert stored() == {"bravo", "charlie"}
+    alpha = mission_summaries(summary_query().where(Mission.name == "alpha"))[0]
+    assert alpha["groups"] == ["Cyan"]
+
+    db.session.get(Mission, "bravo").description = "Updated"
+    db.session.commit()
+    assert stored() == {"alpha", "charlie"}
+
+    # Groups are shared by every mission
+    group.description = "Renamed"
+    db.session.commit()
+    assert stored() == set()
+
+
+def test_filters(app):
+    add_missions()
+    query = summary_query().where(Mission.password_protected.is_not(True)).order_by(Mission.name)
+    assert [summary["name"] for summary in mission_summaries(query)] == ["alpha", "charlie"]
+    query = summary_query().where(Mission.tool == "VBM")
+    assert [summary["name"] for summary in mission_summaries(query)] == ["charlie"]
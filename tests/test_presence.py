@@ -0,0 +1,89 @@
+import json
+
+from opentakserver.controllers.presence_controller import PresenceController
+from opentakserver.presence import (
+    CONNECTED,
+    DISCONNECTED,
+    HEARTBEAT,
+    PresenceRegistry,
+    presence_message,
+)
+
+
+def uids(sessions):
+    return [session.uid for session in sessions]
+
+
+def test_connect_and_disconnect():
+    # count() and online() use the current time, so use a TTL that never expires
+    registry = PresenceRegistry(ttl=1e12)
+    assert registry.apply(presence_message(CONNECTED, "session-1", "uid-1", "ALPHA"), now=0)
+    assert not registry.apply(presence_message(HEARTBEAT, "session-1", "uid-1"), now=10)
+    assert registry.count() == 1
+    assert registry.online()[0].callsign == "ALPHA"
+
+    assert registry.apply(presence_message(DISCONNECTED, "session-1", "uid-1"), now=20)
+    assert registry.count() == 0
+
+
+def test_reconnect_keeps_eud_online():
+    registry = PresenceRegistry(ttl=1e12)
+    registry.apply(presence_message(CONNECTED, "old", "uid-1"), now=0)
+    # The EUD reconnects before the old handler notices the dead socket
+    assert not registry.apply(presence_message(CONNECTED, "new", "uid-1"), now=5)
+    assert not registry.apply(presence_message(DISCONNECTED, "old", "uid-1"), now=6)
+    assert registry.is_online("uid-1")
+    assert registry.count() == 1
+
+
+def test_sessions_without_heartbeats_expire():
+    registry = PresenceRegistry(ttl=30)
+    registry.apply(presence_message(CONNECTED, "session-1", "uid-1"), now=0)
+    registry.apply(presence_message(CONNECTED, "session-2", "uid-2"), now=0)
+    registry.apply(presence_message(HEARTBEAT, "session-2", "uid-2"), now=25)
+
+    assert uids(registry.expire(now=40)) == ["uid-1"]
+    assert uids(registry.expire(now=50)) == []
+    assert uids(registry.expire(now=60)) == ["uid-2"]
+
+
+def test_reads_do_not_lose_expired_uids(monkeypatch):
+    registry = PresenceRegistry(ttl=30)
+    registry.apply(presence_message(CONNECTED, "session-1", "uid-1"), now=0)
+    registry.apply(presence_message(CONNECTED, "session-2", "uid-2"), now=0)
+
+    monkeypatch.setattr("opentakserver.presence.time.time", lambda: 40)
+    assert registry.count() == 0
+    # uid-2 came back before the controller checked for expired sessions
+    registry.apply(presence_message(CONNECTED, "session-3", "uid-2"), now=45)
+    assert uids(registry.expire(now=50)) == ["uid-1"]
+    assert uids(registry.expire(now=50)) == []
+
+
+def test_presence_is_sent_to_the_eud_groups(monkeypatch):
+    emitted = []
+
+    class FakeSocketIO:
+        def emit(self, event, data, namespace=None, to=None):
+            emitted.append((event, to))
+
+    registry = PresenceRegistry(ttl=30)
+    monkeypatch.setattr("opentakserver.controllers.presence_controller.registry", registry)
+    # Skip __init__, it connects to RabbitMQ
+    controller = PresenceController.__new__(PresenceController)
+    controller.socketio = FakeSocketIO()
+
+    message = presence_message(CONNECTED, "session-1", "uid-1", group_mask=0b100)
+    controller.on_message(None, None, None, json.dumps(message))
+    assert emitted == [("presence", ["group:all", "group:2"])]
+
+    # The mask of a session that expired is remembered
+    registry.apply(presence_message(HEARTBEAT, "session-1", "uid-1", group_mask=0b10), now=0)
+    emitted.clear()
+    for session in registry.expire(now=40):
+        controller.emit(session.uid, False, session.group_mask)
+    assert emitted == [("presence", ["group:all", "group:1"])]
+
+    # Without a mask, only administrators are told
+    controller.emit("uid-2", True, None)
+    assert emitted[-1] == ("presence", ["group:all"])
@@ -0,0 +1,113 @@
+import csv
+import datetime
+import io
+import os
+import sys
+import threading
+import types
+import zipfile
+
+import pytest
+
+from opentakserver.blueprints.ots_api.package_api import create_product_infz
+from opentakserver.extensions import db
+from opentakserver.models.Packages import Packages
+
+
+@pytest.fixture
+def packages_app(db_app, tmp_path):
+    db_app.config["OTS_DATA_FOLDER"] = str(tmp_path)
+    return db_app, tmp_path
+
+
+def add_package(package_name, atak_version="5.5.0", icon=None):
+    package = Packages()
+    package.platform = "Android"
+    package.plugin_type = "plugin"
+    package.package_name = package_name
+    package.name = package_name.split(".")[-1]
+    package.file_name = f"{package_name}.apk"
+    package.version = "1.0"
+    package.revision_code = 1
+    package.description = 'A plugin, with "quotes"'
+    package.apk_hash = "0" * 64
+    package.file_size = 1024
+    package.icon = icon
+    package.icon_filename = f"{package_name}.png" if icon else None
+    package.publish_time = datetime.datetime.now(datetime.timezone.utc)
+    package.atak_version = atak_version
+    db.session.add(package)
+    db.session.commit()
+    return package
+
+
+def read_index(path):
+    with zipfile.ZipFile(path) as zipf:
+        rows = list(csv.reader(io.StringIO(zipf.read("product.inf").decode())))
+        return rows, zipf.namelist()
+
+
+def test_product_infz(packages_app):
+    app, folder = packages_app
+    add_package("com.example.one", icon=b"\x89PNG one")
+    package = add_package("com.example.two")
+    add_package("com.example.other", atak_version="5.4.0")
+
+    create_product_infz("5.5.0")
+    path = os.path.join(folder, "packages", "5.5.0", "product.infz")
+    rows, names = read_index(path)
+    assert [row[2] for row in rows] == ["com.example.one", "com.example.two"]
+    assert rows[0][8] == 'A plugin, with "quotes"'
+    assert "com.example.one.png" in names
+
+    # Editing a package updates its own entry
+    package.version = "2.0"
+    db.session.commit()
+    create_product_infz("5.5.0")
+    rows, names = read_index(path)
+    assert rows[1][4] == "2.0"
+
+    # No temp files are left in the packages folder
+    assert sorted(os.listdir(os.path.dirname(path))) == [".product.infz.lock", "product.infz"]
+
+
+def test_concurrent_regenerations(packages_app):
+    app, folder = packages_app
+    for i in range(20):
+        add_package(f"com.example.plugin{i}", icon=os.urandom(1024))
+
+    errors = []
+
+    def regenerate():
+        try:
+            with app.app_context():
+                create_product_infz("5.5.0")
+        except BaseException as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=regenerate) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    rows, names = read_index(os.path.join(folder, "packages", "5.5.0", "product.infz"))
+    assert len(rows) == 20
+
+
+def test_product_infz_without_fcntl(packages_app, monkeypatch):
+    app, folder = packages_app
+    add_package("com.example.one")
+
+    # Pretend to be on Windows, where there's no fcntl
+    calls = []
+    msvcrt = types.SimpleNamespace(LK_LOCK=1, LK_UNLCK=0)
+    msvcrt.locking = lambda fd, mode, nbytes: calls.append(mode)
+    monkeypatch.setitem(sys.modules, "fcntl", None)
+    monkeypatch.setitem(sys.modules, "msvcrt", msvcrt)
+
+    create_product_infz("5.5.0")
+    rows, names = read_index(os.path.join(folder, "packages", "5.5.0", "product.infz"))
+    assert len(rows) == 1
+    assert calls == [msvcrt.LK_LOCK, msvcrt.LK_UNLCK]
@@ -0,0 +1,74 @@
+import datetime
+
+import pytest
+
+from opentakserver.extensions import db
+from opentakserver.models.CoT import CoT
+from opentakserver.models.EUD import EUD
+from opentakserver.models.Point import Point
+
+# Statements a request may use regardless of how many rows are returned (auth, session, the query itself
+# and one selectinload per relationship)
+MAX_STATEMENTS_PER_REQUEST = 20
+
+
+@pytest.fixture
+def app(sqlite_server):
+    return sqlite_server
+
+
+@pytest.fixture
+def seeded(app, auth):
+    with app.app_context():
+        now = datetime.datetime.now(datetime.timezone.utc)
+        for i in range(30):
+            uid = f"query-count-eud-{i}"
+            if db.session.query(EUD).filter_by(uid=uid).first():
+                continue
+            eud = EUD()
+            eud.uid = uid
+            eud.callsign = f"QC-{i}"
+            eud.last_event_time = now
+            db.session.add(eud)
+
+            cot = CoT()
+            cot.uid = uid
+            cot.how = "m-g"
+            cot.type = "a-f-G-U-C"
+            cot.sender_uid = uid
+            cot.timestamp = now
+            cot.start = now
+            cot.stale = now + datetime.timedelta(minutes=5)
+            cot.xml = "<event />"
+            db.session.add(cot)
+            db.session.flush()
+
+            point = Point()
+            point.uid = uid
+            point.device_uid = uid
+            point.latitude = 1
+            point.longitude = 1
+            point.timestamp = now
+            point.cot_id = cot.id
+            db.session.add(point)
+        db.session.commit()
+    return auth
+
+
+@pytest.mark.parametrize("path", ["/api/eud", "/api/point", "/api/cot"])
+def test_listing_statement_count_does_not_grow_with_rows(seeded, count_queries, path):
+    with count_queries() as small_page:
+        assert seeded.get(f"{path}?per_page=5").status_code == 200
+
+    with count_queries() as large_page:
+        assert seeded.get(f"{path}?per_page=25").status_code == 200
+
+    assert large_page.count == small_page.count, large_page.statements
+    assert large_page.count <= MAX_STATEMENTS_PER_REQUEST, large_page.statements
+
+
+def test_map_state_statement_count(seeded, count_queries):
+    with count_queries() as counter:
+        assert seeded.get("/api/map_state").status_code == 200
+
+    assert counter.count <= MAX_STATEMENTS_PER_REQUEST, counter.statements
@@ -0,0 +1,158 @@
+"""Query plan regression tests for the hot queries in cot_parser, the Marti API, the OTS API and scheduled_jobs.
+
+Every query is run through EXPLAIN against a seeded database and fails if the planner falls back to a sequential scan
+of one of the large tables. Uses an in memory SQLite DB by default. Set OTS_TEST_DATABASE_URI to run against PostgreSQL.
+"""
+
+import datetime
+import os
+
+import pytest
+from sqlalchemy import select, text
+
+from opentakserver.extensions import db
+from opentakserver.models.Alert import Alert
+from opentakserver.models.CoT import CoT
+from opentakserver.models.EUD import EUD
+from opentakserver.models.GeoChat import GeoChat
+from opentakserver.models.Group import Group
+from opentakserver.models.GroupUser import GroupUser
+from opentakserver.models.Icon import Icon
+from opentakserver.models.Marker import Marker
+from opentakserver.models.MissionChange import MissionChange
+from opentakserver.models.MissionRole import MissionRole
+from opentakserver.models.MissionUID import MissionUID
+from opentakserver.models.Point import Point
+from opentakserver.models.RBLine import RBLine
+
+SEED_ROWS = 2000
+now = datetime.datetime.now(datetime.timezone.utc)
+hour_ago = now - datetime.timedelta(hours=1)
+
+HOT_QUERIES = {
+    # cot_marti_api.get_cot and mission_marti_api.mission_contents
+    "cot_by_uid": select(CoT).where(CoT.uid == "uid-1"),
+    # cot_marti_api.get_all_cot
+    "cot_by_uid_and_start": select(CoT).where(CoT.uid == "uid-1", CoT.start >= hour_ago),
+    # mission_marti_api.get_mission_cots
+    "cot_by_mission_name": select(CoT).where(CoT.mission_name == "mission-1"),
+    # api.get_map_state
+    "cot_not_stale": select(CoT).where(CoT.stale >= now),
+    # scheduled_jobs.delete_old_data
+    "cot_retention": select(CoT).where(CoT.timestamp <= hour_ago),
+    "point_retention": select(Point).where(Point.timestamp <= hour_ago),
+    "alert_retention": select(Alert).where(Alert.start_time <= hour_ago),
+    "rb_line_retention": select(RBLine).where(RBLine.timestamp <= hour_ago),
+    "geochat_retention": select(GeoChat).where(GeoChat.timestamp <= hour_ago),
+    "marker_retention": select(Marker).where(Marker.production_timestamp <= hour_ago),
+    "mission_change_retention": select(MissionChange).where(MissionChange.timestamp <= hour_ago),
+    "mission_uid_retention": select(MissionUID).where(MissionUID.timestamp <= hour_ago),
+    "mission_role_retention": select(MissionRole).where(MissionRole.createTime <= hour_ago),
+    "eud_retention": select(EUD).where(EUD.last_event_time <= hour_ago),
+    # marti_api.atak_track_history
+    "track_history": select(Point).where(
+        Point.device_uid == "uid-1", Point.timestamp >= hour_ago, Point.timestamp <= now
+    ),
+    # mission_marti_api.mission_changes
+    "mission_changes": select(MissionChange).where(MissionChange.mission_name == "mission-1"),
+    # cot_parser.generate_mission_change and cot_parser.parse_point
+    "mission_uid_by_uid": select(MissionUID).where(MissionUID.uid == "uid-1"),
+    "mission_uids_by_mission": select(MissionUID).where(MissionUID.mission_name == "mission-1"),
+    # cot_parser.route_cot and api.route_cot
+    "group_memberships": select(GroupUser).where(
+        GroupUser.user_id == 1,
+        GroupUser.direction == Group.IN,
+        GroupUser.enabled == True,  # noqa: E712
+    ),
+    # cot_parser.parse_marker
+    "icon_by_filename": select(Icon).where(Icon.filename == "marker-icon.png"),
+    # api.status
+    "online_euds": select(EUD).where(EUD.last_status == "Connected"),
+    # GeoChat history for a chatroom
+    "geochat_by_chatroom": select(GeoChat).where(GeoChat.chatroom_id == "All Chat Rooms"),
+}
+
+
+@pytest.fixture(scope="module")
+def plan_app(make_sqlite_app):
+    with make_sqlite_app(os.environ.get("OTS_TEST_DATABASE_URI", "sqlite://")) as app:
+        seed(db.session)
+        yield app
+        db.session.rollback()
+
+
+def seed(session):
+    for i in range(SEED_ROWS):
+        timestamp = now - datetime.timedelta(seconds=i)
+        uid = f"uid-{i % 50}"
+        session.execute(
+            CoT.__table__.insert().values(
+                id=i + 1,
+                uid=uid,
+                how="m-g",
+                type="a-f-G-U-C",
+                timestamp=timestamp,
+                start=timestamp,
+                stale=timestamp + datetime.timedelta(minutes=5),
+                xml="<event />",
+                mission_name=f"mission-{i % 100}" if i % 2 else None,
+            )
+        )
+        session.execute(
+            Point.__table__.insert().values(
+                id=i + 1,
+                uid=uid,
+                device_uid=None,
+                latitude=(i % 180) - 90,
+                longitude=(i % 360) - 180,
+                timestamp=timestamp,
+                cot_id=i + 1,
+            )
+        )
+        session.execute(
+            Icon.__table__.insert().values(id=i + 1, filename=f"icon-{i}.png", groupName="test")
+        )
+    session.commit()
+
+    if db.engine.dialect.name == "sqlite":
+        session.execute(text("ANALYZE"))
+    elif db.engine.dialect.name == "postgresql":
+        session.execute(text("ANALYZE"))
+        # Only pick a sequential scan when there is no usable index
+        session.execute(text("SET enable_seqscan = off"))
+
+
+def explain(statement) -> list[str]:
+    dialect = db.engine.dialect
+    compiled = statement.compile(dialect=dialect)
+    if dialect.name == "sqlite":
+        params = tuple(
+            (
+                compiled.params[name].isoformat(" ")
+                if isinstance(compiled.params[name], datetime.datetime)
+                else compiled.params[name]
+            )
+            for name in compiled.positiontup
+        )
+        rows = db.session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params)
+        return [row[-1] for row in rows]
+
+    rows = db.session.connection().exec_driver_sql(f"EXPLAIN {compiled}", compiled.params)
+    return [row[0] for row in rows]
+
+
+def is_sequential_scan(plan_line: str) -> bool:
+    plan_line = plan_line.strip()
+    # SQLite: "SCAN cot" or "SCAN TABLE cot" without an index
+    if plan_line.startswith("SCAN") and "USING" not in plan_line:
+        return True
+    # PostgreSQL
+    return "Seq Scan" in plan_line
+
+
+@pytest.mark.parametrize("name", sorted(HOT_QUERIES.keys()))
+def test_hot_query_uses_index(plan_app, name):
+    plan = explain(HOT_QUERIES[name])
+    assert plan
+    sequential_scans = [line for line in plan if is_sequential_scan(line)]
+    assert not sequential_scans, f"{name} does a sequential scan: {plan}"
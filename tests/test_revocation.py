@@ -0,0 +1,138 @@
+import datetime
+import os
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.x509 import ocsp
+
+from opentakserver import ca_engine, revocation
+from opentakserver.extensions import db
+from opentakserver.models.Certificate import Certificate
+from opentakserver.revocation import revoked_certificates
+
+
+def issue(authority, common_name):
+    key = ca_engine.generate_key()
+    csr = ca_engine.build_csr(key, ca_engine.parse_subject("/CN={}".format(common_name)))
+    cert, pem = authority.sign(csr, common_name)
+
+    certificate = Certificate()
+    certificate.common_name = common_name
+    certificate.expiration_date = cert.not_valid_after_utc
+    certificate.server_address = "tak.example.com"
+    certificate.server_port = 8089
+    certificate.truststore_filename = authority.path("truststore-root.p12")
+    certificate.user_cert_filename = authority.path("certs", common_name, common_name + ".pem")
+    certificate.cert_password = "atakatak"
+    certificate.serial_number = revocation.serial_number(pem)
+    db.session.add(certificate)
+    db.session.commit()
+    return cert, certificate
+
+
+def load_crl(authority, filename):
+    with open(authority.path(filename), "rb") as f:
+        return x509.load_pem_x509_crl(f.read())
+
+
+def test_revocations_are_written_to_the_full_and_delta_crls(ca_app):
+    authority, folder = ca_app
+    first, first_row = issue(authority, "alpha")
+    second, second_row = issue(authority, "bravo")
+    base_number = revocation.crl_number(load_crl(authority, revocation.BASE_CRL))
+
+    assert revocation.revoke([first_row]) == [first_row.serial_number]
+    assert revoked_certificates.is_revoked(first.serial_number)
+    assert not revoked_certificates.is_revoked(second.serial_number)
+
+    # The full CRL that nginx reads is signed again right away
+    base = load_crl(authority, revocation.BASE_CRL)
+    assert base.is_signature_valid(authority.load_ca().certificate.public_key())
+    assert revocation.crl_number(base) > base_number
+    assert [entry.serial_number for entry in base] == [first.serial_number]
+
+    delta = load_crl(authority, revocation.DELTA_CRL)
+    assert delta.is_signature_valid(authority.load_ca().certificate.public_key())
+    assert revocation.delta_base(delta) == base_number
+    assert revocation.crl_number(delta) > revocation.crl_number(base)
+    assert [entry.serial_number for entry in delta] == [first.serial_number]
+
+    # The delta keeps applying to the same full CRL
+    revocation.revoke([second_row])
+    delta = load_crl(authority, revocation.DELTA_CRL)
+    assert revocation.delta_base(delta) == base_number
+    assert sorted(entry.serial_number for entry in delta) == sorted(
+        [first.serial_number, second.serial_number]
+    )
+
+    # Once the delta grows too large it starts over from the full CRL
+    third, third_row = issue(authority, "charlie")
+    revocation.revoke([third_row])
+    base = load_crl(authority, revocation.BASE_CRL)
+    assert revocation.crl_number(base) > revocation.crl_number(delta)
+    assert sorted(entry.serial_number for entry in base) == sorted(
+        [first.serial_number, second.serial_number, third.serial_number]
+    )
+    assert not os.path.exists(authority.path(revocation.DELTA_CRL))
+
+
+def test_revocation_set_only_reads_new_rows(ca_app, monkeypatch):
+    authority, folder = ca_app
+    cert, row = issue(authority, "alpha")
+    assert not revoked_certificates.is_revoked(cert.serial_number)
+
+    # Revoked by another process, picked up once the set is stale
+    row.revoked_at = datetime.datetime.now(datetime.timezone.utc)
+    db.session.commit()
+    assert not revoked_certificates.is_revoked(cert.serial_number)
+    monkeypatch.setitem(authority.app.config, "OTS_REVOCATION_REFRESH_SECONDS", 0)
+    assert revoked_certificates.is_revoked(cert.serial_number)
+
+
+def ocsp_request(cert, issuer):
+    request = ocsp.OCSPRequestBuilder().add_certificate(cert, issuer, hashes.SHA1()).build()
+    return request.public_bytes(serialization.Encoding.DER)
+
+
+def test_ocsp_responses(ca_app):
+    authority, folder = ca_app
+    ca = authority.load_ca()
+    cert, row = issue(authority, "alpha")
+
+    der, max_age = revocation.ocsp_response(ocsp_request(cert, ca.certificate))
+    assert max_age == 300
+    response = ocsp.load_der_ocsp_response(der)
+    assert response.response_status == ocsp.OCSPResponseStatus.SUCCESSFUL
+    assert response.certificate_status == ocsp.OCSPCertStatus.GOOD
+    assert response.serial_number == cert.serial_number
+    ca.certificate.public_key().verify(
+        response.signature,
+        response.tbs_response_bytes,
+        padding.PKCS1v15(),
+        response.signature_hash_algorithm,
+    )
+
+    # Cached until something is revoked
+    assert revocation.ocsp_response(ocsp_request(cert, ca.certificate))[0] == der
+
+    revocation.revoke([row])
+    response = ocsp.load_der_ocsp_response(
+        revocation.ocsp_response(ocsp_request(cert, ca.certificate))[0]
+    )
+    assert response.certificate_status == ocsp.OCSPCertStatus.REVOKED
+
+    # Requests for another CA's certs and garbage are refused
+    other_key = ca_engine.generate_key()
+    other_ca = ca_engine.CA(
+        ca_engine.create_ca_certificate(other_key, ca_engine.parse_subject("/CN=Other"), 30),
+        other_key,
+    )
+    other_csr = ca_engine.build_csr(ca_engine.generate_key(), ca_engine.parse_subject("/CN=x"))
+    other_cert = ca_engine.sign_csr(other_ca, other_csr, 30)
+    response = ocsp.load_der_ocsp_response(
+        revocation.ocsp_response(ocsp_request(other_cert, other_ca.certificate))[0]
+    )
+    assert response.response_status == ocsp.OCSPResponseStatus.UNAUTHORIZED
+    response = ocsp.load_der_ocsp_response(revocation.ocsp_response(b"garbage")[0])
+    assert response.response_status == ocsp.OCSPResponseStatus.MALFORMED_REQUEST
@@ -0,0 +1,161 @@
+from opentakserver.blueprints import ots_socketio
+from opentakserver.extensions import db
+from opentakserver.models.Group import Group
+from opentakserver.models.GroupUser import GroupUser
+from opentakserver.models.user import User
+from opentakserver.socketio_rooms import (
+    NAMESPACE,
+    emit_group_event,
+    emit_map_event,
+    group_rooms,
+    location_rooms,
+    room_groups,
+    viewer_groups,
+    viewport_rooms,
+)
+from opentakserver.spatial import geohash_encode
+
+
+class Point:
+    def __init__(self, latitude, longitude):
+        self.latitude = latitude
+        self.longitude = longitude
+
+
+class FakeSocketIO:
+    def __init__(self):
+        self.emitted = []
+        self.server = FakeServer()
+
+    def emit(self, event, data, namespace=None, to=None):
+        self.emitted.append((event, data, namespace, to))
+
+
+class FakeServer:
+    def __init__(self):
+        self.manager = self
+        self.sid_rooms = {}
+
+    def is_connected(self, sid, namespace):
+        return sid in self.sid_rooms
+
+    def rooms(self, sid, namespace=None):
+        return list(self.sid_rooms[sid])
+
+    def enter_room(self, sid, room, namespace=None):
+        self.sid_rooms[sid].add(room)
+
+    def leave_room(self, sid, room, namespace=None):
+        self.sid_rooms[sid].discard(room)
+
+
+def receives(viewer_rooms, emitted_rooms) -> bool:
+    return bool(set(viewer_rooms) & set(emitted_rooms))
+
+
+def test_room_groups():
+    assert room_groups(None) == ["public"]
+    assert room_groups(0b101) == ["all", 0, 2]
+
+
+def test_viewer_groups():
+    assert viewer_groups(0b10) == ["public", 1]
+    assert viewer_groups(0b10, administrator=True) == ["all", "public"]
+
+
+def test_location_rooms_has_every_prefix():
+    geohash = geohash_encode(38.8977, -77.0365, 5)
+    rooms = location_rooms(0b1, 38.8977, -77.0365)
+
+    assert "map:0:" in rooms
+    assert f"map:0:{geohash}" in rooms
+    assert f"map:all:{geohash[:2]}" in rooms
+    assert len(rooms) == 2 * 6
+
+
+def test_location_rooms_without_location():
+    assert location_rooms(0b1, None, None) == ["map:all:", "map:0:"]
+
+
+def test_viewport_rooms():
+    assert viewport_rooms(["public"], None) == ["map:public:"]
+
+    rooms = viewport_rooms(["public", 1], (-77.1, 38.8, -77.0, 38.9))
+    assert rooms
+    assert all(len(room.split(":")[2]) <= 5 for room in rooms)
+    assert {room.split(":")[1] for room in rooms} == {"public", "1"}
+
+
+def test_viewers_only_receive_their_groups_inside_their_viewport():
+    emitted = location_rooms(0b10, 38.8977, -77.0365)
+
+    washington = (-77.1, 38.8, -77.0, 38.9)
+    london = (-0.2, 51.4, 0.0, 51.6)
+
+    assert receives(viewport_rooms(viewer_groups(0b10), washington), emitted)
+    assert receives(viewport_rooms(viewer_groups(0b10), None), emitted)
+    assert not receives(viewport_rooms(viewer_groups(0b10), london), emitted)
+    assert not receives(viewport_rooms(viewer_groups(0b100), washington), emitted)
+    assert receives(viewport_rooms(viewer_groups(0, administrator=True), washington), emitted)
+
+
+def test_public_items_reach_everyone():
+    emitted = location_rooms(None, 38.8977, -77.0365)
+
+    washington = (-77.1, 38.8, -77.0, 38.9)
+    assert receives(viewport_rooms(viewer_groups(0b100), washington), emitted)
+    assert receives(viewport_rooms(viewer_groups(0, administrator=True), washington), emitted)
+
+
+def test_emit_map_event():
+    socketio = FakeSocketIO()
+    emit_map_event(socketio, "point", {"uid": "a"}, 0b1, Point(38.8977, -77.0365))
+    emit_map_event(socketio, "marker", {"uid": "b"}, 0b1)
+
+    event, data, namespace, to = socketio.emitted[0]
+    assert (event, data, namespace) == ("point", {"uid": "a"}, NAMESPACE)
+    assert to == location_rooms(0b1, 38.8977, -77.0365)
+    assert socketio.emitted[1][3] == ["map:all:", "map:0:"]
+
+
+def test_emit_group_event():
+    socketio = FakeSocketIO()
+    emit_group_event(socketio, "eud", {"uid": "a"}, 0b100)
+
+    assert socketio.emitted == [("eud", {"uid": "a"}, NAMESPACE, ["group:all", "group:2"])]
+    assert receives(group_rooms(viewer_groups(0b100)), socketio.emitted[0][3])
+    assert not receives(group_rooms(viewer_groups(0b1)), socketio.emitted[0][3])
+
+
+def test_rooms_follow_group_changes(db_app, monkeypatch):
+    socketio = FakeSocketIO()
+    monkeypatch.setattr(ots_socketio, "socketio", socketio)
+    monkeypatch.setattr(ots_socketio, "viewers", {})
+
+    user = User(username="viewer", password="password", active=True, fs_uniquifier="viewer")
+    group = Group()
+    group.name = "Cyan"
+    group.type = Group.SYSTEM
+    db.session.add_all([user, group])
+    db.session.commit()
+
+    socketio.server.sid_rooms = {"sid-1": {"sid-1"}}
+    viewer = ots_socketio.Viewer(user.id, administrator=False)
+    ots_socketio.viewers["sid-1"] = viewer
+    ots_socketio.update_rooms("sid-1", viewer)
+    assert f"group:{group.bitpos}" not in socketio.server.sid_rooms["sid-1"]
+
+    membership = GroupUser()
+    membership.user_id = user.id
+    membership.group_id = group.id
+    membership.direction = Group.OUT
+    membership.enabled = True
+    db.session.add(membership)
+    db.session.commit()
+
+    # One web UI disconnected without its disconnect handler running
+    ots_socketio.viewers["sid-2"] = ots_socketio.Viewer(user.id, administrator=False)
+    ots_socketio.refresh_rooms()
+    rooms = socketio.server.sid_rooms["sid-1"]
+    assert {f"group:{group.bitpos}", f"map:{group.bitpos}:", "sid-1"} <= rooms
+    assert "sid-2" not in ots_socketio.viewers
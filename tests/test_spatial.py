@@ -0,0 +1,148 @@
+"""Tests for the geohash bounding box engine in opentakserver.spatial"""
+
+import datetime
+import json
+import os
+import random
+
+import pytest
+from sqlalchemy import insert, select
+
+from opentakserver.extensions import db
+from opentakserver.models.EUD import EUD
+from opentakserver.models.Point import Point
+from opentakserver.spatial import (
+    bbox_filter,
+    geohash_cover,
+    geohash_encode,
+    geohash_ranges,
+    parse_bbox,
+)
+
+BOXES = [
+    (-77.2, 38.7, -76.8, 39.1),
+    (-10.0, -10.0, 10.0, 10.0),
+    (170.0, -20.0, -170.0, 20.0),
+    (-180.0, -90.0, 180.0, 90.0),
+    (2.29, 48.85, 2.30, 48.86),
+]
+
+
+def test_geohash_encode():
+    assert geohash_encode(57.64911, 10.40744, 11) == "u4pruydqqvj"
+    assert geohash_encode(-25.382708, -49.265506, 8) == "6gkzwgjz"
+
+
+@pytest.mark.parametrize("bbox", BOXES)
+def test_cover_contains_points_in_bbox(bbox):
+    left, bottom, right, top = bbox
+    ranges = geohash_ranges(geohash_cover(*bbox))
+    rng = random.Random(0)
+
+    for _ in range(500):
+        latitude = rng.uniform(bottom, top)
+        if left <= right:
+            longitude = rng.uniform(left, right)
+        else:
+            longitude = rng.choice([rng.uniform(left, 180), rng.uniform(-180, right)])
+        geohash = geohash_encode(latitude, longitude)
+        assert any(start <= geohash and (end is None or geohash < end) for start, end in ranges)
+
+
+def test_parse_bbox():
+    assert parse_bbox({}) is None
+    assert parse_bbox({"left": "1", "bottom": "2", "right": "3", "top": "4"}) == (1, 2, 3, 4)
+    with pytest.raises(ValueError):
+        parse_bbox({"left": "1", "bottom": "2"})
+    with pytest.raises(ValueError):
+        parse_bbox({"left": "1", "bottom": "5", "right": "3", "top": "4"})
+    with pytest.raises(ValueError):
+        parse_bbox({"left": "200", "bottom": "2", "right": "3", "top": "4"})
+
+
+@pytest.fixture(scope="module")
+def spatial_app(make_sqlite_app):
+    with make_sqlite_app(os.environ.get("OTS_TEST_DATABASE_URI", "sqlite://")) as app:
+        rng = random.Random(1)
+        now = datetime.datetime.now(datetime.timezone.utc)
+        for i in range(2000):
+            # Core inserts still fill in the geohash through the column default
+            db.session.execute(
+                insert(Point).values(
+                    uid=f"uid-{i}",
+                    latitude=rng.uniform(-90, 90),
+                    longitude=rng.uniform(-180, 180),
+                    timestamp=now,
+                )
+            )
+        db.session.commit()
+        yield app
+        db.session.rollback()
+
+
+@pytest.mark.parametrize("bbox", BOXES)
+def test_bbox_filter_matches_brute_force(spatial_app, bbox):
+    left, bottom, right, top = bbox
+    points = db.session.execute(select(Point)).scalars().all()
+    expected = {
+        point.id
+        for point in points
+        if bottom <= point.latitude <= top
+        and (
+            left <= point.longitude <= right
+            if left <= right
+            else point.longitude >= left or point.longitude <= right
+        )
+    }
+
+    actual = set(db.session.execute(bbox_filter(select(Point.id), bbox)).scalars().all())
+    assert actual == expected
+
+
+def test_geohash_default(spatial_app):
+    point = db.session.execute(select(Point).limit(1)).scalar_one()
+    assert point.geohash == geohash_encode(point.latitude, point.longitude)
+
+
+def test_bbox_filter_uses_index(spatial_app):
+    if db.engine.dialect.name != "sqlite":
+        pytest.skip("The PostgreSQL plan is covered by the GiST index")
+
+    statement = bbox_filter(select(Point.id), BOXES[0])
+    compiled = statement.compile(dialect=db.engine.dialect)
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    plan = db.session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params)
+    plan = " ".join(row[-1] for row in plan)
+    assert "ix_points_geohash" in plan
+
+
+@pytest.fixture
+def app(sqlite_server):
+    return sqlite_server
+
+
+def test_map_state_uses_latest_position(app, auth):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    with app.app_context():
+        for uid, positions in (
+            # Moved out of the box
+            ("moved-out", [(38.9, -77.0), (51.5, -0.1)]),
+            # Moved into the box
+            ("moved-in", [(51.5, -0.1), (38.9, -77.0)]),
+        ):
+            eud = EUD()
+            eud.uid = uid
+            db.session.add(eud)
+            for i, (latitude, longitude) in enumerate(positions):
+                point = Point()
+                point.uid = uid
+                point.device_uid = uid
+                point.latitude = latitude
+                point.longitude = longitude
+                point.timestamp = now + datetime.timedelta(seconds=i)
+                db.session.add(point)
+        db.session.commit()
+
+    response = auth.get("/api/map_state?left=-77.2&bottom=38.7&right=-76.8&top=39.1")
+    assert response.status_code == 200
+    assert [eud["uid"] for eud in json.loads(response.get_data())["euds"]] == ["moved-in"]
@@ -0,0 +1,91 @@
+import datetime
+import sys
+from xml.etree.ElementTree import fromstring
+
+import pytest
+from sqlalchemy import insert
+
+from opentakserver.extensions import db
+from opentakserver.models.CoT import CoT
+from opentakserver.models.Mission import Mission
+
+MISSION = "stream-mission"
+START = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+@pytest.fixture
+def app(sqlite_server, monkeypatch):
+    # The mission endpoints need a token signed with the server's key
+    monkeypatch.setattr(
+        sys.modules["opentakserver.blueprints.marti_api.mission_marti_api"],
+        "verify_token",
+        lambda: {"MISSION_NAME": MISSION},
+    )
+    with sqlite_server.app_context():
+        seed_cots()
+    return sqlite_server
+
+
+def seed_cots():
+    mission = Mission()
+    mission.name = MISSION
+    db.session.add(mission)
+
+    rows = []
+    for i in range(50):
+        time = START + datetime.timedelta(minutes=i)
+        xml = f'<event uid="stream-1" version="2.0" time="{i}"><detail/></event>'
+        if i == 0:
+            xml = '<?xml version="1.0" encoding="UTF-8"?>' + xml
+        rows.append(
+            {
+                "uid": "stream-1",
+                "timestamp": time,
+                "start": time,
+                "stale": time,
+                "xml": xml,
+                "mission_name": MISSION,
+            }
+        )
+    db.session.execute(insert(CoT), rows)
+    db.session.commit()
+
+
+def event_times(response):
+    assert response.is_streamed
+    assert response.mimetype == "application/xml"
+    return [int(event.attrib["time"]) for event in fromstring(response.get_data())]
+
+
+def test_streams_all_rows_in_order(client):
+    response = client.get("/Marti/api/cot/xml/stream-1/all")
+    assert event_times(response) == list(range(50))
+
+
+def test_mission_cots(client):
+    response = client.get(f"/Marti/api/missions/{MISSION}/cot?limit=5")
+    assert event_times(response) == [45, 46, 47, 48, 49]
+
+
+def test_limit_returns_newest_rows(client):
+    response = client.get("/Marti/api/cot/xml/stream-1/all?limit=5")
+    assert event_times(response) == [45, 46, 47, 48, 49]
+
+
+def test_time_window(client):
+    start = (START + datetime.timedelta(minutes=10)).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+    end = (START + datetime.timedelta(minutes=19)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    response = client.get(
+        "/Marti/api/cot/xml/stream-1/all", query_string={"start": start, "end": end, "limit": 3}
+    )
+    assert event_times(response) == [17, 18, 19]
+
+
+def test_empty_and_invalid(client):
+    assert client.get("/Marti/api/cot/xml/nobody/all").get_data() == b"<events></events>"
+    assert client.get("/Marti/api/cot/xml/stream-1/all?limit=0").status_code == 400
+    response = client.get("/Marti/api/cot/xml/stream-1/all?secago=soon")
+    assert response.status_code == 400
+    assert response.json["error"] == "Invalid secago value: soon"
+    assert client.get("/Marti/api/cot/xml/stream-1/all?start=yesterday").status_code == 400
+    assert client.get(f"/Marti/api/missions/{MISSION}/cot?limit=0").status_code == 400
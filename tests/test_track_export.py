@@ -0,0 +1,114 @@
+import datetime
+import io
+import zipfile
+from xml.etree.ElementTree import fromstring
+
+import numpy as np
+from sqlalchemy import insert
+
+from opentakserver.extensions import db
+from opentakserver.models.EUD import EUD
+from opentakserver.models.Point import Point
+from opentakserver.track_export import (
+    CHUNK_SIZE,
+    douglas_peucker,
+    kml_chunks,
+    kmz_chunks,
+    time_bucket,
+)
+
+KML_NS = "{http://www.opengis.net/kml/2.2}"
+GX_NS = "{http://www.google.com/kml/ext/2.2}"
+START = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def track(count, seconds_between=1.0, gap_at=None, gap_minutes=0):
+    rows = []
+    timestamp = START
+    for i in range(count):
+        if i == gap_at:
+            timestamp += datetime.timedelta(minutes=gap_minutes)
+        # A straight line heading north east
+        rows.append((timestamp, -77.0 + i * 0.00001, 38.0 + i * 0.00001))
+        timestamp += datetime.timedelta(seconds=seconds_between)
+    return rows
+
+
+def parse(chunks):
+    return fromstring("".join(chunks))
+
+
+def test_time_bucket():
+    keep = time_bucket(np.array([0, 1, 2, 5, 6, 11, 12]), 5)
+    assert keep.tolist() == [True, False, False, True, False, True, False]
+
+
+def test_douglas_peucker_keeps_corners():
+    x = np.array([0.0, 1.0, 2.0, 3.0, 3.0, 3.0])
+    y = np.array([0.0, 0.0, 0.0, 0.0, 1.0, 2.0])
+    assert douglas_peucker(x, y, 0.1).tolist() == [True, False, False, True, False, True]
+
+
+def test_unoptimized_export_keeps_every_point():
+    rows = track(CHUNK_SIZE * 2 + 10)
+    kml = parse(kml_chunks(rows, "uid", "callsign", None, False, 5, 5, None))
+    tracks = kml.findall(f".//{GX_NS}Track")
+    assert len(tracks) == 3
+    # Every chunk after the first repeats the last point of the one before it
+    whens = sum(len(t.findall(f"{KML_NS}when")) for t in tracks)
+    assert whens == len(rows) + len(tracks) - 1
+
+
+def test_optimized_export_is_smaller():
+    rows = track(2000)
+    kml = parse(kml_chunks(rows, "uid", "callsign", None, True, 5, 5, None))
+    coords = kml.findall(f".//{GX_NS}coord")
+    assert 2 <= len(coords) < len(rows) // 5
+    assert coords[0].text.startswith("-77.0 38.0")
+
+
+def test_multitrack_threshold_splits_tracks():
+    rows = track(100, gap_at=50, gap_minutes=30)
+    kml = parse(kml_chunks(rows, "uid", "callsign", None, False, 5, 5, 10))
+    tracks = kml.findall(f".//{GX_NS}Track")
+    assert [len(t.findall(f"{KML_NS}when")) for t in tracks] == [50, 50]
+
+
+def test_kmz():
+    kmz = b"".join(kmz_chunks(kml_chunks(track(10), "uid", "callsign", None, False, 5, 5, None)))
+    with zipfile.ZipFile(io.BytesIO(kmz)) as archive:
+        kml = fromstring(archive.read("doc.kml"))
+    assert len(kml.findall(f".//{GX_NS}coord")) == 10
+
+
+def test_export_skips_points_without_a_location(sqlite_server):
+    uid = 'ANDROID-"1";\r\nX-Injected: 1'
+    with sqlite_server.app_context():
+        eud = EUD()
+        eud.uid = uid
+        eud.callsign = "ALPHA"
+        db.session.add(eud)
+        rows = [
+            {"uid": uid, "device_uid": uid, "timestamp": t, "longitude": lon, "latitude": lat}
+            for t, lon, lat in track(10)
+        ]
+        rows[3]["latitude"] = None
+        rows[5]["longitude"] = None
+        db.session.execute(insert(Point), rows)
+        db.session.commit()
+
+    for file_format in ["kml", "kmz"]:
+        response = sqlite_server.test_client().get(
+            "/Marti/ExportMissionKML", query_string={"uid": uid, "format": file_format}
+        )
+        assert response.status_code == 200
+        assert response.headers["Content-Disposition"] == (
+            f'attachment; filename="ANDROID-1_X-Injected_1.{file_format}"'
+        )
+
+        data = response.get_data()
+        if file_format == "kmz":
+            with zipfile.ZipFile(io.BytesIO(data)) as kmz:
+                data = kmz.read("doc.kml")
+        coords = fromstring(data).iter(f"{GX_NS}coord")
+        assert len(list(coords)) == 8
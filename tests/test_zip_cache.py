@@ -0,0 +1,86 @@
+import io
+import os
+import zipfile
+
+import pytest
+from flask import Flask
+
+from opentakserver import zip_cache
+from opentakserver.zip_cache import static_zip
+
+
+@pytest.fixture
+def zip_app(tmp_path):
+    zip_cache._cache.clear()
+    files = tmp_path / "files"
+    files.mkdir()
+    (files / "osm.xml").write_text("<customMapSource/>")
+    (files / "plugin.apk").write_bytes(os.urandom(256 * 1024))
+    (files / "truststore-root.p12").write_bytes(b"\x30\x82" + os.urandom(64))
+
+    app = Flask(__name__)
+    app.config["OTS_DATA_FOLDER"] = str(tmp_path)
+    with app.app_context():
+        yield [
+            ("maps/osm.xml", str(files / "osm.xml")),
+            ("5c2bfcae3d98c9f4d262172df99ebac5/plugin.apk", str(files / "plugin.apk")),
+            ("5c2bfcae3d98c9f4d262172df99ebac5/Ünïcode.p12", str(files / "truststore-root.p12")),
+        ]
+
+
+def test_concatenated_zip_is_valid(zip_app):
+    stream = static_zip(zip_app).stream(
+        {"MANIFEST/manifest.xml": b"<MissionPackageManifest/>", "prefs/preference.pref": b"<p/>"}
+    )
+    data = stream.getvalue()
+    assert len(data) == stream.length
+
+    with zipfile.ZipFile(io.BytesIO(data)) as zipf:
+        assert zipf.testzip() is None
+        assert zipf.namelist() == [name for name, path in zip_app] + [
+            "MANIFEST/manifest.xml",
+            "prefs/preference.pref",
+        ]
+        assert zipf.read("MANIFEST/manifest.xml") == b"<MissionPackageManifest/>"
+        for name, path in zip_app:
+            with open(path, "rb") as f:
+                assert zipf.read(name) == f.read()
+
+
+def test_static_part_is_built_once(zip_app, monkeypatch):
+    first = static_zip(zip_app)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("Cached zip was rebuilt")
+
+    monkeypatch.setattr(zip_cache, "_build", fail)
+    assert static_zip(zip_app) is first
+
+    # A restart loads the zip that's already on disk
+    zip_cache._cache.clear()
+    assert static_zip(zip_app).path == first.path
+
+
+def test_changed_files_are_rebuilt(zip_app):
+    first = static_zip(zip_app)
+    with open(zip_app[0][1], "w") as f:
+        f.write("<customMapSource><name>OSM</name></customMapSource>")
+
+    second = static_zip(zip_app)
+    assert second.path != first.path
+    data = second.stream({}).getvalue()
+    with zipfile.ZipFile(io.BytesIO(data)) as zipf:
+        assert b"OSM" in zipf.read("maps/osm.xml")
+
+
+def test_pruned_zip_can_still_be_sent(zip_app):
+    stream = static_zip(zip_app).stream({"MANIFEST/manifest.xml": b"<MissionPackageManifest/>"})
+    # Another request prunes the zip before this response starts sending it
+    os.remove(stream.cached.path)
+
+    with zipfile.ZipFile(io.BytesIO(stream.getvalue())) as zipf:
+        assert zipf.testzip() is None
+    assert stream.file.closed
+
+    # The next request builds it again
+    assert os.path.exists(static_zip(zip_app).path)